@@ -23,12 +23,15 @@
 from __future__ import absolute_import
 
 import logging
+from multiprocessing.pool import ThreadPool
+import time
 
 from django.conf import settings
 from django.utils.translation import ugettext as _
 
 from cinderclient.v1 import client as cinder_client
 
+from novaclient import exceptions as nova_exceptions
 from novaclient.v1_1 import client as nova_client
 from novaclient.v1_1 import security_group_rules as nova_rules
 from novaclient.v1_1.security_groups import SecurityGroup as NovaSecurityGroup
@@ -46,6 +49,10 @@ LOG = logging.getLogger(__name__)
 INSTANCE_ACTIVE_STATE = 'ACTIVE'
 VOLUME_STATE_AVAILABLE = "available"
 
+# Servers resolved by server_get_many, shared by the requests of a tenant:
+# tenant id -> {instance id: (time fetched, novaclient server)}
+_server_cache = {}
+
 
 class VNCConsole(APIDictWrapper):
     """Wrapper for the "console" dictionary returned by the
@@ -307,6 +314,7 @@ def server_create(request, name, image, flavor, key_name, user_data,
 
 def server_delete(request, instance):
     novaclient(request).servers.delete(instance)
+    _forget_server(request, instance)
 
 
 def server_get(request, instance_id):
@@ -324,6 +332,68 @@ def server_list(request, search_opts=None, all_tenants=False):
             for s in novaclient(request).servers.list(True, search_opts)]
 
 
+def server_get_many(request, instance_ids):
+    """Returns {instance id: Server} of the instances of instance_ids found
+
+    Resolving the instances of a page at once takes a single server_list
+    rather than a server_get per instance. The servers are memoized on
+    the request and kept for INSTANCE_CACHE_TTL seconds (10 by default)
+    for the other requests of the tenant. Instances not in the list of
+    the tenant, and single ones, are fetched with concurrent server_get.
+    """
+    memo = request.__dict__.setdefault('_servers', {})
+    wanted = set(instance_id for instance_id in instance_ids if instance_id)
+    missing = wanted.difference(memo)
+    if missing:
+        ttl = getattr(settings, 'INSTANCE_CACHE_TTL', 10)
+        now = time.time()
+        cache = _server_cache.setdefault(request.user.tenant_id, {})
+        for instance_id in list(missing):
+            fetched_at, server = cache.get(instance_id, (0, None))
+            if now - fetched_at < ttl:
+                memo[instance_id] = Server(server, request)
+                missing.discard(instance_id)
+        if len(missing) > 1:
+            servers = novaclient(request).servers.list(
+                True, {'project_id': request.user.tenant_id})
+            cache.clear()
+            for server in servers:
+                cache[server.id] = (now, server)
+                memo[server.id] = Server(server, request)
+            missing.difference_update(memo)
+        if missing:
+            for instance_id, server in _servers_get(request, missing):
+                memo[instance_id] = server and Server(server, request)
+                if server is not None:
+                    cache[instance_id] = (now, server)
+    return dict((instance_id, memo[instance_id]) for instance_id in wanted
+                if memo.get(instance_id) is not None)
+
+
+def _servers_get(request, instance_ids):
+    """(instance id, novaclient server or None if not found) of instance_ids
+    fetched concurrently"""
+    def get(instance_id):
+        try:
+            return instance_id, novaclient(request).servers.get(instance_id)
+        except nova_exceptions.NotFound:
+            return instance_id, None
+    instance_ids = list(instance_ids)
+    if len(instance_ids) == 1:
+        return [get(instance_ids[0])]
+    pool = ThreadPool(min(len(instance_ids),
+                          getattr(settings, 'INSTANCE_GET_WORKERS', 8)))
+    try:
+        return pool.map(get, instance_ids)
+    finally:
+        pool.close()
+
+
+def _forget_server(request, instance_id):
+    _server_cache.get(request.user.tenant_id, {}).pop(instance_id, None)
+    request.__dict__.get('_servers', {}).pop(instance_id, None)
+
+
 def server_console_output(request, instance_id, tail_length=None):
     """Gets console output of an instance."""
     return novaclient(request).servers.get_console_output(instance_id,
@@ -375,6 +445,7 @@ def server_reboot(request, instance_id, hardness=REBOOT_HARD):
 
 def server_update(request, instance_id, name):
     response = novaclient(request).servers.update(instance_id, name=name)
+    _forget_server(request, instance_id)
     # TODO(gabriel): servers.update method doesn't return anything. :-(
     if response is None:
         return True
@@ -519,9 +590,12 @@ def volume_list(request, search_opts=None):
 def volume_get(request, volume_id):
     volume_data = cinderclient(request).volumes.get(volume_id)
 
+    instances = server_get_many(request,
+                                [attachment.get('server_id') for attachment
+                                 in volume_data.attachments])
     for attachment in volume_data.attachments:
-        if "server_id" in attachment:
-            instance = server_get(request, attachment['server_id'])
+        if attachment.get('server_id') in instances:
+            instance = instances[attachment['server_id']]
             attachment['instance_name'] = instance.name
         else:
             # Nova volume can occasionally send back error'd attachments
@@ -22,9 +22,14 @@
 
 from __future__ import absolute_import
 
+import copy
+import functools
 import logging
+import threading
+import time
 
 from quantumclient.v2_0 import client as quantum_client
+from django.conf import settings
 from django.utils.datastructures import SortedDict
 
 from horizon.api.base import APIDictWrapper, url_for
@@ -90,25 +95,128 @@ def get_ipver_str(ip_version):
     return IP_VERSION_DICT.get(ip_version, '')
 
 
+# Quantum clients by token, per thread as httplib2 is not thread safe.
+# Reusing them keeps their HTTP connections to quantum open.
+_clients = threading.local()
+
+# (tenant id, token, method, args, params) -> (time fetched, response)
+_responses = {}
+_responses_lock = threading.Lock()
+
+
+class CachingQuantumClient(object):
+    """Quantum client remembering what its list_* and show_* calls return
+
+    Responses are memoized for the request and kept QUANTUM_CACHE_TTL
+    seconds (5 by default, 0 to disable) for the other requests made
+    with the same token. Any other call is a write: it drops the
+    responses cached for the tenant.
+    """
+
+    READS = ('list_', 'show_')
+
+    def __init__(self, request, client):
+        self.request = request
+        self.client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        if name.startswith(self.READS):
+            return functools.partial(self._read, name, attr)
+        return functools.partial(self._write, attr)
+
+    def _read(self, name, method, *args, **params):
+        if params.get('retrieve_all', True) is False:
+            # a generator of pages
+            return method(*args, **params)
+        user = self.request.user
+        key = (user.tenant_id, user.token.id, name, args,
+               repr(sorted(params.items())))
+        memo = self.request.__dict__.setdefault('_quantum_responses', {})
+        if key not in memo:
+            ttl = getattr(settings, 'QUANTUM_CACHE_TTL', 5)
+            fetched_at, response = _responses.get(key, (0, None))
+            if time.time() - fetched_at >= ttl:
+                response = method(*args, **params)
+                if ttl:
+                    _store(key, response)
+            memo[key] = response
+        # the callers update what they are given
+        return copy.deepcopy(memo[key])
+
+    def _write(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.request.__dict__.pop('_quantum_responses', None)
+            _forget(self.request.user.tenant_id)
+
+
+def _store(key, response):
+    max_size = getattr(settings, 'QUANTUM_CACHE_SIZE', 1000)
+    with _responses_lock:
+        if len(_responses) >= max_size:
+            ttl = getattr(settings, 'QUANTUM_CACHE_TTL', 5)
+            now = time.time()
+            for other, (fetched_at, response) in _responses.items():
+                if now - fetched_at >= ttl:
+                    del _responses[other]
+            if len(_responses) >= max_size:
+                _responses.clear()
+        _responses[key] = (time.time(), response)
+
+
+def _forget(tenant_id):
+    with _responses_lock:
+        for key in [key for key in _responses if key[0] == tenant_id]:
+            del _responses[key]
+
+
+def _client(request):
+    token = request.user.token.id
+    clients = _clients.__dict__
+    if token not in clients:
+        LOG.debug('quantumclient connection created using token "%s" and '
+                  'url "%s"' % (token, url_for(request, 'network')))
+        # forget the clients of expired tokens
+        if len(clients) >= getattr(settings, 'QUANTUM_CLIENTS', 16):
+            clients.clear()
+        clients[token] = quantum_client.Client(
+            token=token, endpoint_url=url_for(request, 'network'))
+    return clients[token]
+
+
 def quantumclient(request):
-    LOG.debug('quantumclient connection created using token "%s" and url "%s"'
-              % (request.user.token.id, url_for(request, 'network')))
     LOG.debug('user_id=%(user)s, tenant_id=%(tenant)s' %
               {'user': request.user.id, 'tenant': request.user.tenant_id})
-    c = quantum_client.Client(token=request.user.token.id,
-                              endpoint_url=url_for(request, 'network'))
-    return c
+    if '_quantumclient' not in request.__dict__:
+        request._quantumclient = CachingQuantumClient(request,
+                                                      _client(request))
+    return request._quantumclient
+
+
+def _expand_subnets(request, networks):
+    """Replaces the subnet ids of networks by their subnets
+
+    Only the subnets referenced are fetched, with a single subnet_list.
+    """
+    subnet_ids = sorted(set(subnet_id for n in networks
+                            for subnet_id in n['subnets']))
+    subnet_dict = SortedDict()
+    if subnet_ids:
+        subnet_dict = SortedDict([(s['id'], s) for s in
+                                  subnet_list(request, id=subnet_ids)])
+    for n in networks:
+        n['subnets'] = [subnet_dict[s] for s in n['subnets']
+                        if s in subnet_dict]
 
 
 def network_list(request, **params):
     LOG.debug("network_list(): params=%s" % (params))
     networks = quantumclient(request).list_networks(**params).get('networks')
-    # Get subnet list to expand subnet info in network list.
-    subnets = subnet_list(request)
-    subnet_dict = SortedDict([(s['id'], s) for s in subnets])
-    # Expand subnet list from subnet_id to values.
-    for n in networks:
-        n['subnets'] = [subnet_dict[s] for s in n['subnets']]
+    _expand_subnets(request, networks)
     return [Network(n) for n in networks]
 
 
@@ -122,15 +230,18 @@ def network_list_for_tenant(request, tenant_id, **params):
 
     # If a user has admin role, network list returned by Quantum API
     # contains networks that do not belong to that tenant.
-    # So we need to specify tenant_id when calling network_list().
-    networks = network_list(request, tenant_id=tenant_id,
-                            shared=False, **params)
+    # So we need to specify tenant_id when calling list_networks().
+    client = quantumclient(request)
+    networks = client.list_networks(tenant_id=tenant_id, shared=False,
+                                    **params).get('networks')
 
     # In the current Quantum API, there is no way to retrieve
     # both owner networks and public networks in a single API call.
-    networks += network_list(request, shared=True, **params)
+    networks += client.list_networks(shared=True, **params).get('networks')
 
-    return networks
+    # the subnets of both are expanded at once
+    _expand_subnets(request, networks)
+    return [Network(n) for n in networks]
 
 
 def network_get(request, network_id, **params):
@@ -945,6 +1056,23 @@ def chain_list(request, **params):
     chains = quantumclient(request).list_chains(**params).get('chains')
     return [Chain(n) for n in chains]
 
+def chain_list_paged(request, marker=None, **params):
+    """Returns a page of chains from marker and whether there are more
+
+    Pages are API_RESULT_PAGE_SIZE chains long if the quantum server
+    allows pagination, otherwise all the chains are returned at once.
+    """
+    LOG.debug("chain_list_paged(): marker=%s, params=%s" % (marker, params))
+    page_size = getattr(settings, 'API_RESULT_PAGE_SIZE', 20)
+    if marker:
+        params['marker'] = marker
+    page = quantumclient(request).list_chains(retrieve_all=False,
+                                              limit=page_size,
+                                              **params).next()
+    has_more = 'next' in [link['rel'] for link
+                          in page.get('chains_links', [])]
+    return [Chain(n) for n in page.get('chains')], has_more
+
 def chain_list_for_tenant(request, tenant_id, **params):
     LOG.debug("chain_list_for_tenant(): tenant_id=%s, params=%s"
               % (tenant_id, params))
@@ -979,6 +1107,27 @@ def chain_get(request, chain_id, **params):
                                                   **params).get('chain')
     return Chain(chain)
 
+class Chain_launch(QuantumAPIDictWrapper):
+    """Wrapper for quantum chain_launches"""
+    _attrs = ['id', 'chain_id', 'tenant_id', 'status', 'images']
+
+    def __init__(self, apiresource):
+        super(Chain_launch, self).__init__(apiresource)
+
+def chain_launch(request, chain_id):
+    """Boots all the images of a chain, returns at once"""
+    LOG.debug("chain_launch(): chain_id=%s" % chain_id)
+    chain_launch = quantumclient(request).launch_chain_images(
+        chain_id).get('chain_launch')
+    return Chain_launch(chain_launch)
+
+def chain_launch_get(request, chain_launch_id, **params):
+    LOG.debug("chain_launch_get(): chain_launch_id=%s, params=%s"
+              % (chain_launch_id, params))
+    chain_launch = quantumclient(request).show_chain_launch(
+        chain_launch_id, **params).get('chain_launch')
+    return Chain_launch(chain_launch)
+
 class Chain_image(QuantumAPIDictWrapper):
     """Wrapper for quantum chain_images"""
     _attrs = ['name', 'id', 'chain_id', 'image_map_id', 'sequence_number', 'instance_id' , 'instance_uuid']
@@ -991,6 +1140,22 @@ def chain_image_list(request, **params):
     chain_images = quantumclient(request).list_chain_images(**params).get('chain_images')
     return [Chain_image(n) for n in chain_images]
 
+def chain_topology(request, chain_id, **params):
+    """Returns the chain and its Chain_images with one request
+
+    Each chain image also has its 'image', 'networks' and 'confs', and
+    'chain_image_map' is the name of its image as in chain_image_list.
+    """
+    LOG.debug("chain_topology(): chain_id=%s, params=%s" % (chain_id, params))
+    topology = quantumclient(request).show_chain_topology(
+        chain_id, **params).get('topology')
+    chain_images = []
+    for chain_image in topology.pop('images'):
+        chain_image['chain_id'] = chain_id
+        chain_image['chain_image_map'] = chain_image['image']['name']
+        chain_images.append(Chain_image(chain_image))
+    return Chain(topology), chain_images
+
 def chain_image_list_for_chain(request, chain_id, **params):
     LOG.debug("chain_image_list_for_chain(): chain_id=%s, params=%s"
               % (chain_id, params))
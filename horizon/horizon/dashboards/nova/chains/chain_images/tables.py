@@ -97,10 +97,17 @@ def get_image_map_link(datum):
     
 def get_instance_link(datum):
     view = "horizon:nova:instances:detail"
-    if datum.instance_uuid:
+    if getattr(datum, "instance", None):
         return reverse(view, args=(datum.instance_uuid,))
     else:
         return None 
+
+
+def get_instance(datum):
+    instance = getattr(datum, "instance", None)
+    if instance:
+        return "%s (%s)" % (instance.name, instance.status)
+    return datum.instance_uuid
     
     
 class ChainImagesTable(tables.DataTable):
@@ -111,7 +118,7 @@ class ChainImagesTable(tables.DataTable):
                          verbose_name=_("Associated Image"),
                          link=get_image_map_link)
     sequence_number = tables.Column("sequence_number", verbose_name=_("Sequence Number"))
-    instance_uuid = tables.Column("instance_uuid", verbose_name=_("Instance"),
+    instance_uuid = tables.Column(get_instance, verbose_name=_("Instance"),
                                 link=get_instance_link)
     
     class Meta:
@@ -82,93 +82,14 @@ class LaunchChain(forms.SelfHandlingForm):
                                      attrs={'readonly': 'readonly'}))
     def handle(self, request, data):
         try:
-            chain_id = data['chain_id']
-            
-            
-            
-            chain_images = api.quantum.chain_image_list_for_chain(self.request,
-                                                       chain_id)
-            for chain_image in chain_images:
-                name = chain_image.name
-                chian_image_id = chain_image.id
-                image_map_id = chain_image.image_map_id
-                image = api.quantum.image_get(self.request,
-                                                   image_map_id)
-                glance_image_id = image.image_id
-                flavor_id = image.flavor_id
-                security_group_id = image.security_group_id
-                security_groups = []
-                secgrp = api.nova.security_group_get(self.request, image.security_group_id)
-                security_group_name = secgrp.name
-                security_groups.append(security_group_name)
-                chain_confs = api.quantum.chain_image_conf_list_for_chain(self.request,
-                                                   chian_image_id)
-                
-                chain_networks = api.quantum.chain_image_network_list_for_chain(self.request,
-                                                   chian_image_id)
-                netids = []
-                for chain_network in chain_networks:
-                    network_id = chain_network.network_id
-                    netids.append(network_id)
-                if netids:
-                    nics = [{"net-id": netid, "v4-fixed-ip": ""}
-                            for netid in netids]
-                else:
-                    nics = None
-                    msg = _('Failed to launch chain  %s, No Network associated') % data['chain_id']
-                    LOG.info(msg)
-                    redirect = reverse(self.failure_url)
-                    exceptions.handle(request, msg, redirect=redirect)
-                
-                
-                chain_confs = api.quantum.chain_image_conf_list_for_chain(self.request,
-                                                   chian_image_id)
-                for chain_conf in chain_confs:
-                    config_handle_id = chain_conf.config_handle_id
-                    if(config_handle_id == ''):
-                        msg = _('Failed to launch chain  %s, No Cnfiguration associated') % data['chain_id']
-                        LOG.info(msg)
-                        redirect = reverse(self.failure_url)
-                        exceptions.handle(request, msg, redirect=redirect)
-                        
-                    
-                
-                
-                dev_mapping = None
-                custom_script = None
-                keypair_id = None
-                instance_count = 1
-                instance = api.nova.server_create(self.request,
-                               name,
-                               glance_image_id,
-                               flavor_id,
-                               keypair_id,
-                               custom_script,
-                               security_groups,
-                               dev_mapping,
-                               nics=nics,
-                               instance_count=int(instance_count))
-                msg = _('Instance %s was successfully launched.') % instance.id
-                LOG.debug(msg)
-                messages.success(request, msg)
-                instance_uuid = instance.id
-                instance = api.nova.server_get(self.request, instance_uuid)
-                instance_name = getattr(instance,'OS-EXT-SRV-ATTR:instance_name','')
-                instance_id = int(instance_name.split('instance-')[1],16)
-                host = getattr(instance,'OS-EXT-SRV-ATTR:host','')
-                
-                api.quantum.chain_image_modify(request, chian_image_id,
-                                                 instance_uuid=instance_uuid,
-                                                 instance_id=instance_id)
-                
-                for chain_conf in chain_confs:
-                    config_handle_id = chain_conf.config_handle_id
-                    str1 = api.quantum.launch_chain(self.request,
-                                             config_handle_id)                  
-                
-                
-            
-            return instance
+            # quantum boots all the chain images at once and pushes their
+            # configuration once they are active
+            launch = api.quantum.chain_launch(request, data['chain_id'])
+            msg = _('Launch of chain %(name)s started (%(count)d images).') % {
+                'name': data['name'], 'count': len(launch.images)}
+            LOG.debug(msg)
+            messages.success(request, msg)
+            return launch
         except:
             msg = _('Failed to launch chain %s') % data['name']
             LOG.info(msg)
@@ -40,13 +40,20 @@ class IndexView(tables.DataTableView):
     table_class = ChainsTable
     template_name = 'nova/chains/index.html'
 
+    def has_more_data(self, table):
+        return self._more
+
     def get_data(self):
+        marker = self.request.GET.get(ChainsTable._meta.pagination_param,
+                                      None)
         try:
             tenant_id = self.request.user.tenant_id
-            chains = api.quantum.chain_list_for_tenant(self.request,
-                                                           tenant_id)
+            chains, self._more = api.quantum.chain_list_paged(
+                self.request, marker=marker, tenant_id=tenant_id,
+                shared=True)
         except:
             chains = []
+            self._more = False
             msg = _('Chain list can not be retrieved.')
             exceptions.handle(self.request, msg)
         for n in chains:
@@ -93,39 +100,27 @@ class DetailChainView(tables.MultiTableView):
     failure_url = reverse_lazy('horizon:nova:chains:index')
     
     def get_chain_images_data(self):
+        # the chain and its images come in one request, the instance
+        # uuids are recorded by quantum when the chain is launched
+        self._get_data()
         try:
-            chain = self._get_data()
-            chain_images = api.quantum.chain_image_list_for_chain(self.request,
-                                              chain_id=chain.id)
-            for chain_image in chain_images:
-                instance_id = chain_image.instance_id
-                try:
-                    instance = api.nova.server_get(self.request, instance_id)
-                    setattr(chain_image, 'instance_uuid', instance.id)
-                    #xx = getattr(instance,'OS-EXT-SRV-ATTR:instance_name','')
-                    #setattr(chain_image, 'instance_uuid', xx)
-                except:
-                    msg = _('Unable to retrieve details for instance "%s".') \
-                      % (instance_id)
-                    setattr(chain_image, 'instance_uuid', '')
-                    #api.quantum.chain_image_modify(self.request, chain.id,
-                    #                            instance_uuid='NULL')
-                    
-                                                  
-            
+            instances = api.nova.server_get_many(
+                self.request, [s.instance_uuid for s in self._chain_images])
         except:
-            chain_images = []
-            msg = _('Image list can not be retrieved.')
-            exceptions.handle(self.request, msg)
-        for s in chain_images:
+            instances = {}
+            exceptions.handle(self.request,
+                              _('Unable to retrieve chain instances.'))
+        for s in self._chain_images:
             s.set_id_as_name_if_empty()
-        return chain_images
+            s.instance = instances.get(s.instance_uuid)
+        return self._chain_images
 
     def _get_data(self):
         if not hasattr(self, "_chain"):
             try:
                 chain_id = self.kwargs['chain_id']
-                chain = api.quantum.chain_get(self.request, chain_id)
+                chain, self._chain_images = api.quantum.chain_topology(
+                    self.request, chain_id)
                 chain.set_id_as_name_if_empty(length=0)
             except:
                 msg = _('Unable to retrieve details for chain "%s".') \
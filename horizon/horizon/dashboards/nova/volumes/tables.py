@@ -98,8 +98,8 @@ def get_attachment_name(request, attachment):
         name = attachment["instance"].name
     else:
         try:
-            server = api.nova.server_get(request, server_id)
-            name = server.name
+            servers = api.nova.server_get_many(request, [server_id])
+            name = servers[server_id].name if server_id in servers else None
         except:
             name = None
             exceptions.handle(request, _("Unable to retrieve "
@@ -32,9 +32,10 @@ class OverviewTab(tabs.Tab):
         volume_id = self.tab_group.kwargs['volume_id']
         try:
             volume = api.nova.volume_get(request, volume_id)
+            instances = api.nova.server_get_many(
+                request, [att['server_id'] for att in volume.attachments])
             for att in volume.attachments:
-                att['instance'] = api.nova.server_get(request,
-                                                      att['server_id'])
+                att['instance'] = instances.get(att['server_id'])
         except:
             redirect = reverse('horizon:nova:volumes:index')
             exceptions.handle(self.request,
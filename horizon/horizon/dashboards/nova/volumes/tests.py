@@ -296,7 +296,7 @@ class VolumeViewTests(test.TestCase):
                          server.id)
         self.assertEqual(res.status_code, 200)
 
-    @test.create_stubs({api.nova: ('volume_get', 'server_get',)})
+    @test.create_stubs({api.nova: ('volume_get', 'server_get_many',)})
     def test_detail_view(self):
         volume = self.volumes.first()
         server = self.servers.first()
@@ -304,7 +304,8 @@ class VolumeViewTests(test.TestCase):
         volume.attachments = [{"server_id": server.id}]
 
         api.nova.volume_get(IsA(http.HttpRequest), volume.id).AndReturn(volume)
-        api.nova.server_get(IsA(http.HttpRequest), server.id).AndReturn(server)
+        api.nova.server_get_many(IsA(http.HttpRequest), [server.id]) \
+                                 .AndReturn({server.id: server})
 
         self.mox.ReplayAll()
 
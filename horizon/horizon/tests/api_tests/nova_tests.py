@@ -121,6 +121,39 @@ class ComputeApiTests(test.APITestCase):
         ret_val = api.server_get(self.request, server.id)
         self.assertIsInstance(ret_val, api.nova.Server)
 
+    def test_server_get_many(self):
+        servers = self.servers.list()
+        api.nova._server_cache.clear()
+
+        novaclient = self.stub_novaclient()
+        novaclient.servers = self.mox.CreateMockAnything()
+        novaclient.servers.list(True, {'project_id': self.tenant.id}) \
+                          .AndReturn(servers)
+        self.mox.ReplayAll()
+
+        ids = [server.id for server in servers]
+        ret_val = api.nova.server_get_many(self.request, ids)
+        self.assertItemsEqual(ret_val.keys(), ids)
+        for server in ret_val.values():
+            self.assertIsInstance(server, api.nova.Server)
+        # memoized on the request
+        api.nova.server_get_many(self.request, ids)
+
+    def test_server_get_many_cached(self):
+        server = self.servers.first()
+        api.nova._server_cache.clear()
+
+        novaclient = self.stub_novaclient()
+        novaclient.servers = self.mox.CreateMockAnything()
+        novaclient.servers.get(server.id).AndReturn(server)
+        self.mox.ReplayAll()
+
+        api.nova.server_get_many(self.request, [server.id])
+        # another request of the tenant within the TTL
+        del self.request._servers
+        ret_val = api.nova.server_get_many(self.request, [server.id, None])
+        self.assertEqual(ret_val.keys(), [server.id])
+
     def test_server_remove_floating_ip(self):
         server = api.nova.Server(self.servers.first(), self.request)
         floating_ip = self.floating_ips.first()
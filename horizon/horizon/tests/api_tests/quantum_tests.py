@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from quantumclient.v2_0 import client as quantum_client
+
 from horizon import api
 from horizon import test
 
@@ -22,16 +24,44 @@ class QuantumApiTests(test.APITestCase):
     def test_network_list(self):
         networks = {'networks': self.api_networks.list()}
         subnets = {'subnets': self.api_subnets.list()}
+        subnet_ids = sorted(set(subnet_id for n in self.api_networks.list()
+                                for subnet_id in n['subnets']))
 
         quantumclient = self.stub_quantumclient()
         quantumclient.list_networks().AndReturn(networks)
-        quantumclient.list_subnets().AndReturn(subnets)
+        quantumclient.list_subnets(id=subnet_ids).AndReturn(subnets)
         self.mox.ReplayAll()
 
         ret_val = api.quantum.network_list(self.request)
         for n in ret_val:
             self.assertIsInstance(n, api.quantum.Network)
 
+    def test_caching_client(self):
+        networks = {'networks': self.api_networks.list()}
+        network = {'network': self.api_networks.first()}
+        network_id = self.api_networks.first()['id']
+        api.quantum._responses.clear()
+
+        client = self.mox.CreateMock(quantum_client.Client)
+        client.list_networks(shared=True).AndReturn(networks)
+        client.delete_network(network_id)
+        client.list_networks(shared=True).AndReturn(networks)
+        client.show_network(network_id).AndReturn(network)
+        self.mox.ReplayAll()
+
+        caching = api.quantum.CachingQuantumClient(self.request, client)
+        self.assertEqual(caching.list_networks(shared=True), networks)
+        # memoized for the request, a copy every time
+        ret_val = caching.list_networks(shared=True)
+        ret_val['networks'].pop()
+        self.assertEqual(caching.list_networks(shared=True), networks)
+        # and for the other requests of the tenant, until a write
+        del self.request._quantum_responses
+        caching.list_networks(shared=True)
+        caching.delete_network(network_id)
+        caching.list_networks(shared=True)
+        caching.show_network(network_id)
+
     def test_network_get(self):
         network = {'network': self.api_networks.first()}
         subnet = {'subnet': self.api_subnets.first()}
@@ -20,6 +20,7 @@ import httplib
 import logging
 import time
 import urllib
+import urlparse
 
 from quantumclient.client import HTTPClient
 from quantumclient.common import exceptions
@@ -190,6 +191,7 @@ class Client(object):
     session_path = "/lb/sessions/%s"
     slb_configs_path = "/lb/configs"
     slb_config_path = "/lb/configs/%s"
+    slb_config_syncs_path = "/lb/config_syncs"
     
     networkfunctions_path = "/fns/networkfunctions"
     networkfunction_path = "/fns/networkfunctions/%s"
@@ -215,6 +217,10 @@ class Client(object):
     chain_image_conf_path = "/fns/chain_image_confs/%s"
     config_handles_path = "/fns/config_handles"
     config_handle_path = "/fns/config_handles/%s"
+    scaling_policies_path = "/fns/scaling_policies"
+    scaling_policy_path = "/fns/scaling_policies/%s"
+    chain_launches_path = "/fns/chain_launches"
+    chain_launch_path = "/fns/chain_launches/%s"
     
     launchs_path = "/fns/launchs"
     launch_path = "/fns/launchs/%s"
@@ -261,12 +267,13 @@ class Client(object):
         return self.get(self.ext_path % ext_alias, params=_params)
 
     @APIParamsCall
-    def list_ports(self, **_params):
+    def list_ports(self, retrieve_all=True, **_params):
         """
         Fetches a list of all networks for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.ports_path, params=_params)
+        return self.list('ports', self.ports_path, retrieve_all,
+                         **_params)
 
     @APIParamsCall
     def show_port(self, port, **_params):
@@ -297,12 +304,13 @@ class Client(object):
         return self.delete(self.port_path % (port))
 
     @APIParamsCall
-    def list_networks(self, **_params):
+    def list_networks(self, retrieve_all=True, **_params):
         """
         Fetches a list of all networks for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.networks_path, params=_params)
+        return self.list('networks', self.networks_path, retrieve_all,
+                         **_params)
 
     @APIParamsCall
     def show_network(self, network, **_params):
@@ -333,11 +341,12 @@ class Client(object):
         return self.delete(self.network_path % (network))
 
     @APIParamsCall
-    def list_subnets(self, **_params):
+    def list_subnets(self, retrieve_all=True, **_params):
         """
         Fetches a list of all networks for a tenant
         """
-        return self.get(self.subnets_path, params=_params)
+        return self.list('subnets', self.subnets_path, retrieve_all,
+                         **_params)
 
     @APIParamsCall
     def show_subnet(self, subnet, **_params):
@@ -368,12 +377,13 @@ class Client(object):
         return self.delete(self.subnet_path % (subnet))
 
     @APIParamsCall
-    def list_routers(self, **_params):
+    def list_routers(self, retrieve_all=True, **_params):
         """
         Fetches a list of all routers for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.routers_path, params=_params)
+        return self.list('routers', self.routers_path, retrieve_all,
+                         **_params)
 
     @APIParamsCall
     def show_router(self, router, **_params):
@@ -436,12 +446,13 @@ class Client(object):
                         body={'router': {'external_gateway_info': {}}})
 
     @APIParamsCall
-    def list_floatingips(self, **_params):
+    def list_floatingips(self, retrieve_all=True, **_params):
         """
         Fetches a list of all floatingips for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.floatingips_path, params=_params)
+        return self.list('floatingips', self.floatingips_path, retrieve_all,
+                         **_params)
 
     @APIParamsCall
     def show_floatingip(self, floatingip, **_params):
@@ -509,12 +520,13 @@ class Client(object):
         return self.put(self.configuration_path % (configuration), body=body)
 
     @APIParamsCall
-    def list_pools(self, **_params):
+    def list_pools(self, retrieve_all=True, **_params):
         """
         Fetches a list of all pools for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.pools_path, params=_params)
+        return self.list('pools', self.pools_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_pool(self, body=None):
@@ -545,11 +557,12 @@ class Client(object):
         return self.put(self.pool_path % (pool), body=body)
         
     @APIParamsCall
-    def list_members(self, **_params):
+    def list_members(self, retrieve_all=True, **_params):
         """
         Fetches a list of all pool members for a pool/tenant
         """
-        return self.get(self.members_path, params=_params)
+        return self.list('members', self.members_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_member(self, body=None):
@@ -581,11 +594,12 @@ class Client(object):
         
     ###Helath Monitors
     @APIParamsCall
-    def list_monitors(self, **_params):
+    def list_monitors(self, retrieve_all=True, **_params):
         """
         Fetches a list of all pool monitors for a pool/tenant
         """
-        return self.get(self.monitors_path, params=_params)
+        return self.list('monitors', self.monitors_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_monitor(self, body=None):
@@ -617,11 +631,12 @@ class Client(object):
         
     ###Virtual IP's
     @APIParamsCall
-    def list_vips(self, **_params):
+    def list_vips(self, retrieve_all=True, **_params):
         """
         Fetches a list of all pool vips for a pool/tenant
         """
-        return self.get(self.vips_path, params=_params)
+        return self.list('vips', self.vips_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_vip(self, body=None):
@@ -653,11 +668,12 @@ class Client(object):
         
     ###Session Persistance
     @APIParamsCall
-    def list_sessions(self, **_params):
+    def list_sessions(self, retrieve_all=True, **_params):
         """
         Fetches a list of all pool sessions for a pool/tenant
         """
-        return self.get(self.sessions_path, params=_params)
+        return self.list('sessions', self.sessions_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_session(self, body=None):
@@ -688,12 +704,13 @@ class Client(object):
         return self.put(self.session_path % (session), body=body)
         
     @APIParamsCall
-    def list_networkfunctions(self, **_params):
+    def list_networkfunctions(self, retrieve_all=True, **_params):
         """
         Fetches a list of all networkfunctions for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.networkfunctions_path, params=_params)
+        return self.list('networkfunctions', self.networkfunctions_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_networkfunction(self, body=None):
@@ -724,12 +741,13 @@ class Client(object):
         return self.put(self.networkfunction_path % (networkfunction), body=body)
     
     @APIParamsCall
-    def list_categories(self, **_params):
+    def list_categories(self, retrieve_all=True, **_params):
         """
         Fetches a list of all categories for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.categories_path, params=_params)
+        return self.list('categories', self.categories_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_category(self, body=None):
@@ -760,12 +778,14 @@ class Client(object):
         return self.put(self.category_path % (category), body=body)
         
     @APIParamsCall
-    def list_category_networkfunctions(self, **_params):
+    def list_category_networkfunctions(self, retrieve_all=True, **_params):
         """
         Fetches a list of all category_networkfunctions for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.category_networkfunctions_path, params=_params)
+        return self.list('category_networkfunctions',
+                         self.category_networkfunctions_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_category_networkfunction(self, body=None):
@@ -796,12 +816,13 @@ class Client(object):
         return self.put(self.category_networkfunction_path % (category_networkfunction), body=body)
         
     @APIParamsCall
-    def list_vendors(self, **_params):
+    def list_vendors(self, retrieve_all=True, **_params):
         """
         Fetches a list of all vendors for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.vendors_path, params=_params)
+        return self.list('vendors', self.vendors_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_vendor(self, body=None):
@@ -832,12 +853,13 @@ class Client(object):
         return self.put(self.vendor_path % (vendor), body=body)
         
     @APIParamsCall
-    def list_images(self, **_params):
+    def list_images(self, retrieve_all=True, **_params):
         """
         Fetches a list of all images for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.images_path, params=_params)
+        return self.list('images', self.images_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_image(self, body=None):
@@ -868,12 +890,13 @@ class Client(object):
         return self.put(self.image_path % (image), body=body)
         
     @APIParamsCall
-    def list_metadatas(self, **_params):
+    def list_metadatas(self, retrieve_all=True, **_params):
         """
         Fetches a list of all metadatas for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.metadatas_path, params=_params)
+        return self.list('metadatas', self.metadatas_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_metadata(self, body=None):
@@ -903,12 +926,13 @@ class Client(object):
         """
         return self.put(self.metadata_path % (metadata), body=body)
     @APIParamsCall
-    def list_personalities(self, **_params):
+    def list_personalities(self, retrieve_all=True, **_params):
         """
         Fetches a list of all personalities for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.personalities_path, params=_params)
+        return self.list('personalities', self.personalities_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_personality(self, body=None):
@@ -939,12 +963,13 @@ class Client(object):
         return self.put(self.personality_path % (personality), body=body)
         
     @APIParamsCall
-    def list_chains(self, **_params):
+    def list_chains(self, retrieve_all=True, **_params):
         """
         Fetches a list of all chains for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.chains_path, params=_params)
+        return self.list('chains', self.chains_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_chain(self, body=None):
@@ -975,12 +1000,45 @@ class Client(object):
         return self.put(self.chain_path % (chain), body=body)
         
     @APIParamsCall
-    def list_chain_images(self, **_params):
+    def launch_chain_images(self, chain, body=None):
+        """
+        Boots all the images of a chain, returns the chain_launch
+        """
+        return self.put((self.chain_path % chain) + "/launch", body=body)
+
+    @APIParamsCall
+    def show_chain_topology(self, chain, **_params):
+        """
+        Fetches a chain with its chain images and their image, networks
+        and configurations
+        """
+        return self.get((self.chain_path % chain) + "/topology",
+                        params=_params)
+
+    @APIParamsCall
+    def list_chain_launches(self, retrieve_all=True, **_params):
+        """
+        Fetches a list of all chain_launches for a tenant
+        """
+        return self.list('chain_launches', self.chain_launches_path,
+                         retrieve_all, **_params)
+
+    @APIParamsCall
+    def show_chain_launch(self, chain_launch, **_params):
+        """
+        Fetches the progress of a chain_launch
+        """
+        return self.get(self.chain_launch_path % (chain_launch),
+                        params=_params)
+
+    @APIParamsCall
+    def list_chain_images(self, retrieve_all=True, **_params):
         """
         Fetches a list of all chain_images for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.chain_images_path, params=_params)
+        return self.list('chain_images', self.chain_images_path, retrieve_all,
+                         **_params)
         
     @APIParamsCall
     def create_chain_image(self, body=None):
@@ -1011,12 +1069,14 @@ class Client(object):
         return self.put(self.chain_image_path % (chain_image), body=body)
         
     @APIParamsCall
-    def list_chain_image_networks(self, **_params):
+    def list_chain_image_networks(self, retrieve_all=True, **_params):
         """
         Fetches a list of all chain_image_networks for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.chain_image_networks_path, params=_params)
+        return self.list('chain_image_networks',
+                         self.chain_image_networks_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_chain_image_network(self, body=None):
@@ -1047,12 +1107,13 @@ class Client(object):
         return self.put(self.chain_image_network_path % (chain_image_network), body=body)
         
     @APIParamsCall
-    def list_chain_image_confs(self, **_params):
+    def list_chain_image_confs(self, retrieve_all=True, **_params):
         """
         Fetches a list of all chain_image_confs for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.chain_image_confs_path, params=_params)
+        return self.list('chain_image_confs', self.chain_image_confs_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_chain_image_conf(self, body=None):
@@ -1083,12 +1144,13 @@ class Client(object):
         return self.put(self.chain_image_conf_path % (chain_image_conf), body=body)
         
     @APIParamsCall
-    def list_config_handles(self, **_params):
+    def list_config_handles(self, retrieve_all=True, **_params):
         """
         Fetches a list of all config_handles for a tenant
         """
         # Pass filters in "params" argument to do_request
-        return self.get(self.config_handles_path, params=_params)
+        return self.list('config_handles', self.config_handles_path,
+                         retrieve_all, **_params)
         
     @APIParamsCall
     def create_config_handle(self, body=None):
@@ -1118,12 +1180,57 @@ class Client(object):
         """
         return self.put(self.config_handle_path % (config_handle), body=body)
         
+    @APIParamsCall
+    def list_scaling_policies(self, retrieve_all=True, **_params):
+        """
+        Fetches a list of all scaling_policies for a tenant
+        """
+        return self.list('scaling_policies', self.scaling_policies_path,
+                         retrieve_all, **_params)
+
+    @APIParamsCall
+    def create_scaling_policy(self, body=None):
+        """
+        Creates a new scaling_policy
+        """
+        return self.post(self.scaling_policies_path, body=body)
+
+    @APIParamsCall
+    def delete_scaling_policy(self, scaling_policy):
+        """
+        Deletes the specified scaling_policy
+        """
+        return self.delete(self.scaling_policy_path % (scaling_policy))
+
+    @APIParamsCall
+    def show_scaling_policy(self, scaling_policy, **_params):
+        """
+        Fetches information of a certain scaling_policy
+        """
+        return self.get(self.scaling_policy_path % (scaling_policy),
+                        params=_params)
+
+    @APIParamsCall
+    def update_scaling_policy(self, scaling_policy, body=None):
+        """
+        Updates a scaling_policy
+        """
+        return self.put(self.scaling_policy_path % (scaling_policy),
+                        body=body)
+
     @APIParamsCall
     def generate_slb_config(self, body=None):
         """
         Generate the specified configuration
         """
         return self.post(self.slb_configs_path, body=body)
+
+    @APIParamsCall
+    def sync_slb_config(self, body=None):
+        """
+        Fetches the configuration changes since the given version
+        """
+        return self.post(self.slb_config_syncs_path, body=body)
         
     @APIParamsCall
     def launch_chain(self, launch, **_params):
@@ -1157,6 +1264,38 @@ class Client(object):
         # Raise the appropriate exception
         exception_handler_v20(status_code, des_error_body)
 
+    def list(self, collection, path, retrieve_all=True, **params):
+        """
+        Fetches a list of resources, following the pagination links of
+        the server. With retrieve_all the pages are merged into a single
+        {collection: [...]}, otherwise a generator of the pages is
+        returned.
+        """
+        if retrieve_all:
+            res = []
+            for r in self._pagination(collection, path, **params):
+                res.extend(r[collection])
+            return {collection: res}
+        else:
+            return self._pagination(collection, path, **params)
+
+    def _pagination(self, collection, path, **params):
+        if params.get('page_reverse', False):
+            linkrel = 'previous'
+        else:
+            linkrel = 'next'
+        next = True
+        while next:
+            res = self.get(path, params=params)
+            yield res
+            next = False
+            for link in res.get('%s_links' % collection, []):
+                if link['rel'] == linkrel:
+                    query_str = urlparse.urlparse(link['href']).query
+                    params = urlparse.parse_qs(query_str)
+                    next = True
+                    break
+
     def do_request(self, method, action, body=None, headers=None, params=None):
         # Add format and tenant_id
         action += ".%s" % self.format
@@ -0,0 +1,205 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import logging
+import shlex
+
+import eventlet
+from eventlet.green import subprocess
+
+from quantum.agent.linux import utils
+
+LOG = logging.getLogger(__name__)
+
+INTERFACE_COLUMNS = ['name', 'ofport', 'external_ids']
+
+
+def _cell(value):
+    """Converts an ovsdb json cell to python."""
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == 'map':
+            return dict((_cell(k), _cell(v)) for k, v in value[1])
+        if value[0] == 'set':
+            return [_cell(v) for v in value[1]]
+        if value[0] in ('uuid', 'named-uuid'):
+            return value[1]
+    return value
+
+
+class InterfaceMonitor(object):
+    """Live view of the VIF ports of a bridge.
+
+    Runs 'ovsdb-client monitor' on the Interface table and keeps its rows
+    in memory, so the set of VIF ports is known without running
+    ovs-vsctl for every port on each polling pass. Only a change to the
+    table costs a fork: the port list of the bridge is read again when a
+    VIF interface appears.
+
+    Until the monitor has received the initial table contents, and
+    whenever ovsdb-client is not running, get_vif_port_set() falls back
+    to polling the bridge.
+    """
+
+    def __init__(self, bridge, respawn_interval=2):
+        self.bridge = bridge
+        self.respawn_interval = respawn_interval
+        # row uuid -> {'name': ..., 'ofport': ..., 'external_ids': ...}
+        self.rows = {}
+        # row uuid -> iface-id of the xenserver VIFs
+        self.xapi_ids = {}
+        self.bridge_ports = set()
+        self.synced = False
+        self.vif_ports = set()
+        self.changed = eventlet.queue.Queue(1)
+        self._process = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+        self._kill()
+
+    def _command(self):
+        cmd = ['ovsdb-client', 'monitor', 'Interface',
+               ','.join(INTERFACE_COLUMNS), '--format=json']
+        if self.bridge.root_helper:
+            cmd = shlex.split(self.bridge.root_helper) + cmd
+        return cmd
+
+    def _run(self):
+        while True:
+            try:
+                self._process = subprocess.Popen(
+                    self._command(), stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    preexec_fn=utils._subprocess_setup)
+                for line in iter(self._process.stdout.readline, ''):
+                    self.process_update(line)
+            except Exception:
+                LOG.exception(_("Error monitoring the Interface table"))
+            self._kill()
+            self.synced = False
+            self.rows.clear()
+            self.xapi_ids.clear()
+            self._notify()
+            LOG.warn(_("ovsdb-client monitor exited, polling %(br)s until "
+                       "it is respawned in %(interval)s seconds"),
+                     {'br': self.bridge.br_name,
+                      'interval': self.respawn_interval})
+            eventlet.sleep(self.respawn_interval)
+
+    def _kill(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait()
+            except OSError:
+                pass
+            self._process = None
+
+    def process_update(self, line):
+        """Applies one table update printed by ovsdb-client."""
+        line = line.strip()
+        if not line:
+            return
+        update = json.loads(line)
+        headings = update['headings']
+        vif_added = False
+        for data in update['data']:
+            row = dict(zip(headings, data))
+            uuid = _cell(row['row'])
+            action = row['action']
+            if action == 'delete':
+                self.rows.pop(uuid, None)
+                self.xapi_ids.pop(uuid, None)
+            elif action in ('initial', 'insert', 'new'):
+                values = dict((column, _cell(row[column]))
+                              for column in INTERFACE_COLUMNS)
+                old = self.rows.get(uuid)
+                if self._is_vif(values) and (
+                        old is None or old['name'] != values['name'] or
+                        not self._is_vif(old)):
+                    vif_added = True
+                self.rows[uuid] = values
+            # 'old' rows only carry the columns the 'new' row changes
+        if vif_added or not self.synced:
+            self.bridge_ports = set(self.bridge.get_port_name_list())
+        self.synced = True
+        self._update_vif_ports()
+
+    def _is_vif(self, values):
+        external_ids = values['external_ids']
+        return (isinstance(external_ids, dict) and
+                'attached-mac' in external_ids and
+                ('iface-id' in external_ids or
+                 'xs-vif-uuid' in external_ids))
+
+    def _update_vif_ports(self):
+        vif_ports = set()
+        for uuid, values in self.rows.iteritems():
+            if values['name'] not in self.bridge_ports:
+                continue
+            if not self._is_vif(values):
+                continue
+            external_ids = values['external_ids']
+            if 'iface-id' in external_ids:
+                vif_ports.add(external_ids['iface-id'])
+            else:
+                # if this is a xenserver and iface-id is not automatically
+                # synced to OVS from XAPI, we grab it from XAPI directly
+                if uuid not in self.xapi_ids:
+                    self.xapi_ids[uuid] = self.bridge.get_xapi_iface_id(
+                        external_ids['xs-vif-uuid'])
+                vif_ports.add(self.xapi_ids[uuid])
+        added = vif_ports - self.vif_ports
+        removed = self.vif_ports - vif_ports
+        if added or removed:
+            LOG.debug(_("VIF ports added to %(br)s: %(added)s, removed: "
+                        "%(removed)s"), {'br': self.bridge.br_name,
+                                        'added': list(added),
+                                        'removed': list(removed)})
+            self.vif_ports = vif_ports
+            self._notify()
+
+    def _notify(self):
+        try:
+            self.changed.put_nowait(None)
+        except eventlet.queue.Full:
+            pass
+
+    def get_vif_port_set(self):
+        if not self.synced:
+            return self.bridge.get_vif_port_set()
+        return set(self.vif_ports)
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for the VIF ports to change.
+
+        Returns False on timeout, the caller has to poll the bridge then
+        if the monitor is not synced.
+        """
+        try:
+            self.changed.get(timeout=timeout)
+            return True
+        except eventlet.queue.Empty:
+            return False
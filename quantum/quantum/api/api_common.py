@@ -16,12 +16,104 @@
 #    under the License.
 
 import logging
+import urllib
 
 from webob import exc
 
+from quantum.openstack.common import cfg
+
 
 LOG = logging.getLogger(__name__)
 
+# query parameters of the list operations which are not filters
+PAGINATION_PARAMS = ('limit', 'marker', 'page_reverse')
+SORTING_PARAMS = ('sort_key', 'sort_dir')
+
+
+def get_limit_and_marker(request):
+    """Returns (limit, marker) of a list request, (None, None) if unlimited
+
+    limit=0 or no limit means pagination_max_limit, and larger limits are
+    capped to it.
+    """
+    try:
+        limit = int(request.GET.get('limit', 0))
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise exc.HTTPBadRequest(_("Limit must be an integer 0 or greater "
+                                   "and not '%s'") %
+                                 request.GET.get('limit'))
+    max_limit = cfg.CONF.pagination_max_limit
+    if max_limit > 0:
+        limit = min(limit or max_limit, max_limit)
+    if not limit:
+        return None, None
+    return limit, request.GET.get('marker') or None
+
+
+def get_page_reverse(request):
+    value = request.GET.get('page_reverse', 'False')
+    if value.lower() not in ('true', 'false'):
+        raise exc.HTTPBadRequest(_("page_reverse must be True or False and "
+                                   "not '%s'") % value)
+    return value.lower() == 'true'
+
+
+def get_sorts(request, attr_info):
+    """Returns [(key, ascending)] of the sort_key and sort_dir of a request
+
+    Every sort_key needs a sort_dir, 'asc' or 'desc', and has to be a
+    visible attribute of the resource.
+    """
+    sort_keys = request.GET.getall('sort_key')
+    sort_dirs = request.GET.getall('sort_dir')
+    if len(sort_keys) != len(sort_dirs):
+        raise exc.HTTPBadRequest(_("The number of sort_key and sort_dir "
+                                   "must be the same"))
+    bad_keys = [key for key in sort_keys
+                if not attr_info.get(key, {}).get('is_visible')]
+    if bad_keys:
+        raise exc.HTTPBadRequest(_("%s is invalid attribute for sort_key") %
+                                 ', '.join(bad_keys))
+    bad_dirs = [sort_dir for sort_dir in sort_dirs
+                if sort_dir not in ('asc', 'desc')]
+    if bad_dirs:
+        raise exc.HTTPBadRequest(_("%s is invalid attribute for sort_dir, "
+                                   "must be 'asc' or 'desc'") %
+                                 ', '.join(bad_dirs))
+    return [(key, sort_dir == 'asc')
+            for key, sort_dir in zip(sort_keys, sort_dirs)]
+
+
+def _get_page_href(request, marker, page_reverse):
+    params = [(key, value) for key, value in request.GET.items()
+              if key not in ('marker', 'page_reverse')]
+    params.append(('marker', marker))
+    if page_reverse:
+        params.append(('page_reverse', 'True'))
+    return '%s?%s' % (request.path_url, urllib.urlencode(params))
+
+
+def get_pagination_links(request, items, has_more, marker, page_reverse):
+    """Returns the next and previous links of a page of items
+
+    has_more tells whether there are items beyond the page in the
+    direction it was read in. The other way there are items if the page
+    started at a marker.
+    """
+    if not items:
+        return []
+    links = []
+    if (has_more and not page_reverse) or (marker and page_reverse):
+        links.append({'rel': 'next',
+                      'href': _get_page_href(request, items[-1]['id'],
+                                             False)})
+    if (has_more and page_reverse) or (marker and not page_reverse):
+        links.append({'rel': 'previous',
+                      'href': _get_page_href(request, items[0]['id'], True)})
+    return links
+
 
 class QuantumController(object):
     """ Base controller class for Quantum API """
@@ -14,15 +14,18 @@
 # limitations under the License.
 
 import logging
+import operator
 import socket
 
 import netaddr
 import webob.exc
 
+from quantum.api import api_common
 from quantum.api.v2 import attributes
 from quantum.api.v2 import resource as wsgi_resource
 from quantum.common import exceptions
 from quantum.openstack.common import cfg
+from quantum.openstack.common import excutils
 from quantum.openstack.common.notifier import api as notifier_api
 from quantum import policy
 from quantum import quota
@@ -83,7 +86,8 @@ def _filters(request, attr_info):
     """
     res = {}
     for key in set(request.GET):
-        if key == 'fields':
+        if key in (('fields',) + api_common.PAGINATION_PARAMS +
+                   api_common.SORTING_PARAMS):
             continue
         values = [v for v in request.GET.getall(key) if v]
         key_attr_info = attr_info.get(key, {})
@@ -120,6 +124,10 @@ class Controller(object):
         self._attr_info = attr_info
         self._allow_bulk = allow_bulk
         self._native_bulk = self._is_native_bulk_supported()
+        self._allow_pagination = cfg.CONF.allow_pagination
+        self._allow_sorting = cfg.CONF.allow_sorting
+        self._native_pagination = self._is_native_pagination_supported()
+        self._native_sorting = self._is_native_sorting_supported()
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
         self._publisher_id = notifier_api.publisher_id('network')
@@ -130,6 +138,16 @@ class Controller(object):
                                  % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_bulk_attr_name, False)
 
+    def _is_native_pagination_supported(self):
+        native_pagination_attr_name = ("_%s__native_pagination_support"
+                                       % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_pagination_attr_name, False)
+
+    def _is_native_sorting_supported(self):
+        native_sorting_attr_name = ("_%s__native_sorting_support"
+                                    % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_sorting_attr_name, False)
+
     def _is_visible(self, attr):
         attr_val = self._attr_info.get(attr)
         return attr_val and attr_val['is_visible']
@@ -166,23 +184,89 @@ class Controller(object):
         # are needed for authZ policy validation are not stripped away by the
         # plugin before returning.
         original_fields, fields_to_add = self._do_field_list(_fields(request))
+        limit, marker = None, None
+        if self._allow_pagination:
+            limit, marker = api_common.get_limit_and_marker(request)
+        page_reverse = bool(limit) and api_common.get_page_reverse(request)
+        sorts = []
+        if self._allow_sorting:
+            sorts = api_common.get_sorts(request, self._attr_info)
+        if limit and 'id' not in [key for key, ascending in sorts]:
+            # the marker is an id, pages are only stable if it is unique
+            # in the order
+            sorts.append(('id', True))
         kwargs = {'filters': _filters(request, self._attr_info),
                   'fields': original_fields}
+        # pagination is only native with sorting, it relies on the order
+        native_sorting = self._native_sorting and sorts
+        native_pagination = (self._native_pagination and
+                             self._native_sorting and limit)
+        if native_sorting:
+            kwargs['sorts'] = sorts
+        if native_pagination:
+            # one more item tells whether there is another page
+            kwargs.update(limit=limit + 1, marker=marker,
+                          page_reverse=page_reverse)
+        if sorts and original_fields:
+            # the keys sorted on, and the ids the page links are made of,
+            # have to be fetched whoever sorts and pages
+            for key, ascending in sorts:
+                if key not in original_fields:
+                    original_fields.append(key)
+                    fields_to_add.append(key)
         obj_getter = getattr(self._plugin, "get_%s" % self._collection)
         obj_list = obj_getter(request.context, **kwargs)
+        if sorts and not native_sorting:
+            obj_list = self._emulate_sorting(obj_list, sorts)
+        if limit and not native_pagination:
+            obj_list = self._emulate_pagination(obj_list, limit, marker,
+                                                page_reverse)
+        links = []
+        if limit:
+            has_more = len(obj_list) > limit
+            obj_list = obj_list[-limit:] if page_reverse else obj_list[:limit]
+            links = api_common.get_pagination_links(request, obj_list,
+                                                    has_more, marker,
+                                                    page_reverse)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        "get_%s" % self._resource,
-                                        obj,
-                                        plugin=self._plugin)]
-        return {self._collection: [self._view(obj,
-                                              fields_to_strip=fields_to_add)
-                                   for obj in obj_list]}
+            obj_list = policy.check_list(request.context,
+                                         "get_%s" % self._resource,
+                                         obj_list,
+                                         plugin=self._plugin)
+        result = {self._collection: [self._view(obj,
+                                                fields_to_strip=fields_to_add)
+                                     for obj in obj_list]}
+        if links:
+            result[self._collection + '_links'] = links
+        return result
+
+    def _emulate_sorting(self, obj_list, sorts):
+        # sorts are stable, the first key is sorted on last
+        obj_list = list(obj_list)
+        for key, ascending in reversed(sorts):
+            obj_list.sort(key=operator.itemgetter(key),
+                          reverse=not ascending)
+        return obj_list
+
+    def _emulate_pagination(self, obj_list, limit, marker, page_reverse):
+        """Returns the limit + 1 items from marker as a native plugin does"""
+        if marker:
+            ids = [obj['id'] for obj in obj_list]
+            if marker not in ids:
+                raise webob.exc.HTTPBadRequest(_("Marker %s not found") %
+                                               marker)
+            index = ids.index(marker)
+            if page_reverse:
+                obj_list = obj_list[:index]
+            else:
+                obj_list = obj_list[index + 1:]
+        if page_reverse:
+            return obj_list[-(limit + 1):]
+        return obj_list[:limit + 1]
 
     def _item(self, request, id, do_authz=False, field_list=None):
         """Retrieves and formats a single element of the requested entity"""
@@ -269,20 +353,8 @@ class Controller(object):
                                    action,
                                    item[self._resource],
                                    plugin=self._plugin)
-                    try:
-                        count = QUOTAS.count(request.context, self._resource,
-                                             self._plugin, self._collection,
-                                             item[self._resource]['tenant_id'])
-                        kwargs = {self._resource: count + 1}
-                    except exceptions.QuotaResourceUnknown as e:
-                        # We don't want to quota this resource
-                        LOG.debug(e)
-                    except Exception:
-                        raise
-                    else:
-                        QUOTAS.limit_check(request.context,
-                                           item[self._resource]['tenant_id'],
-                                           **kwargs)
+                items = [item[self._resource]
+                         for item in body[self._collection]]
             else:
                 self._validate_network_tenant_ownership(
                     request,
@@ -292,23 +364,11 @@ class Controller(object):
                                action,
                                body[self._resource],
                                plugin=self._plugin)
-                try:
-                    count = QUOTAS.count(request.context, self._resource,
-                                         self._plugin, self._collection,
-                                         body[self._resource]['tenant_id'])
-                    kwargs = {self._resource: count + 1}
-                except exceptions.QuotaResourceUnknown as e:
-                    # We don't want to quota this resource
-                    LOG.debug(e)
-                except Exception:
-                    raise
-                else:
-                    QUOTAS.limit_check(request.context,
-                                       body[self._resource]['tenant_id'],
-                                       **kwargs)
+                items = [body[self._resource]]
         except exceptions.PolicyNotAuthorized:
             LOG.exception("Create operation not authorized")
             raise webob.exc.HTTPForbidden()
+        reservations = self._reserve_quotas(request, items)
 
         def notify(create_result):
             notifier_api.notify(request.context,
@@ -318,22 +378,51 @@ class Controller(object):
                                 create_result)
             return create_result
 
-        if self._collection in body and self._native_bulk:
-            # plugin does atomic bulk create operations
-            obj_creator = getattr(self._plugin, "%s_bulk" % action)
-            objs = obj_creator(request.context, body)
-            return notify({self._collection: [self._view(obj)
-                                              for obj in objs]})
-        else:
-            obj_creator = getattr(self._plugin, action)
-            if self._collection in body:
-                # Emulate atomic bulk behavior
-                objs = self._emulate_bulk_create(obj_creator, request, body)
-                return notify({self._collection: objs})
+        try:
+            if self._collection in body and self._native_bulk:
+                # plugin does atomic bulk create operations
+                obj_creator = getattr(self._plugin, "%s_bulk" % action)
+                objs = obj_creator(request.context, body)
+                result = {self._collection: [self._view(obj)
+                                             for obj in objs]}
             else:
-                kwargs = {self._resource: body}
-                obj = obj_creator(request.context, **kwargs)
-                return notify({self._resource: self._view(obj)})
+                obj_creator = getattr(self._plugin, action)
+                if self._collection in body:
+                    # Emulate atomic bulk behavior
+                    objs = self._emulate_bulk_create(obj_creator, request,
+                                                     body)
+                    result = {self._collection: objs}
+                else:
+                    kwargs = {self._resource: body}
+                    obj = obj_creator(request.context, **kwargs)
+                    result = {self._resource: self._view(obj)}
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(request.context, reservations)
+        # the usages now count the resources created
+        QUOTAS.commit(request.context, reservations)
+        return notify(result)
+
+    def _reserve_quotas(self, request, items):
+        """Reserves the quota of the resources to be created, once for
+        the items of each tenant, and returns the reservations"""
+        deltas = {}
+        for item in items:
+            tenant_id = item['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        reservations = []
+        try:
+            for tenant_id, delta in deltas.items():
+                reservations.extend(QUOTAS.reserve(
+                    request.context, tenant_id, self._resource, delta,
+                    self._plugin, self._collection, tenant_id))
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(request.context, reservations)
+        return reservations
 
     def delete(self, request, id):
         """Deletes the specified entity"""
@@ -45,12 +45,21 @@ core_opts = [
                default='quantum.plugins.sample.SamplePlugin.FakePlugin'),
     cfg.ListOpt('service_plugins',default = []),   # (Trinath) added to support service plugins config in quantum.conf
     cfg.StrOpt('base_mac', default="fa:16:3e:00:00:00"),
-    cfg.IntOpt('mac_generation_retries', default=16),
     cfg.BoolOpt('allow_bulk', default=True),
+    cfg.BoolOpt('allow_pagination', default=False,
+                help=_("Allow limit and marker on the list operations")),
+    cfg.BoolOpt('allow_sorting', default=False,
+                help=_("Allow sort_key and sort_dir on the list operations")),
+    cfg.IntOpt('pagination_max_limit', default=-1,
+               help=_("Maximum number of items returned by a list "
+                      "operation, -1 means no limit")),
     cfg.IntOpt('max_dns_nameservers', default=5),
     cfg.IntOpt('max_subnet_host_routes', default=20),
     cfg.StrOpt('state_path', default='.'),
     cfg.IntOpt('dhcp_lease_duration', default=120),
+    cfg.BoolOpt('ip_allocation_random_range', default=False,
+                help=_("Allocate IP addresses from a random free range of "
+                       "the subnet rather than the lowest one")),
     cfg.BoolOpt('allow_overlapping_ips', default=False),
     cfg.StrOpt('control_exchange',
                default='quantum',
@@ -61,6 +70,13 @@ core_opts = [
 
 slb_scheduler_opts = [
         cfg.StrOpt('loadbalancer_driver',default='Fake'), # (trinath) added to support Service drivers config
+        cfg.IntOpt('config_history', default=100,
+                   help=_("Config versions kept per config handle, service "
+                          "VMs older than that get a full snapshot")),
+        cfg.IntOpt('notify_window', default=200,
+                   help=_("Milliseconds config change notifications of a "
+                          "config handle are collected for before one is "
+                          "sent, 0 to send them right away")),
 ]
 
 nws_scheduler_opts = [
@@ -69,6 +85,48 @@ nws_scheduler_opts = [
         cfg.StrOpt('admin_password'),
         cfg.StrOpt('admin_tenant_name'),
         cfg.StrOpt('auth_url'),
+        cfg.IntOpt('instance_poll_interval', default=1,
+                   help=_("Seconds between polls of service VM states")),
+        cfg.IntOpt('instance_max_poll_interval', default=10,
+                   help=_("Upper bound of the backed off poll interval")),
+        cfg.IntOpt('instance_active_timeout', default=300,
+                   help=_("Seconds to wait for a service VM to become "
+                          "active before dropping its queued requests")),
+        cfg.IntOpt('instance_cache_ttl', default=600,
+                   help=_("Seconds the host of an active service VM is "
+                          "trusted before nova is asked again")),
+        cfg.IntOpt('client_pool_size', default=4,
+                   help=_("Authenticated nova clients kept per endpoint")),
+        cfg.IntOpt('token_refresh_margin', default=60,
+                   help=_("Seconds before token expiry at which pooled "
+                          "clients re-authenticate")),
+        cfg.StrOpt('scheduler_policy', default='least_loaded',
+                   help=_("Service VM selection policy: least_loaded, "
+                          "bin_pack, spread or the class path of a "
+                          "SchedulingPolicy")),
+        cfg.IntOpt('max_resources_per_device', default=10,
+                   help=_("Resources scheduled to one service VM")),
+        cfg.IntOpt('max_connections_per_device', default=0,
+                   help=_("Connections a service VM is considered full "
+                          "at, 0 to ignore the reported connections")),
+        cfg.IntOpt('device_index_ttl', default=60,
+                   help=_("Seconds the scheduler trusts its in-memory "
+                          "index of candidate devices")),
+        cfg.IntOpt('chain_topology_ttl', default=60,
+                   help=_("Seconds a cached chain topology is served "
+                          "before it is read from the database again")),
+        cfg.IntOpt('scaling_interval', default=60,
+                   help=_("Seconds between evaluations of the chain image "
+                          "scaling policies, 0 disables autoscaling")),
+        cfg.IntOpt('scaling_window', default=300,
+                   help=_("Seconds of HAProxy stats averaged by a scaling "
+                          "policy")),
+        cfg.IntOpt('stats_retention', default=3600,
+                   help=_("Seconds HAProxy stats of the service VMs are "
+                          "kept")),
+        cfg.IntOpt('launch_pool_size', default=8,
+                   help=_("Service VMs booted at once when launching "
+                          "chains")),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(core_opts)
@@ -292,6 +292,12 @@ class Category_networkfunctionNotFound(NotFound):
 class Config_handleNotFound(NotFound):
     message = _("Config_handle %(config_handle_id)s could not be found ")
 
+class Scaling_policyNotFound(NotFound):
+    message = _("Scaling policy %(scaling_policy_id)s could not be found ")
+
+class Chain_launchNotFound(NotFound):
+    message = _("Chain launch %(chain_launch_id)s could not be found ")
+
 class InstanceNotFound(NotFound):
     message = _("No Instance exists for Configuration Handle Id %(config_handle_id)")
 
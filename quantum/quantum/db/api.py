@@ -33,6 +33,8 @@ LOG = logging.getLogger(__name__)
 _ENGINE = None
 _MAKER = None
 BASE = model_base.BASE
+# run by register_models, see register_upgrade
+_UPGRADES = []
 
 
 class MySQLPingListener(object):
@@ -129,12 +131,25 @@ def register_models(base=BASE):
     assert _ENGINE
     try:
         base.metadata.create_all(_ENGINE)
+        for upgrade in _UPGRADES:
+            upgrade(_ENGINE)
     except sql.exc.OperationalError as e:
         LOG.info("Database registration exception: %s" % e)
         return False
     return True
 
 
+def register_upgrade(upgrade):
+    """Registers upgrade(engine), run after the models are registered
+
+    create_all only creates the tables missing, the upgrades bring the
+    tables of an existing database to their models. They are run at
+    each registration, so must do nothing on tables up to date.
+    """
+    if upgrade not in _UPGRADES:
+        _UPGRADES.append(upgrade)
+
+
 def unregister_models(base=BASE):
     """Unregister Models, useful clearing out data before testing"""
     global _ENGINE
@@ -15,9 +15,9 @@
 
 import datetime
 import logging
-import random
 
 import netaddr
+import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
@@ -26,7 +26,11 @@ from quantum.common import constants
 from quantum.common import exceptions as q_exc
 from quantum.common import utils
 from quantum.db import api as db
+from quantum.db import ipam
+from quantum.db import macs
 from quantum.db import models_v2
+from quantum.db import quota_usages
+from quantum.db import sqlalchemyutils
 from quantum.openstack.common import cfg
 from quantum.openstack.common import timeutils
 from quantum import quantum_plugin_base_v2
@@ -46,6 +50,10 @@ AGENT_OWNER_PREFIX = 'network:'
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = ['network:dhcp', 'network:router_interface']
 
+quota_usages.track('network', models_v2.Network)
+quota_usages.track('subnet', models_v2.Subnet)
+quota_usages.track('port', models_v2.Port)
+
 
 class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     """ A class that implements the v2 Quantum plugin interface
@@ -60,6 +68,15 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     # bulk operations. Name mangling is used in order to ensure it
     # is qualified by class
     __native_bulk_support = True
+    # The ports of a bulk request are inserted as one set of rows (see
+    # _create_ports) when create_port does only the database work. Name
+    # mangling is used so that a subclass doing more in create_port does not
+    # inherit it
+    __bulk_port_rows = True
+    # Likewise for sorting and pagination of the collections, done by
+    # the database
+    __native_pagination_support = True
+    __native_sorting_support = True
     # Plugins, mixin classes implementing extension will register
     # hooks into the dict below for "augmenting" the "core way" of
     # building a query for retrieving objects from a model class.
@@ -213,36 +230,51 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         return collection
 
     def _get_collection(self, context, model, dict_func, filters=None,
-                        fields=None):
+                        fields=None, sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         query = self._get_collection_query(context, model, filters)
-        
-        return [dict_func(c, fields) for c in query.all()]
+        return self._get_collection_from_query(context, query, model,
+                                               dict_func, fields, sorts,
+                                               limit, marker, page_reverse)
+
+    def _get_collection_from_query(self, context, query, model, dict_func,
+                                   fields=None, sorts=None, limit=None,
+                                   marker=None, page_reverse=False,
+                                   project=True):
+        if sorts:
+            marker_obj = self._get_marker_obj(context, model, marker)
+            if page_reverse:
+                sorts = [(key, not ascending) for key, ascending in sorts]
+            query = sqlalchemyutils.paginate_query(query, model, limit,
+                                                   sorts, marker_obj)
+        # fields which are all columns are selected on their own, the rows
+        # and their relationships are not loaded
+        columns = project and sqlalchemyutils.get_columns(model, fields)
+        if columns:
+            items = [dict(zip(fields, row))
+                     for row in query.with_entities(*columns)]
+        else:
+            items = [dict_func(c, fields) for c in query.all()]
+        if limit and page_reverse:
+            items.reverse()
+        return items
+
+    def _get_marker_obj(self, context, model, marker):
+        if not marker:
+            return None
+        marker_obj = self._model_query(context, model).filter(
+            model.id == marker).first()
+        if marker_obj is None:
+            raise q_exc.InvalidInput(
+                error_message=_("Marker %s not found") % marker)
+        return marker_obj
 
     def _get_collection_count(self, context, model, filters=None):
         return self._get_collection_query(context, model, filters).count()
 
     @staticmethod
     def _generate_mac(context, network_id):
-        base_mac = cfg.CONF.base_mac.split(':')
-        max_retries = cfg.CONF.mac_generation_retries
-        for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
-            if QuantumDbPluginV2._check_unique_mac(context, network_id,
-                                                   mac_address):
-                LOG.debug("Generated mac for network %s is %s",
-                          network_id, mac_address)
-                return mac_address
-            else:
-                LOG.debug("Generated mac %s exists. Remaining attempts %s.",
-                          mac_address, max_retries - (i + 1))
-        LOG.error("Unable to generate mac address after %s attempts",
-                  max_retries)
-        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+        return macs.generate_mac(context, network_id)
 
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
@@ -301,76 +333,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(models_v2.IPAllocationPool)
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id).all()
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            error_message = _("No allocation pool found for "
-                              "ip address:%s" % ip_address)
-            raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(models_v2.IPAvailabilityRange)
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug("Recycle %s", ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug("Recycle: first match for %s-%s", r1['first_ip'],
-                      r1['last_ip'])
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug("Recycle: last match for %s-%s", r2['first_ip'],
-                      r2['last_ip'])
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug("Recycle: merged %s-%s and %s-%s", r2['first_ip'],
-                      r2['last_ip'], r1['first_ip'], r1['last_ip'])
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug("Recycle: updated first %s-%s", r1['first_ip'],
-                      r1['last_ip'])
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug("Recycle: updated last %s-%s", r2['first_ip'],
-                      r2['last_ip'])
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug("Recycle: created new %s-%s", ip_address, ip_address)
+        ipam.recycle_ip(context, subnet_id, ip_address)
         QuantumDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -413,62 +376,15 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool)
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug("All IP's from subnet %s (%s) allocated",
-                          subnet['id'], subnet['cidr'])
-                continue
-            ip_address = range['first_ip']
-            LOG.debug("Allocated IP - %s from %s to %s", ip_address,
-                      range['first_ip'], range['last_ip'])
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug("No more free IP's in slice. Deleting allocation "
-                          "pool.")
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=network_id)
+        result = ipam.generate_ip(context, subnets)
+        if not result:
+            raise q_exc.IpAddressGenerationFailure(net_id=network_id)
+        return result
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange,
-            models_v2.IPAllocationPool).join(
-                models_v2.IPAllocationPool)
-        results = range_qry.filter_by(subnet_id=subnet_id).all()
-        for (range, pool) in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.allocate_specific_ip(context, subnet_id, ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -509,16 +425,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             return False
 
         # Check if the requested IP is in a defined allocation pool
-        pool_qry = context.session.query(models_v2.IPAllocationPool)
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id).all()
-        ip = netaddr.IPAddress(ip_address)
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if ip in allocation_pool_range:
-                return True
-        return False
+        return ipam.in_allocation_pool(context, subnet_id, ip_address)
 
     def _test_fixed_ips_for_port(self, context, network_id, fixed_ips):
         """Test fixed IPs for port.
@@ -659,14 +566,51 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 else:
                     v6.append(subnet)
             version_subnets = [v4, v6]
+            # addresses allocated beforehand for the ports of a bulk create
+            preallocated = getattr(context, '_preallocated_ips', {})
             for subnets in version_subnets:
                 if subnets:
-                    result = QuantumDbPluginV2._generate_ip(context, network,
-                                                            subnets)
+                    key = (p['network_id'], subnets[0]['ip_version'])
+                    if preallocated.get(key):
+                        result = preallocated[key].pop(0)
+                    else:
+                        result = QuantumDbPluginV2._generate_ip(context,
+                                                                network,
+                                                                subnets)
                     ips.append({'ip_address': result['ip_address'],
                                 'subnet_id': result['subnet_id']})
         return ips
 
+    def _preallocate_ips(self, context, ports):
+        """Allocate the IP addresses of the ports of a bulk create at once.
+
+        Ports without fixed_ips get their addresses from a few ranges
+        locked once rather than a range locked per port. Returns the
+        addresses by (network id, IP version), as _allocate_ips_for_port
+        expects them in context._preallocated_ips.
+        """
+        counts = {}
+        for port in ports:
+            p = port['port']
+            if p['fixed_ips'] == attributes.ATTR_NOT_SPECIFIED:
+                counts[p['network_id']] = counts.get(p['network_id'], 0) + 1
+        preallocated = {}
+        if not counts:
+            return preallocated
+        for network_id in counts:
+            self._recycle_expired_ip_allocations(context, network_id)
+        filter = {'network_id': counts.keys()}
+        subnets = self.get_subnets(context, filters=filter)
+        for network_id, count in counts.items():
+            for ip_version in (4, 6):
+                version_subnets = [subnet for subnet in subnets
+                                   if subnet['network_id'] == network_id and
+                                   subnet['ip_version'] == ip_version]
+                if version_subnets:
+                    preallocated[(network_id, ip_version)] = (
+                        ipam.generate_ips(context, version_subnets, count))
+        return preallocated
+
     def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
         """Validate the CIDR for a subnet.
 
@@ -949,19 +893,30 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             for port in ports:
                 self._delete_port(context, port['id'])
 
-            # clean up subnets
+            # clean up subnets, deleted by a statement the usages do not see
             subnets_qry = context.session.query(models_v2.Subnet)
+            counts = context.session.query(
+                models_v2.Subnet.tenant_id,
+                sa.func.count(models_v2.Subnet.id)).filter_by(
+                    network_id=id).group_by(models_v2.Subnet.tenant_id)
+            for tenant_id, count in counts:
+                quota_usages.add_usage(context.session, 'subnet', tenant_id,
+                                       -count)
             subnets_qry.filter_by(network_id=id).delete()
             context.session.delete(network)
+            macs.forget_network(id)
 
     def get_network(self, context, id, fields=None):
         network = self._get_network(context, id)
         return self._make_network_dict(network, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, models_v2.Network,
                                     self._make_network_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
 
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
@@ -1153,23 +1108,170 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 context.session.delete(allocation)
 
             context.session.delete(subnet)
+        ipam.forget_subnet(id)
 
     def get_subnet(self, context, id, fields=None):
         subnet = self._get_subnet(context, id)
         return self._make_subnet_dict(subnet, fields)
 
-    def get_subnets(self, context, filters=None, fields=None):
+    def get_subnets(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, models_v2.Subnet,
                                     self._make_subnet_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
 
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
+    @macs.retry_duplicate_macs
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        bulk_port_rows_attr = "_%s__bulk_port_rows" % self.__class__.__name__
+        if getattr(self, bulk_port_rows_attr, False):
+            return self._create_ports(context, ports['ports'])
+        # the plugin does more than the database work of each port
+        with context.session.begin(subtransactions=True):
+            context._preallocated_ips = self._preallocate_ips(context,
+                                                              ports['ports'])
+            try:
+                return self._create_bulk('port', context, ports)
+            finally:
+                del context._preallocated_ips
+
+    def _create_ports(self, context, ports):
+        """Create the ports of a bulk request as one set of rows.
 
+        The networks and their subnets are read once, the MAC and IP
+        addresses of all the ports are reserved together and the ports
+        and their IP allocations are inserted with one statement each.
+        Only ports with fixed_ips get their addresses one by one.
+        """
+        port_rows = []
+        allocation_rows = []
+        results = []
+        with context.session.begin(subtransactions=True):
+            network_ids = set(port['port']['network_id'] for port in ports)
+            networks = dict((network.id, network) for network in
+                            self._model_query(
+                                context, models_v2.Network).filter(
+                                    models_v2.Network.id.in_(network_ids)))
+            for network_id in network_ids:
+                if network_id not in networks:
+                    raise q_exc.NetworkNotFound(net_id=network_id)
+
+            # MAC addresses, those requested must be unique on the network
+            mac_addresses = {}
+            for port in ports:
+                p = port['port']
+                if p['mac_address'] != attributes.ATTR_NOT_SPECIFIED:
+                    requested = mac_addresses.setdefault(p['network_id'], [])
+                    if p['mac_address'] in requested:
+                        raise q_exc.MacAddressInUse(net_id=p['network_id'],
+                                                    mac=p['mac_address'])
+                    requested.append(p['mac_address'])
+            for network_id, requested in mac_addresses.items():
+                mac_qry = context.session.query(models_v2.Port.mac_address)
+                in_use = mac_qry.filter(
+                    models_v2.Port.network_id == network_id,
+                    models_v2.Port.mac_address.in_(requested)).first()
+                if in_use:
+                    raise q_exc.MacAddressInUse(net_id=network_id,
+                                                mac=in_use[0])
+                for mac_address in requested:
+                    macs.reserve_mac(context, network_id, mac_address)
+            generated = {}
+            for port in ports:
+                p = port['port']
+                if p['mac_address'] == attributes.ATTR_NOT_SPECIFIED:
+                    generated[p['network_id']] = generated.get(
+                        p['network_id'], 0) + 1
+            for network_id, count in generated.items():
+                generated[network_id] = macs.generate_macs(context,
+                                                           network_id, count)
+
+            # fixed IPs are taken out of the pools before the others
+            fixed_ips = {}
+            requested_ips = set()
+            for index, port in enumerate(ports):
+                p = port['port']
+                if p['fixed_ips'] == attributes.ATTR_NOT_SPECIFIED:
+                    continue
+                ips = self._allocate_ips_for_port(
+                    context, networks[p['network_id']], port)
+                for ip in ips:
+                    key = (ip['subnet_id'], ip['ip_address'])
+                    if key in requested_ips:
+                        raise q_exc.IpAddressInUse(
+                            net_id=p['network_id'],
+                            ip_address=ip['ip_address'])
+                    requested_ips.add(key)
+                fixed_ips[index] = ips
+            preallocated = self._preallocate_ips(context, ports)
+
+            for index, port in enumerate(ports):
+                p = port['port']
+                tenant_id = self._get_tenant_id_for_create(context, p)
+                network_id = p['network_id']
+                mac_address = p['mac_address']
+                if mac_address == attributes.ATTR_NOT_SPECIFIED:
+                    mac_address = generated[network_id].pop(0)
+                ips = fixed_ips.get(index)
+                if ips is None:
+                    ips = []
+                    for ip_version in (4, 6):
+                        key = (network_id, ip_version)
+                        if key in preallocated:
+                            if not preallocated[key]:
+                                raise q_exc.IpAddressGenerationFailure(
+                                    net_id=network_id)
+                            ips.append(preallocated[key].pop(0))
+
+                port_id = p.get('id') or utils.str_uuid()
+                port_rows.append({'id': port_id,
+                                  'tenant_id': tenant_id,
+                                  'name': p['name'],
+                                  'network_id': network_id,
+                                  'mac_address': mac_address,
+                                  'admin_state_up': p['admin_state_up'],
+                                  'status': constants.PORT_STATUS_ACTIVE,
+                                  'device_id': p['device_id'],
+                                  'device_owner': p['device_owner']})
+                expiration = self._default_allocation_expiration()
+                for ip in ips:
+                    allocation_rows.append({
+                        'network_id': network_id,
+                        'port_id': port_id,
+                        'ip_address': ip['ip_address'],
+                        'subnet_id': ip['subnet_id'],
+                        'expiration': expiration})
+                result = dict(port_rows[-1])
+                result['fixed_ips'] = [{'subnet_id': ip['subnet_id'],
+                                        'ip_address': ip['ip_address']}
+                                       for ip in ips]
+                results.append(result)
+
+            # the changes to the free ranges go first, as they would with
+            # the ports added to the session
+            context.session.flush()
+            context.session.execute(models_v2.Port.__table__.insert(),
+                                    port_rows)
+            if allocation_rows:
+                context.session.execute(
+                    models_v2.IPAllocation.__table__.insert(),
+                    allocation_rows)
+            counts = {}
+            for row in port_rows:
+                counts[row['tenant_id']] = counts.get(row['tenant_id'], 0) + 1
+            for tenant_id, count in counts.items():
+                quota_usages.add_usage(context.session, 'port', tenant_id,
+                                       count)
+        LOG.debug("Created %s ports with %s IP allocations",
+                  len(port_rows), len(allocation_rows))
+        return results
+
+    @macs.retry_duplicate_macs
     def create_port(self, context, port):
         LOG.debug("*********** create_port_trinath**************")
         p = port['port']
@@ -1183,16 +1285,19 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
 
             # Ensure that a MAC address is defined and it is unique on the
             # network
-            if p['mac_address'] == attributes.ATTR_NOT_SPECIFIED:
-                p['mac_address'] = QuantumDbPluginV2._generate_mac(
+            # the request is left as is, to be retried
+            mac_address = p['mac_address']
+            if mac_address == attributes.ATTR_NOT_SPECIFIED:
+                mac_address = QuantumDbPluginV2._generate_mac(
                     context, p["network_id"])
             else:
                 # Ensure that the mac on the network is unique
                 if not QuantumDbPluginV2._check_unique_mac(context,
                                                            p["network_id"],
-                                                           p['mac_address']):
+                                                           mac_address):
                     raise q_exc.MacAddressInUse(net_id=p["network_id"],
-                                                mac=p['mac_address'])
+                                                mac=mac_address)
+                macs.reserve_mac(context, p["network_id"], mac_address)
 
             # Returns the IP's for the port
             ips = self._allocate_ips_for_port(context, network, port)
@@ -1201,7 +1306,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                   name=p['name'],
                                   id=p.get('id') or utils.str_uuid(),
                                   network_id=p['network_id'],
-                                  mac_address=p['mac_address'],
+                                  mac_address=mac_address,
                                   admin_state_up=p['admin_state_up'],
                                   status=constants.PORT_STATUS_ACTIVE,
                                   device_id=p['device_id'],
@@ -1288,6 +1393,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                             "recycled") % msg_dict
                     LOG.debug(msg)
 
+        macs.release_mac(context, port['network_id'], port['mac_address'])
         context.session.delete(port)
 
     def get_port(self, context, id, fields=None):
@@ -1316,9 +1422,17 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         query = self._apply_filters_to_query(query, Port, filters)
         return query
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
+        # joined to the fixed ips filtered on, the columns of a port would
+        # be selected once per ip
+        project = not (filters and filters.get('fixed_ips'))
         query = self._get_ports_query(context, filters)
-        return [self._make_port_dict(c, fields) for c in query.all()]
+        return self._get_collection_from_query(context, query,
+                                               models_v2.Port,
+                                               self._make_port_dict, fields,
+                                               sorts, limit, marker,
+                                               page_reverse, project)
 
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
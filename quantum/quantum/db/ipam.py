@@ -0,0 +1,409 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management of the v2 plugins
+
+The free addresses of an allocation pool are kept as ranges
+(IPAvailabilityRange). Addresses are taken from the start of a range and
+returned to the range they are next to.
+
+Several API workers allocate from the same subnets, so a range is always
+read with SELECT ... FOR UPDATE before it is changed: a concurrent
+allocation waits for the range it picked, or finds it gone (its first_ip,
+part of the key, moved on) and picks another one. Which ranges exist is
+remembered per subnet by each process (FreeRanges), so an allocation
+locks the one row it needs without reading the others first. With
+ip_allocation_random_range a random range is picked rather than the
+lowest one, so concurrent allocations lock different rows.
+"""
+
+import random
+import threading
+
+import netaddr
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
+from sqlalchemy import orm
+
+from quantum.common import exceptions as q_exc
+from quantum.db import api as db
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ranges picked from the cached ones before the lowest range of the subnet
+# is locked in the database
+MAX_ATTEMPTS = 4
+
+
+class FreeRanges(object):
+    """Allocation pools and free ranges of the subnets seen by this process
+
+    The ranges are a hint of which rows to lock: a range is read again
+    under its lock before addresses are taken from it, and the ranges of
+    a subnet are reloaded when a hint turns out to be stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # subnet id -> [(first ip, last ip, pool id)], ips as integers
+        self._pools = {}
+        # subnet id -> {(pool id, first ip): (first ip key, last ip)}
+        self._ranges = {}
+
+    def pools(self, context, subnet_id):
+        pools = self._pools.get(subnet_id)
+        if pools is None:
+            query = context.session.query(
+                models_v2.IPAllocationPool.id,
+                models_v2.IPAllocationPool.first_ip,
+                models_v2.IPAllocationPool.last_ip).filter_by(
+                    subnet_id=subnet_id)
+            pools = [(int(netaddr.IPAddress(first_ip)),
+                      int(netaddr.IPAddress(last_ip)), pool_id)
+                     for pool_id, first_ip, last_ip in query]
+            self._pools[subnet_id] = pools
+        return pools
+
+    def pool_id(self, context, subnet_id, ip_address):
+        """Returns the id of the allocation pool of ip_address, None if
+        it is in none of the pools of the subnet"""
+        ip = int(netaddr.IPAddress(ip_address))
+        for first_ip, last_ip, pool_id in self.pools(context, subnet_id):
+            if first_ip <= ip <= last_ip:
+                return pool_id
+        return None
+
+    def _load(self, context, subnet_id):
+        pool_ids = [pool_id for first_ip, last_ip, pool_id
+                    in self.pools(context, subnet_id)]
+        ranges = {}
+        if pool_ids:
+            ip_range = models_v2.IPAvailabilityRange
+            query = context.session.query(
+                ip_range.allocation_pool_id, ip_range.first_ip,
+                ip_range.first_ip_key, ip_range.last_ip).filter(
+                    ip_range.allocation_pool_id.in_(pool_ids))
+            for pool_id, first_ip, first_ip_key, last_ip in query:
+                ranges[(pool_id, first_ip)] = (first_ip_key, last_ip)
+        with self._lock:
+            self._ranges[subnet_id] = ranges
+
+    def choose(self, context, subnet_id, randomly, reload=False):
+        """Returns (pool id, first ip) of a free range of the subnet, the
+        lowest one unless randomly, None if the subnet is full"""
+        for attempt in range(2):
+            if reload or subnet_id not in self._ranges:
+                self._load(context, subnet_id)
+                reload = False
+            with self._lock:
+                ranges = self._ranges.get(subnet_id)
+                if ranges:
+                    if randomly:
+                        return random.choice(ranges.keys())
+                    return min(ranges, key=lambda key: ranges[key][0])
+            # addresses may have been returned by other processes since
+            reload = True
+        return None
+
+    def update(self, subnet_id, removed=(), added=()):
+        """Applies the changes of a transaction to the ranges of a subnet
+
+        removed are (pool id, first ip) and added (pool id, first ip,
+        last ip) of ranges.
+        """
+        with self._lock:
+            ranges = self._ranges.get(subnet_id)
+            if ranges is None:
+                return
+            for key in removed:
+                ranges.pop(key, None)
+            for pool_id, first_ip, last_ip in added:
+                ranges[(pool_id, first_ip)] = (models_v2.ip_key(first_ip),
+                                               last_ip)
+
+    def invalidate(self, subnet_ids):
+        with self._lock:
+            for subnet_id in subnet_ids:
+                self._ranges.pop(subnet_id, None)
+
+    def forget(self, subnet_id):
+        with self._lock:
+            self._ranges.pop(subnet_id, None)
+            self._pools.pop(subnet_id, None)
+
+
+_free_ranges = FreeRanges()
+
+
+def _changed(context, subnet_id, removed=(), added=()):
+    _free_ranges.update(subnet_id, removed, added)
+    changed = context.session.__dict__.setdefault('_ipam_subnets', set())
+    changed.add(subnet_id)
+
+
+def _forget_rolled_back(session):
+    # the cached ranges of the subnets changed by the transaction
+    # include changes that did not happen
+    _free_ranges.invalidate(session.__dict__.pop('_ipam_subnets', ()))
+
+
+def _forget_committed(session):
+    session.__dict__.pop('_ipam_subnets', None)
+
+
+sa.event.listen(orm.Session, 'after_commit', _forget_committed)
+sa.event.listen(orm.Session, 'after_rollback', _forget_rolled_back)
+
+
+def _lock_range(context, pool_id, first_ip):
+    query = context.session.query(models_v2.IPAvailabilityRange)
+    query = query.filter_by(allocation_pool_id=pool_id, first_ip=first_ip)
+    return query.with_lockmode('update').first()
+
+
+def _lock_lowest_range(context, subnet_id):
+    query = context.session.query(models_v2.IPAvailabilityRange).join(
+        models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id)
+    query = query.order_by(models_v2.IPAvailabilityRange.first_ip_key)
+    return query.with_lockmode('update').first()
+
+
+def _take(context, subnet_id, count):
+    """Takes up to count addresses from one free range of the subnet"""
+    randomly = cfg.CONF.ip_allocation_random_range
+    for attempt in range(MAX_ATTEMPTS):
+        hint = _free_ranges.choose(context, subnet_id, randomly,
+                                   reload=attempt > 0)
+        if hint is None:
+            return []
+        ip_range = _lock_range(context, *hint)
+        if ip_range is not None:
+            return _take_from_range(context, subnet_id, ip_range, count)
+        # taken or changed by another transaction since it was seen
+        LOG.debug(_("Free range %(first_ip)s of pool %(pool_id)s is gone"),
+                  {'first_ip': hint[1], 'pool_id': hint[0]})
+    ip_range = _lock_lowest_range(context, subnet_id)
+    if ip_range is None:
+        return []
+    return _take_from_range(context, subnet_id, ip_range, count)
+
+
+def _take_from_range(context, subnet_id, ip_range, count):
+    first_ip = netaddr.IPAddress(ip_range['first_ip'])
+    free = int(netaddr.IPAddress(ip_range['last_ip'])) - int(first_ip) + 1
+    count = min(count, free)
+    ip_addresses = [str(first_ip + i) for i in range(count)]
+    LOG.debug("Allocated IP - %s from %s to %s", ', '.join(ip_addresses),
+              ip_range['first_ip'], ip_range['last_ip'])
+    key = (ip_range['allocation_pool_id'], ip_range['first_ip'])
+    if count == free:
+        # No more free indices on subnet => delete
+        LOG.debug("No more free IP's in slice. Deleting allocation pool.")
+        context.session.delete(ip_range)
+        _changed(context, subnet_id, [key])
+    else:
+        # increment the first free
+        ip_range['first_ip'] = str(first_ip + count)
+        _changed(context, subnet_id, [key],
+                 [(key[0], ip_range['first_ip'], ip_range['last_ip'])])
+    return ip_addresses
+
+
+def generate_ips(context, subnets, count):
+    """Allocates up to count addresses from subnets, in order
+
+    Returns their {'ip_address', 'subnet_id'}, fewer than count if the
+    subnets are full.
+    """
+    ips = []
+    for subnet in subnets:
+        while len(ips) < count:
+            ip_addresses = _take(context, subnet['id'], count - len(ips))
+            if not ip_addresses:
+                LOG.debug("All IP's from subnet %s (%s) allocated",
+                          subnet['id'], subnet['cidr'])
+                break
+            ips.extend({'ip_address': ip_address, 'subnet_id': subnet['id']}
+                       for ip_address in ip_addresses)
+        if len(ips) == count:
+            break
+    return ips
+
+
+def generate_ip(context, subnets):
+    """Allocates an address from the first subnet of subnets not full
+
+    Returns its {'ip_address', 'subnet_id'}, None if all are full.
+    """
+    ips = generate_ips(context, subnets, 1)
+    return ips[0] if ips else None
+
+
+def allocate_specific_ip(context, subnet_id, ip_address):
+    """Removes ip_address from the free ranges of the subnet"""
+    pool_id = _free_ranges.pool_id(context, subnet_id, ip_address)
+    if pool_id is None:
+        return
+    key = models_v2.ip_key(ip_address)
+    query = context.session.query(models_v2.IPAvailabilityRange).filter(
+        models_v2.IPAvailabilityRange.allocation_pool_id == pool_id,
+        models_v2.IPAvailabilityRange.first_ip_key <= key,
+        models_v2.IPAvailabilityRange.last_ip_key >= key)
+    ip_range = query.with_lockmode('update').first()
+    if ip_range is None:
+        return
+    ip = netaddr.IPAddress(ip_address)
+    range_key = (pool_id, ip_range['first_ip'])
+    if ip_range['first_ip'] == ip_range['last_ip']:
+        context.session.delete(ip_range)
+        _changed(context, subnet_id, [range_key])
+    elif ip_range['first_ip_key'] == key:
+        ip_range['first_ip'] = str(ip + 1)
+        _changed(context, subnet_id, [range_key],
+                 [(pool_id, ip_range['first_ip'], ip_range['last_ip'])])
+    elif ip_range['last_ip_key'] == key:
+        ip_range['last_ip'] = str(ip - 1)
+        _changed(context, subnet_id, [],
+                 [(pool_id, ip_range['first_ip'], ip_range['last_ip'])])
+    else:
+        # Split into two ranges
+        new_range = models_v2.IPAvailabilityRange(
+            allocation_pool_id=pool_id,
+            first_ip=str(ip + 1),
+            last_ip=ip_range['last_ip'])
+        ip_range['last_ip'] = str(ip - 1)
+        context.session.add(new_range)
+        _changed(context, subnet_id, [],
+                 [(pool_id, ip_range['first_ip'], ip_range['last_ip']),
+                  (pool_id, new_range['first_ip'], new_range['last_ip'])])
+
+
+def recycle_ip(context, subnet_id, ip_address):
+    """Returns ip_address to the free ranges of its allocation pool
+
+    The ranges ending right before and starting right after it are read
+    at once. If one is found it is extended by the address, if both are
+    they are merged, otherwise the address is a range of its own.
+    """
+    pool_id = _free_ranges.pool_id(context, subnet_id, ip_address)
+    if not pool_id:
+        error_message = _("No allocation pool found for "
+                          "ip address:%s" % ip_address)
+        raise q_exc.InvalidInput(error_message=error_message)
+    ip = netaddr.IPAddress(ip_address)
+    next_key = models_v2.ip_key(ip + 1)
+    previous_key = models_v2.ip_key(ip - 1)
+    LOG.debug("Recycle %s", ip_address)
+    query = context.session.query(models_v2.IPAvailabilityRange).filter(
+        models_v2.IPAvailabilityRange.allocation_pool_id == pool_id,
+        sa.or_(models_v2.IPAvailabilityRange.first_ip_key == next_key,
+               models_v2.IPAvailabilityRange.last_ip_key == previous_key))
+    r1 = r2 = None
+    for ip_range in query.with_lockmode('update'):
+        if ip_range['first_ip_key'] == next_key:
+            r1 = ip_range
+            LOG.debug("Recycle: first match for %s-%s", r1['first_ip'],
+                      r1['last_ip'])
+        else:
+            r2 = ip_range
+            LOG.debug("Recycle: last match for %s-%s", r2['first_ip'],
+                      r2['last_ip'])
+
+    if r1 and r2:
+        # Merge the two ranges
+        LOG.debug("Recycle: merged %s-%s and %s-%s", r2['first_ip'],
+                  r2['last_ip'], r1['first_ip'], r1['last_ip'])
+        r2['last_ip'] = r1['last_ip']
+        context.session.delete(r1)
+        _changed(context, subnet_id, [(pool_id, r1['first_ip'])],
+                 [(pool_id, r2['first_ip'], r2['last_ip'])])
+    elif r1:
+        # Update the range with matched first IP
+        removed = [(pool_id, r1['first_ip'])]
+        r1['first_ip'] = ip_address
+        LOG.debug("Recycle: updated first %s-%s", r1['first_ip'],
+                  r1['last_ip'])
+        _changed(context, subnet_id, removed,
+                 [(pool_id, r1['first_ip'], r1['last_ip'])])
+    elif r2:
+        # Update the range with matched last IP
+        r2['last_ip'] = ip_address
+        LOG.debug("Recycle: updated last %s-%s", r2['first_ip'],
+                  r2['last_ip'])
+        _changed(context, subnet_id, [],
+                 [(pool_id, r2['first_ip'], r2['last_ip'])])
+    else:
+        # Create a new range
+        ip_range = models_v2.IPAvailabilityRange(
+            allocation_pool_id=pool_id,
+            first_ip=ip_address,
+            last_ip=ip_address)
+        context.session.add(ip_range)
+        LOG.debug("Recycle: created new %s-%s", ip_address, ip_address)
+        _changed(context, subnet_id, [],
+                 [(pool_id, ip_address, ip_address)])
+
+
+def in_allocation_pool(context, subnet_id, ip_address):
+    return _free_ranges.pool_id(context, subnet_id, ip_address) is not None
+
+
+def forget_subnet(subnet_id):
+    _free_ranges.forget(subnet_id)
+
+
+def _add_ip_keys(engine):
+    """Adds first_ip_key and last_ip_key, with their indexes, to a
+    database created without them and fills them in for the ranges
+    lacking them. Added columns are nullable, existing rows have none."""
+    inspector = reflection.Inspector.from_engine(engine)
+    ranges = models_v2.IPAvailabilityRange.__table__
+    if ranges.name not in inspector.get_table_names():
+        return
+    key_columns = (ranges.c.first_ip_key, ranges.c.last_ip_key)
+    columns = [column['name'] for column in inspector.get_columns(ranges.name)]
+    for column in key_columns:
+        if column.name not in columns:
+            LOG.info(_("Adding %s to the IP availability ranges"),
+                     column.name)
+            engine.execute('ALTER TABLE %s ADD COLUMN %s %s' %
+                           (ranges.name, column.name,
+                            column.type.compile(dialect=engine.dialect)))
+    indexes = [index['name'] for index in inspector.get_indexes(ranges.name)]
+    for index in ranges.indexes:
+        if index.name not in indexes:
+            index.create(engine)
+    missing = engine.execute(sa.select(
+        [ranges.c.allocation_pool_id, ranges.c.first_ip, ranges.c.last_ip],
+        sa.or_(*[sa.or_(column.is_(None), column == '')
+                 for column in key_columns]))).fetchall()
+    if missing:
+        LOG.info(_("Filling in the keys of %d IP availability ranges"),
+                 len(missing))
+    for pool_id, first_ip, last_ip in missing:
+        engine.execute(ranges.update().where(sa.and_(
+            ranges.c.allocation_pool_id == pool_id,
+            ranges.c.first_ip == first_ip,
+            ranges.c.last_ip == last_ip)).values(
+                first_ip_key=models_v2.ip_key(first_ip),
+                last_ip_key=models_v2.ip_key(last_ip)))
+
+
+db.register_upgrade(_add_ip_keys)
@@ -259,10 +259,13 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         router = self._get_router(context, id)
         return self._make_router_dict(router, fields)
 
-    def get_routers(self, context, filters=None, fields=None):
+    def get_routers(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, Router,
                                     self._make_router_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
 
     def get_routers_count(self, context, filters=None):
         return self._get_collection_count(context, Router,
@@ -658,10 +661,13 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         floatingip = self._get_floatingip(context, id)
         return self._make_floatingip_dict(floatingip, fields)
 
-    def get_floatingips(self, context, filters=None, fields=None):
+    def get_floatingips(self, context, filters=None, fields=None, sorts=None,
+                        limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, FloatingIP,
                                     self._make_floatingip_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
 
     def get_floatingips_count(self, context, filters=None):
         return self._get_collection_count(context, FloatingIP,
@@ -760,6 +766,19 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             context.session.query(ExternalNetwork).filter_by(
                 network_id=net_id).delete()
 
+    def _filter_nets_l3_query(self, context, query, filters):
+        """Filters a query of networks on router:external, so that the
+        database limits and pages the networks filtered"""
+        vals = filters and filters.get('router:external', [])
+        if not vals:
+            return query
+
+        ext_nets = sa.select([ExternalNetwork.network_id])
+        if vals[0]:
+            return query.filter(models_v2.Network.id.in_(ext_nets))
+        else:
+            return query.filter(~models_v2.Network.id.in_(ext_nets))
+
     def _filter_nets_l3(self, context, nets, filters):
         vals = filters.get('router:external', [])
         if not vals:
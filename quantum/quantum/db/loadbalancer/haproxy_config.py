@@ -0,0 +1,174 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+GLOBAL = "global\n\
+    daemon\n\
+    maxconn 256\n\
+    stats socket /tmp/haproxy level admin\n\
+\n\
+defaults\n\
+    mode http\n\
+    timeout connect 5000ms\n\
+    timeout client 50000ms\n\
+    timeout server 50000ms\n\
+    stats enable\n\
+    log global\n\
+    stats scope .\n\
+    stats realm Haproxy\ Statistics\n\
+    stats uri /haproxy?stats\n\
+    option contstats\n\n"
+
+# rendered sections kept by content digest before the cache starts over
+MAX_SECTIONS = 10000
+
+
+def _row_values(row):
+    if row is None:
+        return None
+    return tuple((column.name, getattr(row, column.name))
+                 for column in row.__table__.columns)
+
+
+def digest(vip, pool, members, monitor, session):
+    """Content hash of every row a listen section is rendered from."""
+    rows = (_row_values(vip), _row_values(pool),
+            tuple(_row_values(member) for member in members),
+            _row_values(monitor), _row_values(session))
+    return hashlib.sha1(repr(rows)).hexdigest()
+
+
+def render_vip(vip, pool, members, monitor, session):
+    """Renders the HAProxy listen section of one VIP."""
+    out = ["listen %s\n" % vip.name,
+           "\t mode %s\n" % str(vip.protocol).lower(),
+           "\t bind :%s\n" % vip.port_no,
+           "\t maxconn %s\n" % vip.connection_limit,
+           "\t balance %s\n" % str(pool.lb_method).lower()]
+
+    if monitor is not None:
+        if monitor.type == 'HTTP':
+            out.append("\t option httpchk %s %s HTTP/1.0\n" %
+                       (monitor.http_method or 'OPTIONS',
+                        monitor.url_path or '/'))
+        if monitor.expected_codes:
+            try:
+                out.append("\t http-check expect status %s\n" %
+                           int(monitor.expected_codes))
+            except ValueError:
+                out.append("\t http-check expect %s\n" %
+                           monitor.expected_codes)
+        check = monitor.delay or monitor.max_retries
+    else:
+        check = False
+
+    session_type = session is not None and session.type
+    if session_type:
+        out.append("\t option persist\n")
+        if session_type == 'HTTP_COOKIE' and session.cookie_name:
+            out.append("\t cookie %s insert\n" % session.cookie_name)
+        if session_type == 'APP_COOKIE' and session.cookie_name:
+            out.append("\t appsession %s len 64 timeout 1h\n" %
+                       session.cookie_name)
+
+    for member in members:
+        address = str(member.ip_address)
+        out.append("\t server %s %s:%s" % (address, address, member.port_no))
+        if session_type == 'HTTP_COOKIE':
+            out.append(" cookie %s" % address.replace('.', ''))
+        if member.weight:
+            out.append(" weight %s" % member.weight)
+        if member.admin_status is False:
+            out.append(" disabled")
+        if check:
+            out.append(" check")
+            if monitor.delay:
+                out.append(" inter %s" % monitor.delay)
+            if monitor.max_retries:
+                out.append(" fall %s" % monitor.max_retries)
+            out.append(" rise 1")
+        out.append("\n")
+    return ''.join(out)
+
+
+class ConfigCache(object):
+    """Rendered HAProxy listen sections.
+
+    Sections of a config handle, per member shard, are kept with the
+    config version of the handle they were compiled at and only served
+    for that version. Every change to a handle adds a version in the
+    transaction making it, so a change committed by another API worker
+    is seen too. Changes committed by this process also invalidate the
+    handle, which frees its sections and bumps the generation: sections
+    compiled from rows read before an invalidation are not cached.
+
+    Independently, each rendered section is kept under the digest of the
+    rows it was rendered from, so recompiling a handle after a change
+    only renders the VIPs whose rows actually changed.
+    """
+
+    def __init__(self, max_sections=MAX_SECTIONS):
+        self.max_sections = max_sections
+        # config_handle_id -> {shard: (version, list of (vip_id, section))}
+        self._handles = {}
+        # content digest -> section
+        self._sections = {}
+        self.generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'renders': 0}
+
+    def get(self, config_handle_id, version, shard=None):
+        entry = self._handles.get(config_handle_id, {}).get(shard)
+        if entry is None or entry[0] != version:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry[1]
+
+    def put(self, config_handle_id, version, sections, generation,
+            shard=None):
+        if generation != self.generation:
+            return
+        self._handles.setdefault(config_handle_id, {})[shard] = (version,
+                                                                 sections)
+
+    def invalidate(self, config_handle_ids=None):
+        self.generation += 1
+        if config_handle_ids is None:
+            self._handles.clear()
+            return
+        for config_handle_id in config_handle_ids:
+            self._handles.pop(config_handle_id, None)
+
+    def render(self, vip, pool, members, monitor, session):
+        key = digest(vip, pool, members, monitor, session)
+        section = self._sections.get(key)
+        if section is None:
+            if len(self._sections) >= self.max_sections:
+                LOG.debug(_('HAProxy section cache full, clearing it'))
+                self._sections.clear()
+            section = render_vip(vip, pool, members, monitor, session)
+            self._sections[key] = section
+            self.stats['renders'] += 1
+        return section
+
+
+cache = ConfigCache()
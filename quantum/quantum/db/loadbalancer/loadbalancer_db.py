@@ -16,6 +16,7 @@
 #    under the License.
 
 import sqlalchemy as sa
+from sqlalchemy.engine import reflection
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
@@ -24,14 +25,19 @@ from quantum.common import exceptions as q_exc
 from quantum.db import api as qdbapi
 from quantum.db import model_base
 from quantum.db import models_v2
+from quantum.db import quota_usages
+from quantum.db import sqlalchemyutils
 from quantum.db.nwservices import nwservices_db
 from quantum.extensions import loadbalancer
+from quantum.openstack.common import cfg
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import uuidutils
 from quantum.plugins.common import constants
 from quantum.common import utils
 from quantum.openstack.common import timeutils
 from quantum.db import db_base_plugin_v2
+from quantum.db.loadbalancer import haproxy_config
 from quantum.db.nwservices import nwservices_db
 
 LOG = logging.getLogger(__name__)
@@ -109,16 +115,25 @@ class LB_Virtual_IP(model_base.BASEV2, HasId, HasTenant):
                                         lazy="dynamic")
     
 class LB_Version(model_base.BASEV2):
+    """One change set in the config history of a config handle.
+
+    Version ids are allocated globally, so they also increase
+    monotonically within each config handle. runtime_version is the
+    id as the string carried in config messages to the service VM.
+    """
     id = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
+    config_handle_id = sa.Column(sa.String(36), sa.ForeignKey('ns_config_handles.id'),
+                           nullable=False)
     runtime_version = sa.Column(sa.String(50),
                                 nullable=False)
-    
+
 class LB_Delta(model_base.BASEV2, HasId):
     main_table_name = sa.Column(sa.String(50),
                                 nullable=False)
-    link_id = sa.Column(sa.Integer)
-    old_value = sa.Column(sa.String(50))
-    new_value = sa.Column(sa.String(50))
+    link_id = sa.Column(sa.String(36))
+    # JSON encoded resource dicts before and after the operation
+    old_value = sa.Column(sa.Text)
+    new_value = sa.Column(sa.Text)
     operation = sa.Column(sa.String(50))
     version_id = sa.Column(sa.Integer(), sa.ForeignKey('lb_versions.id'),
                            nullable=False)
@@ -126,6 +141,44 @@ class LB_Delta(model_base.BASEV2, HasId):
     user_id = sa.Column(sa.String(50), nullable=False)
     
 
+def _recreate_config_history(engine):
+    """Recreates lb_versions and lb_deltas in a database created before
+    the versions were kept per config handle and the deltas held JSON.
+
+    The versions of that history belong to no config handle, so it is
+    dropped: a service VM reporting one of them is not known to be in
+    the history any more and syncs its full config.
+    """
+    inspector = reflection.Inspector.from_engine(engine)
+    versions = LB_Version.__table__
+    deltas = LB_Delta.__table__
+    if versions.name not in inspector.get_table_names():
+        return
+    version_columns = [column['name'] for column in
+                       inspector.get_columns(versions.name)]
+    delta_types = dict((column['name'], column['type']) for column in
+                       inspector.get_columns(deltas.name))
+    if ('config_handle_id' in version_columns and
+            isinstance(delta_types.get('link_id'), sa.String) and
+            isinstance(delta_types.get('old_value'), sa.Text) and
+            isinstance(delta_types.get('new_value'), sa.Text)):
+        return
+    LOG.info(_("Recreating the LB config history, %d versions are dropped"),
+             engine.execute(sa.select([sa.func.count()],
+                                      from_obj=versions)).scalar())
+    deltas.drop(engine, checkfirst=True)
+    versions.drop(engine)
+    versions.create(engine)
+    deltas.create(engine)
+
+
+qdbapi.register_upgrade(_recreate_config_history)
+
+
+quota_usages.track('vip', LB_Virtual_IP)
+quota_usages.track('pool', LB_Pool)
+
+
 class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
     """
     A class that wraps the implementation of the Quantum
@@ -177,9 +230,36 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         return collection
 
     def _get_collection(self, context, model, dict_func, filters=None,
-                        fields=None):
+                        fields=None, sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         query = self._get_collection_query(context, model, filters)
-        return [dict_func(c, fields) for c in query.all()]
+        if sorts:
+            marker_obj = self._get_marker_obj(context, model, marker)
+            if page_reverse:
+                sorts = [(key, not ascending) for key, ascending in sorts]
+            query = sqlalchemyutils.paginate_query(query, model, limit,
+                                                   sorts, marker_obj)
+        # fields which are all columns are selected on their own, the rows
+        # and their relationships are not loaded
+        columns = sqlalchemyutils.get_columns(model, fields)
+        if columns is not None:
+            items = [dict(zip(fields, row))
+                     for row in query.with_entities(*columns)]
+        else:
+            items = [dict_func(c, fields) for c in query.all()]
+        if limit and page_reverse:
+            items.reverse()
+        return items
+
+    def _get_marker_obj(self, context, model, marker):
+        if not marker:
+            return None
+        marker_obj = self._model_query(context, model).filter(
+            model.id == marker).first()
+        if marker_obj is None:
+            raise q_exc.InvalidInput(
+                error_message=_("Marker %s not found") % marker)
+        return marker_obj
 
     def _get_collection_count(self, context, model, filters=None):
         return self._get_collection_query(context, model, filters).count()
@@ -201,6 +281,63 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
     def _query_resource(self, context, model, obj_id):
         query = self._model_query(context, model)
         return query.filter(model.id == obj_id).one()
+
+    ###Config change log
+    def _get_config_handles(self, context, pool_id=None, session_id=None):
+        """Config handles of the VIPs using a pool or session persistance."""
+        query = context.session.query(LB_Virtual_IP.config_handle_id)
+        if pool_id:
+            query = query.filter(LB_Virtual_IP.pool_id == pool_id)
+        if session_id:
+            query = query.filter(
+                LB_Virtual_IP.session_persistance_id == session_id)
+        return set(row[0] for row in query)
+
+    def _record_change(self, context, config_handle_ids, model, operation,
+                       old=None, new=None):
+        """Appends a delta to the config history of each config handle.
+
+        Must be called inside the transaction making the change, so that
+        the history never disagrees with the tables.
+        """
+        link_id = (new or old)['id']
+        for config_handle_id in set(config_handle_ids):
+            if not config_handle_id:
+                continue
+            version = LB_Version(config_handle_id=config_handle_id,
+                                 runtime_version='')
+            context.session.add(version)
+            context.session.flush()
+            version.runtime_version = str(version.id)
+            delta = LB_Delta(main_table_name=model.__tablename__,
+                             link_id=link_id,
+                             old_value=old and jsonutils.dumps(old),
+                             new_value=new and jsonutils.dumps(new),
+                             operation=operation,
+                             version_id=version.id,
+                             user_id=context.user_id or '')
+            context.session.add(delta)
+            self._prune_config_history(context, config_handle_id)
+
+    def _prune_config_history(self, context, config_handle_id):
+        query = context.session.query(LB_Version.id)
+        query = query.filter(LB_Version.config_handle_id == config_handle_id)
+        expired = [row[0] for row in
+                   query.order_by(LB_Version.id.desc()).offset(
+                       cfg.CONF.DRIVER.config_history)]
+        if expired:
+            context.session.query(LB_Delta).filter(
+                LB_Delta.version_id.in_(expired)).delete(
+                    synchronize_session=False)
+            context.session.query(LB_Version).filter(
+                LB_Version.id.in_(expired)).delete(
+                    synchronize_session=False)
+
+    def get_config_version(self, context, config_handle_id):
+        """Latest config version of a config handle, 0 if it has none."""
+        query = context.session.query(sa.func.max(LB_Version.id))
+        query = query.filter(LB_Version.config_handle_id == config_handle_id)
+        return query.scalar() or 0
     ########################################################
     # SRIKANTH MODIFICATIONS
     def _get_configuration(self, context, id):
@@ -227,10 +364,14 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         configuration = self._get_configuration(context, id)
         return self._make_configuration_dict(configuration, fields)
 
-    def get_configurations(self, context, filters=None, fields=None):
+    def get_configurations(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         return self._get_collection(context, LB_Logical_app,
                                     self._make_configuration_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_configuration(self, context, configuration):
         """ handle creation of a single configuration """
@@ -294,10 +435,13 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         pool = self._get_pool(context, id)
         return self._make_pool_dict(pool, fields)
 
-    def get_pools(self, context, filters=None, fields=None):
+    def get_pools(self, context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, LB_Pool,
                                     self._make_pool_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_pool(self, context, pool):
         """ handle creation of a single pool """
@@ -322,16 +466,27 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
     def delete_pool(self, context, id):
         with context.session.begin(subtransactions=True):
             pool = self._get_pool(context, id)
+            old = self._make_pool_dict(pool)
             context.session.delete(pool)
+            config_handle_ids = self._get_config_handles(context, pool_id=id)
+            self._record_change(context, config_handle_ids, LB_Pool,
+                                constants.CONFIG_DELETE, old=old)
+        self._invalidate_config(config_handle_ids)
             
     def update_pool(self, context, id, pool):
         """Update the pool with new info."""
 
         s = pool['pool']
-	with context.session.begin(subtransactions=True):
-	    pool = self._get_pool(context, id)
-	    pool.update(s)
-        return self._make_pool_dict(pool)
+        with context.session.begin(subtransactions=True):
+            pool = self._get_pool(context, id)
+            old = self._make_pool_dict(pool)
+            pool.update(s)
+            new = self._make_pool_dict(pool)
+            config_handle_ids = self._get_config_handles(context, pool_id=id)
+            self._record_change(context, config_handle_ids, LB_Pool,
+                                constants.CONFIG_UPDATE, old, new)
+        self._invalidate_config(config_handle_ids)
+        return new
     
     ###Pool Members
     def _get_member(self, context, id):
@@ -361,10 +516,13 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         member = self._get_member(context, id)
         return self._make_member_dict(member, fields)
 
-    def get_members(self, context, filters=None, fields=None):
+    def get_members(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, LB_Pool_Member,
                                     self._make_member_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_member(self, context, member):
         """ handle creation of a single member """
@@ -384,21 +542,42 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
                                         status=1,
                                         admin_status=1)
             context.session.add(member)
-        return self._make_member_dict(member)
+            new = self._make_member_dict(member)
+            config_handle_ids = self._get_config_handles(
+                context, pool_id=new['pool_id'])
+            self._record_change(context, config_handle_ids, LB_Pool_Member,
+                                constants.CONFIG_CREATE, new=new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     def delete_member(self, context, id):
         with context.session.begin(subtransactions=True):
             member = self._get_member(context, id)
+            old = self._make_member_dict(member)
             context.session.delete(member)
+            config_handle_ids = self._get_config_handles(
+                context, pool_id=old['pool_id'])
+            self._record_change(context, config_handle_ids, LB_Pool_Member,
+                                constants.CONFIG_DELETE, old=old)
+        self._invalidate_config(config_handle_ids)
             
     def update_member(self, context, id, member):
         """Update the member with new info."""
 
         s = member['member']
-	with context.session.begin(subtransactions=True):
-	    member = self._get_member(context, id)
-	    member.update(s)
-        return self._make_member_dict(member)
+        with context.session.begin(subtransactions=True):
+            member = self._get_member(context, id)
+            old = self._make_member_dict(member)
+            member.update(s)
+            new = self._make_member_dict(member)
+            # the member may have moved to another pool
+            config_handle_ids = (
+                self._get_config_handles(context, pool_id=old['pool_id']) |
+                self._get_config_handles(context, pool_id=new['pool_id']))
+            self._record_change(context, config_handle_ids, LB_Pool_Member,
+                                constants.CONFIG_UPDATE, old, new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     ###Health Monitors
     def _get_monitor(self, context, id):
@@ -471,10 +650,13 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         monitor = self._get_monitor(context, id)
         return self._make_monitor_dict(monitor, fields)
 
-    def get_monitors(self, context, filters=None, fields=None):
+    def get_monitors(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, LB_Health_Monitor,
                                     self._make_monitor_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_monitor(self, context, monitor):
         """ handle creation of a single monitor """
@@ -498,21 +680,45 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
                                         status=1,
                                         admin_status=1)
             context.session.add(monitor)
-        return self._make_monitor_dict(monitor)
+            new = self._make_monitor_dict(monitor)
+            config_handle_ids = self._get_config_handles(
+                context, pool_id=new['pool_id'])
+            self._record_change(context, config_handle_ids,
+                                LB_Health_Monitor,
+                                constants.CONFIG_CREATE, new=new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     def delete_monitor(self, context, id):
         with context.session.begin(subtransactions=True):
             monitor = self._get_monitor(context, id)
+            old = self._make_monitor_dict(monitor)
             context.session.delete(monitor)
+            config_handle_ids = self._get_config_handles(
+                context, pool_id=old['pool_id'])
+            self._record_change(context, config_handle_ids,
+                                LB_Health_Monitor,
+                                constants.CONFIG_DELETE, old=old)
+        self._invalidate_config(config_handle_ids)
             
     def update_monitor(self, context, id, monitor):
         """Update the monitor with new info."""
 
         s = monitor['monitor']
-	with context.session.begin(subtransactions=True):
-	    monitor = self._get_monitor(context, id)
-	    monitor.update(s)
-        return self._make_monitor_dict(monitor)
+        with context.session.begin(subtransactions=True):
+            monitor = self._get_monitor(context, id)
+            old = self._make_monitor_dict(monitor)
+            monitor.update(s)
+            new = self._make_monitor_dict(monitor)
+            # the monitor may have moved to another pool
+            config_handle_ids = (
+                self._get_config_handles(context, pool_id=old['pool_id']) |
+                self._get_config_handles(context, pool_id=new['pool_id']))
+            self._record_change(context, config_handle_ids,
+                                LB_Health_Monitor,
+                                constants.CONFIG_UPDATE, old, new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     ###Virtual IP's
     def _get_vip(self, context, id):
@@ -552,10 +758,13 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         vip = self._get_vip(context, id)
         return self._make_vip_dict(vip, fields)
 
-    def get_vips(self, context, filters=None, fields=None):
+    def get_vips(self, context, filters=None, fields=None, sorts=None,
+                 limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, LB_Virtual_IP,
                                     self._make_vip_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_vip(self, context, vip):
         """ handle creation of a single vip """
@@ -578,21 +787,38 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
                                         config_handle_id=s['config_handle_id'],
                                         pool_id=s['pool_id'])
             context.session.add(vip)
-        return self._make_vip_dict(vip)
+            new = self._make_vip_dict(vip)
+            config_handle_ids = [new['config_handle_id']]
+            self._record_change(context, config_handle_ids, LB_Virtual_IP,
+                                constants.CONFIG_CREATE, new=new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     def delete_vip(self, context, id):
         with context.session.begin(subtransactions=True):
             vip = self._get_vip(context, id)
+            old = self._make_vip_dict(vip)
             context.session.delete(vip)
+            config_handle_ids = [old['config_handle_id']]
+            self._record_change(context, config_handle_ids, LB_Virtual_IP,
+                                constants.CONFIG_DELETE, old=old)
+        self._invalidate_config(config_handle_ids)
             
     def update_vip(self, context, id, vip):
         """Update the vip with new info."""
 
         s = vip['vip']
-	with context.session.begin(subtransactions=True):
-	    vip = self._get_vip(context, id)
-	    vip.update(s)
-        return self._make_vip_dict(vip)
+        with context.session.begin(subtransactions=True):
+            vip = self._get_vip(context, id)
+            old = self._make_vip_dict(vip)
+            vip.update(s)
+            new = self._make_vip_dict(vip)
+            config_handle_ids = [old['config_handle_id'],
+                                 new['config_handle_id']]
+            self._record_change(context, config_handle_ids, LB_Virtual_IP,
+                                constants.CONFIG_UPDATE, old, new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
     ###Session Persistance
     def _get_session(self, context, id):
@@ -616,10 +842,13 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         session = self._get_session(context, id)
         return self._make_session_dict(session, fields)
 
-    def get_sessions(self, context, filters=None, fields=None):
+    def get_sessions(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, LB_Session_Persistance,
                                     self._make_session_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
     def create_session(self, context, session):
         """ handle creation of a single session """
@@ -638,162 +867,128 @@ class LoadbalancerPluginDb(db_base_plugin_v2.QuantumDbPluginV2):
     def delete_session(self, context, id):
         with context.session.begin(subtransactions=True):
             session = self._get_session(context, id)
+            old = self._make_session_dict(session)
             context.session.delete(session)
+            config_handle_ids = self._get_config_handles(context,
+                                                         session_id=id)
+            self._record_change(context, config_handle_ids,
+                                LB_Session_Persistance,
+                                constants.CONFIG_DELETE, old=old)
+        self._invalidate_config(config_handle_ids)
             
     def update_session(self, context, id, session):
         """Update the session with new info."""
 
         s = session['session']
-	with context.session.begin(subtransactions=True):
-	    session = self._get_session(context, id)
-	    session.update(s)
-        return self._make_session_dict(session)
+        with context.session.begin(subtransactions=True):
+            session = self._get_session(context, id)
+            old = self._make_session_dict(session)
+            session.update(s)
+            new = self._make_session_dict(session)
+            config_handle_ids = self._get_config_handles(context,
+                                                         session_id=id)
+            self._record_change(context, config_handle_ids,
+                                LB_Session_Persistance,
+                                constants.CONFIG_UPDATE, old, new)
+        self._invalidate_config(config_handle_ids)
+        return new
         
+    def _load_config_rows(self, context, config_handle_id, shard=None):
+        """Loads the rows rendered into the config of a config handle.
+
+        Takes three queries however many VIPs the handle has: the VIPs
+        joined with their pool and session persistance, then the members
+        and the monitors of all those pools.
+
+        shard is the (index, count) of a service VM among the instances
+        the chain image was scaled out to. Each of them gets every
+        count-th member of a pool, all of them when the pool has fewer
+        members than instances.
+        """
+        query = context.session.query(LB_Virtual_IP, LB_Pool,
+                                      LB_Session_Persistance)
+        query = query.join(LB_Pool, LB_Virtual_IP.pool_id == LB_Pool.id)
+        query = query.outerjoin(
+            LB_Session_Persistance,
+            LB_Virtual_IP.session_persistance_id == LB_Session_Persistance.id)
+        query = query.filter(
+            LB_Virtual_IP.config_handle_id == config_handle_id)
+        rows = query.order_by(LB_Virtual_IP.name, LB_Virtual_IP.id).all()
+
+        pool_ids = set(pool.id for vip, pool, session in rows)
+        members = {}
+        monitors = {}
+        if pool_ids:
+            member_qry = context.session.query(LB_Pool_Member)
+            member_qry = member_qry.filter(
+                LB_Pool_Member.pool_id.in_(pool_ids))
+            for member in member_qry.order_by(LB_Pool_Member.id):
+                members.setdefault(member.pool_id, []).append(member)
+            if shard:
+                index, count = shard
+                for pool_id, pool_members in members.items():
+                    if len(pool_members) >= count:
+                        members[pool_id] = pool_members[index::count]
+            monitor_qry = context.session.query(LB_Health_Monitor)
+            for monitor in monitor_qry.filter(
+                    LB_Health_Monitor.pool_id.in_(pool_ids)):
+                monitors.setdefault(monitor.pool_id, []).append(monitor)
+
+        for vip, pool, session in rows:
+            pool_monitors = monitors.get(pool.id, [])
+            if len(pool_monitors) != 1:
+                LOG.debug(_("No Health Monitors Mapped for the Virtual IP"))
+            monitor = pool_monitors[0] if len(pool_monitors) == 1 else None
+            yield vip, pool, members.get(pool.id, []), monitor, session
+
+    def _compile_config(self, context, config_handle_id, shard=None,
+                        version=None):
+        """Returns the (vip_id, listen section) list of a config handle.
+
+        version is the current config version of the handle, read before
+        the rows so the sections are never cached as newer than they are.
+        """
+        if version is None:
+            version = self.get_config_version(context, config_handle_id)
+        sections = haproxy_config.cache.get(config_handle_id, version, shard)
+        if sections is None:
+            generation = haproxy_config.cache.generation
+            sections = [(row[0].id, haproxy_config.cache.render(*row))
+                        for row in self._load_config_rows(context,
+                                                          config_handle_id,
+                                                          shard)]
+            haproxy_config.cache.put(config_handle_id, version, sections,
+                                     generation, shard)
+        return sections
+
+    def _get_shard(self, shard):
+        """Validates the [index, count] shard sent by a service VM."""
+        if not shard:
+            return None
+        try:
+            index, count = [int(value) for value in shard]
+        except (TypeError, ValueError):
+            raise q_exc.InvalidInput(
+                error_message=_('Invalid shard %s') % shard)
+        if not 0 <= index < count:
+            raise q_exc.InvalidInput(
+                error_message=_('Invalid shard %s') % shard)
+        if count == 1:
+            return None
+        return index, count
+
+    def _invalidate_config(self, config_handle_ids):
+        """Drops cached configs, called once the change is committed."""
+        haproxy_config.cache.invalidate(config_handle_ids)
+
     def create_config(self, context, config):
         c = config['config']
         id = c['config_handle_id']
         slug = c['slug']
         version = c['version']
-        vip_qry = context.session.query(LB_Virtual_IP)
-        vips = vip_qry.filter_by(config_handle_id=id).all()
-        lb_str = "global\n\
-    daemon\n\
-    maxconn 256\n\
-    stats socket /tmp/haproxy\n\
-\n\
-defaults\n\
-    mode http\n\
-    timeout connect 5000ms\n\
-    timeout client 50000ms\n\
-    timeout server 50000ms\n\
-    stats enable\n\
-    log global\n\
-    stats scope .\n\
-    stats realm Haproxy\ Statistics\n\
-    stats uri /haproxy?stats\n\
-    option contstats\n\n"
-        for vip in vips:
-            pool_id = vip.pool_id
-            pool_qry = context.session.query(LB_Pool)
-            pool = pool_qry.filter_by(id=pool_id).one()
-            
-            pool_member_qry = context.session.query(LB_Pool_Member)
-            pool_members = pool_member_qry.filter_by(pool_id=pool_id).all()
-            
-            health_monitor_qry = context.session.query(LB_Health_Monitor)
-            try:
-                health_monitors = health_monitor_qry.filter_by(pool_id=pool_id).one()
-            except:
-                LOG.debug(_("No Health Monitors Mapped for the Virtual IP"))
-                health_monitors = []
-                
-            
-            session_pers_qry = context.session.query(LB_Session_Persistance)
-            session_pers = session_pers_qry.filter_by(id=vip.session_persistance_id).one()
-            
-            ##VIP Details
-            vip_name = vip.name
-            vip_protocol = str(vip.protocol)
-            vip_port = vip.port_no
-            vip_conn_limit = vip.connection_limit
-            
-            ##Pool Details
-            pool_name = pool.name
-            pool_protocol = pool.protocol
-            pool_lb_method = str(pool.lb_method)
-            
-            ##Health Monitors Details
-            if health_monitors:
-                hm_type = health_monitors.type
-                hm_timeout = health_monitors.type
-                hm_delay = health_monitors.delay
-                hm_max_retries = health_monitors.max_retries
-                hm_http_method = health_monitors.http_method
-                hm_url_path = health_monitors.url_path
-                hm_expected_codes = health_monitors.expected_codes
-            else:
-                hm_type = ''
-                hm_timeout = ''
-                hm_delay = ''
-                hm_max_retries = ''
-                hm_http_method = ''
-                hm_url_path = ''
-                hm_expected_codes = ''
-            
-            ###Session Persistance
-            session_type = session_pers.type
-            cookie_name = session_pers.cookie_name
-            
-            #lb_str += "listen\t %s" % (vip_name) + " %s" % (server_ip) + ":%s" % (port_num) + "\n"
-            lb_str += "listen %s" % (vip_name) + "\n"
-            lb_str += "\t mode %s" % (vip_protocol.lower()) + "\n"
-            lb_str += "\t bind :%s" % (vip_port) + "\n"
-            lb_str += "\t maxconn %s" % (vip_conn_limit) + "\n"
-            lb_str += "\t balance %s" % (pool_lb_method.lower()) + "\n"
-            
-            if hm_type == 'HTTP':
-                lb_str += "\t option httpchk"
-                
-                if len(hm_http_method) > 0:
-                    lb_str += " %s" % (hm_http_method)
-                else:
-                    lb_str += " OPTIONS"
-                
-                if len(hm_url_path) > 0:
-                    lb_str += " %s" % (hm_url_path)
-                else:
-                    lb_str += " /"
-                    
-                lb_str += " HTTP/1.0\n"
-                
-            if len(hm_expected_codes) > 0 and hm_expected_codes:
-                lb_str += "\t http-check expect"
-                
-                try:
-                    hm_expected_codes = int(hm_expected_codes)
-                    lb_str += " status %s" % (hm_expected_codes)
-                except:
-                    lb_str += " %s" % (hm_expected_codes)
-                
-                lb_str += "\n"
-                
-            if len(session_type) > 0 and session_type:
-                lb_str += "\t option persist\n"
-                if session_type == 'HTTP_COOKIE' and len(cookie_name) > 0:
-                    lb_str += "\t cookie %s" % (cookie_name) + " insert\n"
-                
-                if session_type == 'APP_COOKIE' and len(cookie_name) > 0:
-                    lb_str += "\t appsession %s" % (cookie_name) + " len 64 timeout 1h\n"
-                
-            for pm in pool_members:
-                pm_name = str(pm.ip_address)
-                pm_port_no = pm.port_no
-                pm_weight = pm.weight
-                
-                lb_str += "\t server %s" % (pm_name) + " %s" % (pm_name) + ":%s" % (pm_port_no)
-		if session_type == 'HTTP_COOKIE':
-		    ck_name = pm_name.replace('.','')
-		    lb_str += " cookie %s" % (ck_name)
-		    
-                if pm_weight:
-                    lb_str += " weight %s" % (pm_weight)
-                
-                if hm_delay or hm_max_retries:
-                    lb_str += " check"
-                    if hm_delay:
-                        lb_str += " inter %s" % (hm_delay)
-                    if hm_max_retries:
-                        lb_str += " fall %s" % (hm_max_retries)
-                    
-                    lb_str += " rise 1"
-                
-                lb_str += "\n"
-                
-                
-                
-            #with open('/tmp/haproxy.cfg', 'w+') as f:
-            #    f.write(lb_str)
-            #    f.close()
+        sections = self._compile_config(context, id)
+        lb_str = haproxy_config.GLOBAL + ''.join(
+            section for vip_id, section in sections)
                 
         res = {'config_handle_id': id,
                'data': lb_str,
@@ -802,3 +997,84 @@ defaults\n\
                'header': 'data'}
         return res
         #return True
+
+    def _get_changed_vips(self, context, config_handle_id, since):
+        """Ids of the VIPs whose listen section changed after version since.
+
+        Returns the ids of VIPs touched directly by a delta and of the
+        VIPs using a pool, member, monitor or session that was changed.
+        """
+        query = context.session.query(LB_Delta).join(
+            LB_Version, LB_Delta.version_id == LB_Version.id)
+        query = query.filter(LB_Version.config_handle_id == config_handle_id)
+        query = query.filter(LB_Version.id > since)
+        vip_ids = set()
+        pool_ids = set()
+        session_ids = set()
+        for delta in query:
+            if delta.main_table_name == LB_Virtual_IP.__tablename__:
+                vip_ids.add(delta.link_id)
+            elif delta.main_table_name == LB_Pool.__tablename__:
+                pool_ids.add(delta.link_id)
+            elif delta.main_table_name == LB_Session_Persistance.__tablename__:
+                session_ids.add(delta.link_id)
+            else:
+                for value in (delta.old_value, delta.new_value):
+                    if value:
+                        pool_ids.add(jsonutils.loads(value)['pool_id'])
+        if pool_ids or session_ids:
+            vip_qry = context.session.query(LB_Virtual_IP.id)
+            vip_qry = vip_qry.filter(
+                LB_Virtual_IP.config_handle_id == config_handle_id)
+            vip_qry = vip_qry.filter(
+                LB_Virtual_IP.pool_id.in_(pool_ids or ['']) |
+                LB_Virtual_IP.session_persistance_id.in_(session_ids or ['']))
+            vip_ids.update(row[0] for row in vip_qry)
+        return vip_ids
+
+    def create_config_sync(self, context, config_sync):
+        """Returns the config changes of a config handle since a version.
+
+        'version' is the last version the service VM applied. If it is
+        still in the config history only the listen sections of VIPs
+        changed since then are returned, a removed VIP maps to None.
+        Otherwise (first boot, pruned history or a VM that is ahead of
+        the database) all sections are returned with 'full' set.
+
+        'shard' is the [index, count] of the members the VM serves, see
+        _load_config_rows. A VM changing shard syncs from version 0.
+        """
+        c = config_sync['config_sync']
+        id = c['config_handle_id']
+        shard = self._get_shard(c.get('shard'))
+        try:
+            since = int(c.get('version') or 0)
+        except ValueError:
+            since = 0
+        with context.session.begin(subtransactions=True):
+            current = self.get_config_version(context, id)
+            known = since and context.session.query(LB_Version).filter(
+                LB_Version.id == since).filter(
+                    LB_Version.config_handle_id == id).first()
+            compiled = dict(self._compile_config(context, id, shard,
+                                                 current))
+            if known:
+                full = False
+                changed = self._get_changed_vips(context, id, since)
+                sections = dict((vip_id, compiled.get(vip_id))
+                                for vip_id in changed)
+            else:
+                full = True
+                sections = compiled
+        LOG.debug(_('Config sync of %(id)s from version %(since)s to '
+                    '%(current)s, full %(full)s, %(count)d sections'),
+                  {'id': id, 'since': since, 'current': current,
+                   'full': full, 'count': len(sections)})
+        return {'config_handle_id': id,
+                'slug': c.get('slug') or 'loadbalancer',
+                'version': str(current),
+                'full': full,
+                'shard': shard and list(shard),
+                'global': haproxy_config.GLOBAL if full else '',
+                'sections': sections,
+                'header': 'data'}
@@ -0,0 +1,269 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""MAC address management of the v2 plugins
+
+A MAC address is base_mac's first three bytes (four if its fourth one is
+not 00) followed by a suffix unique on the network of the port. Rather
+than trying random suffixes each checked by a query, each process keeps
+the suffixes in use on the networks it has seen (UsedMacs), read once
+from the database, and hands out the free ones following a cursor. The
+cursor starts at a random suffix, so processes allocating on the same
+network do not follow each other.
+
+An address taken by another process since the suffixes were read is
+caught by the unique index of the ports on network_id and mac_address:
+the transaction fails, the suffixes of the networks it allocated on are
+read again and the ports are created again (retry_duplicate_macs).
+"""
+
+import functools
+import random
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import orm
+
+from quantum.common import exceptions as q_exc
+from quantum.db import api as db
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# times the ports are created before giving up on addresses taken by
+# other processes
+MAX_ATTEMPTS = 3
+
+
+def _prefix():
+    """Returns the prefix of the generated addresses and the number of
+    bytes of their suffixes"""
+    base_mac = cfg.CONF.base_mac.split(':')
+    size = 3 if base_mac[3] == '00' else 2
+    prefix = ':'.join('%02x' % int(byte, 16) for byte in base_mac[:6 - size])
+    return prefix, size
+
+
+def _mac_address(prefix, size, suffix):
+    return ':'.join([prefix] + ['%02x' % (suffix >> (8 * i) & 0xff)
+                                for i in range(size - 1, -1, -1)])
+
+
+def _suffix(prefix, mac_address):
+    """Returns the suffix of mac_address, None if it has another prefix"""
+    mac_address = mac_address.lower()
+    if not mac_address.startswith(prefix + ':'):
+        return None
+    return int(mac_address[len(prefix) + 1:].replace(':', ''), 16)
+
+
+class UsedMacs(object):
+    """MAC suffixes in use on the networks seen by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (network id, prefix) -> set of the suffixes in use
+        self._used = {}
+        # (network id, prefix) -> next suffix to hand out
+        self._cursors = {}
+
+    def _get(self, context, network_id, prefix):
+        key = (network_id, prefix)
+        used = self._used.get(key)
+        if used is None:
+            query = context.session.query(models_v2.Port.mac_address)
+            used = set()
+            for mac_address, in query.filter_by(network_id=network_id):
+                suffix = _suffix(prefix, mac_address)
+                if suffix is not None:
+                    used.add(suffix)
+            with self._lock:
+                used = self._used.setdefault(key, used)
+        return key, used
+
+    def take(self, context, network_id, count):
+        """Returns count addresses not in use on the network, marked as
+        used, None if the network has fewer left"""
+        prefix, size = _prefix()
+        space = 1 << (8 * size)
+        key, used = self._get(context, network_id, prefix)
+        with self._lock:
+            if len(used) + count > space:
+                return None
+            suffix = self._cursors.get(key)
+            if suffix is None:
+                suffix = random.randrange(space)
+            suffixes = []
+            while len(suffixes) < count:
+                if suffix not in used:
+                    used.add(suffix)
+                    suffixes.append(suffix)
+                suffix = (suffix + 1) % space
+            self._cursors[key] = suffix
+        return [_mac_address(prefix, size, suffix) for suffix in suffixes]
+
+    def add(self, context, network_id, mac_address):
+        prefix, size = _prefix()
+        suffix = _suffix(prefix, mac_address)
+        if suffix is not None:
+            key, used = self._get(context, network_id, prefix)
+            with self._lock:
+                used.add(suffix)
+
+    def discard(self, network_id, mac_address):
+        with self._lock:
+            for (used_network_id, prefix), used in self._used.items():
+                if used_network_id == network_id:
+                    suffix = _suffix(prefix, mac_address)
+                    if suffix is not None:
+                        used.discard(suffix)
+
+    def forget(self, network_ids):
+        with self._lock:
+            for key in self._used.keys():
+                if key[0] in network_ids:
+                    del self._used[key]
+                    self._cursors.pop(key, None)
+
+
+_used_macs = UsedMacs()
+
+
+def _changed(context, network_id):
+    changed = context.session.__dict__.setdefault('_mac_networks', set())
+    changed.add(network_id)
+
+
+def _release_committed(session):
+    session.__dict__.pop('_mac_networks', None)
+    # the addresses of the ports deleted can be handed out again
+    for network_id, mac_address in session.__dict__.pop('_mac_released', ()):
+        _used_macs.discard(network_id, mac_address)
+
+
+def _forget_rolled_back(session):
+    # the addresses taken by the transaction are not in use after all, or
+    # one of them was in use on another process
+    session.__dict__.pop('_mac_released', None)
+    network_ids = session.__dict__.pop('_mac_networks', set())
+    _used_macs.forget(network_ids)
+    session.__dict__['_mac_forgotten'] = network_ids
+
+
+sa.event.listen(orm.Session, 'after_commit', _release_committed)
+sa.event.listen(orm.Session, 'after_rollback', _forget_rolled_back)
+
+
+def generate_macs(context, network_id, count):
+    """Returns count MAC addresses not in use on the network"""
+    mac_addresses = _used_macs.take(context, network_id, count)
+    if mac_addresses is None:
+        LOG.error(_("No MAC address left on network %s"), network_id)
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+    _changed(context, network_id)
+    LOG.debug(_("Generated mac %(mac_addresses)s on network %(network_id)s"),
+              {'mac_addresses': ', '.join(mac_addresses),
+               'network_id': network_id})
+    return mac_addresses
+
+
+def generate_mac(context, network_id):
+    return generate_macs(context, network_id, 1)[0]
+
+
+def reserve_mac(context, network_id, mac_address):
+    """Marks mac_address, requested for a port, as in use on the network"""
+    _used_macs.add(context, network_id, mac_address)
+    _changed(context, network_id)
+
+
+def release_mac(context, network_id, mac_address):
+    """Marks mac_address as free on the network once the transaction
+    deleting its port is committed"""
+    released = context.session.__dict__.setdefault('_mac_released', [])
+    released.append((network_id, mac_address))
+
+
+def forget_network(network_id):
+    _used_macs.forget([network_id])
+
+
+def retry_duplicate_macs(create):
+    """Decorates a plugin method creating ports, to create them again
+    when their transaction fails on a constraint after addresses were
+    taken on networks: another process may have taken one of them since
+    the addresses in use on the network were read.
+
+    Only the transactions begun by the method are retried, not those it
+    joins.
+    """
+    @functools.wraps(create)
+    def wrapper(self, context, *args, **kwargs):
+        if context.session.transaction is not None:
+            return create(self, context, *args, **kwargs)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            context.session.__dict__.pop('_mac_forgotten', None)
+            try:
+                return create(self, context, *args, **kwargs)
+            except sa_exc.IntegrityError:
+                network_ids = context.session.__dict__.pop('_mac_forgotten',
+                                                           None)
+                if not network_ids:
+                    raise
+                LOG.warning(_("Creating ports on networks %(network_ids)s "
+                              "failed on a constraint, attempt "
+                              "%(attempt)s of %(max)s"),
+                            {'network_ids': ', '.join(sorted(network_ids)),
+                             'attempt': attempt, 'max': MAX_ATTEMPTS})
+        raise q_exc.MacAddressGenerationFailure(
+            net_id=', '.join(sorted(network_ids)))
+    return wrapper
+
+
+def _index_macs(engine):
+    """Adds the unique index of the ports on network_id and mac_address
+    to a database created without it, unless addresses are already
+    duplicated on networks"""
+    inspector = reflection.Inspector.from_engine(engine)
+    ports = models_v2.Port.__table__
+    if ports.name not in inspector.get_table_names():
+        return
+    if models_v2.PORT_MAC_INDEX in [index['name'] for index in
+                                    inspector.get_indexes(ports.name)]:
+        return
+    duplicates = engine.execute(sa.select(
+        [ports.c.network_id, ports.c.mac_address],
+        group_by=[ports.c.network_id, ports.c.mac_address],
+        having=sa.func.count(ports.c.id) > 1)).fetchall()
+    if duplicates:
+        LOG.error(_("MAC addresses are duplicated on networks, the ports "
+                    "are not indexed on their addresses until they are "
+                    "unique: %s"),
+                  ', '.join('%s on %s' % (mac_address, network_id)
+                            for network_id, mac_address in duplicates))
+        return
+    LOG.info(_("Indexing the ports on their MAC addresses"))
+    for index in ports.indexes:
+        if index.name == models_v2.PORT_MAC_INDEX:
+            index.create(engine)
+
+
+db.register_upgrade(_index_macs)
@@ -13,12 +13,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import netaddr
 import sqlalchemy as sa
 from sqlalchemy import orm
 
 from quantum.common import utils
 from quantum.db import model_base
 
+# the MAC addresses are unique on their networks
+PORT_MAC_INDEX = 'ports_network_id_mac_address'
+
+
+def ip_key(ip_address):
+    """Returns the integer value of ip_address as 32 hexadecimal digits
+
+    Compared as strings the keys of addresses order as their integers do,
+    for IPv6 addresses as well, which no portable integer column holds.
+    """
+    return '%032x' % int(netaddr.IPAddress(ip_address))
+
 
 class HasTenant(object):
     """Tenant mixin, add to subclasses that have a tenant."""
@@ -50,6 +63,15 @@ class IPAvailabilityRange(model_base.BASEV2):
                                    primary_key=True)
     first_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
     last_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    # ip_key of first_ip and last_ip, kept up to date by _set_ip_key, see
+    # ipam._add_ip_keys for the ranges created before them
+    first_ip_key = sa.Column(sa.String(32), nullable=False, index=True)
+    last_ip_key = sa.Column(sa.String(32), nullable=False, index=True)
+
+    @orm.validates('first_ip', 'last_ip')
+    def _set_ip_key(self, name, ip_address):
+        setattr(self, '%s_key' % name, ip_key(ip_address))
+        return ip_address
 
     def __repr__(self):
         return "%s - %s" % (self.first_ip, self.last_ip)
@@ -90,6 +112,8 @@ class IPAllocation(model_base.BASEV2):
 
 class Port(model_base.BASEV2, HasId, HasTenant):
     """Represents a port on a quantum v2 network."""
+    __table_args__ = (sa.Index(PORT_MAC_INDEX, 'network_id', 'mac_address',
+                               unique=True),)
     name = sa.Column(sa.String(255))
     network_id = sa.Column(sa.String(36), sa.ForeignKey("networks.id"),
                            nullable=False)
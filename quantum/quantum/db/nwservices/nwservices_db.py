@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import datetime
+import time
+
 import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
@@ -23,7 +27,9 @@ from quantum.common import exceptions as q_exc
 from quantum.db import api as qdbapi
 from quantum.db import model_base
 from quantum.db import models_v2
+from quantum.db import quota_usages
 from quantum.extensions import nwservices
+from quantum.openstack.common import cfg
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import uuidutils
 from quantum.plugins.common import constants
@@ -146,9 +152,78 @@ class ns_config_handle(model_base.BASEV2, HasId, HasTenant):
     networkfunction_id = sa.Column(sa.String(36), sa.ForeignKey('ns_networkfunctions.id'), nullable=False) 
     status = sa.Column(sa.Boolean)
     slug = sa.Column(sa.String(255))
-    
 
-    
+
+class ns_scaling_policy(model_base.BASEV2, HasId, HasTenant):
+    """Autoscaling policy of a chain image.
+
+    The instances of the chain image are scaled out when the average of
+    metric over them exceeds scale_out_threshold and in when it drops
+    below scale_in_threshold, at most once per cooldown seconds.
+    """
+    name = sa.Column(sa.String(50))
+    chain_map_id = sa.Column(sa.String(36),
+                             sa.ForeignKey('ns_chain_image_maps.id',
+                                           ondelete='CASCADE'),
+                             nullable=False)
+    metric = sa.Column(sa.String(16), nullable=False)
+    scale_out_threshold = sa.Column(sa.Integer, nullable=False)
+    scale_in_threshold = sa.Column(sa.Integer, nullable=False)
+    min_instances = sa.Column(sa.Integer, nullable=False)
+    max_instances = sa.Column(sa.Integer, nullable=False)
+    cooldown = sa.Column(sa.Integer, nullable=False)
+    last_scaled_at = sa.Column(sa.DateTime)
+
+
+class ns_chain_image_instance(model_base.BASEV2, HasId):
+    """Instance of a chain image launched by the autoscaler, in addition
+    to the one recorded in ns_chain_image_maps."""
+    chain_map_id = sa.Column(sa.String(36),
+                             sa.ForeignKey('ns_chain_image_maps.id',
+                                           ondelete='CASCADE'),
+                             nullable=False)
+    instance_uuid = sa.Column(sa.String(36), nullable=False)
+    created_at = sa.Column(sa.DateTime, default=timeutils.utcnow)
+
+
+class ns_chain_launch_image(model_base.BASEV2, HasId):
+    """Progress of one chain image in a chain launch."""
+    launch_id = sa.Column(sa.String(36),
+                          sa.ForeignKey('ns_chain_launchs.id',
+                                        ondelete='CASCADE'),
+                          nullable=False)
+    chain_map_id = sa.Column(sa.String(36), nullable=False)
+    name = sa.Column(sa.String(50))
+    instance_uuid = sa.Column(sa.String(36))
+    status = sa.Column(sa.String(16), nullable=False)
+    error = sa.Column(sa.String(255))
+
+
+class ns_chain_launch(model_base.BASEV2, HasId, HasTenant):
+    """A launch of all the images of a chain, see drivers/chain_launcher.py."""
+    chain_id = sa.Column(sa.String(36),
+                         sa.ForeignKey('ns_chains.id', ondelete='CASCADE'),
+                         nullable=False)
+    created_at = sa.Column(sa.DateTime, default=timeutils.utcnow)
+    images = orm.relationship(ns_chain_launch_image, backref='launch',
+                              lazy='joined', cascade='all, delete-orphan')
+
+
+class ns_stat(model_base.BASEV2):
+    """HAProxy counters of one frontend or backend of a service VM."""
+    __table_args__ = (sa.Index('ns_stats_handle_time', 'config_handle_id',
+                               'created_at'),)
+    id = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
+    instance_id = sa.Column(sa.Integer, nullable=False)
+    config_handle_id = sa.Column(sa.String(36), nullable=False)
+    name = sa.Column(sa.String(255))
+    type = sa.Column(sa.String(16))
+    sessions = sa.Column(sa.Integer)
+    rate = sa.Column(sa.Integer)
+    queue = sa.Column(sa.Integer)
+    created_at = sa.Column(sa.DateTime, default=timeutils.utcnow)
+
+
 class ns_version(model_base.BASEV2):
     id = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
     runtime_version = sa.Column(sa.String(50),
@@ -168,6 +243,121 @@ class ns_delta(model_base.BASEV2, HasId):
     
    
 
+class ChainTopologyCache(object):
+    """Topologies of the chains, see NwservicePluginDb.get_chain_topology
+
+    A topology is dropped once a change to one of its rows is committed:
+    the chain, its chain images and their network and configuration
+    associations. Image maps, their metadata and personalities, config
+    handles, network functions and networks can be shared by chains, a
+    change to any of them drops all the topologies.
+
+    Only the changes committed by this process are seen that way, other
+    API workers and servers change chains too. A topology is therefore
+    also dropped once it is older than chain_topology_ttl: none of the
+    rows has a version or update time to check cheaply on every request,
+    and a topology is read for display, so stale for up to the ttl is
+    acceptable.
+    """
+
+    # a change to these drops every topology
+    SHARED_MODELS = (ns_image_map, ns_metadata, ns_personalitie,
+                     ns_config_handle, ns_networkfunction, models_v2.Network)
+
+    def __init__(self):
+        # chain id -> (load time, topology)
+        self._topologies = {}
+        # chain image id -> chain id, of the cached topologies
+        self._chain_images = {}
+        # bumped by every invalidation, a topology read from the database
+        # before one is not cached
+        self.generation = 0
+
+    def get(self, chain_id):
+        entry = self._topologies.get(chain_id)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > cfg.CONF.NWSDRIVER.chain_topology_ttl:
+            self._drop(chain_id)
+            return None
+        return entry[1]
+
+    def put(self, chain_id, topology, generation, loaded_at):
+        """Caches topology, read from the database at loaded_at, unless
+        the topologies were invalidated since generation"""
+        if generation != self.generation:
+            return
+        self._topologies[chain_id] = (loaded_at, topology)
+        for image in topology['images']:
+            self._chain_images[image['id']] = chain_id
+
+    def _drop(self, chain_id):
+        entry = self._topologies.pop(chain_id, None)
+        if entry is not None:
+            for image in entry[1]['images']:
+                self._chain_images.pop(image['id'], None)
+
+    def invalidate(self, chain_ids):
+        """Drops the topologies of chain_ids, all of them if None"""
+        self.generation += 1
+        if chain_ids is None:
+            self._topologies.clear()
+            self._chain_images.clear()
+            return
+        for chain_id in chain_ids:
+            self._drop(chain_id)
+
+    def changed_chains(self, objs):
+        """Chain ids whose topology objs belong to, None for all of them"""
+        chain_ids = set()
+        for obj in objs:
+            if isinstance(obj, self.SHARED_MODELS):
+                return None
+            if isinstance(obj, ns_chain):
+                chain_ids.add(obj.id)
+            elif isinstance(obj, ns_chain_image_map):
+                chain_ids.add(obj.chain_id)
+                chain_ids.add(self._chain_images.get(obj.id))
+            elif isinstance(obj, (ns_chain_network_associate,
+                                  ns_chain_configuration_associate)):
+                chain_ids.add(self._chain_images.get(obj.chain_map_id))
+        chain_ids.discard(None)
+        return chain_ids
+
+
+_topologies = ChainTopologyCache()
+
+
+def _collect_topology_changes(session, flush_context):
+    objs = list(session.new) + list(session.dirty) + list(session.deleted)
+    chain_ids = _topologies.changed_chains(objs)
+    if chain_ids is not None and not chain_ids:
+        return
+    # None stands for all the chains
+    pending = session.__dict__.get('_ns_topology_changes', set())
+    if chain_ids is None or pending is None:
+        session._ns_topology_changes = None
+    else:
+        session._ns_topology_changes = pending | chain_ids
+
+
+def _apply_topology_changes(session):
+    # rolled back changes drop the topologies as well, the flushes of a
+    # subtransaction may have been committed with its parent
+    if '_ns_topology_changes' in session.__dict__:
+        _topologies.invalidate(session.__dict__.pop('_ns_topology_changes'))
+
+
+sa.event.listen(orm.Session, 'after_flush', _collect_topology_changes)
+sa.event.listen(orm.Session, 'after_commit', _apply_topology_changes)
+sa.event.listen(orm.Session, 'after_rollback', _apply_topology_changes)
+
+quota_usages.track('chain', ns_chain)
+# the images of a chain count for the tenant of the chain
+quota_usages.track('chain_image', ns_chain_image_map,
+                   parent=(ns_chain, 'chain_id'))
+
+
 class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
     """
     A class that wraps the implementation of the Quantum
@@ -200,10 +390,14 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         networkfunction = self._get_networkfunction(context, id)
         return self._make_networkfunction_dict(networkfunction, fields)
         
-    def get_networkfunctions(self, context, filters=None, fields=None):
+    def get_networkfunctions(self, context, filters=None, fields=None,
+                             sorts=None, limit=None, marker=None,
+                             page_reverse=False):
         return self._get_collection(context, ns_networkfunction,
                                     self._make_networkfunction_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_networkfunction(self, context, networkfunction):
@@ -259,10 +453,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         category = self._get_category(context, id)
         return self._make_category_dict(category, fields)
         
-    def get_categories(self, context, filters=None, fields=None):
+    def get_categories(self, context, filters=None, fields=None, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_categorie,
                                     self._make_category_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_category(self, context, category):
@@ -317,10 +514,14 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         category_networkfunction = self._get_category_networkfunction(context, id)
         return self._make_category_networkfunction_dict(category_networkfunction, fields)
         
-    def get_category_networkfunctions(self, context, filters=None, fields=None):
+    def get_category_networkfunctions(self, context, filters=None, fields=None,
+                                      sorts=None, limit=None, marker=None,
+                                      page_reverse=False):
         return self._get_collection(context, ns_category_networkfunction,
                                     self._make_category_networkfunction_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_category_networkfunction(self, context, category_networkfunction):
@@ -374,10 +575,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         vendor = self._get_vendor(context, id)
         return self._make_vendor_dict(vendor, fields)
         
-    def get_vendors(self, context, filters=None, fields=None):
+    def get_vendors(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_vendor,
                                     self._make_vendor_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_vendor(self, context, vendor):
@@ -443,10 +647,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         image = self._get_image(context, id)
         return self._make_image_dict(image, fields)
         
-    def get_images(self, context, filters=None, fields=None):
+    def get_images(self, context, filters=None, fields=None, sorts=None,
+                   limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_image_map,
                                     self._make_image_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_image(self, context, image):
@@ -505,10 +712,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         metadata = self._get_metadata(context, id)
         return self._make_metadata_dict(metadata, fields)
         
-    def get_metadatas(self, context, filters=None, fields=None):
+    def get_metadatas(self, context, filters=None, fields=None, sorts=None,
+                      limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_metadata,
                                     self._make_metadata_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_metadata(self, context, metadata):
@@ -562,10 +772,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         personality = self._get_personality(context, id)
         return self._make_personality_dict(personality, fields)
         
-    def get_personalities(self, context, filters=None, fields=None):
+    def get_personalities(self, context, filters=None, fields=None, sorts=None,
+                          limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_personalitie,
                                     self._make_personality_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_personality(self, context, personality):
@@ -620,10 +833,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         chain = self._get_chain(context, id)
         return self._make_chain_dict(chain, fields)
         
-    def get_chains(self, context, filters=None, fields=None):
+    def get_chains(self, context, filters=None, fields=None, sorts=None,
+                   limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_chain,
                                     self._make_chain_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_chain(self, context, chain):
@@ -686,10 +902,13 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         chain_image = self._get_chain_image(context, id)
         return self._make_chain_image_dict(chain_image, fields)
         
-    def get_chain_images(self, context, filters=None, fields=None):
+    def get_chain_images(self, context, filters=None, fields=None, sorts=None,
+                         limit=None, marker=None, page_reverse=False):
         return self._get_collection(context, ns_chain_image_map,
                                     self._make_chain_image_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_chain_image(self, context, chain_image):
@@ -748,10 +967,14 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         chain_image_network = self._get_chain_image_network(context, id)
         return self._make_chain_image_network_dict(chain_image_network, fields)
         
-    def get_chain_image_networks(self, context, filters=None, fields=None):
+    def get_chain_image_networks(self, context, filters=None, fields=None,
+                                 sorts=None, limit=None, marker=None,
+                                 page_reverse=False):
         return self._get_collection(context, ns_chain_network_associate,
                                     self._make_chain_image_network_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_chain_image_network(self, context, chain_image_network):
@@ -819,10 +1042,14 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         chain_image_conf = self._get_chain_image_conf(context, id)
         return self._make_chain_image_conf_dict(chain_image_conf, fields)
         
-    def get_chain_image_confs(self, context, filters=None, fields=None):
+    def get_chain_image_confs(self, context, filters=None, fields=None,
+                              sorts=None, limit=None, marker=None,
+                              page_reverse=False):
         return self._get_collection(context, ns_chain_configuration_associate,
                                     self._make_chain_image_conf_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_chain_image_conf(self, context, chain_image_conf):
@@ -896,10 +1123,14 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
         config_handle = self._get_config_handle(context, id)
         return self._make_config_handle_dict(config_handle, fields)
         
-    def get_config_handles(self, context, filters=None, fields=None):
+    def get_config_handles(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         return self._get_collection(context, ns_config_handle,
                                     self._make_config_handle_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
         
         
     def create_config_handle(self, context, config_handle):
@@ -942,3 +1173,363 @@ class NwservicePluginDb(db_base_plugin_v2.QuantumDbPluginV2):
             config_handle.update(n)
           
         return self._make_config_handle_dict(config_handle)
+
+    def _make_scaling_policy_dict(self, scaling_policy, fields=None):
+        res = {'id': scaling_policy['id'],
+               'name': scaling_policy['name'],
+               'tenant_id': scaling_policy['tenant_id'],
+               'chain_map_id': scaling_policy['chain_map_id'],
+               'metric': scaling_policy['metric'],
+               'scale_out_threshold': scaling_policy['scale_out_threshold'],
+               'scale_in_threshold': scaling_policy['scale_in_threshold'],
+               'min_instances': scaling_policy['min_instances'],
+               'max_instances': scaling_policy['max_instances'],
+               'cooldown': scaling_policy['cooldown']}
+
+        return self._fields(res, fields)
+
+    def get_scaling_policy(self, context, id, fields=None):
+        scaling_policy = self._get_scaling_policy(context, id)
+        return self._make_scaling_policy_dict(scaling_policy, fields)
+
+    def get_scaling_policies(self, context, filters=None, fields=None,
+                             sorts=None, limit=None, marker=None,
+                             page_reverse=False):
+        return self._get_collection(context, ns_scaling_policy,
+                                    self._make_scaling_policy_dict,
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
+
+    def _validate_scaling_policy(self, n):
+        if n['scale_in_threshold'] >= n['scale_out_threshold']:
+            raise q_exc.InvalidInput(
+                error_message=_('scale_in_threshold must be lower than '
+                                'scale_out_threshold'))
+        if not 1 <= n['min_instances'] <= n['max_instances']:
+            raise q_exc.InvalidInput(
+                error_message=_('min_instances must be at least 1 and not '
+                                'more than max_instances'))
+
+    def create_scaling_policy(self, context, scaling_policy):
+        n = scaling_policy['scaling_policy']
+        tenant_id = self._get_tenant_id_for_create(context, n)
+        self._validate_scaling_policy(n)
+        with context.session.begin(subtransactions=True):
+            # raises Chain_imageNotFound
+            self._get_chain_image(context, n['chain_map_id'])
+            scaling_policy = ns_scaling_policy(
+                tenant_id=tenant_id,
+                id=n.get('id') or utils.str_uuid(),
+                name=n['name'],
+                chain_map_id=n['chain_map_id'],
+                metric=n['metric'],
+                scale_out_threshold=n['scale_out_threshold'],
+                scale_in_threshold=n['scale_in_threshold'],
+                min_instances=n['min_instances'],
+                max_instances=n['max_instances'],
+                cooldown=n['cooldown'])
+            context.session.add(scaling_policy)
+        return self._make_scaling_policy_dict(scaling_policy)
+
+    def _get_scaling_policy(self, context, id):
+        try:
+            scaling_policy = self._get_by_id(context, ns_scaling_policy, id)
+        except exc.NoResultFound:
+            raise q_exc.Scaling_policyNotFound(scaling_policy_id=id)
+        return scaling_policy
+
+    def delete_scaling_policy(self, context, id):
+        scaling_policy = self._get_scaling_policy(context, id)
+        with context.session.begin(subtransactions=True):
+            context.session.delete(scaling_policy)
+
+    def update_scaling_policy(self, context, id, scaling_policy):
+        n = scaling_policy['scaling_policy']
+        with context.session.begin(subtransactions=True):
+            scaling_policy = self._get_scaling_policy(context, id)
+            values = self._make_scaling_policy_dict(scaling_policy)
+            values.update(n)
+            self._validate_scaling_policy(values)
+            scaling_policy.update(n)
+
+        return self._make_scaling_policy_dict(scaling_policy)
+
+    def get_due_scaling_policies(self, context, now):
+        """Scaling policies whose cooldown is over."""
+        query = context.session.query(ns_scaling_policy)
+        return [self._make_scaling_policy_dict(scaling_policy)
+                for scaling_policy in query
+                if (scaling_policy.last_scaled_at is None or
+                    scaling_policy.last_scaled_at + datetime.timedelta(
+                        seconds=scaling_policy.cooldown) <= now)]
+
+    def mark_scaled(self, context, id):
+        """Starts the cooldown of a scaling policy."""
+        with context.session.begin(subtransactions=True):
+            scaling_policy = self._get_scaling_policy(context, id)
+            scaling_policy.last_scaled_at = timeutils.utcnow()
+
+    def get_chain_image_instances(self, context, chain_map_id):
+        """uuids of the extra instances of a chain image, oldest first."""
+        query = context.session.query(ns_chain_image_instance.instance_uuid)
+        query = query.filter(
+            ns_chain_image_instance.chain_map_id == chain_map_id)
+        query = query.order_by(ns_chain_image_instance.created_at,
+                               ns_chain_image_instance.id)
+        return [row[0] for row in query]
+
+    def add_chain_image_instance(self, context, chain_map_id, instance_uuid):
+        with context.session.begin(subtransactions=True):
+            context.session.add(ns_chain_image_instance(
+                id=utils.str_uuid(), chain_map_id=chain_map_id,
+                instance_uuid=instance_uuid))
+
+    def delete_chain_image_instance(self, context, instance_uuid):
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(ns_chain_image_instance)
+            query.filter(ns_chain_image_instance.instance_uuid ==
+                         instance_uuid).delete()
+
+    def add_stats(self, context, instance_id, config_handle_id, stats):
+        """Records the counters a service VM reported for a config handle.
+
+        stats is the list of frontend and backend rows sent by the SLB VM
+        daemon, see slbvm/slb_config_daemon.py.
+        """
+        now = timeutils.utcnow()
+        with context.session.begin(subtransactions=True):
+            for row in stats:
+                context.session.add(ns_stat(
+                    instance_id=instance_id,
+                    config_handle_id=config_handle_id,
+                    name=row['name'], type=row['type'],
+                    sessions=row.get('sessions'), rate=row.get('rate'),
+                    queue=row.get('queue'), created_at=now))
+
+    def get_stats(self, context, config_handle_ids, since):
+        """Counters of the config handles recorded after since."""
+        if not config_handle_ids:
+            return []
+        query = context.session.query(ns_stat)
+        query = query.filter(ns_stat.config_handle_id.in_(config_handle_ids))
+        query = query.filter(ns_stat.created_at > since)
+        return query.order_by(ns_stat.created_at).all()
+
+    def prune_stats(self, context, before):
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(ns_stat)
+            return query.filter(ns_stat.created_at < before).delete()
+
+    def get_chain_launch_plan(self, context, chain_id):
+        """Resolves what booting the images of a chain takes.
+
+        Returns a dict per chain image, ordered by sequence number, with
+        its glance image, flavor, security group, networks and config
+        handles. Takes three queries however many images the chain has.
+        """
+        self._get_chain(context, chain_id)
+        query = context.session.query(ns_chain_image_map, ns_image_map)
+        query = query.join(ns_image_map,
+                           ns_chain_image_map.image_map_id == ns_image_map.id)
+        query = query.filter(ns_chain_image_map.chain_id == chain_id)
+        query = query.order_by(ns_chain_image_map.sequence_number,
+                               ns_chain_image_map.id)
+        plan = []
+        chain_images = {}
+        for chain_image, image in query:
+            entry = {'id': chain_image.id,
+                     'name': chain_image.name,
+                     'sequence_number': chain_image.sequence_number,
+                     'image_id': image.image_id,
+                     'flavor_id': image.flavor_id,
+                     'security_group_id': image.security_group_id,
+                     'network_ids': [],
+                     'config_handle_ids': []}
+            plan.append(entry)
+            chain_images[chain_image.id] = entry
+        if chain_images:
+            network_qry = context.session.query(
+                ns_chain_network_associate.chain_map_id,
+                ns_chain_network_associate.network_id)
+            for chain_map_id, network_id in network_qry.filter(
+                    ns_chain_network_associate.chain_map_id.in_(
+                        chain_images)):
+                chain_images[chain_map_id]['network_ids'].append(network_id)
+            conf_qry = context.session.query(
+                ns_chain_configuration_associate.chain_map_id,
+                ns_chain_configuration_associate.config_handle_id)
+            for chain_map_id, config_handle_id in conf_qry.filter(
+                    ns_chain_configuration_associate.chain_map_id.in_(
+                        chain_images)):
+                chain_images[chain_map_id]['config_handle_ids'].append(
+                    config_handle_id)
+        return plan
+
+    def get_chain_topology(self, context, chain_id):
+        """The chain with its images, their networks and configurations
+
+        Returns the chain dict with an 'images' list, ordered by sequence
+        number. Each chain image has its image map ('image', with its
+        metadata and personalities), 'networks' and 'confs'. Takes six
+        queries however large the chain is, and none while the topology
+        is cached (see ChainTopologyCache).
+        """
+        topology = _topologies.get(chain_id)
+        if topology is None:
+            generation = _topologies.generation
+            loaded_at = time.time()
+            topology = self._load_chain_topology(context, chain_id)
+            _topologies.put(chain_id, topology, generation, loaded_at)
+        elif not context.is_admin and (topology['tenant_id'] !=
+                                       context.tenant_id):
+            raise q_exc.ChainNotFound(chain_id=chain_id)
+        return copy.deepcopy(topology)
+
+    def _load_chain_topology(self, context, chain_id):
+        chain = self._get_chain(context, chain_id)
+        topology = {'id': chain['id'],
+                    'name': chain['name'],
+                    'type': chain['type'],
+                    'tenant_id': chain['tenant_id'],
+                    'auto_boot': chain['auto_boot'],
+                    'images': []}
+        query = context.session.query(ns_chain_image_map, ns_image_map)
+        query = query.join(ns_image_map,
+                           ns_chain_image_map.image_map_id == ns_image_map.id)
+        query = query.filter(ns_chain_image_map.chain_id == chain_id)
+        query = query.order_by(ns_chain_image_map.sequence_number,
+                               ns_chain_image_map.id)
+        chain_images = {}
+        # image map id -> image dicts of the chain images using it
+        images = {}
+        for chain_image, image in query:
+            image_dict = {'id': image.id,
+                          'name': image.name,
+                          'category_id': image.category_id,
+                          'vendor_id': image.vendor_id,
+                          'image_id': image.image_id,
+                          'flavor_id': image.flavor_id,
+                          'security_group_id': image.security_group_id,
+                          'metadatas': [],
+                          'personalities': []}
+            images.setdefault(image.id, []).append(image_dict)
+            entry = {'id': chain_image.id,
+                     'name': chain_image.name,
+                     'image_map_id': chain_image.image_map_id,
+                     'sequence_number': chain_image.sequence_number,
+                     'instance_id': chain_image.instance_id,
+                     'instance_uuid': chain_image.instance_uuid,
+                     'image': image_dict,
+                     'networks': [],
+                     'confs': []}
+            topology['images'].append(entry)
+            chain_images[chain_image.id] = entry
+        if not chain_images:
+            return topology
+
+        query = context.session.query(ns_chain_network_associate,
+                                      models_v2.Network.name)
+        query = query.outerjoin(
+            models_v2.Network,
+            ns_chain_network_associate.network_id == models_v2.Network.id)
+        query = query.filter(
+            ns_chain_network_associate.chain_map_id.in_(chain_images))
+        for network, network_name in query:
+            chain_images[network.chain_map_id]['networks'].append(
+                {'id': network.id,
+                 'name': network.name,
+                 'network_id': network.network_id,
+                 'network_name': network_name})
+
+        query = context.session.query(ns_chain_configuration_associate,
+                                      ns_config_handle.name,
+                                      ns_config_handle.slug)
+        query = query.outerjoin(
+            ns_config_handle,
+            ns_chain_configuration_associate.config_handle_id ==
+            ns_config_handle.id)
+        query = query.filter(
+            ns_chain_configuration_associate.chain_map_id.in_(chain_images))
+        for conf, config_handle_name, slug in query:
+            chain_images[conf.chain_map_id]['confs'].append(
+                {'id': conf.id,
+                 'name': conf.name,
+                 'networkfunction_id': conf.networkfunction_id,
+                 'config_handle_id': conf.config_handle_id,
+                 'config_handle_name': config_handle_name,
+                 'slug': slug})
+
+        query = context.session.query(ns_metadata).filter(
+            ns_metadata.image_map_id.in_(images))
+        for metadata in query:
+            for image_dict in images[metadata.image_map_id]:
+                image_dict['metadatas'].append({'id': metadata.id,
+                                                'name': metadata.name,
+                                                'value': metadata.value})
+        query = context.session.query(ns_personalitie).filter(
+            ns_personalitie.image_map_id.in_(images))
+        for personality in query:
+            for image_dict in images[personality.image_map_id]:
+                image_dict['personalities'].append(
+                    {'id': personality.id,
+                     'file_path': personality.file_path,
+                     'file_content': personality.file_content})
+        return topology
+
+    def _make_chain_launch_dict(self, chain_launch, fields=None):
+        images = [{'id': image['id'],
+                   'chain_map_id': image['chain_map_id'],
+                   'name': image['name'],
+                   'instance_uuid': image['instance_uuid'],
+                   'status': image['status'],
+                   'error': image['error']}
+                  for image in chain_launch['images']]
+        statuses = set(image['status'] for image in images)
+        if constants.ERROR in statuses:
+            status = constants.ERROR
+        elif statuses == set([constants.ACTIVE]):
+            status = constants.ACTIVE
+        else:
+            status = constants.PENDING_CREATE
+        res = {'id': chain_launch['id'],
+               'tenant_id': chain_launch['tenant_id'],
+               'chain_id': chain_launch['chain_id'],
+               'status': status,
+               'images': images}
+
+        return self._fields(res, fields)
+
+    def get_chain_launch(self, context, id, fields=None):
+        try:
+            chain_launch = self._get_by_id(context, ns_chain_launch, id)
+        except exc.NoResultFound:
+            raise q_exc.Chain_launchNotFound(chain_launch_id=id)
+        return self._make_chain_launch_dict(chain_launch, fields)
+
+    def get_chain_launches(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
+        return self._get_collection(context, ns_chain_launch,
+                                    self._make_chain_launch_dict,
+                                    filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
+
+    def create_chain_launch(self, context, chain_id, plan):
+        with context.session.begin(subtransactions=True):
+            chain = self._get_chain(context, chain_id)
+            chain_launch = ns_chain_launch(id=utils.str_uuid(),
+                                           tenant_id=chain['tenant_id'],
+                                           chain_id=chain_id)
+            for entry in plan:
+                chain_launch.images.append(ns_chain_launch_image(
+                    id=utils.str_uuid(), chain_map_id=entry['id'],
+                    name=entry['name'], status=constants.PENDING_CREATE))
+            context.session.add(chain_launch)
+        return self._make_chain_launch_dict(chain_launch)
+
+    def update_chain_launch_image(self, context, id, **values):
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(ns_chain_launch_image)
+            query.filter(ns_chain_launch_image.id == id).update(values)
@@ -0,0 +1,262 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Quota usages of the tenants, kept as their resources are created
+
+The usage of a resource by a tenant (QuotaUsage) is counted once from
+the rows of the model of the resource (SELECT COUNT(*)), then kept up to
+date by the flushes adding or deleting rows of the model, in the
+transaction doing it. Quotas are checked against the usage plus the
+quantities reserved (Reservation) by the requests creating resources,
+N at once for a bulk create. A reservation is released once its
+resources are created, or failed to be, or when it expires.
+
+The models of the resources are tracked by the plugins defining them:
+
+    quota_usages.track('network', models_v2.Network)
+
+The tenant of a resource whose model has no tenant_id is the tenant of
+its parent, given as the parent model and the foreign key to it.
+
+The flushes are only counted once enable() is called, by the quota
+driver keeping the usages (DbQuotaDriver).
+"""
+
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import orm
+
+from quantum.common import exceptions
+from quantum.common import utils
+from quantum.db import api as db
+from quantum.db import model_base
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+# resource -> (model, (parent model, foreign key) or None)
+_TRACKED = {}
+# model -> resource
+_RESOURCES = {}
+# the flushes are counted
+_enabled = False
+
+
+class QuotaUsage(model_base.BASEV2):
+    """Represents the usage of a resource by a tenant."""
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False)
+    reserved = sa.Column(sa.Integer, nullable=False)
+    # in_use was last counted from the rows of the resource
+    counted_at = sa.Column(sa.DateTime, nullable=False)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represents a quantity of a resource reserved for a tenant."""
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255), nullable=False)
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
+def track(resource, model, parent=None):
+    """Keeps the usages of resource, whose rows are those of model"""
+    _TRACKED[resource] = (model, parent)
+    _RESOURCES[model] = resource
+
+
+def is_tracked(resource):
+    return resource in _TRACKED
+
+
+def count(context, resource, tenant_id):
+    """Counts the rows of resource of the tenant in the database"""
+    model, parent = _TRACKED[resource]
+    query = context.session.query(sa.func.count(model.id))
+    if parent:
+        parent_model, foreign_key = parent
+        query = query.join(parent_model,
+                           parent_model.id == getattr(model, foreign_key))
+        query = query.filter(parent_model.tenant_id == tenant_id)
+    else:
+        query = query.filter(model.tenant_id == tenant_id)
+    return query.scalar()
+
+
+def _tenant_of(session, resource, obj):
+    model, parent = _TRACKED[resource]
+    if not parent:
+        return obj.tenant_id
+    parent_model, foreign_key = parent
+    return session.execute(sa.select(
+        [parent_model.tenant_id],
+        parent_model.id == getattr(obj, foreign_key))).scalar()
+
+
+def add_usage(session, resource, tenant_id, delta):
+    """Adds delta to the usage of resource by the tenant
+
+    For the rows added or deleted without the session knowing, by
+    statements rather than objects.
+    """
+    if not _enabled:
+        return
+    table = QuotaUsage.__table__
+    session.execute(table.update().where(
+        sa.and_(table.c.tenant_id == tenant_id,
+                table.c.resource == resource)).values(
+                    in_use=table.c.in_use + delta))
+
+
+def _count_flushed(session, flush_context):
+    # new and deleted still hold the objects flushed
+    deltas = {}
+    for delta, objs in ((1, session.new), (-1, session.deleted)):
+        for obj in objs:
+            resource = _RESOURCES.get(type(obj))
+            if resource is None:
+                continue
+            tenant_id = _tenant_of(session, resource, obj)
+            if tenant_id is not None:
+                key = (resource, tenant_id)
+                deltas[key] = deltas.get(key, 0) + delta
+    for (resource, tenant_id), delta in deltas.items():
+        if delta:
+            add_usage(session, resource, tenant_id, delta)
+
+
+def enable():
+    """Keeps the usages up to date from now on, as the flushes add and
+    delete rows of the tracked models"""
+    global _enabled
+    if not _enabled:
+        sa.event.listen(orm.Session, 'after_flush', _count_flushed)
+        _enabled = True
+
+
+def _insert_usage(context, tenant_id, resource, now):
+    """Inserts the usage of resource by the tenant, counted, in a
+    transaction of its own
+
+    The first reservations of concurrent requests all insert it, the
+    inserts failing are not to roll back the transactions reserving.
+    """
+    usage = QuotaUsage(tenant_id=tenant_id, resource=resource,
+                       in_use=count(context, resource, tenant_id),
+                       reserved=0, counted_at=now)
+    session = db.get_session()
+    try:
+        with session.begin():
+            session.add(usage)
+    except sa_exc.IntegrityError:
+        LOG.debug(_("Usage of %(resource)s by %(tenant_id)s inserted "
+                    "concurrently"),
+                  {'resource': resource, 'tenant_id': tenant_id})
+
+
+def _lock_usage(context, tenant_id, resource, now):
+    query = context.session.query(QuotaUsage).filter_by(tenant_id=tenant_id,
+                                                       resource=resource)
+    # the usage may have been loaded before and changed since
+    usage = query.with_lockmode('update').populate_existing().first()
+    if usage is None:
+        _insert_usage(context, tenant_id, resource, now)
+        usage = query.with_lockmode('update').populate_existing().one()
+        return usage
+    max_age = cfg.CONF.QUOTAS.quota_usage_max_age
+    if max_age and usage.counted_at + datetime.timedelta(
+            seconds=max_age) <= now:
+        # rows deleted by the database (ON DELETE CASCADE) are not seen
+        in_use = count(context, resource, tenant_id)
+        if in_use != usage.in_use:
+            LOG.debug(_("Usage of %(resource)s by %(tenant_id)s was "
+                        "%(old)s, counted %(new)s"),
+                      {'resource': resource, 'tenant_id': tenant_id,
+                       'old': usage.in_use, 'new': in_use})
+        usage.in_use = in_use
+        usage.counted_at = now
+    return usage
+
+
+def _release(context, reservations):
+    table = QuotaUsage.__table__
+    for reservation in reservations:
+        context.session.execute(table.update().where(
+            sa.and_(table.c.tenant_id == reservation.tenant_id,
+                    table.c.resource == reservation.resource)).values(
+                        reserved=table.c.reserved - reservation.delta))
+        context.session.delete(reservation)
+
+
+def reserve(context, tenant_id, deltas, quotas):
+    """Reserves deltas of tracked resources for the tenant
+
+    quotas are the limits of the resources, negative for unlimited. Raises
+    OverQuota if a delta does not fit in the quota of the resource minus
+    its usage and the quantities already reserved. Returns the ids of the
+    reservations, to release once the resources are created or not.
+    """
+    now = timeutils.utcnow()
+    expiration = now + datetime.timedelta(
+        seconds=cfg.CONF.QUOTAS.reservation_expire)
+    with context.session.begin(subtransactions=True):
+        expired = context.session.query(Reservation).filter(
+            Reservation.tenant_id == tenant_id,
+            Reservation.expiration <= now).all()
+        if expired:
+            LOG.warning(_("Releasing %(count)s expired reservations of "
+                          "%(tenant_id)s"),
+                        {'count': len(expired), 'tenant_id': tenant_id})
+            _release(context, expired)
+            context.session.flush()
+        usages = dict((resource, _lock_usage(context, tenant_id, resource,
+                                             now))
+                      for resource in deltas)
+        overs = [resource for resource, delta in deltas.items()
+                 if delta > 0 and quotas[resource] >= 0 and
+                 quotas[resource] < (usages[resource].in_use +
+                                     usages[resource].reserved + delta)]
+        if overs:
+            raise exceptions.OverQuota(
+                overs=sorted(overs), quotas=quotas,
+                usages=dict((resource, {'in_use': usage.in_use,
+                                        'reserved': usage.reserved})
+                            for resource, usage in usages.items()))
+        reservations = []
+        for resource, delta in deltas.items():
+            usages[resource].reserved += delta
+            reservation = Reservation(id=utils.str_uuid(),
+                                      tenant_id=tenant_id,
+                                      resource=resource, delta=delta,
+                                      expiration=expiration)
+            context.session.add(reservation)
+            reservations.append(reservation.id)
+    return reservations
+
+
+def release(context, reservation_ids):
+    """Releases the reservations, if they have not expired yet"""
+    with context.session.begin(subtransactions=True):
+        reservations = context.session.query(Reservation).filter(
+            Reservation.id.in_(reservation_ids)).all()
+        _release(context, reservations)
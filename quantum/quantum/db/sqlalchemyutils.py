@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import orm
+from sqlalchemy import sql
+
+from quantum.common import exceptions as q_exc
+
+
+def get_columns(model, fields):
+    """Returns the columns of model named fields, None if one is not one"""
+    columns = dict((prop.key, prop) for prop in
+                   orm.class_mapper(model).iterate_properties
+                   if isinstance(prop, orm.ColumnProperty))
+    if not fields or [field for field in fields if field not in columns]:
+        return None
+    return [getattr(model, field) for field in fields]
+
+
+def paginate_query(query, model, limit, sorts, marker_obj=None):
+    """Orders query by sorts and returns at most limit rows after marker_obj
+
+    sorts is a list of (key, ascending) of columns of model ending with a
+    unique one, usually id, so the rows after the marker are those greater
+    (or smaller if descending) than it in the order:
+
+        (k1 > m1) or (k1 == m1 and k2 > m2) or ...
+    """
+    columns = get_columns(model, [key for key, ascending in sorts])
+    if columns is None:
+        raise q_exc.InvalidInput(
+            error_message=_("Cannot sort %(model)s on %(keys)s") %
+            {'model': model.__name__,
+             'keys': ', '.join(key for key, ascending in sorts)})
+    for column, (key, ascending) in zip(columns, sorts):
+        query = query.order_by(column.asc() if ascending else column.desc())
+
+    if marker_obj is not None:
+        criteria = []
+        for i, (column, (key, ascending)) in enumerate(zip(columns, sorts)):
+            crit = [prior == marker_obj[prior_key] for prior, (prior_key, a)
+                    in zip(columns[:i], sorts[:i])]
+            if ascending:
+                crit.append(column > marker_obj[key])
+            else:
+                crit.append(column < marker_obj[key])
+            criteria.append(sql.and_(*crit))
+        query = query.filter(sql.or_(*criteria))
+
+    if limit:
+        query = query.limit(limit)
+    return query
@@ -16,6 +16,7 @@
 #    under the License.
 
 from quantum.common import exceptions
+from quantum.db import quota_usages
 from quantum.extensions import _quotav2_model as quotav2_model
 
 
@@ -26,6 +27,10 @@ class DbQuotaDriver(object):
     database.
     """
 
+    def __init__(self):
+        # the usages are only kept when this driver is used
+        quota_usages.enable()
+
     @staticmethod
     def get_tenant_quotas(context, resources, tenant_id):
         """
@@ -115,7 +120,7 @@ class DbQuotaDriver(object):
 
         # Grab and return the quotas (without usages)
         quotas = DbQuotaDriver.get_tenant_quotas(
-            context, sub_resources, context.tenant_id)
+            context, sub_resources, tenant_id)
 
         return dict((k, v['limit']) for k, v in quotas.items())
 
@@ -156,3 +161,36 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    def reserve(self, context, tenant_id, resources, deltas):
+        """Check quotas and reserve resources.
+
+        The usages of the resources are kept in the database, as the
+        resources are created and deleted. The quota of each resource in
+        deltas must fit its usage, the quantities already reserved and
+        its delta, which is then reserved.
+
+        If any of the deltas is over the defined quota, an OverQuota
+        exception will be raised with the sorted list of the resources
+        which are too high.  Otherwise, the method returns the list of
+        the reservation ids to commit or roll back.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve the resources for.
+        :param resources: A dictionary of the registered resources.
+        :param deltas: A dictionary of the number of resources to reserve.
+        """
+
+        quotas = self._get_quotas(context, tenant_id, resources,
+                                  deltas.keys())
+        return quota_usages.reserve(context, tenant_id, deltas, quotas)
+
+    def commit(self, context, reservations):
+        """Release the reservations of the resources created, their
+        usages are already up to date"""
+        quota_usages.release(context, reservations)
+
+    def rollback(self, context, reservations):
+        """Release the reservations of the resources not created"""
+        quota_usages.release(context, reservations)
+
@@ -22,8 +22,10 @@ from quantum.api.v2 import attributes as attr
 from quantum.api.v2 import base
 from quantum.common import exceptions as qexception
 from quantum import manager
+from quantum.openstack.common import cfg
 from quantum.plugins.common import constants
 from quantum.plugins.services.service_base import ServicePluginBase
+from quantum import quota
 
 import logging
 LOG = logging.getLogger(__name__)
@@ -86,8 +88,10 @@ RESOURCE_ATTRIBUTE_MAP = {
                       'validate': {'type:string': None},
                       'required_by_policy': True,
                       'is_visible': True},
-        'admin_status': {'allow_post': False, 'allow_put': False,
-                   'is_visible': True},
+        # a disabled member stays in the config and takes no traffic
+        'admin_status': {'allow_post': False, 'allow_put': True,
+                         'convert_to': attr.convert_to_boolean,
+                         'is_visible': True},
         'status': {'allow_post': False, 'allow_put': False,
                    'is_visible': True},
     },
@@ -204,6 +208,28 @@ RESOURCE_ATTRIBUTE_MAP = {
                  'validate': {'type:string': None},
                  'default': '', 'is_visible': True},
      },
+    'config_syncs': {
+        'config_handle_id': {'allow_post': True, 'allow_put': False,
+               'validate': {'type:regex': attr.UUID_PATTERN},
+               'is_visible': True},
+        'slug': {'allow_post': True, 'allow_put': False,
+                 'validate': {'type:string': None},
+                 'default': '', 'is_visible': True},
+        'version': {'allow_post': True, 'allow_put': False,
+                 'validate': {'type:string': None},
+                 'default': '', 'is_visible': True},
+        'header': {'allow_post': True, 'allow_put': False,
+                 'validate': {'type:string': None},
+                 'default': '', 'is_visible': True},
+        'shard': {'allow_post': True, 'allow_put': False,
+                 'default': None, 'is_visible': True},
+        'full': {'allow_post': False, 'allow_put': False,
+                 'is_visible': True},
+        'global': {'allow_post': False, 'allow_put': False,
+                 'is_visible': True},
+        'sections': {'allow_post': False, 'allow_put': False,
+                 'is_visible': True},
+     },
 }
 
 
@@ -222,6 +248,16 @@ RESOURCE_ATTRIBUTE_MAP = {
 #    }
 #}
 
+loadbalancer_quota_opts = [
+    cfg.IntOpt('quota_vip',
+               default=-1,
+               help='number of vips allowed per tenant, -1 for unlimited'),
+    cfg.IntOpt('quota_pool',
+               default=-1,
+               help='number of pools allowed per tenant, -1 for unlimited'),
+]
+cfg.CONF.register_opts(loadbalancer_quota_opts, 'QUOTAS')
+
 
 class Loadbalancer(extensions.ExtensionDescriptor):
 
@@ -258,6 +294,9 @@ class Loadbalancer(extensions.ExtensionDescriptor):
             resource_name = collection_name[:-1]
             params = RESOURCE_ATTRIBUTE_MAP[collection_name]
 
+            if resource_name in ('vip', 'pool'):
+                quota.QUOTAS.register_resource_by_name(resource_name)
+
             member_actions = {}
             if resource_name == 'pool':
                 member_actions = {'stats': 'GET'}
@@ -397,3 +436,7 @@ class LoadbalancerPluginBase(ServicePluginBase):
     @abc.abstractmethod
     def create_config(self, context, config):
         pass
+
+    @abc.abstractmethod
+    def create_config_sync(self, context, config_sync):
+        pass
@@ -20,8 +20,10 @@ from quantum.api.v2 import attributes as attr
 from quantum.api.v2 import base
 from quantum.common import exceptions as qexception
 from quantum import manager
+from quantum.openstack.common import cfg
 from quantum.plugins.common import constants
 from quantum.plugins.services.service_base import ServicePluginBase
+from quantum import quota
 
 
 NWSERVICES_PLURALS = {
@@ -37,9 +39,25 @@ NWSERVICES_PLURALS = {
     'chain_image_networks': 'chain_image_network',
     'category_networkfunctions': 'category_networkfunction',
     'config_handles': 'config_handle',
+    'scaling_policies': 'scaling_policy',
+    'chain_launches': 'chain_launch',
     'launchs': 'launch'
 }
 
+BULK_COLLECTIONS = ('chain_images', 'chain_image_networks',
+                    'chain_image_confs')
+
+nwservices_quota_opts = [
+    cfg.IntOpt('quota_chain',
+               default=-1,
+               help='number of chains allowed per tenant, -1 for unlimited'),
+    cfg.IntOpt('quota_chain_image',
+               default=-1,
+               help='number of chain images allowed per tenant, '
+                    '-1 for unlimited'),
+]
+cfg.CONF.register_opts(nwservices_quota_opts, 'QUOTAS')
+
 RESOURCE_ATTRIBUTE_MAP = {
     'networkfunctions': {
         'id': {'allow_post': False, 'allow_put': False,
@@ -305,6 +323,59 @@ RESOURCE_ATTRIBUTE_MAP = {
                    'default': '', 'is_visible': True},
                 
     },
+    'scaling_policies': {
+        'id': {'allow_post': False, 'allow_put': False,
+               'validate': {'type:regex': attr.UUID_PATTERN},
+               'is_visible': True},
+        'name': {'allow_post': True, 'allow_put': True,
+                 'validate': {'type:string': None},
+                 'default': '', 'is_visible': True},
+        'tenant_id': {'allow_post': True, 'allow_put': False,
+                      'validate': {'type:string': None},
+                      'required_by_policy': True,
+                      'is_visible': True},
+        'chain_map_id': {'allow_post': True, 'allow_put': False,
+                         'validate': {'type:uuid': None},
+                         'is_visible': True},
+        'metric': {'allow_post': True, 'allow_put': True,
+                   'validate': {'type:values': ['sessions', 'rate',
+                                                'queue']},
+                   'default': 'sessions', 'is_visible': True},
+        'scale_out_threshold': {'allow_post': True, 'allow_put': True,
+                                'convert_to': attr.convert_to_int,
+                                'validate': {'type:non_negative': None},
+                                'is_visible': True},
+        'scale_in_threshold': {'allow_post': True, 'allow_put': True,
+                               'convert_to': attr.convert_to_int,
+                               'validate': {'type:non_negative': None},
+                               'is_visible': True},
+        'min_instances': {'allow_post': True, 'allow_put': True,
+                          'convert_to': attr.convert_to_int,
+                          'validate': {'type:non_negative': None},
+                          'default': 1, 'is_visible': True},
+        'max_instances': {'allow_post': True, 'allow_put': True,
+                          'convert_to': attr.convert_to_int,
+                          'validate': {'type:non_negative': None},
+                          'default': 4, 'is_visible': True},
+        'cooldown': {'allow_post': True, 'allow_put': True,
+                     'convert_to': attr.convert_to_int,
+                     'validate': {'type:non_negative': None},
+                     'default': 300, 'is_visible': True},
+    },
+    'chain_launches': {
+        'id': {'allow_post': False, 'allow_put': False,
+               'validate': {'type:regex': attr.UUID_PATTERN},
+               'is_visible': True},
+        'tenant_id': {'allow_post': False, 'allow_put': False,
+                      'required_by_policy': True,
+                      'is_visible': True},
+        'chain_id': {'allow_post': False, 'allow_put': False,
+                     'is_visible': True},
+        'status': {'allow_post': False, 'allow_put': False,
+                   'is_visible': True},
+        'images': {'allow_post': False, 'allow_put': False,
+                   'is_visible': True},
+    },
     'launchs': {
         'config_handle_id': {'allow_post': False, 'allow_put': False,
                'validate': {'type:regex': attr.UUID_PATTERN},
@@ -359,11 +430,24 @@ class Nwservices(extensions.ExtensionDescriptor):
             resource_name = NWSERVICES_PLURALS[collection_name]
             params = RESOURCE_ATTRIBUTE_MAP[collection_name]
 
-            member_actions = {}
+            if resource_name in ('chain', 'chain_image'):
+                quota.QUOTAS.register_resource_by_name(resource_name)
 
+            member_actions = {}
+            if collection_name == 'chains':
+                # boots all the images of the chain and returns the whole
+                # chain in one document, see NwservicesPluginBase.launch
+                # and topology
+                member_actions = {'launch': 'PUT', 'topology': 'GET'}
+
+            # the images of a chain and their networks and configs are
+            # posted together when the chain is created
+            allow_bulk = (cfg.CONF.allow_bulk and
+                          collection_name in BULK_COLLECTIONS)
             controller = base.create_resource(collection_name,
                                               resource_name,
                                               plugin, params,
+                                              allow_bulk=allow_bulk,
                                               member_actions=member_actions)
 
             resource = extensions.ResourceExtension(
@@ -633,6 +717,53 @@ class NwservicesPluginBase(ServicePluginBase):
     def delete_config_handle(self, context, id):
         pass
     
+    @abc.abstractmethod
+    def get_scaling_policies(self, context, filters=None, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def get_scaling_policy(self, context, id, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def create_scaling_policy(self, context, scaling_policy):
+        pass
+
+    @abc.abstractmethod
+    def update_scaling_policy(self, context, id, scaling_policy):
+        pass
+
+    @abc.abstractmethod
+    def delete_scaling_policy(self, context, id):
+        pass
+
+    @abc.abstractmethod
+    def launch(self, context, id, body=None):
+        """Boots all the images of chain id at once.
+
+        Returns {'chain_launch': ...} at once, the progress of the launch
+        can be followed with get_chain_launch.
+        """
+        pass
+
+    @abc.abstractmethod
+    def topology(self, context, id, body=None):
+        """Returns {'topology': ...}, chain id with its chain images
+
+        Each chain image comes with its image, networks and configurations
+        (see NwservicePluginDb.get_chain_topology), so a chain is shown
+        with one request.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_chain_launches(self, context, filters=None, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def get_chain_launch(self, context, id, fields=None):
+        pass
+
     @abc.abstractmethod
     def get_launch(self, context, id, fields=None):
         pass
@@ -41,3 +41,9 @@ ERROR = "ERROR"
 
 # Driver notification methods
 LB_UPDATE = "LB_UPDATE"
+LB_DELETE = "LB_DELETE"
+
+# Config change log operations
+CONFIG_CREATE = "create"
+CONFIG_UPDATE = "update"
+CONFIG_DELETE = "delete"
@@ -169,6 +169,9 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     # bulk operations. Name mangling is used in order to ensure it
     # is qualified by class
     __native_bulk_support = True
+    # create_port does only the database work, the ports of a bulk request
+    # are inserted as one set of rows
+    __bulk_port_rows = True
 
     supported_extension_aliases = ["provider", "router"]
 
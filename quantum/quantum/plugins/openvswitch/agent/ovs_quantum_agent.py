@@ -30,6 +30,7 @@ from sqlalchemy.ext import sqlsoup
 from quantum.agent import rpc as agent_rpc
 from quantum.agent.linux import ip_lib
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.agent.linux import utils
 from quantum.common import constants as q_const
 from quantum.common import config as logging_config
@@ -136,7 +137,8 @@ class OVSQuantumAgent(object):
 
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
-                 polling_interval, reconnect_interval, rpc, enable_tunneling):
+                 polling_interval, reconnect_interval, rpc, enable_tunneling,
+                 ovsdb_monitor=False):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -148,6 +150,8 @@ class OVSQuantumAgent(object):
         :param reconnect_internal: retry interval (secs) on DB error.
         :param rpc: if True use RPC interface to interface with plugin.
         :param enable_tunneling: if True enable GRE networks.
+        :param ovsdb_monitor: if True watch the integration bridge ports
+               with ovsdb-client monitor instead of polling them.
         '''
         self.root_helper = root_helper
         self.available_local_vlans = set(
@@ -159,6 +163,8 @@ class OVSQuantumAgent(object):
 
         self.polling_interval = polling_interval
         self.reconnect_interval = reconnect_interval
+        self.ovsdb_monitor = ovsdb_monitor
+        self.port_monitor = None
 
         self.enable_tunneling = enable_tunneling
         self.local_ip = local_ip
@@ -651,7 +657,10 @@ class OVSQuantumAgent(object):
                 self.rollback_until_success(db)
 
     def update_ports(self, registered_ports):
-        ports = self.int_br.get_vif_port_set()
+        if self.port_monitor:
+            ports = self.port_monitor.get_vif_port_set()
+        else:
+            ports = self.int_br.get_vif_port_set()
         if ports == registered_ports:
             return
         added = ports - registered_ports
@@ -741,10 +750,20 @@ class OVSQuantumAgent(object):
             resync = True
         return resync
 
+    def wait_for_ports(self, timeout):
+        if self.port_monitor:
+            self.port_monitor.wait(timeout)
+        else:
+            time.sleep(timeout)
+
     def rpc_loop(self):
         sync = True
         ports = set()
         tunnel_sync = True
+        if self.ovsdb_monitor:
+            self.port_monitor = ovsdb_monitor.InterfaceMonitor(
+                self.int_br, self.reconnect_interval)
+            self.port_monitor.start()
 
         while True:
             try:
@@ -776,7 +795,7 @@ class OVSQuantumAgent(object):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                self.wait_for_ports(self.polling_interval - elapsed)
             else:
                 LOG.debug("Loop iteration exceeded interval (%s vs. %s)!",
                           self.polling_interval, elapsed)
@@ -804,6 +823,7 @@ def main():
     tun_br = cfg.CONF.OVS.tunnel_bridge
     local_ip = cfg.CONF.OVS.local_ip
     enable_tunneling = cfg.CONF.OVS.enable_tunneling
+    ovsdb_monitor = cfg.CONF.AGENT.ovsdb_monitor
 
     if enable_tunneling and not local_ip:
         LOG.error("Tunnelling cannot be enabled without a valid local_ip.")
@@ -819,7 +839,8 @@ def main():
 
     plugin = OVSQuantumAgent(integ_br, tun_br, local_ip, bridge_mappings,
                              root_helper, polling_interval,
-                             reconnect_interval, rpc, enable_tunneling)
+                             reconnect_interval, rpc, enable_tunneling,
+                             ovsdb_monitor)
 
     # Start everything.
     LOG.info("Agent initialized successfully, now running... ")
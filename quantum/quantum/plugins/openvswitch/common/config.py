@@ -51,6 +51,9 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2),
     cfg.StrOpt('root_helper', default='sudo'),
     cfg.BoolOpt('rpc', default=True),
+    cfg.BoolOpt('ovsdb_monitor', default=True,
+                help="Watch the integration bridge with ovsdb-client "
+                "monitor instead of polling it with ovs-vsctl"),
 ]
 
 
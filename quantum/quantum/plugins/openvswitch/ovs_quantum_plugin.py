@@ -31,6 +31,7 @@ from quantum.common import topics
 from quantum.db import db_base_plugin_v2
 from quantum.db import dhcp_rpc_base
 from quantum.db import l3_db
+from quantum.db import models_v2
 from quantum.extensions import providernet as provider
 from quantum.openstack.common import context
 from quantum.openstack.common import cfg
@@ -189,6 +190,11 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     # bulk operations. Name mangling is used in order to ensure it
     # is qualified by class
     __native_bulk_support = True
+    # create_port does only the database work, the ports of a bulk request
+    # are inserted as one set of rows
+    __bulk_port_rows = True
+    __native_pagination_support = True
+    __native_sorting_support = True
     supported_extension_aliases = ["provider", "router"]
 
     def __init__(self, configfile=None):
@@ -473,18 +479,22 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_network_dict_l3(context, net)
         return self._fields(net, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
-            nets = super(OVSQuantumPluginV2, self).get_networks(context,
-                                                                filters,
-                                                                None)
+            query = self._get_collection_query(context, models_v2.Network,
+                                               filters)
+            # filtered in the query, so that a page is not cut short
+            query = self._filter_nets_l3_query(context, query, filters)
+            nets = self._get_collection_from_query(
+                context, query, models_v2.Network, self._make_network_dict,
+                None, sorts, limit, marker, page_reverse)
             for net in nets:
                 self._extend_network_dict_provider(context, net)
                 self._extend_network_dict_l3(context, net)
 
             # TODO(rkukura): Filter on extended provider attributes.
-            nets = self._filter_nets_l3(context, nets, filters)
 
         return [self._fields(net, fields) for net in nets]
 
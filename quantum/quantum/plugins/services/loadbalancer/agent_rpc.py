@@ -17,30 +17,183 @@
 #
 # @author: Ilya Shakhat, Mirantis Inc.
 
+import eventlet
+
+from quantum import context as q_context
 from quantum.agent.services.driver_manager import ServiceDriverManager
 from quantum.common import topics
+from quantum.openstack.common import cfg
 from quantum.openstack.common import log as logging
 from quantum.openstack.common.rpc import proxy as rpc_proxy
 from quantum.plugins.common import constants
 from quantum.plugins.services.loadbalancer.api import loadbalancer_agent_api
 from quantum.plugins.services.loadbalancer.api import loadbalancer_plugin_api
+from quantum.plugins.services.loadbalancer import work_queue
 
 LOG = logging.getLogger(__name__)
 
+LBAGENT_OPTS = [
+    cfg.IntOpt('device_workers', default=16,
+               help=_("Number of devices configured in parallel")),
+    cfg.IntOpt('queue_report_interval', default=0,
+               help=_("Seconds between logs of the queue depths and "
+                      "latencies, 0 to disable")),
+    cfg.IntOpt('device_load_report_interval', default=30,
+               help=_("Seconds between reports of the connections and CPU "
+                      "load of the devices to the plugin, which weighs "
+                      "them in scheduling, 0 to disable")),
+]
+
+cfg.CONF.register_opts(LBAGENT_OPTS, 'LBAGENT')
+
+
+def _merge(older, newer):
+    """Merges two requests on an object of a device, None if both run.
+
+    An update supersedes an update still queued and is applied to the
+    create it follows, a delete supersedes an update and cancels a create.
+    Pools are not created or deleted this way since devices are created
+    and deleted with them. Only one of repeated stats or load reports
+    runs.
+    """
+    older_kind = older.action.split('_')[0]
+    newer_kind = newer.action.split('_')[0]
+    model, obj_id = newer.key
+    if model in ('pool_stats', 'device_load'):
+        return older
+    if model not in ('vip', 'pool', 'member'):
+        return None
+    if older_kind == 'update' and newer_kind == 'update':
+        context, device, new_obj, old_obj = newer.args
+        return work_queue.Operation(newer.action, newer.key, newer.func,
+                                    context, device, new_obj, older.args[3])
+    if older_kind == 'update' and newer_kind == 'delete':
+        return newer
+    if model == 'pool' or older_kind != 'create':
+        return None
+    if newer_kind == 'update':
+        context, device, new_obj, old_obj = newer.args
+        return work_queue.Operation(older.action, older.key, older.func,
+                                    context, device, new_obj)
+    if newer_kind == 'delete':
+        return work_queue.Operation(newer.action, newer.key,
+                                    _confirm_deleted,
+                                    newer.args[0], model, obj_id)
+
+
+def _confirm_deleted(context, model, obj_id):
+    # deleted before it was created on the device
+    plugin_caller.confirm(context, model, obj_id,
+                          loadbalancer_plugin_api.STATUS_OK,
+                          loadbalancer_plugin_api.STATUS_OK)
+
 
 class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
+    """Runs the requests of the plugin on the device drivers.
+
+    Requests are queued per device and the queues of different devices
+    are drained in parallel (see work_queue.DeviceWorkQueues). A request
+    still queued is merged with a later one on the same object when only
+    the latter matters, see _merge.
+
+    Every device_load_report_interval seconds the load of the devices
+    configured through this agent since it started is queued on them
+    too and reported to the plugin.
+    """
+
+    _work_queues = None
+    _load_reporter = None
+    # device id -> device, of the devices to report the load of
+    _devices = {}
+
+    def _put(self, device, action, model, obj_id, *args):
+        if LoadbalancerAgentCallbacks._work_queues is None:
+            LoadbalancerAgentCallbacks._work_queues = (
+                work_queue.DeviceWorkQueues(
+                    cfg.CONF.LBAGENT.device_workers, _merge,
+                    cfg.CONF.LBAGENT.queue_report_interval))
+        self._track(device)
+        self._work_queues.put(device['id'], work_queue.Operation(
+            action, (model, obj_id), getattr(self, '_' + action), *args))
+
+    def _track(self, device):
+        if device['status'] == constants.PENDING_DELETE:
+            self._devices.pop(device['id'], None)
+        else:
+            self._devices[device['id']] = device
+        interval = cfg.CONF.LBAGENT.device_load_report_interval
+        if interval and LoadbalancerAgentCallbacks._load_reporter is None:
+            LoadbalancerAgentCallbacks._load_reporter = eventlet.spawn(
+                self._report_loads, interval)
+
+    def _report_loads(self, interval):
+        context = q_context.get_admin_context()
+        while True:
+            eventlet.sleep(interval)
+            for device in self._devices.values():
+                self._put(device, 'report_device_load', 'device_load',
+                          device['id'], context, device)
+
     def create_vip(self, context, device, vip):
+        self._put(device, 'create_vip', 'vip', vip['id'], context, device, vip)
+
+    def update_vip(self, context, device, new_vip, old_vip):
+        self._put(device, 'update_vip', 'vip', new_vip['id'], context, device,
+                  new_vip, old_vip)
+
+    def delete_vip(self, context, device, vip):
+        self._put(device, 'delete_vip', 'vip', vip['id'], context, device, vip)
+
+    def create_pool(self, context, device, pool):
+        self._put(device, 'create_pool', 'pool', pool['id'], context, device,
+                  pool)
+
+    def update_pool(self, context, device, new_pool, old_pool):
+        self._put(device, 'update_pool', 'pool', new_pool['id'], context,
+                  device, new_pool, old_pool)
+
+    def delete_pool(self, context, device, pool):
+        self._put(device, 'delete_pool', 'pool', pool['id'], context, device,
+                  pool)
+
+    def create_member(self, context, device, member):
+        self._put(device, 'create_member', 'member', member['id'], context,
+                  device, member)
+
+    def update_member(self, context, device, new_member, old_member):
+        self._put(device, 'update_member', 'member', new_member['id'],
+                  context, device, new_member, old_member)
+
+    def delete_member(self, context, device, member):
+        self._put(device, 'delete_member', 'member', member['id'], context,
+                  device, member)
+
+    def create_health_monitor(self, context, device, health_monitor, pool_id):
+        self._put(device, 'create_health_monitor', 'health_monitor',
+                  health_monitor['id'], context, device, health_monitor,
+                  pool_id)
+
+    def delete_health_monitor(self, context, device, health_monitor, pool_id):
+        self._put(device, 'delete_health_monitor', 'health_monitor',
+                  health_monitor['id'], context, device, health_monitor,
+                  pool_id)
+
+    def get_pool_stats(self, context, device, pool_id):
+        self._put(device, 'get_pool_stats', 'pool_stats', pool_id, context,
+                  device, pool_id)
+
+    def _create_vip(self, context, device, vip):
         LOG.debug(_('Got request to create vip %(v)s on device %(d)s'),
                   {'d': device['id'], 'v': vip['id']})
         proxy.create_vip(device, vip).confirm(context, 'vip', vip['id'])
 
-    def update_vip(self, context, device, new_vip, old_vip):
+    def _update_vip(self, context, device, new_vip, old_vip):
         LOG.debug(_('Got request to update vip %(v)s on device %(d)s'),
                   {'d': device['id'], 'v': new_vip['id']})
         proxy.update_vip(device, new_vip, old_vip).confirm(context, 'vip',
                                                            new_vip['id'])
 
-    def delete_vip(self, context, device, vip):
+    def _delete_vip(self, context, device, vip):
         LOG.debug(_('Got request to delete vip %(v)s on device %(d)s'),
                   {'d': device['id'], 'v': vip['id']})
         proxy.delete_vip(device, vip).confirm(context, 'vip', vip['id'])
@@ -56,9 +209,10 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
             device['management'] = res.data
         else:
             LOG.warn(_('Device %s is not created'), device['id'])
+            self._devices.pop(device['id'], None)
         return res
 
-    def create_pool(self, context, device, pool):
+    def _create_pool(self, context, device, pool):
         LOG.debug(_('Got request to create pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'p': pool['id']})
         ok = True
@@ -79,6 +233,7 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
                            ' The device will be deleted.'),
                          {'p': pool['id'], 'd': device['id']})
                 device['status'] = constants.PENDING_DELETE
+                self._devices.pop(device['id'], None)
                 res_dev = proxy.delete_device(device)
         else:
             LOG.debug(_('Failed to create device %s. Pool will not be '
@@ -91,7 +246,7 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
                                          res_dev.message)
         plugin_caller.confirm(context, 'pool', pool['id'], status, msg)
 
-    def update_pool(self, context, device, new_pool, old_pool):
+    def _update_pool(self, context, device, new_pool, old_pool):
         LOG.debug(_('Got request to update pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'p': new_pool['id']})
         proxy.update_pool(device, new_pool, old_pool).confirm(context, 'pool',
@@ -104,7 +259,7 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
         LOG.debug(_('Device %s is deleted'), device['id'])
         plugin_caller.confirm_device(context, device, res.status, res.message)
 
-    def delete_pool(self, context, device, pool):
+    def _delete_pool(self, context, device, pool):
         LOG.debug(_('Got request to delete pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'p': pool['id']})
         res = proxy.delete_pool(device, pool)
@@ -113,25 +268,25 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
         if device['status'] == constants.PENDING_DELETE:
             self._delete_device(context, device)
 
-    def create_member(self, context, device, member):
+    def _create_member(self, context, device, member):
         LOG.debug(_('Got request to create member %(m)s on device %(d)s'),
                   {'d': device['id'], 'm': member['id']})
         proxy.create_member(device, member).confirm(context, 'member',
                                                     member['id'])
 
-    def update_member(self, context, device, new_member, old_member):
+    def _update_member(self, context, device, new_member, old_member):
         LOG.debug(_('Got request to update member %(m)s on device %(d)s'),
                   {'d': device['id'], 'm': new_member['id']})
         proxy.update_member(device, new_member, old_member).confirm(
             context, 'member', new_member['id'])
 
-    def delete_member(self, context, device, member):
+    def _delete_member(self, context, device, member):
         LOG.debug(_('Got request to delete member %(m)s on device %(d)s'),
                   {'d': device['id'], 'm': member['id']})
         proxy.delete_member(device, member).confirm(
             context, 'member', member['id'])
 
-    def create_health_monitor(self, context, device, health_monitor, pool_id):
+    def _create_health_monitor(self, context, device, health_monitor, pool_id):
         LOG.debug(_('Got request to create health monitor %(hm)s for '
                     'pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'hm': health_monitor['id'],
@@ -139,7 +294,7 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
         proxy.create_health_monitor(device, health_monitor, pool_id).confirm(
             context, 'pool', pool_id)
 
-    def delete_health_monitor(self, context, device, health_monitor, pool_id):
+    def _delete_health_monitor(self, context, device, health_monitor, pool_id):
         LOG.debug(_('Got request to delete health monitor %(hm)s '
                     'for pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'hm': health_monitor['id'],
@@ -147,13 +302,24 @@ class LoadbalancerAgentCallbacks(loadbalancer_agent_api.LoadbalancerAgentAPI):
         proxy.delete_health_monitor(device, health_monitor, pool_id).confirm(
             context, 'pool', pool_id)
 
-    def get_pool_stats(self, context, device, pool_id):
+    def _get_pool_stats(self, context, device, pool_id):
         LOG.debug(_('Got request to get stats for pool %(p)s on device %(d)s'),
                   {'d': device['id'], 'p': pool_id})
         result = proxy.get_pool_stats(device, pool_id)
         plugin_caller.store_pool_stats(context, pool_id, result.data,
                                        result.status, result.message)
 
+    def _report_device_load(self, context, device):
+        result = proxy.get_device_load(device)
+        if result.status != loadbalancer_plugin_api.STATUS_OK:
+            LOG.debug(_('Load of device %(d)s is not reported: %(msg)s'),
+                      {'d': device['id'], 'msg': result.message})
+            return
+        plugin_caller.report_device_load(context, device['id'],
+                                         result.data['host'],
+                                         result.data['connections'],
+                                         result.data['cpu_load'])
+
 
 class Dispatcher(object):
     def __init__(self, data, device, status, message):
@@ -230,5 +396,13 @@ class LoadbalancerPluginCaller(rpc_proxy.RpcProxy,
         self.cast(context, rpc_msg, topic=self.topic)
         LOG.debug(_('Pool statistics for object %s is sent'), obj_id)
 
+    def report_device_load(self, context, device_id, host, connections,
+                           cpu_load):
+        rpc_msg = self.make_msg('report_device_load', device_id=device_id,
+                                host=host, connections=connections,
+                                cpu_load=cpu_load)
+        self.cast(context, rpc_msg, topic=self.topic)
+        LOG.debug(_('Load of device %s is sent'), device_id)
+
 
 plugin_caller = LoadbalancerPluginCaller(topics.LOADBALANCER_PLUGIN)
@@ -37,3 +37,8 @@ class LoadbalancerPluginAPI(object):
     @abc.abstractmethod
     def store_pool_stats(self, context, obj_id, data, status, message):
         pass
+
+    @abc.abstractmethod
+    def report_device_load(self, context, device_id, host, connections,
+                           cpu_load):
+        pass
@@ -18,8 +18,10 @@
 # @author: Oleg Bondarev (obondarev@mirantis.com)
 #
 
+import copy
+import hashlib
 import re
-import tempfile
+import threading
 
 from quantum.plugins.services.loadbalancer.drivers import constants
 from quantum.plugins.services.loadbalancer.drivers import exceptions
@@ -47,6 +49,36 @@ def validate_backend(method):
     return wrapper
 
 
+def _checksum(lines):
+    return hashlib.md5(''.join(line + '\n' for line in lines)).hexdigest()
+
+
+class DeviceConfig(object):
+    """Parsed configuration of a device kept between ConfigManagers"""
+
+    def __init__(self):
+        # parsed config as last fetched or deployed, and the checksum
+        # of the file on the device it corresponds to
+        self.config = None
+        self.checksum = None
+        # config being changed by the ConfigManagers entered on the device
+        self.pending = None
+        self.depth = 0
+        self.failed = False
+        # reentrant, so the ConfigManagers of a batch nest
+        self.lock = threading.RLock()
+
+
+_device_configs = {}
+
+
+def get_device_config(device_mgmt_info):
+    key = (device_mgmt_info['address'], device_mgmt_info.get('namespace'))
+    if key not in _device_configs:
+        _device_configs[key] = DeviceConfig()
+    return _device_configs[key]
+
+
 class ConfigManager(object):
     """HAProxy configuration manager
 
@@ -55,6 +87,13 @@ class ConfigManager(object):
     deploy config on the device.
 
     It operates with HAProxy config objects defined in ./config_models.py
+
+    The parsed config is cached per device along with the checksum of
+    the file it came from, it is only fetched again when the md5sum of
+    the file on the device differs. ConfigManagers entered while another
+    one is open on the same device (see HAProxyDriver.batch) share its
+    config and the config is deployed once, when the outermost one exits
+    without error.
     """
 
     remote_config_path = '/etc/haproxy/haproxy.cfg'
@@ -63,45 +102,85 @@ class ConfigManager(object):
         self.config = {}
         self.remote_control = remote_control.RemoteControl(
             device['management'])
-        self.local_config_path = tempfile.mktemp()
+        self.device_config = get_device_config(device['management'])
 
     def __enter__(self):
-        self._parse(self._fetch_config())
+        device_config = self.device_config
+        device_config.lock.acquire()
+        try:
+            if device_config.depth == 0:
+                self._load()
+                device_config.pending = self.config
+                device_config.failed = False
+            else:
+                self.config = device_config.pending
+        except Exception:
+            device_config.lock.release()
+            raise
+        device_config.depth += 1
         return self
 
     def __exit__(self, type, value, traceback):
-        if type is None:
-            self._deploy_config(self._get_raw_config())
+        device_config = self.device_config
+        try:
+            device_config.depth -= 1
+            if type is not None:
+                device_config.failed = True
+            if device_config.depth == 0:
+                device_config.pending = None
+                if not device_config.failed:
+                    self._deploy_config(self._get_raw_config())
+        finally:
+            device_config.lock.release()
+
+    def _load(self):
+        device_config = self.device_config
+        if device_config.checksum is not None:
+            checksum = self.remote_control.get_checksum(
+                self.remote_config_path)
+            if checksum == device_config.checksum:
+                LOG.debug(_('Using cached configuration of %s'),
+                          self.remote_control.address)
+                self.config = copy.deepcopy(device_config.config)
+                return
+        raw_config = self._fetch_config()
+        self._parse(raw_config)
+        device_config.config = copy.deepcopy(self.config)
+        device_config.checksum = _checksum(raw_config)
 
     def _fetch_config(self):
         LOG.debug(_('Fetching configuration from %s'),
                   self.remote_config_path)
 
-        if not self.remote_control.get_file(self.remote_config_path,
-                                            self.local_config_path):
+        raw_config = self.remote_control.read_file(self.remote_config_path)
+        if raw_config is None:
             msg = _('Could not fetch configuration from the device')
             LOG.error(msg)
             raise exceptions.ConfigError(msg=msg)
 
-        with open(self.local_config_path, 'r') as f:
-            return [line.rstrip() for line in f]
+        return [line.rstrip() for line in raw_config.splitlines()]
 
     def _deploy_config(self, raw_config):
-        LOG.debug(_('writing configuration to %s'), self.local_config_path)
-        with open(self.local_config_path, 'w') as f:
-            f.writelines([line + '\n' for line in raw_config])
+        checksum = _checksum(raw_config)
+        if checksum == self.device_config.checksum:
+            LOG.debug(_('Configuration of %s is unchanged'),
+                      self.remote_control.address)
+            return
 
         LOG.debug(_('Deploying configuration'))
         tmp_path = '/tmp/haproxy.cfg.remote'
-        if not self.remote_control.put_file(self.local_config_path, tmp_path):
+        steps = self.remote_control.deploy_config(
+            ''.join(line + '\n' for line in raw_config), tmp_path,
+            self.remote_config_path)
+        if remote_control.DEPLOY_UPLOADED not in steps:
             msg = _('Could not put configuration on the device')
             LOG.error(msg)
             raise exceptions.ConfigError(msg=msg)
 
-        if self.remote_control.validate_config(tmp_path):
-            self.remote_control.perform('sudo mv %s %s' %
-                                        (tmp_path, self.remote_config_path))
-            if not self.remote_control.restart_haproxy():
+        if remote_control.DEPLOY_VALID in steps:
+            self.device_config.config = copy.deepcopy(self.config)
+            self.device_config.checksum = checksum
+            if remote_control.DEPLOY_RELOADED not in steps:
                 msg = _('Failed to restart HAProxy')
                 LOG.error(msg)
         else:
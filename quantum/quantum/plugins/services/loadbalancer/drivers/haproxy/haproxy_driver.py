@@ -29,6 +29,8 @@ from quantum.plugins.services.loadbalancer.drivers.haproxy import (
 from quantum.plugins.services.loadbalancer.drivers.haproxy import constants
 from quantum.plugins.services.loadbalancer.drivers.haproxy import (
     remote_control)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    stats_cache)
 from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -43,6 +45,19 @@ HAPROXY_OPTS = [
     cfg.StrOpt("haproxy_key_path",
                default="/root/.ssh/haproxy-keypair.pem",
                help=_("Path to the private key for ssh to a haproxy VM")),
+    cfg.IntOpt("haproxy_ssh_persist", default=300,
+               help=_("Seconds an idle ssh master connection to a haproxy "
+                      "VM is kept open, 0 to open a connection per "
+                      "command")),
+    cfg.StrOpt("haproxy_ssh_control_dir", default="$state_path/haproxy-ssh",
+               help=_("Directory of the control sockets of the ssh master "
+                      "connections")),
+    cfg.IntOpt("haproxy_stats_ttl", default=10,
+               help=_("Seconds the stats fetched from a haproxy VM are "
+                      "served for")),
+    cfg.IntOpt("haproxy_stats_refresh_interval", default=0,
+               help=_("Seconds between background refreshes of the stats "
+                      "of a haproxy VM, 0 to fetch them on demand only")),
 ]
 
 cfg.CONF.register_opts(HAPROXY_OPTS, 'HAPROXY')
@@ -81,6 +96,11 @@ class HAProxyDriver(base_driver.BaseLoadbalancerDriver):
     driver_type = 'HAPROXY'
     driver_version = 'v1.0'
 
+    def __init__(self):
+        self.stats = stats_cache.StatsCache(
+            cfg.CONF.HAPROXY.haproxy_stats_ttl,
+            cfg.CONF.HAPROXY.haproxy_stats_refresh_interval)
+
     def get_type(self):
         return self.driver_type
 
@@ -96,9 +116,21 @@ class HAProxyDriver(base_driver.BaseLoadbalancerDriver):
                                   device['tenant_id'])
 
     def delete_device(self, device):
+        if 'management' in device:
+            self.stats.forget(device['management'])
+            remote_control.RemoteControl(device['management']).close()
         return vm_utils.shutdown_vm(device['tenant_id'],
                                     device['management']['instance_id'])
 
+    @validate_device
+    def batch(self, device):
+        """Returns a context manager applying the driver calls made in it
+        to device at once: the HAProxy config is deployed and reloaded
+        when the block exits, not after each call. If one of the calls
+        fails nothing is deployed.
+        """
+        return config_manager.ConfigManager(device)
+
     @validate_device
     def create_vip(self, device, vip):
         LOG.debug(_('Create VIP: device=%(device)s, vip=%(vip)s'),
@@ -236,55 +268,64 @@ class HAProxyDriver(base_driver.BaseLoadbalancerDriver):
             config.delete_probe(backend)
         LOG.debug(_('Delete health monitor succeed'))
 
-    @validate_device
-    def get_pool_stats(self, device, pool_id):
-        LOG.debug(_('Get pool stats: device=%(device)s, pool=%(pool)s'),
-                  {'device': device, 'pool': pool_id})
-        remote_ctrl = remote_control.RemoteControl(device['management'])
-        status, raw_stats, errors = remote_ctrl.get_backend_stats(pool_id)
-        if status != 0:
-            msg = _('Error while getting stats for pool %(pool_id)s: '
-                    '%(errors)s') % {'pool_id': pool_id, 'errors': errors}
+    def _get_stats(self, device, key, msg):
+        stats = self.stats.get(device['management'])
+        if stats is None:
+            msg = _('Error while getting stats of device %s') % (
+                device['management']['address'],)
             LOG.error(msg)
             raise HAProxyError(msg=msg)
-        if len(raw_stats.splitlines()) < 2 or not raw_stats.splitlines()[1]:
-            msg = _('No stats found for pool %s') % (pool_id,)
+        if key not in stats:
             LOG.error(msg)
             raise HAProxyError(msg=msg)
+        return self._map_stats(stats[key])
 
+    @validate_device
+    def get_pool_stats(self, device, pool_id):
+        LOG.debug(_('Get pool stats: device=%(device)s, pool=%(pool)s'),
+                  {'device': device, 'pool': pool_id})
+        result = self._get_stats(device, (pool_id, stats_cache.BACKEND),
+                                 _('No stats found for pool %s') % (pool_id,))
         LOG.debug(_('Get pool stats succeed'))
-        return self._parse_stats(raw_stats)
+        return result
 
     @validate_device
     def get_member_stats(self, device, pool_id, member_id):
         LOG.debug(_('Get member stats: device=%(device)s, pool=%(pool)s, '
                     'member=%(member)s'),
                   {'device': device, 'pool': pool_id, 'member': member_id})
-        remote_ctrl = remote_control.RemoteControl(device['management'])
-        status, raw_stats, errors = remote_ctrl.get_server_stats(
-            pool_id, member_id)
-        if status != 0:
-            msg = _('Error while getting stats for member %(member_id)s: '
-                    '%(errors)s') % {'member_id': member_id,
-                                     'errors': errors}
-            LOG.error(msg)
-            raise HAProxyError(msg=msg)
-        if len(raw_stats.splitlines()) < 2 or not raw_stats.splitlines()[1]:
-            msg = _('No stats found for member %s') % (member_id,)
+        result = self._get_stats(device, (pool_id, member_id),
+                                 _('No stats found for member %s') %
+                                 (member_id,))
+        LOG.debug(_('Get member stats succeed'))
+        return result
+
+    @validate_device
+    def get_device_load(self, device):
+        """Returns the load of device weighed by the scheduler
+
+        connections are the current sessions of all the frontends,
+        cpu_load the percentage of the time HAProxy was busy and host
+        the compute host of the VM if its management info tells it.
+        """
+        stats = self.stats.get(device['management'])
+        info = remote_control.RemoteControl(device['management']).get_info()
+        if stats is None or info is None:
+            msg = _('Error while getting the load of device %s') % (
+                device['management']['address'],)
             LOG.error(msg)
             raise HAProxyError(msg=msg)
-
-        LOG.debug(_('Get member stats succeed'))
-        return self._parse_stats(raw_stats)
-
-    def _parse_stats(self, raw_stats):
-        stat_lines = raw_stats.splitlines()
-        if len(stat_lines) < 2:
-            return {}
-        stat_names = [line.strip('# ') for line in stat_lines[0].split(',')]
-        stat_values = [line.strip() for line in stat_lines[1].split(',')]
-        stats = dict(zip(stat_names, stat_values))
-        stats['check_status'] = self._map_health(stats['check_status'])
+        connections = sum(int(proxy_stats.get('scur') or 0)
+                          for (pxname, svname), proxy_stats in stats.items()
+                          if svname == stats_cache.FRONTEND)
+        cpu_load = 100 - int(info.get('Idle_pct') or 100)
+        return {'host': device['management'].get('host'),
+                'connections': connections,
+                'cpu_load': cpu_load}
+
+    def _map_stats(self, stats):
+        stats = dict(stats)
+        stats['check_status'] = self._map_health(stats.get('check_status'))
         result_stats = {}
         for stat in constants.STATS_MAPPING:
             result_stats[stat] = stats.get(constants.STATS_MAPPING[stat], '')
@@ -18,6 +18,8 @@
 # @author: Oleg Bondarev (obondarev@mirantis.com)
 #
 
+import hashlib
+import os
 import shlex
 
 from quantum.openstack.common import cfg
@@ -29,12 +31,25 @@ from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+RELOAD_COMMAND = ('haproxy -f /etc/haproxy/haproxy.cfg -p /var/run/haproxy.pid'
+                  ' -sf $(cat /var/run/haproxy.pid)')
+
+# steps of deploy_config, echoed by the device as they succeed
+DEPLOY_UPLOADED = 'uploaded'
+DEPLOY_VALID = 'valid'
+DEPLOY_RELOADED = 'reloaded'
+
 
 class RemoteControl(object):
     """HAProxy remote control class
 
     This class is capable of managing HAProxy service
     on a haproxy VM and retrieving its config and stats.
+
+    Unless haproxy_ssh_persist is 0, ssh and scp share one master
+    connection per device (OpenSSH ControlMaster), so a command costs a
+    round trip on an open session instead of a TCP connect and a key
+    exchange. The master exits after haproxy_ssh_persist idle seconds.
     """
 
     def __init__(self, device_mgmt_info):
@@ -45,9 +60,62 @@ class RemoteControl(object):
         self.ssh_options = ('-i %s -o StrictHostKeyChecking=no '
                             '-o UserKnownHostsFile=/dev/null'
                             % cfg.CONF.HAPROXY.haproxy_key_path)
+        self.control_path = None
+        self._master_checked = False
+        if cfg.CONF.HAPROXY.haproxy_ssh_persist:
+            # the same address may be reached in several namespaces,
+            # hashed since unix socket paths are limited to 108 chars
+            name = hashlib.md5('%s/%s' % (self.namespace,
+                                          self.address)).hexdigest()
+            self.control_path = os.path.join(
+                cfg.CONF.HAPROXY.haproxy_ssh_control_dir, name)
+            self.ssh_options += (' -o ControlMaster=auto -o ControlPath=%s'
+                                 ' -o ControlPersist=%d'
+                                 ' -o ServerAliveInterval=10'
+                                 ' -o ServerAliveCountMax=3'
+                                 % (self.control_path,
+                                    cfg.CONF.HAPROXY.haproxy_ssh_persist))
+
+    def _check_master(self):
+        """Drops the master connection of the device if it is unhealthy
+
+        Checked once per RemoteControl, the next ssh or scp opens a new
+        master connection.
+        """
+        if not self.control_path or self._master_checked:
+            return
+        self._master_checked = True
+        control_dir = os.path.dirname(self.control_path)
+        if not os.path.isdir(control_dir):
+            os.makedirs(control_dir, 0700)
+            return
+        if not os.path.exists(self.control_path):
+            return
+        if not self._control('check'):
+            LOG.warn(_('SSH master connection to %s is unhealthy, '
+                       'reconnecting'), self.address)
+            self._control('exit')
+
+    def _control(self, command):
+        return self.perform('ssh %(ssh_options)s -O %(cmd)s root@%(address)s'
+                            % {'ssh_options': self.ssh_options,
+                               'cmd': command,
+                               'address': self.address},
+                            use_ssh=False)
+
+    def close(self):
+        """Closes the master connection to the device"""
+        if self.control_path and os.path.exists(self.control_path):
+            self._control('exit')
 
     def perform(self, command, use_ssh=True, use_namespace=True):
+        return self.execute(command, use_ssh, use_namespace) is not None
+
+    def execute(self, command, use_ssh=True, use_namespace=True,
+                process_input=None, check_exit_code=True):
+        """Same as perform but returns the output, None on error"""
         if use_ssh:
+            self._check_master()
             command = ('ssh %(ssh_options)s root@%(address)s "%(cmd)s"'
                        % {'ssh_options': self.ssh_options,
                           'address': self.address,
@@ -61,16 +129,19 @@ class RemoteControl(object):
         try:
             stdout, stderr = utils.execute(shlex.split(command),
                                            root_helper=root_helper,
+                                           process_input=process_input,
+                                           check_exit_code=check_exit_code,
                                            return_stderr=True)
         except RuntimeError as e:
             LOG.error(_('Error while performing command: %s'), e)
-            return False
+            return None
 
-        return True
+        return stdout
 
     def get_file(self, remote_path, local_path):
         LOG.debug(_('Copying remote file %(remote)s to local %(local)s'),
                   {'remote': remote_path, 'local': local_path})
+        self._check_master()
         cmd = ('scp %(ssh_options)s root@%(address)s:%(remote)s %(local)s'
                % {'ssh_options': self.ssh_options,
                   'address': self.address,
@@ -85,6 +156,7 @@ class RemoteControl(object):
     def put_file(self, local_path, remote_path):
         LOG.debug(_('Copying local file %(local)s to remote %(remote)s'),
                   {'remote': remote_path, 'local': local_path})
+        self._check_master()
         cmd = ('scp %(ssh_options)s %(local)s root@%(address)s:%(remote)s'
                % {'ssh_options': self.ssh_options,
                   'address': self.address,
@@ -92,6 +164,34 @@ class RemoteControl(object):
                   'local': local_path})
         return self.perform(cmd, use_ssh=False)
 
+    def read_file(self, remote_path):
+        """Returns the contents of a remote file, None on error"""
+        return self.execute('cat %s' % remote_path)
+
+    def deploy_config(self, raw_config, tmp_path, remote_path):
+        """Uploads, validates, installs and reloads a config at once
+
+        The config is written to tmp_path through the stdin of a single
+        ssh command, which moves it to remote_path and reloads HAProxy
+        if it is valid. Returns the DEPLOY_* steps that succeeded.
+        """
+        command = ' && '.join([
+            'cat > %s' % tmp_path,
+            'echo %s' % DEPLOY_UPLOADED,
+            'haproxy -c -q -f %s' % tmp_path,
+            'echo %s' % DEPLOY_VALID,
+            'sudo mv %s %s' % (tmp_path, remote_path),
+            RELOAD_COMMAND,
+            'echo %s' % DEPLOY_RELOADED])
+        output = self.execute(command, process_input=raw_config,
+                              check_exit_code=False)
+        return (output or '').split()
+
+    def get_checksum(self, remote_path):
+        output = self.execute('md5sum %s' % remote_path)
+        if output:
+            return output.split()[0]
+
     def validate_config(self, remote_path):
         command = 'haproxy -c -f {0}'.format(remote_path)
         if self.perform(command):
@@ -112,28 +212,35 @@ class RemoteControl(object):
 
     def restart_haproxy(self):
         LOG.debug(_('Restarting haproxy'))
-        return self.perform('haproxy'
-                            ' -f /etc/haproxy/haproxy.cfg'
-                            ' -p /var/run/haproxy.pid'
-                            ' -sf $(cat /var/run/haproxy.pid)')
+        return self.perform(RELOAD_COMMAND)
 
     def _perform_unix_socket_command(self, command):
-        return self.perform(
-            'echo "%s" | socat stdio unix-connect:%s'
+        return self.execute(
+            "echo '%s' | socat stdio unix-connect:%s"
             % (command, STATS_SOCKET_PATH))
 
     def disable_server(self, backend, server):
-        return self._perform_unix_socket_command('disable server %s/%s'
-                                                 % (backend, server))
+        return self._perform_unix_socket_command(
+            'disable server %s/%s' % (backend, server)) is not None
 
     def enable_server(self, backend, server):
-        return self._perform_unix_socket_command('enable server %s/%s'
-                                                 % (backend, server))
-
-    def get_backend_stats(self, backend_id):
-        cmd = 'show stat %s 2 -1' % backend_id
-        return self._perform_unix_socket_command(cmd)
-
-    def get_server_stats(self, backend_id, server_id):
-        cmd = 'show stat %s 4 %s' % (backend_id, server_id)
-        return self._perform_unix_socket_command(cmd)
+        return self._perform_unix_socket_command(
+            'enable server %s/%s' % (backend, server)) is not None
+
+    def get_stats(self):
+        """Returns the stats CSV of all proxies and servers, None on error"""
+        return self._perform_unix_socket_command('show stat -1 -1 -1')
+
+    def get_info(self):
+        """Returns the 'show info' of the HAProxy process as a dict,
+        None on error
+        """
+        output = self._perform_unix_socket_command('show info')
+        if output is None:
+            return None
+        info = {}
+        for line in output.splitlines():
+            name, sep, value = line.partition(':')
+            if sep:
+                info[name.strip()] = value.strip()
+        return info
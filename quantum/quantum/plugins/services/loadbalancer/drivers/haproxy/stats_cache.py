@@ -0,0 +1,115 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+import eventlet
+
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    remote_control)
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# svname of the rows of a proxy itself
+FRONTEND = 'FRONTEND'
+BACKEND = 'BACKEND'
+
+
+def parse_stats(raw_stats):
+    """Parses the CSV of 'show stat' into {(pxname, svname): stats}"""
+    lines = raw_stats.splitlines()
+    if not lines:
+        return {}
+    names = [name.strip('# ') for name in lines[0].split(',')]
+    result = {}
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+        stats = dict(zip(names, [value.strip() for value in line.split(',')]))
+        result[(stats.get('pxname'), stats.get('svname'))] = stats
+    return result
+
+
+class _DeviceStats(object):
+    def __init__(self):
+        self.stats = None
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+        self.refresher = None
+
+
+class StatsCache(object):
+    """Stats of all the proxies and servers of the HAProxy devices
+
+    A device is asked for all its stats at once ('show stat -1 -1 -1')
+    and the result is kept for ttl seconds, so the stats of the pools
+    and members of a device cost one ssh command per ttl. With a refresh
+    interval the stats of the devices asked for are refetched in the
+    background every interval seconds until they are forgotten.
+    """
+
+    def __init__(self, ttl=10, refresh_interval=0):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        # (address, namespace) -> _DeviceStats
+        self._devices = {}
+
+    def _key(self, device_mgmt_info):
+        return (device_mgmt_info['address'],
+                device_mgmt_info.get('namespace'))
+
+    def get(self, device_mgmt_info):
+        """Returns {(pxname, svname): stats} of the device, None on error"""
+        key = self._key(device_mgmt_info)
+        if key not in self._devices:
+            self._devices[key] = _DeviceStats()
+        device_stats = self._devices[key]
+        if self.refresh_interval and device_stats.refresher is None:
+            device_stats.refresher = eventlet.spawn(
+                self._refresh, device_mgmt_info, device_stats)
+        # concurrent callers wait for the stats fetched by the first one
+        with device_stats.lock:
+            if (device_stats.stats is None or
+                    time.time() - device_stats.fetched_at >= self.ttl):
+                self._fetch(device_mgmt_info, device_stats)
+            return device_stats.stats
+
+    def _fetch(self, device_mgmt_info, device_stats):
+        raw_stats = remote_control.RemoteControl(
+            device_mgmt_info).get_stats()
+        if raw_stats is None:
+            device_stats.stats = None
+            return
+        device_stats.stats = parse_stats(raw_stats)
+        device_stats.fetched_at = time.time()
+
+    def _refresh(self, device_mgmt_info, device_stats):
+        while True:
+            eventlet.sleep(self.refresh_interval)
+            try:
+                with device_stats.lock:
+                    self._fetch(device_mgmt_info, device_stats)
+            except Exception:
+                LOG.exception(_('Failed to refresh the stats of %s'),
+                              device_mgmt_info['address'])
+
+    def forget(self, device_mgmt_info):
+        device_stats = self._devices.pop(self._key(device_mgmt_info), None)
+        if device_stats is not None and device_stats.refresher is not None:
+            device_stats.refresher.kill()
@@ -18,6 +18,9 @@
 # @author: B39208 (b39208@freescale.com)
 #
 
+import eventlet
+
+from quantum import context as q_context
 from quantum.openstack.common import cfg
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
@@ -26,6 +29,49 @@ from quantum.db.loadbalancer import loadbalancer_db
 from quantum.plugins.common import constants
 LOG = logging.getLogger(__name__)
 
+
+class NotificationAggregator(object):
+    """
+    Collects the config change notifications of each config handle for
+    window seconds and sends one, so a burst of changes to the VIPs of a
+    handle makes the service VM sync and restart HAProxy once. The
+    version is read when the notification is sent, so it is the latest.
+    """
+    def __init__(self, send, window):
+        # send(context, config_handle_id)
+        self.send = send
+        self.window = window
+        # config handle id -> timer of its pending notification
+        self.pending = {}
+        self.sent = 0
+        self.saved = 0
+
+    def notify(self, config_handle_id, flush=False):
+        """Notifies config_handle_id, right away if flush"""
+        timer = self.pending.get(config_handle_id)
+        if timer is not None:
+            self.saved += 1
+            if not flush:
+                return
+            timer.cancel()
+        if flush or not self.window:
+            self._send(config_handle_id)
+        else:
+            self.pending[config_handle_id] = eventlet.spawn_after(
+                self.window, self._send, config_handle_id)
+
+    def _send(self, config_handle_id):
+        self.pending.pop(config_handle_id, None)
+        self.sent += 1
+        try:
+            self.send(q_context.get_admin_context(), config_handle_id)
+        except Exception:
+            LOG.exception(_("Failed to notify config handle %s"),
+                          config_handle_id)
+        LOG.debug(_("Config notifications sent: %(sent)d, saved: "
+                    "%(saved)d"), {'sent': self.sent, 'saved': self.saved})
+
+
 class HAProxyDriver():
     """
     The HAProxy Driver class
@@ -38,52 +84,68 @@ class HAProxyDriver():
         self.client_api = "dummpy.api" # TODO (trinath) yet to get the API details
         self.driver = importutils.import_object(cfg.CONF.NWSDRIVER.nwservice_driver)
         LOG.debug(_("Trinath :: Using SLB Scheduler Driver: %s"),str(self.driver))
+        self.notifications = NotificationAggregator(
+            self.notify_config, cfg.CONF.DRIVER.notify_window / 1000.0)
 
-    def vip_config_update(self,context,vip):
+    def vip_config_update(self,context,vip,method=constants.LB_UPDATE):
         LOG.debug(_("Trinath::Prepare Virtual_IP update msg."))
         if vip != '':
-            self.prepare_update([vip],constants.LB_UPDATE)
+            self.prepare_update(context,[vip],method)
         return
 
-    def lb_pool_update(self,context,lb_rec):
+    def lb_pool_update(self,context,lb_rec,method=constants.LB_UPDATE):
         pool_id = lb_rec['id']
         tenant_id = lb_rec['tenant_id']
         vips_record = self.db.check_vip_update(context,pool_id,tenant_id)
         if (vips_record != False):
-            self.prepare_update(vips_record,constants.LB_UPDATE)        
+            self.prepare_update(context,vips_record,method)
             LOG.debug(_("Trinath :: Prepare LB_Config_Update."))
         return
 
-    def lb_config_update(self,context,lb_rec):
+    def lb_config_update(self,context,lb_rec,method=constants.LB_UPDATE):
         pool_id = lb_rec['pool_id']
         tenant_id = lb_rec['tenant_id']
         vips_record = self.db.check_vip_update(context,pool_id,tenant_id)
         if (vips_record != False):
-            self.prepare_update(vips_record,constants.LB_UPDATE)        
+            self.prepare_update(context,vips_record,method)
             LOG.debug(_("Trinath :: Prepare LB_Config_Update."))
         return
 
-    def lb_session_vips_update(self,context,session_record):
+    def lb_session_vips_update(self,context,session_record,
+                               method=constants.LB_UPDATE):
         session_id = session_record['id']
         vips_record = self.db.check_session_vips_update(context,session_id)
         if (vips_record != False):
             LOG.debug(_("Trinath :: Prepare Session Persistance based Update"))
-            self.prepare_update(vips_record,constants.LB_UPDATE)
+            self.prepare_update(context,vips_record,method)
         return 
 
-    def prepare_update(self,vip,method):
+    def prepare_update(self,context,vip,method):
+        """
+        Notifies the service VM of each config handle of the latest config
+        version, the VM then fetches the changes since the version it has.
+        Notifications are aggregated per config handle (see
+        NotificationAggregator), deletions are sent right away.
+        """
         LOG.debug(_("Trinath:: VIP data => %s"),(str(vip)))
         if vip:
-            for vip_record in vip:
-                update_dict = { "header":"request",
-                            "config_handle_id":vip_record['config_handle_id'],
-                            "slug":"loadbalancer",
-                            "version":"0.0",
-                          }
-                LOG.debug(_("Trinath :: Notification Data : %s" % str(update_dict)))
-                self.send_modified_notification(vip_record['config_handle_id'],{'config':update_dict})
+            config_handle_ids = set(vip_record['config_handle_id'] for vip_record in vip)
+            self.notifications.saved += len(vip) - len(config_handle_ids)
+            for config_handle_id in config_handle_ids:
+                self.notifications.notify(
+                    config_handle_id, flush=method == constants.LB_DELETE)
         return
 
+    def notify_config(self,context,config_handle_id):
+        version = self.db.get_config_version(context,config_handle_id)
+        update_dict = { "header":"request",
+                        "config_handle_id":config_handle_id,
+                        "slug":"loadbalancer",
+                        "version":str(version),
+                      }
+        LOG.debug(_("Trinath :: Notification Data : %s" % str(update_dict)))
+        self.send_modified_notification(config_handle_id,{'config':update_dict})
+
     def send_modified_notification(self,config_handle_id,notify_data):
         LOG.debug(_('Trinath :: Send modified notification to NS Driver: Data: %s' % str(notify_data)))
         self.driver.send_rpc_msg(config_handle_id,notify_data)
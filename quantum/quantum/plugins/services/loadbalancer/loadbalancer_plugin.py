@@ -36,6 +36,10 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
     DB related work is implemented in class LoadBalancerPluginDb
     """
     supported_extension_aliases = ["lbaas"]
+    # The collections are sorted and paginated in the database (see
+    # LoadbalancerPluginDb._get_collection)
+    __native_pagination_support = True
+    __native_sorting_support = True
 
     def __init__(self):
         self.db = loadbalancer_db.LoadbalancerPluginDb()
@@ -71,9 +75,12 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Get configuration %s'), configuration_id)
         return self.db.get_configuration(context, configuration_id, fields)
 
-    def get_configurations(self, context, filters=None, fields=None):
+    def get_configurations(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         LOG.debug(_('Get configurations'))
-        return self.db.get_configurations(context, filters, fields)
+        return self.db.get_configurations(context, filters, fields,
+                                          sorts, limit, marker, page_reverse)
     
     """
     Handling Virtual IPs 
@@ -95,15 +102,17 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Delete vip %s'), vip_id)
         vip_record = self.get_vip(context,vip_id)     # (trinath) added to support SLB driver
         self.db.delete_vip(context, vip_id)
-        self.driver.vip_config_update(context,vip_record) # (trinath) added to support SLB driver
+        self.driver.vip_config_update(context,vip_record,constants.LB_DELETE) # (trinath) added to support SLB driver
 
     def get_vip(self, context, vip_id, fields=None):
         LOG.debug(_('Get vip %s'), vip_id)
         return self.db.get_vip(context, vip_id, fields)
 
-    def get_vips(self, context, filters=None, fields=None):
+    def get_vips(self, context, filters=None, fields=None, sorts=None,
+                 limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get vips'))
-        return self.db.get_vips(context, filters, fields)
+        return self.db.get_vips(context, filters, fields, sorts, limit, marker,
+                                page_reverse)
 
     """
     Handling Pools
@@ -124,15 +133,17 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Delete pool %s'), pool_id)
         pool_record = self.get_pool(context,pool_id)
         self.db.delete_pool(context, pool_id)
-        self.driver.lb_pool_update(context,pool_record) # Notify HAProxy Driver
+        self.driver.lb_pool_update(context,pool_record,constants.LB_DELETE) # Notify HAProxy Driver
         
     def get_pool(self, context, pool_id, fields=None):
         LOG.debug(_('Get pool %s'), pool_id)
         return self.db.get_pool(context, pool_id, fields)
 
-    def get_pools(self, context, filters=None, fields=None):
+    def get_pools(self, context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get Pools'))
-        return self.db.get_pools(context, filters, fields)
+        return self.db.get_pools(context, filters, fields,
+                                 sorts, limit, marker, page_reverse)
 
     """
     Handling Pool Members
@@ -142,9 +153,11 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Get member: %s'), member_id)
         return self.db.get_member(context, member_id, fields)
 
-    def get_members(self, context, filters=None, fields=None):
+    def get_members(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get members'))
-        return self.db.get_members(context, filters, fields)
+        return self.db.get_members(context, filters, fields,
+                                   sorts, limit, marker, page_reverse)
 
     def create_member(self, context, member):
         member_record = self.db.create_member(context, member)
@@ -163,7 +176,7 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Delete member: %s'), member_id)
         member_record = self.get_member(context,member_id)
         self.db.delete_member(context, member_id)
-        self.driver.lb_config_update(context,member_record)
+        self.driver.lb_config_update(context,member_record,constants.LB_DELETE)
 
     """
     Handling Health Monitors
@@ -174,9 +187,11 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         res = self.db.get_monitor(context, monitor_id, fields)
         return res
 
-    def get_monitors(self, context, filters=None, fields=None):
+    def get_monitors(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get health monitors'))
-        res = self.db.get_monitors(context, filters, fields)
+        res = self.db.get_monitors(context, filters, fields,
+                                   sorts, limit, marker, page_reverse)
         return res
 
     def create_monitor(self, context, monitor):
@@ -199,7 +214,7 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Delete health monitor: %s'), monitor_id)
         monitor_record = self.get_monitor(context,monitor_id)
         self.db.delete_monitor(context, monitor_id)
-        self.driver.lb_config_update(context,monitor_record)
+        self.driver.lb_config_update(context,monitor_record,constants.LB_DELETE)
     
     """
     Handling Session Persistance
@@ -210,9 +225,11 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         res = self.db.get_session(context, session_id, fields)
         return res
 
-    def get_sessions(self, context, filters=None, fields=None):
+    def get_sessions(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get health sessions'))
-        res = self.db.get_sessions(context, filters, fields)
+        res = self.db.get_sessions(context, filters, fields,
+                                   sorts, limit, marker, page_reverse)
         return res
 
     def create_session(self, context, session):
@@ -227,7 +244,7 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Update health session: %s'), session_id)
         session_record = self.db.update_session(context, session_id,
                                                              session)
-        self.drvier.lb_session_vips_update(context,session_record)
+        self.driver.lb_session_vips_update(context,session_record)
         return session_record
 
     def delete_session(self, context, session_id):
@@ -236,7 +253,7 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         LOG.debug(_('Delete health session: %s'), session_id)
         sp_record = self.get_session(context,session_id)
         self.db.delete_session(context, session_id)
-        self.driver.lb_session_vips_update(context,sp_record)
+        self.driver.lb_session_vips_update(context,sp_record,constants.LB_DELETE)
         
     """
     Generating Configuration File from Configuration Feilds
@@ -249,3 +266,6 @@ class LoadbalancerPlugin(LoadbalancerPluginBase):
         #    f.close()
         return res
 
+    def create_config_sync(self, context, config_sync):
+        return self.db.create_config_sync(context, config_sync)
+
@@ -0,0 +1,150 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+import eventlet
+
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Operation(object):
+    """A call queued for a device
+
+    key identifies the object the operation applies to, (model, id).
+    Operations with the same model and different ids are independent of
+    each other.
+    """
+
+    def __init__(self, action, key, func, *args):
+        self.action = action
+        self.key = key
+        self.func = func
+        self.args = args
+        self.queued_at = time.time()
+
+    def __call__(self):
+        return self.func(*self.args)
+
+
+class DeviceWorkQueues(object):
+    """Serialized queues of operations per device, run in parallel
+
+    The operations of a device run one at a time in the order they were
+    queued, the queues of different devices are drained concurrently by
+    the green threads of a pool.
+
+    Before an operation is queued, merge(older, newer) is asked whether
+    it supersedes the last operation pending for the same object, if only
+    operations on other objects of the same model were queued in between.
+    It returns the operation replacing both, which takes the place of the
+    older one, or None if both have to run.
+    """
+
+    def __init__(self, pool_size=16, merge=None, report_interval=0):
+        self.pool = eventlet.GreenPool(pool_size)
+        self.merge = merge
+        # device id -> deque of pending operations
+        self._queues = {}
+        # action -> {'count', 'merged', 'latency', 'max_latency'}
+        self._stats = {}
+        self._reporter = None
+        if report_interval:
+            self._reporter = eventlet.spawn(self._report, report_interval)
+
+    def put(self, device_id, operation):
+        queue = self._queues.get(device_id)
+        if queue is None:
+            queue = self._queues[device_id] = collections.deque()
+            queue.append(operation)
+            self.pool.spawn_n(self._drain, device_id, queue)
+            return
+        if self.merge is not None and self._merge(queue, operation):
+            return
+        queue.append(operation)
+
+    def _merge(self, queue, operation):
+        model = operation.key[0]
+        # the head of the queue is running or about to
+        for index in range(len(queue) - 1, 0, -1):
+            pending = queue[index]
+            if pending.key == operation.key:
+                merged = self.merge(pending, operation)
+                if merged is None:
+                    return False
+                merged.queued_at = pending.queued_at
+                queue[index] = merged
+                self._action_stats(operation.action)['merged'] += 1
+                LOG.debug(_('%(newer)s of %(key)s merged into queued '
+                            '%(older)s'),
+                          {'newer': operation.action, 'key': operation.key,
+                           'older': pending.action})
+                return True
+            if pending.key[0] != model:
+                return False
+        return False
+
+    def _drain(self, device_id, queue):
+        while True:
+            operation = queue[0]
+            try:
+                operation()
+            except Exception:
+                LOG.exception(_('%(action)s of %(key)s failed on device '
+                                '%(device)s'),
+                              {'action': operation.action,
+                               'key': operation.key, 'device': device_id})
+            self._record(operation)
+            queue.popleft()
+            if not queue:
+                del self._queues[device_id]
+                return
+
+    def _action_stats(self, action):
+        if action not in self._stats:
+            self._stats[action] = {'count': 0, 'merged': 0, 'latency': 0.0,
+                                   'max_latency': 0.0}
+        return self._stats[action]
+
+    def _record(self, operation):
+        latency = time.time() - operation.queued_at
+        stats = self._action_stats(operation.action)
+        stats['count'] += 1
+        stats['latency'] += latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+
+    def get_stats(self):
+        """Queue depth per device, and per action the number of operations
+        run and merged and their latency from queueing to completion.
+        """
+        actions = {}
+        for action, stats in self._stats.items():
+            actions[action] = dict(stats)
+            actions[action]['avg_latency'] = (stats['count'] and
+                                              stats['latency'] /
+                                              stats['count'])
+        return {'depth': dict((device_id, len(queue)) for device_id, queue
+                              in self._queues.items()),
+                'actions': actions}
+
+    def _report(self, interval):
+        while True:
+            eventlet.sleep(interval)
+            LOG.info(_('Device work queues: %s'), self.get_stats())
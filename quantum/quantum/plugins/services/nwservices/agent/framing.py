@@ -0,0 +1,73 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Framing of the messages exchanged with service VMs over virtio-serial.
+
+Every message is a JSON object preceded by its length as a 4 byte
+unsigned integer in network byte order. The service VM daemons carry
+their own copy of this code (slbvm/slb_config_daemon.py), keep them in
+sync.
+
+Messages from a VM carrying an 'id' are requests, the reply to each of
+them carries the same 'id' so that several requests can be in flight.
+"""
+
+import struct
+
+from quantum.openstack.common import jsonutils
+
+HEADER = struct.Struct('!I')
+# a frame larger than this means the stream is corrupt
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class FramingError(Exception):
+    pass
+
+
+def encode(message):
+    payload = jsonutils.dumps(message)
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder(object):
+    """Reassembles messages from the chunks read off a connection."""
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Buffers data and returns the messages completed by it."""
+        self.buffer.extend(data)
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            size = HEADER.unpack_from(self.buffer, offset)[0]
+            if size > self.max_frame_size:
+                raise FramingError(_('Frame of %d bytes exceeds the '
+                                     'limit') % size)
+            end = offset + HEADER.size + size
+            if len(self.buffer) < end:
+                break
+            try:
+                messages.append(jsonutils.loads(
+                    str(self.buffer[offset + HEADER.size:end])))
+            except ValueError, e:
+                raise FramingError(_('Malformed message: %s') % e)
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return messages
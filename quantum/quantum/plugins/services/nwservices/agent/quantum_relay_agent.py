@@ -22,12 +22,14 @@ import time
 import eventlet
 
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.common import config as logging_config
 from quantum.common import topics
 from quantum.openstack.common import cfg
 from quantum.openstack.common import context
 from quantum.openstack.common import rpc
 from quantum.openstack.common.rpc import dispatcher
+from quantum.openstack.common.rpc import proxy
 from quantum.plugins.services.nwservices.agent import remote_control
 
 logging.basicConfig()
@@ -41,6 +43,7 @@ agent_opts = [
     cfg.StrOpt('root_helper', default='sudo'),
     cfg.BoolOpt('rpc', default=True),
     cfg.StrOpt('integration_bridge', default='br-int'),
+    cfg.BoolOpt('ovsdb_monitor', default=True),
 ]
 
 relay_opts = [
@@ -49,6 +52,11 @@ relay_opts = [
     cfg.StrOpt('admin_tenant',default="service"),
     cfg.StrOpt('auth_url',default='http://10.232.90.53:5000/v2.0/'),
     cfg.StrOpt('endpoint_url',default='http://10.232.90.53:9696/'),
+    cfg.IntOpt('client_pool_size', default=4),
+    cfg.IntOpt('token_refresh_margin', default=60),
+    cfg.IntOpt('max_requests_per_vm', default=8),
+    cfg.IntOpt('vm_queue_size', default=64),
+    cfg.IntOpt('stats_interval', default=30),
 ]
 
 cfg.CONF.register_opts(relay_opts, "RELAY")
@@ -63,17 +71,23 @@ class QuantumRelayAgent(object):
     RPC_API_VERSION = '1.0'
 
     def __init__(self, integ_br, root_helper,
-                 polling_interval, reconnect_interval, rpc):
+                 polling_interval, reconnect_interval, rpc,
+                 ovsdb_monitor=False):
         '''Constructor.
 
         :param root_helper: utility to use when running shell cmds.
         :param rpc: if True use RPC interface to interface with plugin.
+        :param ovsdb_monitor: if True watch the integration bridge ports
+               with ovsdb-client monitor instead of polling them.
         '''
         self.root_helper = root_helper
         self.polling_interval = polling_interval
         self.reconnect_interval = reconnect_interval
+        self.ovsdb_monitor = ovsdb_monitor
+        self.port_monitor = None
         self.setup_integration_br(integ_br)
-        self.com = remote_control.RemoteControl()
+        self.com = remote_control.RemoteControl(
+            stats_callback=rpc and self.report_stats or None)
 
         self.rpc = rpc
         if rpc:
@@ -86,6 +100,8 @@ class QuantumRelayAgent(object):
         # RPC network init
         self.context = context.RequestContext('quantum', 'quantum',
                                               is_admin=False)
+        self.plugin_rpc = proxy.RpcProxy(topics.NWSERVICES_PLUGIN,
+                                         self.RPC_API_VERSION)
         # Handle updates from service
         self.dispatcher = self.create_rpc_dispatcher()
         # Define the listening consumers for the agent
@@ -99,7 +115,18 @@ class QuantumRelayAgent(object):
         LOG.debug(_('Config Update Message received\n'))
         LOG.debug(_('msg received is %s\n'),str(kwargs))
         LOG.debug(_('context token id= %s*******************\n\n'),str(context.to_dict()))
-        self.com.send_data_to_vm(kwargs.get('instance_id'),str(kwargs.get('config_request')))
+        self.com.send_data_to_vm(kwargs.get('instance_id'),kwargs.get('config_request'))
+
+    def get_vm_stats(self,context,**kwargs):
+        return self.com.get_stats()
+
+    def report_stats(self, instance_id, config_handle_id, stats):
+        self.plugin_rpc.cast(self.context,
+                             self.plugin_rpc.make_msg(
+                                 'report_stats', instance_id=instance_id,
+                                 host=self.host,
+                                 config_handle_id=config_handle_id,
+                                 stats=stats))
 
     def create_rpc_dispatcher(self):
         '''Get the rpc dispatcher for this manager.
@@ -118,7 +145,10 @@ class QuantumRelayAgent(object):
         self.int_br = ovs_lib.OVSBridge(integ_br, self.root_helper)
 
     def update_ports(self, registered_ports):
-        ports = self.int_br.get_vif_port_set()
+        if self.port_monitor:
+            ports = self.port_monitor.get_vif_port_set()
+        else:
+            ports = self.int_br.get_vif_port_set()
         if ports == registered_ports:
             return
         added = ports - registered_ports
@@ -127,10 +157,20 @@ class QuantumRelayAgent(object):
                 'added': added,
                 'removed': removed}
 
+    def wait_for_ports(self, timeout):
+        if self.port_monitor:
+            self.port_monitor.wait(timeout)
+        else:
+            time.sleep(timeout)
+
     def rpc_loop(self):
         sync = True
         ports = set()
         tunnel_sync = True
+        if self.ovsdb_monitor:
+            self.port_monitor = ovsdb_monitor.InterfaceMonitor(
+                self.int_br, self.reconnect_interval)
+            self.port_monitor.start()
 
         while True:
             try:
@@ -155,7 +195,7 @@ class QuantumRelayAgent(object):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                self.wait_for_ports(self.polling_interval - elapsed)
             else:
                 LOG.debug("Loop iteration exceeded interval (%s vs. %s)!",
                           self.polling_interval, elapsed)
@@ -180,10 +220,11 @@ def main():
     reconnect_interval = cfg.CONF.RAGENT.reconnect_interval
     rpc = cfg.CONF.RAGENT.rpc
     integ_br = cfg.CONF.RAGENT.integration_bridge
+    ovsdb_monitor = cfg.CONF.RAGENT.ovsdb_monitor
     LOG.debug(_("username= %s,password=%s,auth_url=%s"),cfg.CONF.RELAY.admin_user,cfg.CONF.RELAY.admin_password,cfg.CONF.RELAY.auth_url)
 
     plugin = QuantumRelayAgent(integ_br,root_helper, polling_interval,
-                             reconnect_interval, rpc)
+                             reconnect_interval, rpc, ovsdb_monitor)
 
     # Start everything.
     LOG.info("Agent initialized successfully, now running... ")
@@ -13,127 +13,330 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import ast
-import socket
-import select
+import collections
+import os
 import time
 
 import eventlet
+from eventlet.green import socket
+from eventlet import semaphore
 
 from quantumclient.v2_0 import client as qclient
 from quantum.openstack.common import cfg
 from quantum.openstack.common import log as logging
+from quantum.plugins.services.nwservices import client_pool
+from quantum.plugins.services.nwservices.agent import framing
 
 LOG = logging.getLogger(__name__)
 INSTANCES_PATH='/var/lib/nova/instances'
+RECV_SIZE = 65536
+# weight of the latest sample in the average round trip time
+RTT_WEIGHT = 0.2
+
+
+class VMPort(object):
+    """Virtio-serial connection to the config daemon of one service VM.
+
+    Outbound messages wait in a queue until the daemon has said hello.
+    Config notifications and stats requests are keyed by ('config', handle)
+    and ('stats', handle): a newer one replaces the one still queued with
+    the same key, the daemon syncs to the latest version anyway. Replies
+    to the daemon's requests are bounded by queue_size, a reply waits for
+    room.
+    """
+
+    def __init__(self, instance_id, queue_size, max_requests):
+        self.instance_id = instance_id
+        self.path = INSTANCES_PATH + '/instance-%08x/port' % instance_id
+        self.sock = None
+        self.generation = 0
+        self.status_up = False
+        self.decoder = None
+        self.queue = collections.deque()
+        # key -> message of the keyed entries in the queue
+        self.keyed = {}
+        # key -> last config notification, sent again after a reconnect
+        self.last = {}
+        # key -> time the message was written
+        self.sent = {}
+        self.room = semaphore.Semaphore(queue_size)
+        self.max_requests = max_requests
+        self.requests = semaphore.Semaphore(max_requests)
+        self.wakeup = eventlet.queue.Queue(1)
+        self.coalesced = 0
+        self.reconnects = 0
+        self.rtt = None
+        self.avg_rtt = None
+
+    def put(self, message, key=None, resend=False):
+        if key is None:
+            self.room.acquire()
+            self.queue.append((None, message))
+        else:
+            if key in self.keyed:
+                self.coalesced += 1
+            else:
+                self.queue.append((key, None))
+            self.keyed[key] = message
+            if resend:
+                self.last[key] = message
+        self.wake()
+
+    def pop(self):
+        key, message = self.queue.popleft()
+        if key is None:
+            self.room.release()
+        else:
+            message = self.keyed.pop(key)
+        return key, message
+
+    def wake(self):
+        try:
+            self.wakeup.put_nowait(None)
+        except eventlet.queue.Full:
+            pass
+
+    def reset(self):
+        """Drops what was queued for the lost connection.
+
+        The last config notifications are queued again, the daemon of a
+        rebooted VM needs them to sync its configuration.
+        """
+        while self.queue:
+            self.pop()
+        self.sent.clear()
+        self.status_up = False
+        for key, message in self.last.items():
+            self.put(message, key)
+
+    def received(self, key):
+        sent = self.sent.pop(key, None)
+        if sent is None:
+            return
+        self.rtt = time.time() - sent
+        if self.avg_rtt is None:
+            self.avg_rtt = self.rtt
+        else:
+            self.avg_rtt += RTT_WEIGHT * (self.rtt - self.avg_rtt)
+
+    def stats(self):
+        return {'connected': self.sock is not None,
+                'status_up': self.status_up,
+                'queue_depth': len(self.queue),
+                'in_flight': self.max_requests - self.requests.balance,
+                'coalesced': self.coalesced,
+                'reconnects': self.reconnects,
+                'rtt': self.rtt,
+                'avg_rtt': self.avg_rtt}
+
 
 class RemoteControl(object):
     """Relay config class
 
     This class is capable of mananging configurations in service VMs
     and retrieving its config and stats.
+
+    Every VM port is served by a green thread reading framed messages
+    (see framing.py) and one writing its queue. Requests from a VM are
+    answered with the id they carry, up to max_requests_per_vm of them
+    run at once; beyond that the VM is not read from until one completes.
+    When a VM goes away its port is reconnected for as long as the
+    instance directory exists.
     """
 
-    def __init__(self):
+    def __init__(self, stats_callback=None):
         LOG.debug(_('Instantiating RelayConfig'))
-        self.port_fds = {}
+        self.ports = {}
+        # called with (instance_id, config_handle_id, stats) for every
+        # stats reply of a VM
+        self.stats_callback = stats_callback
+        self.stats_interval = cfg.CONF.RELAY.stats_interval
         self.user = cfg.CONF.RELAY.admin_user
         self.password = cfg.CONF.RELAY.admin_password
         self.tenant=cfg.CONF.RELAY.admin_tenant
         self.auth_url=cfg.CONF.RELAY.auth_url
         self.endpoint_url=cfg.CONF.RELAY.endpoint_url
-        self.epoll = select.epoll()
-        self.poll_fn = eventlet.spawn_n(self.poller)
+        self.max_requests = cfg.CONF.RELAY.max_requests_per_vm
+        self.queue_size = cfg.CONF.RELAY.vm_queue_size
+        self.reconnect_interval = cfg.CONF.RAGENT.reconnect_interval
+        self.clients = quantumclient_pool(self.user,self.password,self.tenant,self.auth_url,self.endpoint_url)
+        self.pool = eventlet.GreenPool()
+        if self.stats_callback and self.stats_interval:
+            eventlet.spawn_n(self._poll_stats)
 
+    def _run(self,port):
+        while os.path.isdir(os.path.dirname(port.path)):
+            if self._connect(port):
+                writer = eventlet.spawn(self._writer, port)
+                self._reader(port)
+                writer.kill()
+                self._disconnect(port)
+            eventlet.sleep(self.reconnect_interval)
+        LOG.info(_('instance-%08x is gone, dropping its virtio-serial port'),
+                 port.instance_id)
+        del self.ports[port.instance_id]
 
-    
-    def poller(self):
-        while True:
-            time.sleep(0.25)
-            events = self.epoll.poll(0.25)
-            LOG.debug(_('Polling %d events'),len(events))
-            LOG.debug('port_fds = %s' % str(self.port_fds))
-            for fileno, event in events:
-                if event & select.EPOLLIN:
-                    self.process_config_request(fileno)
-
-    
-    def process_config_request(self,fileno):
-        data = self.port_fds[fileno]['tmp_data'] + self.port_fds[fileno]['fd'].recv(65535)
-        LOG.debug("data received from VM ...... ************sairam*************\n\n%s\n\n" % data)
-        
+    def _connect(self,port):
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
         try:
-            req = ast.literal_eval(data)
-            self.port_fds[fileno]['tmp_data'] = ''
-            LOG.debug("data received from VM ...... ************sairam*************\n\n%s\n\n" % data)
-            if req['method'] == 'hello':
-                self.port_fds[fileno]['status_up'] = True
-                if self.port_fds[fileno]['conf_up_req'] != '':
-		    LOG.debug('sending data to VM............\n\n%s\n\n' % self.port_fds[fileno]['conf_up_req'])
-                    self.send_data_to_vm(self.port_fds[fileno]['instance_id'],self.port_fds[fileno]['conf_up_req'])
-                    self.port_fds[fileno]['conf_up_req'] = ''
+            sock.connect(port.path)
+        except socket.error,msg:
+            LOG.debug(_('unable to connect to virtio-serial port. Error: %s'),msg)
+            sock.close()
+            return False
+        LOG.debug(_('Connected to virtio-serial port of instance-%08x'),
+                  port.instance_id)
+        port.sock = sock
+        port.decoder = framing.FrameDecoder()
+        port.generation += 1
+        return True
+
+    def _disconnect(self,port):
+        LOG.debug(_('Closing virtio-serial socket of instance-%08x'),
+                  port.instance_id)
+        port.sock.close()
+        port.sock = None
+        port.reconnects += 1
+        port.reset()
+
+    def _reader(self,port):
+        while True:
+            try:
+                data = port.sock.recv(RECV_SIZE)
+            except socket.error, e:
+                LOG.error(_('Error reading from instance-%(id)08x: %(err)s'),
+                          {'id': port.instance_id, 'err': e})
                 return
-            else:
+            if not data:
+                return
+            try:
+                messages = port.decoder.feed(data)
+            except framing.FramingError, e:
+                LOG.error(_('Dropping connection to instance-%(id)08x: %(err)s'),
+                          {'id': port.instance_id, 'err': e})
+                return
+            for req in messages:
+                self._handle_message(port, req)
+
+    def _writer(self,port):
+        while True:
+            port.wakeup.get()
+            while port.status_up and port.queue:
+                key, message = port.pop()
+                if key is not None:
+                    port.sent[key] = time.time()
                 try:
-                    qc = quantumclient(self.user,self.password,self.tenant,self.auth_url,self.endpoint_url)
-                    LOG.debug("quantum client created ......%s *****************sairam****************\n\n" % str(qc))
-                    q_data_recv=str(getattr(qc,req['method'])(**req['kwargs']))
-                    LOG.debug('data received from quantum client = %s*************************sairam**************\n\n' % q_data_recv)
-                    self.port_fds[fileno]['fd'].send(q_data_recv)
+                    port.sock.sendall(framing.encode(message))
+                except socket.error, e:
+                    LOG.error(_('Error writing to instance-%(id)08x: %(err)s'),
+                              {'id': port.instance_id, 'err': e})
                     return
-                except Exception,msg:
-                    LOG.error(_('Quantumclient Exception...\n\t%s'),msg)
-        except SyntaxError,msg:
-            LOG.debug(_('Incomplete data received from VM.'))
-            self.port_fds[fileno]['tmp_data'] += data
-            return
 
+    def _handle_message(self,port,req):
+        if req.get('header') == 'response':
+            port.received(('config', req['config_handle_id']))
+            LOG.info(_('Instance %(instance)s config %(handle)s version %(version)s: '
+                       '%(status)s, %(reload)s reload in %(latency).3f seconds'),
+                     {'instance': port.instance_id,
+                      'handle': req['config_handle_id'],
+                      'version': req['version'],
+                      'status': req['status'],
+                      'reload': req.get('reload'),
+                      'latency': req['latency']})
+            if req.get('error'):
+                LOG.error(_('Config update failed: %s'), req['error'])
+        elif req.get('header') == 'stats':
+            port.received(('stats', req['config_handle_id']))
+            if self.stats_callback:
+                try:
+                    self.stats_callback(port.instance_id,
+                                        req['config_handle_id'], req['stats'])
+                except Exception:
+                    LOG.exception(_('Failed to report stats of '
+                                    'instance-%08x'), port.instance_id)
+        elif req.get('method') == 'hello':
+            port.status_up = True
+            port.wake()
+        elif 'method' in req:
+            port.requests.acquire()
+            self.pool.spawn_n(self._call_quantum, port, port.generation, req)
+        else:
+            LOG.error(_('Unexpected message from instance-%(id)08x: %(req)s'),
+                      {'id': port.instance_id, 'req': req})
 
-    def connect_vm(self,instance_id):
-        fd = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    def _call_quantum(self,port,generation,req):
         try:
-            fd.connect(INSTANCES_PATH + '/instance-%08x/port' % instance_id)
-        except socket.error,msg:
-            LOG.debug(_('unable to connect to virtio-serial port. Error: %s'),msg)
+            with self.clients.item() as qc:
+                reply = {'id': req.get('id'),
+                         'result': getattr(qc,req['method'])(**req.get('kwargs', {}))}
+        except Exception, e:
+            LOG.error(_('Quantumclient Exception...\n\t%s'),e)
+            reply = {'id': req.get('id'), 'error': str(e)}
+        finally:
+            port.requests.release()
+        # the VM does not know about requests of an earlier connection
+        if port.generation == generation and port.sock is not None:
+            port.put(reply)
+
+    def _get_port(self,instance_id):
+        port = self.ports.get(instance_id)
+        if port is None:
+            if not os.path.isdir(INSTANCES_PATH + '/instance-%08x' % instance_id):
+                return None
+            port = VMPort(instance_id, self.queue_size, self.max_requests)
+            self.ports[instance_id] = port
+            eventlet.spawn_n(self._run, port)
+        return port
+
+    def send_data_to_vm(self,instance_id,data=None):
+        port = self._get_port(instance_id)
+        if not port:
+            LOG.debug(_('No VM virtio-serial port exists for instance instance-%08x'),instance_id)
             return False
-        self.port_fds[fd.fileno()] = {'fd':fd,
-                                      'instance_id':instance_id,
-                                      'status_up':False,
-                                      'tmp_data':'',
-                                      'conf_up_req' : '',
-                                     }
-        LOG.debug("Successfully created virtio-serial socket.")
-        self.epoll.register(fd.fileno(),select.EPOLLIN)
-        return self.port_fds[fd.fileno()]
-    
-    def _get_fd_details(self,instance_id):
-        for val in self.port_fds.values():
-            if val['instance_id'] == instance_id:
-                return val
-        return False
-
-    def send_data_to_vm(self,instance_id,data=''):
-        fd = self._get_fd_details(instance_id)
-        if not fd:
-            LOG.debug("no socket fd exists.creating.")
-            fd = self.connect_vm(instance_id)
-            if not fd:
-                LOG.debug(_('No VM virtio-serial port exists for instance instance-%08x'),instance_id)
-                return False
-        LOG.debug('fd details  %s' % str(fd))
-        LOG.debug('data = %s' % data)
-        if data != '' and fd['status_up']:
-            if not fd['fd'].send(data) == len(data):
-                LOG.debug(_('Could not Send complete data. Data length = %d'),len(data))
-	elif (data != '') and (not fd['status_up']):
-            fd['conf_up_req'] = data
-	    LOG.debug("VM is not up.......Storing data\n\n%s\n\n" % (fd['conf_up_req']))
+        if data is None:
+            return True
+        if 'config' in data:
+            port.put(data, ('config', data['config'].get('config_handle_id')),
+                     resend=True)
+        else:
+            port.put(data)
+        return True
+
+    def _poll_stats(self):
+        """Asks every VM for the HAProxy counters of its config handles.
+
+        The request is keyed like config notifications, so a VM that
+        did not answer the previous one is not asked twice.
+        """
+        while True:
+            eventlet.sleep(self.stats_interval)
+            for port in self.ports.values():
+                if not port.status_up:
+                    continue
+                for (kind, handle), message in port.last.items():
+                    port.put({'stats': {'config_handle_id': handle,
+                                        'slug': message['config'].get('slug')}},
+                             ('stats', handle))
+
+    def get_stats(self):
+        """Queue depth, requests in flight and round trip time per VM."""
+        return dict((instance_id, port.stats())
+                    for instance_id, port in self.ports.items())
 
     def update_config(self):
         """
         TODO: Configuration Update available event generated at plugin. Need to send this to VM.
         """
-def quantumclient(username,password,tenant,auth_url,endpoint_url):
-    cl = qclient.Client(username=username,tenant_name=tenant,password=password,auth_url=auth_url,endpoint_url=endpoint_url)
-    cl.httpclient.authenticate()
-    return cl
+
+def quantumclient_pool(username,password,tenant,auth_url,endpoint_url):
+    def create_client():
+        return qclient.Client(username=username,tenant_name=tenant,password=password,auth_url=auth_url,endpoint_url=endpoint_url)
+
+    def authenticate(cl):
+        cl.httpclient.authenticate()
+        return cl.httpclient.service_catalog.get_token()['expires']
+
+    return client_pool.get_pool('quantum:%s@%s/%s' % (username,tenant,endpoint_url),
+                                create_client, authenticate,
+                                max_size=cfg.CONF.RELAY.client_pool_size,
+                                refresh_margin=cfg.CONF.RELAY.token_refresh_margin)
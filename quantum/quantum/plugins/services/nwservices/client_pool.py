@@ -0,0 +1,151 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import datetime
+import time
+
+from eventlet import pools
+from eventlet import semaphore
+
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+# tokens without an expiry in the service catalog are kept this long
+DEFAULT_TOKEN_LIFETIME = 3600
+
+
+class _Session(object):
+    """An API client together with the expiry of its token."""
+
+    def __init__(self, client):
+        self.client = client
+        self.expires = None
+
+
+class ClientPool(pools.Pool):
+    """Pool of authenticated API clients for one endpoint and user.
+
+    Creating a nova or quantum client costs a keystone token round trip
+    and a new HTTP connection. Clients handed out by the pool keep both:
+    the token is reused until refresh_margin seconds before it expires,
+    at which point the same client re-authenticates, and its underlying
+    HTTP object keeps its keep-alive connections to the endpoint.
+
+    create_client() must return an unauthenticated client and
+    authenticate(client) must authenticate it and return the token
+    expiry as reported by keystone (an ISO 8601 string) or None.
+    """
+
+    def __init__(self, name, create_client, authenticate, max_size=4,
+                 refresh_margin=60):
+        self.name = name
+        self.create_client = create_client
+        self.authenticate = authenticate
+        self.refresh_margin = refresh_margin
+        self.stats = {'hits': 0,
+                      'misses': 0,
+                      'refreshes': 0,
+                      'failures': 0,
+                      'auth_time': 0.0,
+                      'requests': 0,
+                      'request_time': 0.0}
+        super(ClientPool, self).__init__(max_size=max_size,
+                                         order_as_stack=True)
+
+    def create(self):
+        self.stats['misses'] += 1
+        LOG.debug(_('Client pool %s creating new client'), self.name)
+        return _Session(self.create_client())
+
+    def _expiring(self, session):
+        if session.expires is None:
+            return True
+        margin = datetime.timedelta(seconds=self.refresh_margin)
+        return timeutils.utcnow() + margin >= session.expires
+
+    def _authenticate(self, session):
+        start = time.time()
+        try:
+            expires = self.authenticate(session.client)
+        except Exception:
+            self.stats['failures'] += 1
+            raise
+        finally:
+            self.stats['auth_time'] += time.time() - start
+        if expires:
+            # normalize_time leaves the tzinfo of UTC timestamps in place
+            expires = timeutils.normalize_time(
+                timeutils.parse_isotime(expires)).replace(tzinfo=None)
+        else:
+            expires = timeutils.utcnow() + datetime.timedelta(
+                seconds=DEFAULT_TOKEN_LIFETIME)
+        session.expires = expires
+        LOG.debug(_('Client pool %(name)s authenticated, token expires '
+                    'at %(expires)s, stats %(stats)s'),
+                  {'name': self.name, 'expires': expires,
+                   'stats': self.stats})
+
+    @contextlib.contextmanager
+    def item(self):
+        """Yields an authenticated client and returns it to the pool.
+
+        A client whose request failed is put back without its token, so
+        a revoked or otherwise rejected token is never handed out again.
+        """
+        session = self.get()
+        try:
+            if self._expiring(session):
+                if session.expires is not None:
+                    self.stats['refreshes'] += 1
+                self._authenticate(session)
+            else:
+                self.stats['hits'] += 1
+            start = time.time()
+            try:
+                yield session.client
+            finally:
+                self.stats['requests'] += 1
+                self.stats['request_time'] += time.time() - start
+        except Exception:
+            session.expires = None
+            raise
+        finally:
+            self.put(session)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['free'] = self.free()
+        stats['size'] = self.current_size
+        return stats
+
+
+_pools = {}
+_pools_sem = semaphore.Semaphore()
+
+
+def get_pool(name, create_client, authenticate, **kwargs):
+    """Returns the pool registered under name, creating it if needed."""
+    with _pools_sem:
+        if name not in _pools:
+            _pools[name] = ClientPool(name, create_client, authenticate,
+                                      **kwargs)
+    return _pools[name]
+
+
+def get_stats():
+    return dict((name, pool.get_stats()) for name, pool in _pools.items())
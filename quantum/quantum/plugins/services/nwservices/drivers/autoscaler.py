@@ -0,0 +1,176 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import eventlet
+
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+# proxies of the HAProxy stats each scaling metric is summed over
+METRIC_PROXY_TYPES = {
+    'sessions': 'frontend',
+    'rate': 'frontend',
+    'queue': 'backend',
+}
+
+
+class Autoscaler(object):
+    """Scales chain images out and in on the HAProxy stats of their VMs.
+
+    The relay agents pull the frontend and backend counters of every SLB
+    VM over virtio-serial and report them to the driver, which stores them
+    in ns_stats. Every interval seconds each scaling policy whose cooldown
+    is over compares the average of its metric over the last window
+    seconds, per instance of the chain image, with its thresholds.
+
+    Scaling out launches another instance of the chain image with the
+    image, flavor, security group and networks of the original one,
+    scaling in deletes the newest extra instance. Either way the config
+    handles of the chain image are then pushed again, and each instance
+    syncs its shard of the pool members (see LoadBalancerPluginDb.
+    _load_config_rows).
+    """
+
+    def __init__(self, driver, clients, interval=60, window=300,
+                 retention=3600):
+        self.driver = driver
+        self.db = driver.db
+        self.context = driver.context
+        # a client_pool.ClientPool of nova clients
+        self.clients = clients
+        self.interval = interval
+        self.window = window
+        self.retention = retention
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                LOG.exception(_('Failed to evaluate the scaling policies'))
+
+    def run_once(self):
+        now = timeutils.utcnow()
+        self.db.prune_stats(self.context,
+                            now - datetime.timedelta(seconds=self.retention))
+        for policy in self.db.get_due_scaling_policies(self.context, now):
+            try:
+                self.evaluate(policy, now)
+            except Exception:
+                LOG.exception(_('Failed to evaluate scaling policy %s'),
+                              policy['id'])
+
+    def measure(self, metric, config_handle_ids, since):
+        """Average of metric per instance serving the config handles.
+
+        Every report of a VM is one sample, summed over its proxies. The
+        samples are averaged per instance and then over the instances.
+        Returns None without samples.
+        """
+        proxy_type = METRIC_PROXY_TYPES[metric]
+        # (instance_id, report time) -> metric summed over the proxies
+        samples = {}
+        for row in self.db.get_stats(self.context, config_handle_ids, since):
+            if row.type != proxy_type:
+                continue
+            key = (row.instance_id, row.created_at)
+            samples[key] = samples.get(key, 0) + (getattr(row, metric) or 0)
+        if not samples:
+            return None
+        instances = {}
+        for (instance_id, created_at), value in samples.items():
+            instances.setdefault(instance_id, []).append(value)
+        averages = [float(sum(values)) / len(values)
+                    for values in instances.values()]
+        return sum(averages) / len(averages)
+
+    def evaluate(self, policy, now):
+        chain_image = self.db.get_chain_image(self.context,
+                                              policy['chain_map_id'])
+        if not chain_image['instance_uuid']:
+            # the chain has not been launched
+            return
+        extra = self.db.get_chain_image_instances(self.context,
+                                                  chain_image['id'])
+        count = 1 + len(extra)
+        config_handle_ids = [conf['config_handle_id'] for conf in
+                             self.db.get_chain_image_confs(
+                                 self.context,
+                                 filters={'chain_map_id': [chain_image['id']]})]
+        since = now - datetime.timedelta(seconds=self.window)
+        value = self.measure(policy['metric'], config_handle_ids, since)
+        LOG.debug(_('Chain image %(chain_image)s: %(count)d instances, '
+                    '%(metric)s %(value)s'),
+                  {'chain_image': chain_image['id'], 'count': count,
+                   'metric': policy['metric'], 'value': value})
+
+        if count < policy['min_instances'] or (
+                value is not None and count < policy['max_instances'] and
+                value > policy['scale_out_threshold']):
+            self.scale_out(policy, chain_image)
+        elif (value is not None and count > policy['min_instances'] and
+              value < policy['scale_in_threshold'] and extra):
+            self.scale_in(policy, chain_image, extra[-1])
+        else:
+            return
+        self.db.mark_scaled(self.context, policy['id'])
+        for config_handle_id in config_handle_ids:
+            self.driver.notify_config(config_handle_id)
+
+    def scale_out(self, policy, chain_image):
+        image = self.db.get_image(self.context, chain_image['image_map_id'])
+        networks = self.db.get_chain_image_networks(
+            self.context, filters={'chain_map_id': [chain_image['id']]})
+        nics = [{'net-id': network['network_id'], 'v4-fixed-ip': ''}
+                for network in networks]
+        with self.clients.item() as nova:
+            security_group = nova.security_groups.get(
+                image['security_group_id'])
+            server = nova.servers.create(chain_image['name'],
+                                         image['image_id'],
+                                         image['flavor_id'],
+                                         security_groups=[security_group.name],
+                                         nics=nics)
+        self.db.add_chain_image_instance(self.context, chain_image['id'],
+                                         server.id)
+        LOG.info(_('Scaling policy %(policy)s launched instance %(uuid)s '
+                   'of chain image %(chain_image)s'),
+                 {'policy': policy['id'], 'uuid': server.id,
+                  'chain_image': chain_image['id']})
+
+    def scale_in(self, policy, chain_image, instance_uuid):
+        with self.clients.item() as nova:
+            nova.servers.delete(instance_uuid)
+        self.db.delete_chain_image_instance(self.context, instance_uuid)
+        self.driver.tracker.forget(instance_uuid)
+        LOG.info(_('Scaling policy %(policy)s deleted instance %(uuid)s '
+                   'of chain image %(chain_image)s'),
+                 {'policy': policy['id'], 'uuid': instance_uuid,
+                  'chain_image': chain_image['id']})
@@ -0,0 +1,151 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+
+from quantum.common import exceptions as q_exc
+from quantum import context as q_context
+from quantum.openstack.common import log as logging
+from quantum.plugins.common import constants
+
+LOG = logging.getLogger(__name__)
+
+
+class ChainLauncher(object):
+    """Boots all the images of a chain at once.
+
+    The chain is resolved in one pass over the database (see
+    NwservicePluginDb.get_chain_launch_plan) and each chain image is
+    booted by a green thread of a pool, so launching a chain takes about
+    as long as its slowest VM rather than the sum of all of them.
+
+    Sequence numbers only order images sharing a network: such an image
+    is booted once the lower numbered images on its networks have been
+    created, so their ports come first on the network. Images with
+    nothing in common boot together.
+
+    The progress of every image is recorded in the chain launch returned
+    by launch(). Once a VM is active its config handles are pushed to it.
+    """
+
+    def __init__(self, driver, clients, pool_size=8):
+        self.driver = driver
+        self.db = driver.db
+        # a client_pool.ClientPool of nova clients
+        self.clients = clients
+        self.pool = eventlet.GreenPool(pool_size)
+
+    def launch(self, context, chain_id):
+        plan = self.db.get_chain_launch_plan(context, chain_id)
+        if not plan:
+            raise q_exc.InvalidInput(
+                error_message=_('Chain %s has no images') % chain_id)
+        for entry in plan:
+            if not entry['network_ids']:
+                raise q_exc.InvalidInput(
+                    error_message=_('No network associated to chain image '
+                                    '%s') % entry['name'])
+            if '' in entry['config_handle_ids']:
+                raise q_exc.InvalidInput(
+                    error_message=_('No configuration associated to chain '
+                                    'image %s') % entry['name'])
+
+        chain_launch = self.db.create_chain_launch(context, chain_id, plan)
+        launch_images = dict((image['chain_map_id'], image['id'])
+                             for image in chain_launch['images'])
+        created = dict((entry['id'], event.Event()) for entry in plan)
+        # security group id -> name, shared by the boots of this launch
+        security_groups = {}
+        for entry in plan:
+            networks = set(entry['network_ids'])
+            dependencies = [created[other['id']] for other in plan
+                            if other['sequence_number'] <
+                            entry['sequence_number'] and
+                            networks.intersection(other['network_ids'])]
+            self.pool.spawn_n(self._boot, launch_images[entry['id']], entry,
+                              dependencies, created[entry['id']],
+                              security_groups)
+        LOG.info(_('Launch %(launch)s of chain %(chain)s started, '
+                   '%(count)d images'),
+                 {'launch': chain_launch['id'], 'chain': chain_id,
+                  'count': len(plan)})
+        return chain_launch
+
+    def _security_group_name(self, nova, security_group_id, security_groups):
+        if security_group_id not in security_groups:
+            for security_group in nova.security_groups.list():
+                security_groups[security_group.id] = security_group.name
+        return security_groups[security_group_id]
+
+    def _boot(self, launch_image_id, entry, dependencies, created,
+              security_groups):
+        context = q_context.get_admin_context()
+        # cannot deadlock the pool: the images waited for have a lower
+        # sequence number, they were spawned first and hold a slot
+        for dependency in dependencies:
+            if not dependency.wait():
+                self._failed(context, launch_image_id,
+                             _('an image it depends on failed to boot'),
+                             created)
+                return
+        nics = [{'net-id': network_id, 'v4-fixed-ip': ''}
+                for network_id in entry['network_ids']]
+        try:
+            with self.clients.item() as nova:
+                security_group = self._security_group_name(
+                    nova, entry['security_group_id'], security_groups)
+                server = nova.servers.create(entry['name'],
+                                             entry['image_id'],
+                                             entry['flavor_id'],
+                                             security_groups=[security_group],
+                                             nics=nics)
+        except Exception, e:
+            LOG.exception(_('Failed to boot chain image %s'), entry['id'])
+            self._failed(context, launch_image_id, str(e), created)
+            return
+
+        self.db.update_chain_image(context, entry['id'],
+                                   {'chain_image': {'instance_uuid':
+                                                    server.id}})
+        self.db.update_chain_launch_image(context, launch_image_id,
+                                          instance_uuid=server.id)
+        created.send(True)
+        self.driver.tracker.wait(
+            None, server.id,
+            lambda instance_id, tenant_id, hostname:
+            self._active(launch_image_id, entry, instance_id),
+            lambda reason:
+            self._failed(q_context.get_admin_context(), launch_image_id,
+                         reason))
+
+    def _active(self, launch_image_id, entry, instance_id):
+        context = q_context.get_admin_context()
+        self.db.update_chain_image(context, entry['id'],
+                                   {'chain_image': {'instance_id':
+                                                    instance_id}})
+        self.db.update_chain_launch_image(context, launch_image_id,
+                                          status=constants.ACTIVE)
+        for config_handle_id in entry['config_handle_ids']:
+            self.driver.notify_config(config_handle_id)
+
+    def _failed(self, context, launch_image_id, reason, created=None):
+        LOG.error(_('Chain launch image %(id)s failed: %(reason)s'),
+                  {'id': launch_image_id, 'reason': reason})
+        self.db.update_chain_launch_image(context, launch_image_id,
+                                          status=constants.ERROR,
+                                          error=reason[:255])
+        if created is not None:
+            created.send(False)
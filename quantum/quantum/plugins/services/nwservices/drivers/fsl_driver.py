@@ -24,10 +24,12 @@ from quantum.openstack.common.rpc import dispatcher
 from quantum.db.nwservices import nwservices_db
 from quantum.db import models_v2
 from novaclient.v1_1 import client as nova_client
-from keystoneclient.v2_0 import client as keystone_client
 from quantum.common import exceptions as q_exc
 from quantum.openstack.common import cfg
-import time
+from quantum.plugins.services.nwservices import client_pool
+from quantum.plugins.services.nwservices.drivers import autoscaler
+from quantum.plugins.services.nwservices.drivers import chain_launcher
+from quantum.plugins.services.nwservices.drivers import instance_tracker
 
 
 LOG = logging.getLogger(__name__)
@@ -49,7 +51,24 @@ class NwservicesDriver(proxy.RpcProxy):
         super(NwservicesDriver,self).__init__(topic=topic,default_version=self.BASE_RPC_API_VERSION)
         self.context = q_context.Context('quantum', 'quantum',
                                                    is_admin=False)
+        self.db = nwservices_db.NwservicePluginDb()
+        self.tracker = instance_tracker.InstanceReadinessTracker(
+            novaclient_pool(),
+            poll_interval=cfg.CONF.NWSDRIVER.instance_poll_interval,
+            max_poll_interval=cfg.CONF.NWSDRIVER.instance_max_poll_interval,
+            timeout=cfg.CONF.NWSDRIVER.instance_active_timeout,
+            cache_ttl=cfg.CONF.NWSDRIVER.instance_cache_ttl)
+        self.autoscaler = autoscaler.Autoscaler(
+            self, novaclient_pool(),
+            interval=cfg.CONF.NWSDRIVER.scaling_interval,
+            window=cfg.CONF.NWSDRIVER.scaling_window,
+            retention=cfg.CONF.NWSDRIVER.stats_retention)
+        self.launcher = chain_launcher.ChainLauncher(
+            self, novaclient_pool(),
+            pool_size=cfg.CONF.NWSDRIVER.launch_pool_size)
         self.setup_rpc()
+        if cfg.CONF.NWSDRIVER.scaling_interval:
+            self.autoscaler.start()
 
 
     def setup_rpc(self):
@@ -62,10 +81,7 @@ class NwservicesDriver(proxy.RpcProxy):
         # Consume from all consumers in a thread
         self.conn.consume_in_thread()
         
-    def get_instance_details(self,config_handle_id,timeout=300):
-        LOG.debug('In get_instance_details config_id = %s****************** sairam ************\n\n' % config_handle_id)
-        self.db = nwservices_db.NwservicePluginDb()
-        
+    def _get_chain_image(self,config_handle_id):
         try:
             chain_image_confs = self.db.get_chain_image_confs(self.context, filters = dict(config_handle_id=[config_handle_id]))[0]
         except IndexError:
@@ -74,43 +90,22 @@ class NwservicesDriver(proxy.RpcProxy):
         chain_map_id=chain_image_confs['chain_map_id']
         
         chain_image = self.db.get_chain_image(self.context, chain_map_id)
-        instance_uuid=chain_image['instance_uuid']
-        if instance_uuid == '':
+        if not chain_image['instance_uuid']:
             raise q_exc.InstanceNotFound(config_handle_id=config_handle_id)
-        LOG.debug('instance uuid = %s' % chain_image['instance_uuid'])
+        return chain_image
+
+    def _get_instance_uuids(self,config_handle_id):
+        """
+        The instance the chain image was launched as, followed by the
+        ones the autoscaler added.
+        """
+        chain_image = self._get_chain_image(config_handle_id)
+        instance_uuids = [chain_image['instance_uuid']]
+        instance_uuids.extend(self.db.get_chain_image_instances(
+            self.context, chain_image['id']))
+        LOG.debug('instance uuids = %s' % instance_uuids)
+        return instance_uuids
 
-        try:
-            LOG.debug(_("waiting for instance to be active..."))
-            instance_id, tenant_id, hostname = self.wait_for_instance_active(instance_uuid)
-        except q_exc.InstanceErrorState,msg:
-            LOG.error(_(msg))
-            raise q_exc.InstanceNotFound(config_handle_id=config_handle_id)
-        LOG.debug(_('tenant id = %s, instance id = %s hostname=%s'),tenant_id,str(instance_id),hostname)
-        return tenant_id,instance_id,hostname
-
-    def wait_for_instance_active(self,instance_uuid,timeout=300):
-        LOG.debug('Looping for 300 secs')
-        for i in range(0,timeout):
-            time.sleep(1)
-            LOG.debug('After Sleep.')
-            nt = novaclient()
-            LOG.debug('novaclient = %s' % str(nt))
-            try:
-                instance_details = nt.servers.get(instance_uuid)
-            except Exception,msg:
-                LOG.error(msg)
-                raise q_exc.InstanceErrorState(instance_uuid=instance_uuid)
-            LOG.debug(_('VM state = %s'),instance_details.__getattribute__('OS-EXT-STS:vm_state'))
-            LOG.debug('tenant id = %s' % instance_details.__getattribute__('tenant_id'))
-            if instance_details.__getattribute__('OS-EXT-STS:vm_state') == 'active':
-                LOG.debug('vm state is active')
-                instance_id = int(instance_details.__getattribute__('OS-EXT-SRV-ATTR:instance_name').split('instance-')[1],16)
-                tenant_id = instance_details.__getattribute__('tenant_id') 
-                hostname = instance_details.__getattribute__('OS-EXT-SRV-ATTR:host') 
-                return instance_id,tenant_id,hostname
-            elif instance_details.__getattribute__('OS-EXT-STS:vm_state') == 'error':
-                raise q_exc.InstanceErrorState(instance_id=instance_uuid)
-        
     def prepare_msg(self,instance_id,tenant_id,msg):
         m = self.make_msg('config_update',
                       instance_id=instance_id,
@@ -122,14 +117,61 @@ class NwservicesDriver(proxy.RpcProxy):
     def _get_relay_topic_name(self,hostname):
         return '%s.%s' % (topics.RELAY_AGENT,hostname)
 
+    def _cast_to_relay(self,instance_id,tenant_id,hostname,msg):
+        LOG.debug(_('sending cast to machine %s\n\n'),self._get_relay_topic_name(hostname))
+        self.cast(self.rpc_context,self.prepare_msg(instance_id,tenant_id,msg),topic=self._get_relay_topic_name(hostname))
+
     def send_cast(self,logical_id,msg):
-        LOG.debug('In send_cast ****************** sairam ************\n\n')
+        """
+        Sends msg to the relay agents hosting the service VMs of logical_id.
+        Returns at once, the cast is queued until a VM is active.
+
+        When the chain image was scaled out, a config notification tells
+        each VM the [index, count] shard of the pool members it serves.
+        """
         try:
-            tenant_id,instance_id,hostname = self.get_instance_details(logical_id)
-            LOG.debug(_('sending cast to machine %s\n\n'),self._get_relay_topic_name(hostname))
-            self.cast(self.rpc_context,self.prepare_msg(instance_id,tenant_id,msg),topic=self._get_relay_topic_name(hostname))
-        except q_exc.InstanceNotFound,msg:
-            LOG.error(msg)
+            instance_uuids = self._get_instance_uuids(logical_id)
+        except q_exc.InstanceNotFound,e:
+            LOG.error(e)
+            return
+        count = len(instance_uuids)
+        for index, instance_uuid in enumerate(instance_uuids):
+            request = msg
+            if count > 1 and 'config' in msg:
+                request = {'config': dict(msg['config'],
+                                          shard=[index, count])}
+            self._cast_when_active(logical_id, instance_uuid, request)
+
+    def _cast_when_active(self,logical_id,instance_uuid,msg):
+        self.tracker.wait(logical_id, instance_uuid,
+                          lambda instance_id, tenant_id, hostname:
+                          self._cast_to_relay(instance_id, tenant_id,
+                                              hostname, msg))
+
+    def notify_config(self,config_handle_id):
+        """
+        Makes every VM of config_handle_id sync its configuration, after
+        it was launched or the autoscaler changed the number of VMs
+        serving it.
+        """
+        config_handle = self.db.get_config_handle(self.context,
+                                                  config_handle_id)
+        # no version: the VMs sync whatever version they have
+        self.send_cast(config_handle_id,
+                       {'config': {'header': 'request',
+                                   'config_handle_id': config_handle_id,
+                                   'slug': config_handle['slug'],
+                                   'version': ''}})
+
+    def report_stats(self,context,instance_id,host,config_handle_id,stats):
+        """
+        RPC from the relay agents: HAProxy counters of a service VM.
+        """
+        LOG.debug(_('Stats of config handle %(handle)s from instance-%(id)08x '
+                    'on %(host)s'),
+                  {'handle': config_handle_id, 'id': instance_id,
+                   'host': host})
+        self.db.add_stats(self.context, instance_id, config_handle_id, stats)
 
     @classmethod
     def send_rpc_msg(cls,logical_id,msg):
@@ -145,7 +187,6 @@ class NwservicesDriver(proxy.RpcProxy):
     
 def novaclient():
     LOG.debug(cfg.CONF.NWSDRIVER.admin_user)
-    LOG.debug(cfg.CONF.NWSDRIVER.admin_password)
     LOG.debug(cfg.CONF.NWSDRIVER.admin_tenant_name)
     LOG.debug(cfg.CONF.NWSDRIVER.auth_url)
     return  nova_client.Client(cfg.CONF.NWSDRIVER.admin_user,
@@ -154,3 +195,15 @@ def novaclient():
                                auth_url=cfg.CONF.NWSDRIVER.auth_url,
                                service_type="compute")
 
+def _authenticate_novaclient(nc):
+    nc.authenticate()
+    return nc.client.service_catalog.catalog['access']['token'].get('expires')
+
+def novaclient_pool():
+    """Authenticated nova clients shared by everything in this process."""
+    return client_pool.get_pool('nova:%s@%s' % (cfg.CONF.NWSDRIVER.admin_user,
+                                                cfg.CONF.NWSDRIVER.auth_url),
+                                novaclient, _authenticate_novaclient,
+                                max_size=cfg.CONF.NWSDRIVER.client_pool_size,
+                                refresh_margin=cfg.CONF.NWSDRIVER.token_refresh_margin)
+
@@ -0,0 +1,210 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import time
+
+import eventlet
+from novaclient import exceptions as nova_exc
+
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+VM_STATE = 'OS-EXT-STS:vm_state'
+INSTANCE_NAME = 'OS-EXT-SRV-ATTR:instance_name'
+HOST = 'OS-EXT-SRV-ATTR:host'
+
+VM_ACTIVE = 'active'
+VM_FAILED = ('error', 'deleted')
+
+# nova keeps updated_at in its own clock, allow some skew when asking for
+# servers changed since an instance started being watched
+CHANGES_SINCE_SLACK = 60
+
+
+class InstanceReadinessTracker(object):
+    """Tracks service VMs until nova reports them active.
+
+    Instead of one blocking sleep/poll loop per request, all the instances
+    waited for are polled by a single green thread with one detailed server
+    listing per round (limited to servers changed since the oldest pending
+    watch). The poll interval backs off while nothing changes. An instance
+    may have been active, and unchanged, long before it is waited for, so
+    each one is first looked up on its own.
+
+    Once an instance is active its (instance_id, tenant_id, hostname) is
+    cached per instance uuid for cache_ttl seconds, so later config pushes
+    to the same instance are delivered without talking to nova at all.
+    """
+
+    def __init__(self, clients, poll_interval=1, max_poll_interval=10,
+                 timeout=300, cache_ttl=600):
+        # a client_pool.ClientPool of nova clients
+        self.clients = clients
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._poller = None
+        # instance_uuid -> (details, time resolved)
+        self._resolved = {}
+        # instance_uuid -> {'since': ..., 'deadline': ..., 'waiters': [...],
+        #                   'looked_up': ...}
+        self._pending = {}
+
+    def lookup(self, instance_uuid):
+        """Returns cached instance details or None.
+
+        A relaunched chain image gets a new uuid, but a live migrated
+        instance keeps its uuid on another host, so entries expire after
+        cache_ttl seconds. See also forget().
+        """
+        entry = self._resolved.get(instance_uuid)
+        if entry is None:
+            return None
+        details, resolved_at = entry
+        if time.time() - resolved_at >= self.cache_ttl:
+            del self._resolved[instance_uuid]
+            return None
+        return details
+
+    def forget(self, instance_uuid):
+        self._resolved.pop(instance_uuid, None)
+
+    def wait(self, config_handle_id, instance_uuid, callback, errback=None):
+        """Calls callback(instance_id, tenant_id, hostname) once active.
+
+        The callback runs immediately if the instance is already known to
+        be active, otherwise it is queued and this method returns at once.
+        errback(reason) is called instead if the instance fails or times
+        out.
+        """
+        details = self.lookup(instance_uuid)
+        if details:
+            if not self._run_callback(config_handle_id, callback, details):
+                self.forget(instance_uuid)
+            return
+
+        now = time.time()
+        pending = self._pending.setdefault(instance_uuid,
+                                           {'since': now,
+                                            'deadline': now + self.timeout,
+                                            'waiters': [],
+                                            'looked_up': False})
+        pending['waiters'].append((config_handle_id, callback, errback))
+        LOG.debug(_('Queued request for config handle %(handle)s until '
+                    'instance %(uuid)s is active'),
+                  {'handle': config_handle_id, 'uuid': instance_uuid})
+        if self._poller is None:
+            self._poller = eventlet.spawn(self._poll_loop)
+
+    def _poll_loop(self):
+        interval = self.poll_interval
+        try:
+            while self._pending:
+                eventlet.sleep(interval)
+                try:
+                    changed = self._poll_once()
+                except Exception:
+                    LOG.exception(_('Failed to poll instance states'))
+                    changed = False
+                if changed:
+                    interval = self.poll_interval
+                else:
+                    interval = min(interval * 2, self.max_poll_interval)
+        finally:
+            self._poller = None
+
+    def _poll_once(self):
+        since = min(p['since'] for p in self._pending.values())
+        since = timeutils.isotime(datetime.datetime.utcfromtimestamp(
+            since - CHANGES_SINCE_SLACK))
+        with self.clients.item() as client:
+            servers = client.servers.list(
+                detailed=True,
+                search_opts={'all_tenants': 1, 'changes-since': since})
+            servers = dict((server.id, server) for server in servers
+                           if server.id in self._pending)
+            # the listing misses the instances which have not changed
+            # lately, active ones among them
+            for instance_uuid, pending in self._pending.items():
+                if instance_uuid in servers or pending['looked_up']:
+                    continue
+                pending['looked_up'] = True
+                try:
+                    servers[instance_uuid] = client.servers.get(
+                        instance_uuid)
+                except nova_exc.NotFound:
+                    servers[instance_uuid] = None
+
+        changed = False
+        now = time.time()
+        for instance_uuid in self._pending.keys():
+            if instance_uuid in servers and servers[instance_uuid] is None:
+                state = 'deleted'
+            else:
+                server = servers.get(instance_uuid)
+                state = server and getattr(server, VM_STATE, None)
+            if state == VM_ACTIVE:
+                self._resolve(instance_uuid, self._get_details(server))
+                changed = True
+            elif state in VM_FAILED:
+                reason = _('Instance %(uuid)s went to %(state)s '
+                           'state') % {'uuid': instance_uuid, 'state': state}
+                LOG.error(reason)
+                self._drop(instance_uuid, reason)
+                changed = True
+            elif now > self._pending[instance_uuid]['deadline']:
+                reason = _('Instance %(uuid)s is not active after '
+                           '%(timeout)s seconds') % {'uuid': instance_uuid,
+                                                     'timeout': self.timeout}
+                LOG.error(reason)
+                self._drop(instance_uuid, reason)
+        return changed
+
+    def _get_details(self, server):
+        instance_name = getattr(server, INSTANCE_NAME)
+        instance_id = int(instance_name.split('instance-')[1], 16)
+        return instance_id, server.tenant_id, getattr(server, HOST)
+
+    def _resolve(self, instance_uuid, details):
+        pending = self._pending.pop(instance_uuid)
+        LOG.debug(_('Instance %(uuid)s is active: %(details)s'),
+                  {'uuid': instance_uuid, 'details': details})
+        self._resolved[instance_uuid] = (details, time.time())
+        for config_handle_id, callback, errback in pending['waiters']:
+            if not self._run_callback(config_handle_id, callback, details):
+                # the instance may have moved, look it up again next time
+                self.forget(instance_uuid)
+
+    def _drop(self, instance_uuid, reason):
+        pending = self._pending.pop(instance_uuid)
+        for config_handle_id, callback, errback in pending['waiters']:
+            LOG.error(_('Dropping queued request for config handle %s'),
+                      config_handle_id)
+            if errback:
+                self._run_callback(config_handle_id, errback, (reason,))
+
+    def _run_callback(self, config_handle_id, callback, details):
+        """Returns whether the callback succeeded"""
+        try:
+            callback(*details)
+        except Exception:
+            LOG.exception(_('Failed to deliver request for config handle %s'),
+                          config_handle_id)
+            return False
+        return True
@@ -32,6 +32,13 @@ class NwservicesPlugin(NwservicesPluginBase):
     DB related work is implemented in class NwservicesPluginDb
     """
     supported_extension_aliases = ["fns"]
+    # The collections are sorted and paginated in the database (see
+    # QuantumDbPluginV2._get_collection)
+    __native_pagination_support = True
+    __native_sorting_support = True
+    # The images of a chain with their networks and configs are created
+    # in one transaction (see QuantumDbPluginV2._create_bulk)
+    __native_bulk_support = True
 
     def __init__(self):
         self.scheduler = scheduler.BalancerScheduler()
@@ -75,9 +82,12 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get networkfunction %s'), networkfunction_id)
         return self.db.get_networkfunction(context, networkfunction_id, fields)
 
-    def get_networkfunctions(self, context, filters=None, fields=None):
+    def get_networkfunctions(self, context, filters=None, fields=None,
+                             sorts=None, limit=None, marker=None,
+                             page_reverse=False):
         LOG.debug(_('Get networkfunctions'))
-        return self.db.get_networkfunctions(context, filters, fields)
+        return self.db.get_networkfunctions(context, filters, fields,
+                                            sorts, limit, marker, page_reverse)
         
     def create_category(self, context, category):
         v = self.db.create_category(context, category)
@@ -97,9 +107,11 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get category %s'), category_id)
         return self.db.get_category(context, category_id, fields)
 
-    def get_categories(self, context, filters=None, fields=None):
+    def get_categories(self, context, filters=None, fields=None, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get categories'))
-        return self.db.get_categories(context, filters, fields)
+        return self.db.get_categories(context, filters, fields,
+                                      sorts, limit, marker, page_reverse)
     
     def create_category_networkfunction(self, context, category_networkfunction):
         v = self.db.create_category_networkfunction(context, category_networkfunction)
@@ -119,9 +131,13 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get category_networkfunction %s'), category_networkfunction_id)
         return self.db.get_category_networkfunction(context, category_networkfunction_id, fields)
 
-    def get_category_networkfunctions(self, context, filters=None, fields=None):
+    def get_category_networkfunctions(self, context, filters=None, fields=None,
+                                      sorts=None, limit=None, marker=None,
+                                      page_reverse=False):
         LOG.debug(_('Get category_networkfunctions'))
-        return self.db.get_category_networkfunctions(context, filters, fields)
+        return self.db.get_category_networkfunctions(context, filters, fields,
+                                                     sorts, limit, marker,
+                                                     page_reverse)
         
         
     def create_vendor(self, context, vendor):
@@ -142,9 +158,11 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get vendor %s'), vendor_id)
         return self.db.get_vendor(context, vendor_id, fields)
 
-    def get_vendors(self, context, filters=None, fields=None):
+    def get_vendors(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get vendors'))
-        return self.db.get_vendors(context, filters, fields)
+        return self.db.get_vendors(context, filters, fields,
+                                   sorts, limit, marker, page_reverse)
         
     def create_image(self, context, image):
         v = self.db.create_image(context, image)
@@ -164,9 +182,11 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get image %s'), image_id)
         return self.db.get_image(context, image_id, fields)
 
-    def get_images(self, context, filters=None, fields=None):
+    def get_images(self, context, filters=None, fields=None, sorts=None,
+                   limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get images'))
-        return self.db.get_images(context, filters, fields)
+        return self.db.get_images(context, filters, fields,
+                                  sorts, limit, marker, page_reverse)
         
     def create_metadata(self, context, metadata):
         v = self.db.create_metadata(context, metadata)
@@ -186,9 +206,11 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get metadata %s'), metadata_id)
         return self.db.get_metadata(context, metadata_id, fields)
 
-    def get_metadatas(self, context, filters=None, fields=None):
+    def get_metadatas(self, context, filters=None, fields=None, sorts=None,
+                      limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get metadatas'))
-        return self.db.get_metadatas(context, filters, fields)
+        return self.db.get_metadatas(context, filters, fields,
+                                     sorts, limit, marker, page_reverse)
         
     def create_personality(self, context, personality):
         v = self.db.create_personality(context, personality)
@@ -208,9 +230,11 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get personality %s'), personality_id)
         return self.db.get_personality(context, personality_id, fields)
 
-    def get_personalities(self, context, filters=None, fields=None):
+    def get_personalities(self, context, filters=None, fields=None, sorts=None,
+                          limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get personalities'))
-        return self.db.get_personalities(context, filters, fields)
+        return self.db.get_personalities(context, filters, fields,
+                                         sorts, limit, marker, page_reverse)
         
     def create_chain(self, context, chain):
         v = self.db.create_chain(context, chain)
@@ -230,15 +254,20 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get chain %s'), chain_id)
         return self.db.get_chain(context, chain_id, fields)
 
-    def get_chains(self, context, filters=None, fields=None):
+    def get_chains(self, context, filters=None, fields=None, sorts=None,
+                   limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get chains'))
-        return self.db.get_chains(context, filters, fields)
+        return self.db.get_chains(context, filters, fields,
+                                  sorts, limit, marker, page_reverse)
         
     def create_chain_image(self, context, chain_image):
         v = self.db.create_chain_image(context, chain_image)
         ###TODO::Network Service DRVIER TO HANDLE
         return v
 
+    def create_chain_image_bulk(self, context, chain_images):
+        return self.db._create_bulk('chain_image', context, chain_images)
+
     def update_chain_image(self, context, chain_image_id, chain_image):
         LOG.debug(_('Update chain_image %s'), chain_image_id)
         v_new = self.db.update_chain_image(context, chain_image_id, chain_image)
@@ -252,15 +281,21 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get chain_image %s'), chain_image_id)
         return self.db.get_chain_image(context, chain_image_id, fields)
 
-    def get_chain_images(self, context, filters=None, fields=None):
+    def get_chain_images(self, context, filters=None, fields=None, sorts=None,
+                         limit=None, marker=None, page_reverse=False):
         LOG.debug(_('Get chain_images'))
-        return self.db.get_chain_images(context, filters, fields)
+        return self.db.get_chain_images(context, filters, fields,
+                                        sorts, limit, marker, page_reverse)
         
     def create_chain_image_network(self, context, chain_image_network):
         v = self.db.create_chain_image_network(context, chain_image_network)
         ###TODO::Network Service DRVIER TO HANDLE
         return v
 
+    def create_chain_image_network_bulk(self, context, chain_image_networks):
+        return self.db._create_bulk('chain_image_network', context,
+                                    chain_image_networks)
+
     def update_chain_image_network(self, context, chain_image_network_id, chain_image_network):
         LOG.debug(_('Update chain_image_network %s'), chain_image_network_id)
         v_new = self.db.update_chain_image_network(context, chain_image_network_id, chain_image_network)
@@ -274,15 +309,23 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get chain_image_network %s'), chain_image_network_id)
         return self.db.get_chain_image_network(context, chain_image_network_id, fields)
 
-    def get_chain_image_networks(self, context, filters=None, fields=None):
+    def get_chain_image_networks(self, context, filters=None, fields=None,
+                                 sorts=None, limit=None, marker=None,
+                                 page_reverse=False):
         LOG.debug(_('Get chain_image_networks'))
-        return self.db.get_chain_image_networks(context, filters, fields)
+        return self.db.get_chain_image_networks(context, filters, fields,
+                                                sorts, limit, marker,
+                                                page_reverse)
         
     def create_chain_image_conf(self, context, chain_image_conf):
         v = self.db.create_chain_image_conf(context, chain_image_conf)
         ###TODO::Network Service DRVIER TO HANDLE
         return v
 
+    def create_chain_image_conf_bulk(self, context, chain_image_confs):
+        return self.db._create_bulk('chain_image_conf', context,
+                                    chain_image_confs)
+
     def update_chain_image_conf(self, context, chain_image_conf_id, chain_image_conf):
         LOG.debug(_('Update chain_image_conf %s'), chain_image_conf_id)
         v_new = self.db.update_chain_image_conf(context, chain_image_conf_id, chain_image_conf)
@@ -296,9 +339,13 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get chain_image_conf %s'), chain_image_conf_id)
         return self.db.get_chain_image_conf(context, chain_image_conf_id, fields)
 
-    def get_chain_image_confs(self, context, filters=None, fields=None):
+    def get_chain_image_confs(self, context, filters=None, fields=None,
+                              sorts=None, limit=None, marker=None,
+                              page_reverse=False):
         LOG.debug(_('Get chain_image_confs'))
-        return self.db.get_chain_image_confs(context, filters, fields)
+        return self.db.get_chain_image_confs(context, filters, fields,
+                                             sorts, limit, marker,
+                                             page_reverse)
         
     def create_config_handle(self, context, config_handle):
         v = self.db.create_config_handle(context, config_handle)
@@ -318,10 +365,57 @@ class NwservicesPlugin(NwservicesPluginBase):
         LOG.debug(_('Get config_handle %s'), config_handle_id)
         return self.db.get_config_handle(context, config_handle_id, fields)
 
-    def get_config_handles(self, context, filters=None, fields=None):
+    def get_config_handles(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         LOG.debug(_('Get config_handles'))
-        return self.db.get_config_handles(context, filters, fields)
+        return self.db.get_config_handles(context, filters, fields,
+                                          sorts, limit, marker, page_reverse)
         
+    def create_scaling_policy(self, context, scaling_policy):
+        return self.db.create_scaling_policy(context, scaling_policy)
+
+    def update_scaling_policy(self, context, scaling_policy_id,
+                              scaling_policy):
+        LOG.debug(_('Update scaling_policy %s'), scaling_policy_id)
+        return self.db.update_scaling_policy(context, scaling_policy_id,
+                                             scaling_policy)
+
+    def delete_scaling_policy(self, context, scaling_policy_id):
+        LOG.debug(_('Delete scaling_policy %s'), scaling_policy_id)
+        self.db.delete_scaling_policy(context, scaling_policy_id)
+
+    def get_scaling_policy(self, context, scaling_policy_id, fields=None):
+        LOG.debug(_('Get scaling_policy %s'), scaling_policy_id)
+        return self.db.get_scaling_policy(context, scaling_policy_id, fields)
+
+    def get_scaling_policies(self, context, filters=None, fields=None,
+                             sorts=None, limit=None, marker=None,
+                             page_reverse=False):
+        LOG.debug(_('Get scaling_policies'))
+        return self.db.get_scaling_policies(context, filters, fields,
+                                            sorts, limit, marker, page_reverse)
+
+    def launch(self, context, chain_id, body=None):
+        LOG.debug(_('Launch chain %s'), chain_id)
+        return {'chain_launch': self.driver.launcher.launch(context,
+                                                            chain_id)}
+
+    def topology(self, context, chain_id, body=None):
+        LOG.debug(_('Get topology of chain %s'), chain_id)
+        return {'topology': self.db.get_chain_topology(context, chain_id)}
+
+    def get_chain_launch(self, context, chain_launch_id, fields=None):
+        LOG.debug(_('Get chain_launch %s'), chain_launch_id)
+        return self.db.get_chain_launch(context, chain_launch_id, fields)
+
+    def get_chain_launches(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
+        LOG.debug(_('Get chain_launches'))
+        return self.db.get_chain_launches(context, filters, fields,
+                                          sorts, limit, marker, page_reverse)
+
     def get_launch(self, context, config_handle_id, fields=None):
         LOG.debug(_('Launch Configuration'))
         conf = self.db.get_config_handle(context, config_handle_id, fields)
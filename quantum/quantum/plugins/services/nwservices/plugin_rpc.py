@@ -55,6 +55,14 @@ class LoadbalancerPluginCallbacks(plugin_api.LoadbalancerPluginAPI):
             device['status'] = STATUSES[status]
             self.scheduler.update_device(context, device)
 
+    def report_device_load(self, context, device_id, host, connections,
+                           cpu_load):
+        LOG.debug(_('Device %(id)s on %(host)s: %(conn)s connections, '
+                    '%(cpu)s%% cpu'), {'id': device_id, 'host': host,
+                                       'conn': connections, 'cpu': cpu_load})
+        self.scheduler.report_device_load(context, device_id, host,
+                                          connections, cpu_load)
+
     def confirm(self, context, model, obj_id, status, message):
         LOG.debug(_('Confirm status %(status)s for %(model)s:%(id)s '),
                   {'status': status, 'model': model, 'id': obj_id})
@@ -13,7 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import sqlalchemy as sa
+from sqlalchemy.engine import reflection
 from sqlalchemy import types
 from sqlalchemy.orm import exc as orm_exc
 from sqlalchemy.types import TypeDecorator
@@ -27,13 +30,10 @@ from quantum.openstack.common import jsonutils
 from quantum.openstack.common import uuidutils
 from quantum.plugins.common import constants
 from quantum.openstack.common import cfg
+from quantum.plugins.services.nwservices.scheduler import policies
 
 LOG = logging.getLogger(__name__)
 
-# No of resources per balancer device
-# hardcoded for now
-RESOURCE_LIMIT = 10
-
 
 class BalancerDeviceNotFound(q_exc.QuantumException):
     message = _("Loadbalancer Device was not found")
@@ -81,7 +81,11 @@ class JsonType(TypeDecorator):
 class BalancerDevice(model_base.BASEV2, models_v2.HasId,
                      models_v2.HasTenant):
     """ Represents loadbalancing device
+        host, connections and cpu_load (percent) are reported by the
+        service VM and weigh in scheduling
     """
+    __table_args__ = (sa.Index('balancerdevices_scheduling', 'tenant_id',
+                               'subnet_id', 'type', 'status'),)
     name = sa.Column(sa.String(36), nullable=False)
     type = sa.Column(sa.String(36), nullable=False)
     version = sa.Column(sa.String(36), nullable=False)
@@ -90,37 +94,70 @@ class BalancerDevice(model_base.BASEV2, models_v2.HasId,
     subnet_id = sa.Column(sa.String(36), default="")
     status = sa.Column(sa.String(36), nullable=False,
                        default=constants.PENDING_CREATE)
+    host = sa.Column(sa.String(255), default="")
+    connections = sa.Column(sa.Integer, default=0)
+    cpu_load = sa.Column(sa.Integer, default=0)
+
+
+def _add_load_columns(engine):
+    """Adds host, connections and cpu_load, with the scheduling index,
+    to a database created without them. The existing devices get the
+    defaults, as if they had reported no load yet."""
+    inspector = reflection.Inspector.from_engine(engine)
+    devices = BalancerDevice.__table__
+    if devices.name not in inspector.get_table_names():
+        return
+    columns = [column['name'] for column in
+               inspector.get_columns(devices.name)]
+    for column in (devices.c.host, devices.c.connections,
+                   devices.c.cpu_load):
+        if column.name not in columns:
+            LOG.info(_("Adding %s to the balancer devices"), column.name)
+            engine.execute('ALTER TABLE %s ADD COLUMN %s %s' %
+                           (devices.name, column.name,
+                            column.type.compile(dialect=engine.dialect)))
+            engine.execute(devices.update().where(column.is_(None)).values(
+                {column.name: column.default.arg}))
+    indexes = [index['name'] for index in
+               inspector.get_indexes(devices.name)]
+    for index in devices.indexes:
+        if index.name not in indexes:
+            index.create(engine)
+
+
+db.register_upgrade(_add_load_columns)
+
+
+class DeviceIndex(object):
+    """ Ids of the devices by (tenant_id, subnet_id, type, status)
+        Entries are loaded from the database on first use and dropped
+        when this process changes a device of the key or when they are
+        older than device_index_ttl, other API workers change devices
+        too. Selection locks and re-checks the rows, so a stale entry
+        costs a reload, never an oversubscribed device.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # key -> (load time, device ids)
+        self._entries = {}
 
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
 
-class SchedulingAlgorithm():
-    """ Algorithm which chooses appropriate device for the tenant/network
-        which has less associated resources with it
-    """
-    def __call__(self, resource, devices, device_type=None):
-        # assuming resource and devices has tenant_id in it
-        if len(devices) == 0:
-            raise NoValidDevice()
+    def put(self, key, device_ids):
+        self._entries[key] = (time.time(), set(device_ids))
 
-        # find running device of needed type
-        filtered = [device for device in devices
-                    if device["status"] == constants.ACTIVE and
-                    (device_type is None or device_type == device["type"])]
-        # filter by tenant_id and subnet_id
-        # if they're present in resource
-        # also find only those devices which doesn't exceed
-        # the limit of already associatied resources
-        filtered = [device for device in filtered if
-                    ((device["tenant_id"] == resource["tenant_id"] and
-                      (device["subnet_id"] ==
-                       resource.get('subnet_id', device['subnet_id'])))) and
-                    device["ref_counter"] < RESOURCE_LIMIT]
-        if not filtered:
-            raise NoValidDevice()
-        # select device with minimum associated resources
-        device = min(filtered, key=lambda x: x["ref_counter"])
-        LOG.debug(_("Found device %(dev)s for resource %(res)s"),
-                  {"dev": device, "res": resource})
-        return device
+    def invalidate(self, *keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+def _index_key(device):
+    return (device["tenant_id"], device["subnet_id"], device["type"],
+            device["status"])
 
 
 class BalancerDeviceManager(object):
@@ -129,17 +166,21 @@ class BalancerDeviceManager(object):
     """
     def __init__(self):
         self._initialize_db()
+        self.index = DeviceIndex(cfg.CONF.NWSDRIVER.device_index_ttl)
 
     def _apply_add_policy(self, context, device, resource):
         # perform common steps
+        old_key = _index_key(device)
         device.ref_counter = device.ref_counter + 1
         device.tenant_id = resource["tenant_id"]
         device.subnet_id = resource["subnet_id"]
+        self.index.invalidate(old_key, _index_key(device))
 
     def _apply_del_policy(self, context, device):
         # perform common steps
         device.ref_counter = device.ref_counter - 1
         if device.ref_counter == 0:
+            self.index.invalidate(_index_key(device))
             device.status = constants.PENDING_DELETE
 
     def _initialize_db(self):
@@ -164,6 +205,7 @@ class BalancerDeviceManager(object):
                                  subnet_id=dev_info["subnet_id"],
                                  status=dev_info["status"])
             context.session.add(dev)
+            self.index.invalidate(_index_key(dev))
             return dev
 
     def update_device(self, context, device):
@@ -177,14 +219,29 @@ class BalancerDeviceManager(object):
         with context.session.begin(subtransactions=True):
             dev = (context.session.query(BalancerDevice).
                    filter_by(id=device["id"]).one())
+            old_key = _index_key(dev)
             dev.update({"management": device["management"],
                         "status": device["status"]})
+            self.index.invalidate(old_key, _index_key(dev))
+
+    def report_load(self, context, device_id, host, connections, cpu_load):
+        """ Stores the load reported by the agent of a service VM
+            The host is kept when the agent does not know it
+        """
+        values = {"connections": connections, "cpu_load": cpu_load}
+        if host:
+            values["host"] = host
+        with context.session.begin(subtransactions=True):
+            (context.session.query(BalancerDevice).
+             filter_by(id=device_id).
+             update(values))
 
     def delete_device(self, context, device):
         LOG.debug(_("Deleting device: %s"), device)
         with context.session.begin(subtransactions=True):
             dev = (context.session.query(BalancerDevice).
                    filter_by(id=device["id"]))
+            self.index.invalidate(*[_index_key(d) for d in dev])
             dev.delete()
 
     def get_device_list(self, context):
@@ -192,6 +249,55 @@ class BalancerDeviceManager(object):
         with context.session.begin(subtransactions=True):
             return context.session.query(BalancerDevice).all()
 
+    def _get_candidate_ids(self, context, key, reload=False):
+        device_ids = None
+        if not reload:
+            device_ids = self.index.get(key)
+        if device_ids is None:
+            tenant_id, subnet_id, device_type, status = key
+            query = (context.session.query(BalancerDevice.id).
+                     filter(BalancerDevice.tenant_id == tenant_id).
+                     filter(BalancerDevice.subnet_id == subnet_id).
+                     filter(BalancerDevice.status == status))
+            if device_type is not None:
+                query = query.filter(BalancerDevice.type == device_type)
+            device_ids = [row.id for row in query]
+            self.index.put(key, device_ids)
+        return device_ids
+
+    def schedule(self, context, resource, policy, device_type=None):
+        """ Associates the resource with a device chosen by policy
+            among the active devices of its tenant and subnet that have
+            capacity left. The candidates are locked (SELECT ... FOR
+            UPDATE) until the association is committed, so concurrent
+            API workers cannot oversubscribe a device.
+        """
+        key = (resource["tenant_id"], resource["subnet_id"], device_type,
+               constants.ACTIVE)
+        with context.session.begin(subtransactions=True):
+            for reload in (False, True):
+                device_ids = self._get_candidate_ids(context, key, reload)
+                if not device_ids:
+                    continue
+                devices = (context.session.query(BalancerDevice).
+                           filter(BalancerDevice.id.in_(device_ids)).
+                           filter(BalancerDevice.status == constants.ACTIVE).
+                           filter(BalancerDevice.ref_counter <
+                                  cfg.CONF.NWSDRIVER.max_resources_per_device).
+                           with_lockmode('update').all())
+                devices = [device for device in devices
+                           if policies.load(device) < 1]
+                if devices:
+                    break
+            else:
+                raise NoValidDevice()
+            device = policy(resource, devices)
+            context.session.add(
+                ResourceAssociation(resource_id=resource["id"],
+                                    device_id=device["id"]))
+            self._apply_add_policy(context, device, resource)
+            return device
+
     def _get_resource_association(self, context, resource):
         with context.session.begin(subtransactions=True):
             try:
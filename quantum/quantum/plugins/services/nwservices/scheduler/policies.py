@@ -0,0 +1,103 @@
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Device selection policies of the service VM scheduler.
+
+A policy picks one of the candidate devices, all of which have capacity
+left, for a new resource. Policies are selected with the scheduler_policy
+option of [NWSDRIVER], either by one of the names in POLICIES or by the
+class path of a SchedulingPolicy subclass.
+"""
+
+from quantum.common import exceptions as q_exc
+from quantum.openstack.common import cfg
+from quantum.openstack.common import importutils
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def load(device):
+    """Load of a device between 0 (idle) and 1 (full).
+
+    The highest of the resource count, the connection count and the CPU
+    load reported by the service VM, each relative to its limit.
+    """
+    loads = [float(device['ref_counter'] or 0) /
+             cfg.CONF.NWSDRIVER.max_resources_per_device,
+             float(device['cpu_load'] or 0) / 100]
+    if cfg.CONF.NWSDRIVER.max_connections_per_device:
+        loads.append(float(device['connections'] or 0) /
+                     cfg.CONF.NWSDRIVER.max_connections_per_device)
+    return max(loads)
+
+
+class SchedulingPolicy(object):
+    """Chooses the device with the lowest weight."""
+
+    def weigh(self, device, devices):
+        raise NotImplementedError()
+
+    def __call__(self, resource, devices):
+        device = min(devices, key=lambda d: (self.weigh(d, devices), d['id']))
+        LOG.debug(_("%(policy)s chose device %(dev)s for resource %(res)s"),
+                  {'policy': self.__class__.__name__, 'dev': device['id'],
+                   'res': resource['id']})
+        return device
+
+
+class LeastLoaded(SchedulingPolicy):
+    """Spreads resources evenly over the devices."""
+
+    def weigh(self, device, devices):
+        return load(device)
+
+
+class BinPack(SchedulingPolicy):
+    """Fills the busiest device first so idle devices can be released."""
+
+    def weigh(self, device, devices):
+        return -load(device)
+
+
+class Spread(SchedulingPolicy):
+    """Prefers devices on the compute hosts hosting the fewest resources
+    of the candidates, then the least loaded device. A device whose host
+    is not reported yet counts as alone on its host.
+    """
+
+    def weigh(self, device, devices):
+        if not device['host']:
+            return (device['ref_counter'] or 0, load(device))
+        host_resources = sum(d['ref_counter'] or 0 for d in devices
+                             if d['host'] == device['host'])
+        return (host_resources, load(device))
+
+
+POLICIES = {
+    'least_loaded': LeastLoaded,
+    'bin_pack': BinPack,
+    'spread': Spread,
+}
+
+
+def get_policy(name=None):
+    name = name or cfg.CONF.NWSDRIVER.scheduler_policy
+    if name in POLICIES:
+        return POLICIES[name]()
+    try:
+        return importutils.import_object(name)
+    except ImportError:
+        raise q_exc.ClassNotFound(class_name=name)
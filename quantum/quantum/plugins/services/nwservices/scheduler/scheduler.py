@@ -16,12 +16,11 @@
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import uuidutils
 from quantum.plugins.common import constants
-from quantum.plugins.services.loadbalancer.\
+from quantum.plugins.services.nwservices.\
     scheduler.device_manager import BalancerDeviceManager
-from quantum.plugins.services.loadbalancer.\
+from quantum.plugins.services.nwservices.\
     scheduler.device_manager import NoValidDevice
-from quantum.plugins.services.loadbalancer.\
-    scheduler.device_manager import SchedulingAlgorithm
+from quantum.plugins.services.nwservices.scheduler import policies
 
 
 LOG = logging.getLogger(__name__)
@@ -36,7 +35,7 @@ class BalancerScheduler(object):
 
     def __init__(self):
         self.dev_manager = BalancerDeviceManager()
-        self.algorithm = SchedulingAlgorithm()
+        self.policy = policies.get_policy()
 
     def _get_default_device(self, resource):
         # no management since it's unknown at the moment
@@ -57,9 +56,9 @@ class BalancerScheduler(object):
 
     def add_resource_association(self, context, resource):
         LOG.debug(_("Going to schedule resource %s"), resource)
-        devices = self.dev_manager.get_device_list(context)
         try:
-            device = self.algorithm(resource, devices)
+            return self.dev_manager.schedule(context, resource, self.policy,
+                                             HAPROXY)
         except NoValidDevice, e:
             LOG.info(_("No valid device was found, "
                        "creating haproxy vm device"))
@@ -80,3 +79,8 @@ class BalancerScheduler(object):
 
     def delete_device(self, context, device):
         self.dev_manager.delete_device(context, device)
+
+    def report_device_load(self, context, device_id, host, connections,
+                           cpu_load):
+        self.dev_manager.report_load(context, device_id, host, connections,
+                                     cpu_load)
@@ -30,6 +30,10 @@ from quantum.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# predicates compiled from the rules of _COMPILED_BRAIN, by match list
+_COMPILED = {}
+_COMPILED_RULES = {}
+_COMPILED_BRAIN = None
 
 
 def reset():
@@ -37,6 +41,7 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _reset_compiled(None)
     policy.reset()
 
 
@@ -74,11 +79,13 @@ def _is_attribute_explicitly_set(attribute_name, resource, target):
     return False
 
 
-def _build_target(action, original_target, plugin, context):
+def _build_target(action, original_target, plugin, context,
+                  parent_tenants=None):
     """Augment dictionary of target attributes for policy engine.
 
     This routine adds to the dictionary attributes belonging to the
-    "parent" resource of the targeted one.
+    "parent" resource of the targeted one. parent_tenants are the tenants
+    of parent resources already known, by id.
     """
     target = original_target.copy()
     resource, _a = get_resource_and_action(action)
@@ -86,15 +93,37 @@ def _build_target(action, original_target, plugin, context):
     if hierarchy_info and plugin:
         # use the 'singular' version of the resource name
         parent_resource = hierarchy_info['parent'][:-1]
-        parent_id = hierarchy_info['identified_by']
-        f = getattr(plugin, 'get_%s' % parent_resource)
-        # f *must* exist, if not found it is better to let quantum explode
-        # Note: we do not use admin context
-        data = f(context, target[parent_id], fields=['tenant_id'])
-        target['%s_tenant_id' % parent_resource] = data['tenant_id']
+        parent_id = target[hierarchy_info['identified_by']]
+        if parent_tenants and parent_id in parent_tenants:
+            tenant_id = parent_tenants[parent_id]
+        else:
+            f = getattr(plugin, 'get_%s' % parent_resource)
+            # f *must* exist, if not found it is better to let quantum
+            # explode
+            # Note: we do not use admin context
+            tenant_id = f(context, parent_id, fields=['tenant_id'])[
+                'tenant_id']
+        target['%s_tenant_id' % parent_resource] = tenant_id
     return target
 
 
+def _get_parent_tenants(action, targets, plugin, context):
+    """Returns the tenants of the parent resources of targets by id,
+    read with one call to the plugin"""
+    resource, _a = get_resource_and_action(action)
+    hierarchy_info = attributes.RESOURCE_HIERARCHY_MAP.get(resource, None)
+    if not hierarchy_info or not plugin or not targets:
+        return {}
+    parent_ids = set(target[hierarchy_info['identified_by']]
+                     for target in targets)
+    f = getattr(plugin, 'get_%s' % hierarchy_info['parent'])
+    # Note: we do not use admin context, the parents not visible in this
+    # context are looked up one by one as check does
+    parents = f(context, filters={'id': list(parent_ids)},
+                fields=['id', 'tenant_id'])
+    return dict((parent['id'], parent['tenant_id']) for parent in parents)
+
+
 def _build_match_list(action, target):
     """Create the list of rules to match for a given action.
 
@@ -151,6 +180,115 @@ def check_field(brain, match_kind, match, target_dict, cred_dict):
     return True
 
 
+def _reset_compiled(brain):
+    global _COMPILED
+    global _COMPILED_RULES
+    global _COMPILED_BRAIN
+    _COMPILED = {}
+    _COMPILED_RULES = {}
+    _COMPILED_BRAIN = brain
+
+
+def _compile_rule(brain, name):
+    if name not in _COMPILED_RULES:
+        if name in brain.rules:
+            match_list = brain.rules[name]
+        elif brain.default_rule and name != brain.default_rule:
+            match_list = ('rule:%s' % brain.default_rule,)
+        else:
+            _COMPILED_RULES[name] = lambda target, cred, roles: False
+            return _COMPILED_RULES[name]
+        # the rules referring to themselves can't be evaluated anyway
+        _COMPILED_RULES[name] = None
+        _COMPILED_RULES[name] = _compile_match_list(brain, match_list)
+    return _COMPILED_RULES[name]
+
+
+def _compile_field(match):
+    resource, field_value = match.split(':', 1)
+    field, value = field_value.split('=', 1)
+    # the attribute may come with an extension not loaded, it is only
+    # looked up for a target having it as check_field does
+    converted = []
+
+    def check(target, cred, roles):
+        target_value = target.get(field)
+        if target_value is None:
+            return False
+        if not converted:
+            conv_func = attributes.RESOURCE_ATTRIBUTE_MAP[resource][
+                field].get('convert_to', lambda x: x)
+            converted.append(conv_func(value))
+        return target_value == converted[0]
+    return check
+
+
+def _compile_check(brain, match):
+    """Returns a predicate(target, cred, roles) doing what the check of
+    match by brain does, roles being the lower case roles of cred"""
+    try:
+        match_kind, match_value = match.split(':', 1)
+    except Exception:
+        LOG.exception(_("Failed to understand rule %r"), match)
+        # If the rule is invalid, fail closed
+        return lambda target, cred, roles: False
+    func = brain._checks.get(match_kind, brain._checks.get(None))
+    if hasattr(brain, '_check_%s' % match_kind) or not func:
+        return lambda target, cred, roles: brain._check(match, target, cred)
+    if func is policy._check_rule:
+        return lambda target, cred, roles: _compile_rule(
+            brain, match_value)(target, cred, roles)
+    if func is policy._check_role:
+        role = match_value.lower()
+        return lambda target, cred, roles: role in roles
+    if func is check_field:
+        return _compile_field(match_value)
+    if func is policy._check_generic:
+        def check_generic(target, cred, roles):
+            value = match_value % target
+            return (match_kind in cred and
+                    value == unicode(cred[match_kind]))
+        return check_generic
+    return lambda target, cred, roles: func(brain, match_kind, match_value,
+                                            target, cred)
+
+
+def _compile_match_list(brain, match_list):
+    if not match_list:
+        return lambda target, cred, roles: True
+    and_lists = []
+    for and_list in match_list:
+        if isinstance(and_list, basestring):
+            and_list = (and_list,)
+        and_lists.append([_compile_check(brain, item) for item in and_list])
+
+    def check_match_list(target, cred, roles):
+        for checks in and_lists:
+            if all(check(target, cred, roles) for check in checks):
+                return True
+        return False
+    return check_match_list
+
+
+def _compiled(match_list):
+    """Returns the predicate of match_list compiled from the current
+    rules, those of the policy file once loaded by init"""
+    if not policy._BRAIN:
+        policy.set_brain(policy.Brain())
+    if policy._BRAIN is not _COMPILED_BRAIN:
+        _reset_compiled(policy._BRAIN)
+    key = tuple(match_list)
+    predicate = _COMPILED.get(key)
+    if predicate is None:
+        predicate = _COMPILED[key] = _compile_match_list(_COMPILED_BRAIN,
+                                                         match_list)
+    return predicate
+
+
+def _roles(credentials):
+    return set(role.lower() for role in credentials['roles'])
+
+
 def check(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -169,7 +307,29 @@ def check(context, action, target, plugin=None):
     real_target = _build_target(action, target, plugin, context)
     match_list = _build_match_list(action, real_target)
     credentials = context.to_dict()
-    return policy.enforce(match_list, real_target, credentials)
+    return _compiled(match_list)(real_target, credentials,
+                                 _roles(credentials))
+
+
+def check_list(context, action, targets, plugin=None):
+    """Returns the targets the action is valid on in this context.
+
+    Checks each target as check does, but the policy file, the credentials
+    and the tenants of the parent resources of the targets are read once
+    for the whole list.
+    """
+    init()
+    parent_tenants = _get_parent_tenants(action, targets, plugin, context)
+    credentials = context.to_dict()
+    roles = _roles(credentials)
+    allowed = []
+    for target in targets:
+        real_target = _build_target(action, target, plugin, context,
+                                    parent_tenants)
+        match_list = _build_match_list(action, real_target)
+        if _compiled(match_list)(real_target, credentials, roles):
+            allowed.append(target)
+    return allowed
 
 
 def enforce(context, action, target, plugin=None):
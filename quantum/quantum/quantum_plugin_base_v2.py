@@ -69,7 +69,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_subnets(self, context, filters=None, fields=None):
+    def get_subnets(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of subnets.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -86,6 +87,13 @@ class QuantumPluginBaseV2(object):
             subnet dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, ascending) tuples to order the
+            subnets on. Only passed to plugins flagging
+            __native_sorting_support.
+        : param limit, marker, page_reverse: at most limit subnets following
+            (preceding if page_reverse) the subnet whose id is marker, in
+            the order of sorts. Only passed to plugins flagging
+            __native_pagination_support, along with sorts.
         """
         pass
 
@@ -156,7 +164,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of networks.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -173,6 +182,13 @@ class QuantumPluginBaseV2(object):
             network dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, ascending) tuples to order the
+            networks on. Only passed to plugins flagging
+            __native_sorting_support.
+        : param limit, marker, page_reverse: at most limit networks following
+            (preceding if page_reverse) the network whose id is marker, in
+            the order of sorts. Only passed to plugins flagging
+            __native_pagination_support, along with sorts.
         """
         pass
 
@@ -243,7 +259,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of ports.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -260,6 +277,13 @@ class QuantumPluginBaseV2(object):
             port dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, ascending) tuples to order the
+            ports on. Only passed to plugins flagging
+            __native_sorting_support.
+        : param limit, marker, page_reverse: at most limit ports following
+            (preceding if page_reverse) the port whose id is marker, in
+            the order of sorts. Only passed to plugins flagging
+            __native_pagination_support, along with sorts.
         """
         pass
 
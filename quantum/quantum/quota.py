@@ -18,7 +18,9 @@
 
 import logging
 
+from quantum.api.v2 import attributes
 from quantum.common import exceptions
+from quantum.db import quota_usages
 from quantum.openstack.common import cfg
 from quantum.openstack.common import importutils
 
@@ -45,6 +47,14 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='quantum.quota.ConfDriver',
                help='default driver to use for quota checks'),
+    cfg.IntOpt('reservation_expire',
+               default=600,
+               help='number of seconds until a quota reservation of a '
+               'create request is released if the request did not'),
+    cfg.IntOpt('quota_usage_max_age',
+               default=3600,
+               help='number of seconds between recounts of the resources '
+               'of a tenant in use, 0 to never recount'),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -258,6 +268,47 @@ class QuotaEngine(object):
         return self._driver.limit_check(context, tenant_id,
                                         self._resources, values)
 
+    def reserve(self, context, tenant_id, resource, delta, *args, **kwargs):
+        """Check that delta more of a resource fit in the quota.
+
+        With a driver keeping the usages of the resource, delta is reserved
+        until the reservations returned are committed or rolled back.
+        Otherwise the resource is counted, the arguments following delta
+        are passed to the count function as for count(), and no
+        reservation is returned.
+
+        This method will raise a QuotaResourceUnknown exception if the
+        resource is unknown, and an OverQuota exception if delta does not
+        fit in its quota.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to be created.
+        """
+
+        res = self._resources.get(resource)
+        if not res or not hasattr(res, 'count'):
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+
+        if (hasattr(self._driver, 'reserve') and
+                quota_usages.is_tracked(resource)):
+            return self._driver.reserve(context, tenant_id, self._resources,
+                                        {resource: delta})
+        count = res.count(context, *args, **kwargs)
+        self.limit_check(context, tenant_id, **{resource: count + delta})
+        return []
+
+    def commit(self, context, reservations):
+        """Release reservations once their resources are created."""
+        if reservations:
+            self._driver.commit(context, reservations)
+
+    def rollback(self, context, reservations):
+        """Release reservations whose resources could not be created."""
+        if reservations:
+            self._driver.rollback(context, reservations)
+
     @property
     def resources(self):
         return self._resources
@@ -269,6 +320,13 @@ QUOTAS = QuotaEngine()
 def _count_resource(context, plugin, resources, tenant_id):
     count_getter_name = "get_%s_count" % resources
 
+    # Service plugins have no count methods, the rows of the resources
+    # they keep in the database are counted there
+    resource = attributes.PLURALS.get(resources)
+    if (not hasattr(plugin, count_getter_name) and
+            quota_usages.is_tracked(resource)):
+        return quota_usages.count(context, resource, tenant_id)
+
     # Some plugins support a count method for particular resources,
     # using a DB's optimized counting features. We try to use that one
     # if present. Otherwise just use regular getter to retrieve all objects
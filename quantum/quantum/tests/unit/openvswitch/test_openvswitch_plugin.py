@@ -13,6 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+
+from quantum.extensions import l3
 from quantum.tests.unit import test_db_plugin as test_plugin
 
 
@@ -42,4 +45,24 @@ class TestOpenvswitchPortsV2(test_plugin.TestPortsV2,
 
 class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
                                 OpenvswitchPluginV2TestCase):
-    pass
+
+    def test_list_networks_with_pagination_router_external(self):
+        self._enable_pagination_sorting()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')) as nets:
+            self._update('networks', nets[0]['network']['id'],
+                         {'network': {l3.EXTERNAL: True}})
+            # the external network is not counted in the page
+            res = self._list('networks',
+                             query_params='limit=1&sort_key=name&'
+                                          'sort_dir=asc&%s=False' %
+                                          l3.EXTERNAL)
+            self.assertEqual([net['name'] for net in res['networks']],
+                             ['net2'])
+            self.assertEqual([link['rel'] for link in
+                              res['networks_links']], ['next'])
+            res = self._list('networks',
+                             query_params='limit=1&%s=True' % l3.EXTERNAL)
+            self.assertEqual([net['name'] for net in res['networks']],
+                             ['net1'])
@@ -0,0 +1,167 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import cfg
+from quantum.plugins.common import constants
+from quantum.plugins.services.loadbalancer import agent_rpc
+from quantum.plugins.services.loadbalancer.api import loadbalancer_plugin_api
+from quantum.plugins.services.loadbalancer import work_queue
+
+
+def _device(dev_id='dev1', status=constants.ACTIVE):
+    return {'id': dev_id, 'status': status, 'type': 'HAPROXY',
+            'version': 'v1.0', 'management': {'address': '10.0.0.3'}}
+
+
+def _operation(action, obj_id='vip1', *args):
+    model = action.split('_', 1)[1]
+    return work_queue.Operation(action, (model, obj_id), mock.Mock(), *args)
+
+
+class TestMerge(unittest.TestCase):
+    def test_update_supersedes_update(self):
+        older = _operation('update_vip', 'vip1', 'ctx', 'dev', 'v2', 'v1')
+        newer = _operation('update_vip', 'vip1', 'ctx2', 'dev', 'v3', 'v2')
+        merged = agent_rpc._merge(older, newer)
+        self.assertEqual(merged.func, newer.func)
+        # applied on the device as one change from the oldest value
+        self.assertEqual(merged.args, ('ctx2', 'dev', 'v3', 'v1'))
+
+    def test_delete_supersedes_update(self):
+        older = _operation('update_member', 'm1', 'ctx', 'dev', 'm2', 'm1')
+        newer = _operation('delete_member', 'm1', 'ctx', 'dev', 'm2')
+        self.assertIs(agent_rpc._merge(older, newer), newer)
+
+    def test_update_is_applied_to_the_create(self):
+        older = _operation('create_vip', 'vip1', 'ctx', 'dev', 'v1')
+        newer = _operation('update_vip', 'vip1', 'ctx2', 'dev', 'v2', 'v1')
+        merged = agent_rpc._merge(older, newer)
+        self.assertEqual(merged.action, 'create_vip')
+        self.assertEqual(merged.func, older.func)
+        self.assertEqual(merged.args, ('ctx2', 'dev', 'v2'))
+
+    def test_delete_cancels_the_create(self):
+        older = _operation('create_member', 'm1', 'ctx', 'dev', 'm1')
+        newer = _operation('delete_member', 'm1', 'ctx2', 'dev', 'm1')
+        merged = agent_rpc._merge(older, newer)
+        self.assertEqual(merged.action, 'delete_member')
+        with mock.patch.object(agent_rpc, 'plugin_caller') as caller:
+            merged()
+        caller.confirm.assert_called_once_with(
+            'ctx2', 'member', 'm1', loadbalancer_plugin_api.STATUS_OK,
+            loadbalancer_plugin_api.STATUS_OK)
+
+    def test_pools_are_not_merged_with_their_create(self):
+        older = _operation('create_pool', 'p1', 'ctx', 'dev', 'p1')
+        for newer in (_operation('update_pool', 'p1', 'ctx', 'dev', 'p2',
+                                 'p1'),
+                      _operation('delete_pool', 'p1', 'ctx', 'dev', 'p1')):
+            self.assertIsNone(agent_rpc._merge(older, newer))
+
+    def test_nothing_supersedes_a_delete(self):
+        older = _operation('delete_vip', 'vip1', 'ctx', 'dev', 'v1')
+        newer = _operation('create_vip', 'vip1', 'ctx', 'dev', 'v1')
+        self.assertIsNone(agent_rpc._merge(older, newer))
+
+    def test_health_monitors_are_not_merged(self):
+        older = _operation('create_health_monitor', 'hm1', 'ctx', 'dev',
+                           'hm1', 'p1')
+        newer = _operation('delete_health_monitor', 'hm1', 'ctx', 'dev',
+                           'hm1', 'p1')
+        self.assertIsNone(agent_rpc._merge(older, newer))
+
+
+class TestDeviceLoadReports(unittest.TestCase):
+    def setUp(self):
+        self.callbacks = agent_rpc.LoadbalancerAgentCallbacks()
+        queues = mock.patch.object(agent_rpc.LoadbalancerAgentCallbacks,
+                                   '_work_queues')
+        self.queues = queues.start()
+        self.addCleanup(queues.stop)
+        devices = mock.patch.object(agent_rpc.LoadbalancerAgentCallbacks,
+                                    '_devices', {})
+        devices.start()
+        self.addCleanup(devices.stop)
+        reporter = mock.patch.object(agent_rpc.LoadbalancerAgentCallbacks,
+                                     '_load_reporter', None)
+        reporter.start()
+        self.addCleanup(reporter.stop)
+        spawn = mock.patch.object(agent_rpc.eventlet, 'spawn')
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+        proxy = mock.patch.object(agent_rpc, 'proxy')
+        self.proxy = proxy.start()
+        self.addCleanup(proxy.stop)
+        caller = mock.patch.object(agent_rpc, 'plugin_caller')
+        self.plugin_caller = caller.start()
+        self.addCleanup(caller.stop)
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_devices_are_tracked_until_deleted(self):
+        device = _device()
+        self.callbacks.get_pool_stats(mock.Mock(), device, 'pool1')
+        self.assertEqual(self.callbacks._devices, {'dev1': device})
+        self.callbacks.delete_pool(mock.Mock(),
+                                   _device(status=constants.PENDING_DELETE),
+                                   {'id': 'pool1'})
+        self.assertEqual(self.callbacks._devices, {})
+
+    def test_reporter_is_started_once(self):
+        self.callbacks.get_pool_stats(mock.Mock(), _device('dev1'), 'pool1')
+        self.callbacks.get_pool_stats(mock.Mock(), _device('dev2'), 'pool2')
+        self.spawn.assert_called_once_with(self.callbacks._report_loads, 30)
+
+    def test_no_reporter_without_interval(self):
+        cfg.CONF.set_override('device_load_report_interval', 0, 'LBAGENT')
+        self.callbacks.get_pool_stats(mock.Mock(), _device(), 'pool1')
+        self.assertFalse(self.spawn.called)
+
+    def test_reports_are_queued_on_the_devices(self):
+        device = _device()
+        self.callbacks._devices['dev1'] = device
+        with mock.patch.object(agent_rpc.eventlet, 'sleep',
+                               side_effect=[None, StopIteration()]):
+            self.assertRaises(StopIteration, self.callbacks._report_loads, 30)
+        device_id, operation = self.queues.put.call_args[0]
+        self.assertEqual(device_id, 'dev1')
+        self.assertEqual(operation.key, ('device_load', 'dev1'))
+        self.assertEqual(operation.args[1], device)
+
+    def test_repeated_reports_are_merged(self):
+        older = work_queue.Operation('report_device_load',
+                                     ('device_load', 'dev1'), None)
+        newer = work_queue.Operation('report_device_load',
+                                     ('device_load', 'dev1'), None)
+        self.assertIs(agent_rpc._merge(older, newer), older)
+
+    def test_report_device_load(self):
+        context = mock.Mock()
+        self.proxy.get_device_load.return_value = agent_rpc.Dispatcher(
+            {'host': 'compute1', 'connections': 12, 'cpu_load': 30},
+            _device(), loadbalancer_plugin_api.STATUS_OK, '')
+        self.callbacks._report_device_load(context, _device())
+        self.plugin_caller.report_device_load.assert_called_once_with(
+            context, 'dev1', 'compute1', 12, 30)
+
+    def test_failed_load_is_not_reported(self):
+        self.proxy.get_device_load.return_value = agent_rpc.Dispatcher(
+            None, _device(), loadbalancer_plugin_api.STATUS_ERROR, 'error')
+        self.callbacks._report_device_load(mock.Mock(), _device())
+        self.assertFalse(self.plugin_caller.report_device_load.called)
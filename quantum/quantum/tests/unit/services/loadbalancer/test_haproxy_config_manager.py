@@ -0,0 +1,171 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.plugins.services.loadbalancer.drivers import exceptions
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    config_manager)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    remote_control)
+
+DEVICE = {'management': {'address': '10.0.0.3'}}
+# as rendered by the config manager, so deploying it back changes nothing
+RAW_CONFIG = ['global',
+              '\tdaemon',
+              '\tstats socket /var/run/haproxy.sock user root level admin',
+              'defaults',
+              '\tmode http']
+ALL_STEPS = [remote_control.DEPLOY_UPLOADED, remote_control.DEPLOY_VALID,
+             remote_control.DEPLOY_RELOADED]
+
+
+def _frontend(name):
+    frontend = mock.Mock()
+    frontend.name = name
+    frontend.id = name
+    frontend.bind_address = '10.0.0.10'
+    frontend.bind_port = 80
+    frontend.mode = 'http'
+    frontend.default_backend = 'pool1'
+    frontend.enabled = True
+    return frontend
+
+
+class TestConfigManagerCache(unittest.TestCase):
+    def setUp(self):
+        configs = mock.patch.object(config_manager, '_device_configs', {})
+        configs.start()
+        self.addCleanup(configs.stop)
+        control = mock.patch.object(remote_control, 'RemoteControl')
+        self.control = control.start().return_value
+        self.addCleanup(control.stop)
+        self.file = list(RAW_CONFIG)
+        self.control.read_file.side_effect = lambda path: ''.join(
+            line + '\n' for line in self.file)
+        self.control.get_checksum.side_effect = lambda path: (
+            config_manager._checksum(self.file))
+        self.control.deploy_config.side_effect = self._deploy
+
+    def _deploy(self, raw_config, tmp_path, remote_path):
+        self.file = raw_config.splitlines()
+        return ALL_STEPS
+
+    def _add_frontend(self, name):
+        with config_manager.ConfigManager(DEVICE) as config:
+            config.add_frontend(_frontend(name))
+
+    def test_config_is_fetched_once(self):
+        with config_manager.ConfigManager(DEVICE):
+            pass
+        self.assertFalse(self.control.get_checksum.called)
+        with config_manager.ConfigManager(DEVICE) as config:
+            self.assertIn('\tdaemon', config.config['global'])
+        self.assertEqual(self.control.read_file.call_count, 1)
+        self.assertEqual(self.control.get_checksum.call_count, 1)
+
+    def test_config_changed_on_the_device_is_fetched_again(self):
+        with config_manager.ConfigManager(DEVICE):
+            pass
+        self.file.append('\ttimeout connect 5000')
+        with config_manager.ConfigManager(DEVICE) as config:
+            self.assertIn('\ttimeout connect 5000', config.config['defaults'])
+        self.assertEqual(self.control.read_file.call_count, 2)
+
+    def test_unchanged_config_is_not_deployed(self):
+        with config_manager.ConfigManager(DEVICE):
+            pass
+        self.assertFalse(self.control.deploy_config.called)
+
+    def test_deployed_config_is_cached(self):
+        self._add_frontend('vip1')
+        self.assertEqual(self.control.deploy_config.call_count, 1)
+        self.assertIn('frontend vip1', self.file)
+        with config_manager.ConfigManager(DEVICE) as config:
+            self.assertIn('frontend vip1', config.config)
+        self.assertEqual(self.control.read_file.call_count, 1)
+
+    def test_cached_config_is_not_changed_in_place(self):
+        def change():
+            with config_manager.ConfigManager(DEVICE) as config:
+                config.config['global'].append('\tmaxconn 100')
+                raise ValueError()
+
+        with config_manager.ConfigManager(DEVICE):
+            pass
+        self.assertRaises(ValueError, change)
+        with config_manager.ConfigManager(DEVICE) as config:
+            self.assertNotIn('\tmaxconn 100', config.config['global'])
+
+    def test_batch_is_deployed_once(self):
+        with config_manager.ConfigManager(DEVICE) as batch:
+            self._add_frontend('vip1')
+            self._add_frontend('vip2')
+            self.assertIn('frontend vip2', batch.config)
+            self.assertFalse(self.control.deploy_config.called)
+        self.assertEqual(self.control.deploy_config.call_count, 1)
+        self.assertTrue(set(['frontend vip1', 'frontend vip2']) <=
+                        set(self.file))
+        self.assertEqual(self.control.read_file.call_count, 1)
+
+    def test_failed_batch_is_not_deployed(self):
+        def batch():
+            with config_manager.ConfigManager(DEVICE):
+                self._add_frontend('vip1')
+                with config_manager.ConfigManager(DEVICE):
+                    raise ValueError()
+
+        self.assertRaises(ValueError, batch)
+        self.assertFalse(self.control.deploy_config.called)
+        # the next one starts from the cached config
+        with config_manager.ConfigManager(DEVICE) as config:
+            self.assertNotIn('frontend vip1', config.config)
+        self.assertEqual(self.control.read_file.call_count, 1)
+        self._add_frontend('vip2')
+        self.assertEqual(self.control.deploy_config.call_count, 1)
+
+    def test_invalid_config_is_not_cached(self):
+        self.control.deploy_config.side_effect = lambda *args: [
+            remote_control.DEPLOY_UPLOADED]
+        self.assertRaises(exceptions.ConfigError, self._add_frontend, 'vip1')
+        device_config = config_manager.get_device_config(
+            DEVICE['management'])
+        self.assertEqual(device_config.checksum,
+                         config_manager._checksum(RAW_CONFIG))
+        self.assertNotIn('frontend vip1', device_config.config)
+
+    def test_failed_fetch_releases_the_device(self):
+        self.control.read_file.side_effect = None
+        self.control.read_file.return_value = None
+        manager = config_manager.ConfigManager(DEVICE)
+        self.assertRaises(exceptions.ConfigError, manager.__enter__)
+        device_config = config_manager.get_device_config(
+            DEVICE['management'])
+        self.assertEqual(device_config.depth, 0)
+        self.assertIsNone(device_config.checksum)
+        # the next one fetches the config again and deploys its changes
+        self.control.read_file.side_effect = lambda path: ''.join(
+            line + '\n' for line in self.file)
+        self._add_frontend('vip1')
+        self.assertEqual(self.control.deploy_config.call_count, 1)
+
+    def test_devices_are_cached_apart(self):
+        self.assertIsNot(
+            config_manager.get_device_config({'address': '10.0.0.3'}),
+            config_manager.get_device_config({'address': '10.0.0.3',
+                                              'namespace': 'qlbaas-1'}))
@@ -0,0 +1,134 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.common import config
+from quantum.openstack.common import cfg
+from quantum.plugins.common import constants
+from quantum.plugins.services.loadbalancer.drivers import haproxy_driver
+
+
+class TestNotificationAggregator(unittest.TestCase):
+    def setUp(self):
+        self.send = mock.Mock()
+        self.aggregator = haproxy_driver.NotificationAggregator(self.send,
+                                                                0.2)
+        spawn_after = mock.patch.object(haproxy_driver.eventlet,
+                                        'spawn_after')
+        self.spawn_after = spawn_after.start()
+        self.addCleanup(spawn_after.stop)
+
+    def _expire(self):
+        for call in self.spawn_after.call_args_list:
+            window, func, config_handle_id = call[0]
+            self.assertEqual(window, 0.2)
+            func(config_handle_id)
+        self.spawn_after.reset_mock()
+
+    def _sent(self):
+        return [call[0][1] for call in self.send.call_args_list]
+
+    def test_burst_is_sent_once(self):
+        for i in range(3):
+            self.aggregator.notify('handle1')
+        self.aggregator.notify('handle2')
+        self.assertFalse(self.send.called)
+        self._expire()
+        self.assertEqual(self._sent(), ['handle1', 'handle2'])
+        self.assertEqual((self.aggregator.sent, self.aggregator.saved),
+                         (2, 2))
+        self.assertEqual(self.aggregator.pending, {})
+
+    def test_notification_after_the_window_is_sent_again(self):
+        self.aggregator.notify('handle1')
+        self._expire()
+        self.aggregator.notify('handle1')
+        self._expire()
+        self.assertEqual(self._sent(), ['handle1', 'handle1'])
+
+    def test_flush_sends_the_pending_notification_now(self):
+        self.aggregator.notify('handle1')
+        timer = self.aggregator.pending['handle1']
+        self.aggregator.notify('handle1', flush=True)
+        timer.cancel.assert_called_once_with()
+        self.assertEqual(self._sent(), ['handle1'])
+        self.assertEqual(self.aggregator.pending, {})
+        self.assertEqual(self.aggregator.saved, 1)
+
+    def test_flush_without_pending_notification(self):
+        self.aggregator.notify('handle1', flush=True)
+        self.assertEqual(self._sent(), ['handle1'])
+        self.assertFalse(self.spawn_after.called)
+
+    def test_no_window(self):
+        self.aggregator.window = 0
+        self.aggregator.notify('handle1')
+        self.aggregator.notify('handle1')
+        self.assertEqual(self._sent(), ['handle1', 'handle1'])
+        self.assertFalse(self.spawn_after.called)
+
+    def test_failed_send_is_not_retried(self):
+        self.send.side_effect = Exception()
+        self.aggregator.notify('handle1')
+        self._expire()
+        self.assertEqual(self.aggregator.pending, {})
+        self.aggregator.notify('handle1')
+        self.assertTrue(self.spawn_after.called)
+
+
+class TestHAProxyDriver(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('notify_window', 0, 'DRIVER')
+        with mock.patch.object(haproxy_driver.importutils, 'import_object'):
+            with mock.patch.object(haproxy_driver.loadbalancer_db,
+                                   'LoadbalancerPluginDb'):
+                self.driver = haproxy_driver.HAProxyDriver()
+        self.driver.db.get_config_version.return_value = 7
+
+    def _vips(self, *config_handle_ids):
+        return [{'id': 'vip%d' % i, 'config_handle_id': config_handle_id}
+                for i, config_handle_id in enumerate(config_handle_ids)]
+
+    def test_one_notification_per_config_handle(self):
+        with mock.patch.object(self.driver.notifications,
+                               'notify') as notify:
+            self.driver.prepare_update(
+                mock.Mock(), self._vips('handle1', 'handle1', 'handle2'),
+                constants.LB_UPDATE)
+        self.assertEqual(sorted(notify.call_args_list),
+                         [mock.call('handle1', flush=False),
+                          mock.call('handle2', flush=False)])
+        self.assertEqual(self.driver.notifications.saved, 1)
+
+    def test_deletion_is_flushed(self):
+        with mock.patch.object(self.driver.notifications,
+                               'notify') as notify:
+            self.driver.prepare_update(mock.Mock(), self._vips('handle1'),
+                                       constants.LB_DELETE)
+        notify.assert_called_once_with('handle1', flush=True)
+
+    def test_notification_carries_the_latest_version(self):
+        self.driver.prepare_update(mock.Mock(), self._vips('handle1'),
+                                   constants.LB_UPDATE)
+        self.driver.driver.send_rpc_msg.assert_called_once_with(
+            'handle1', {'config': {'header': 'request',
+                                   'config_handle_id': 'handle1',
+                                   'slug': 'loadbalancer',
+                                   'version': '7'}})
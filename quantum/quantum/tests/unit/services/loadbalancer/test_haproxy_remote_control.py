@@ -0,0 +1,167 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shlex
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import cfg
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    haproxy_driver)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    remote_control)
+
+MGMT = {'address': '10.0.0.3'}
+
+
+class TestRemoteControl(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('haproxy_ssh_control_dir', '/var/lib/ssh',
+                              'HAPROXY')
+        execute = mock.patch.object(remote_control.utils, 'execute',
+                                    return_value=('', ''))
+        self.execute = execute.start()
+        self.addCleanup(execute.stop)
+        isdir = mock.patch.object(remote_control.os.path, 'isdir',
+                                  return_value=True)
+        self.isdir = isdir.start()
+        self.addCleanup(isdir.stop)
+        exists = mock.patch.object(remote_control.os.path, 'exists',
+                                   return_value=False)
+        self.exists = exists.start()
+        self.addCleanup(exists.stop)
+
+    def _commands(self):
+        return [call[0][0] for call in self.execute.call_args_list]
+
+    def test_ssh_shares_a_master_connection(self):
+        control = remote_control.RemoteControl(MGMT)
+        self.assertEqual(os.path.dirname(control.control_path),
+                         '/var/lib/ssh')
+        control.perform('true')
+        command = self._commands()[0]
+        self.assertEqual(command[0], 'ssh')
+        self.assertIn('ControlMaster=auto', command)
+        self.assertIn('ControlPath=%s' % control.control_path, command)
+        self.assertIn('ControlPersist=300', command)
+        self.assertEqual(command[-2:], ['root@10.0.0.3', 'true'])
+
+    def test_connection_per_command_without_persist(self):
+        cfg.CONF.set_override('haproxy_ssh_persist', 0, 'HAPROXY')
+        control = remote_control.RemoteControl(MGMT)
+        self.assertIsNone(control.control_path)
+        control.perform('true')
+        self.assertNotIn('ControlMaster=auto', self._commands()[0])
+        self.assertFalse(self.isdir.called)
+
+    def test_control_path_per_namespace(self):
+        path = remote_control.RemoteControl(MGMT).control_path
+        self.assertEqual(remote_control.RemoteControl(MGMT).control_path,
+                         path)
+        self.assertNotEqual(remote_control.RemoteControl(
+            dict(MGMT, namespace='qlbaas-1')).control_path, path)
+        # unix socket paths are limited to 108 characters
+        self.assertLess(len(path), 108)
+
+    def test_unhealthy_master_is_dropped_once(self):
+        self.exists.return_value = True
+        self.execute.side_effect = [RuntimeError(), ('', ''), ('', ''),
+                                    ('', '')]
+        control = remote_control.RemoteControl(MGMT)
+        control.perform('true')
+        control.perform('true')
+        commands = self._commands()
+        self.assertEqual([command[-2] for command in commands[:2]],
+                         ['check', 'exit'])
+        self.assertEqual(len(commands), 4)
+
+    def test_missing_control_dir_is_created(self):
+        self.isdir.return_value = False
+        with mock.patch.object(remote_control.os, 'makedirs') as makedirs:
+            remote_control.RemoteControl(MGMT).perform('true')
+        makedirs.assert_called_once_with('/var/lib/ssh', 0700)
+        self.assertEqual(len(self._commands()), 1)
+
+    def test_close_exits_the_master(self):
+        control = remote_control.RemoteControl(MGMT)
+        control.close()
+        self.assertFalse(self.execute.called)
+        self.exists.return_value = True
+        control.close()
+        self.assertEqual(self._commands()[0][-2:], ['exit', 'root@10.0.0.3'])
+
+    def test_command_in_namespace(self):
+        with mock.patch.object(remote_control.config, 'get_root_helper',
+                               return_value='sudo', create=True):
+            remote_control.RemoteControl(
+                dict(MGMT, namespace='qlbaas-1')).perform('true')
+        command = self._commands()[0]
+        self.assertEqual(command[:4], ['ip', 'netns', 'exec', 'qlbaas-1'])
+        self.assertEqual(self.execute.call_args[1]['root_helper'], 'sudo')
+
+    def test_deploy_config_is_one_round_trip(self):
+        self.execute.return_value = ('uploaded\nvalid\nreloaded\n', '')
+        control = remote_control.RemoteControl(MGMT)
+        steps = control.deploy_config('global\n', '/tmp/haproxy.cfg.new',
+                                      '/etc/haproxy/haproxy.cfg')
+        self.assertEqual(steps, [remote_control.DEPLOY_UPLOADED,
+                                 remote_control.DEPLOY_VALID,
+                                 remote_control.DEPLOY_RELOADED])
+        self.assertEqual(self.execute.call_count, 1)
+        kwargs = self.execute.call_args[1]
+        self.assertEqual(kwargs['process_input'], 'global\n')
+        self.assertFalse(kwargs['check_exit_code'])
+        remote = self._commands()[0][-1]
+        self.assertTrue(remote.startswith('cat > /tmp/haproxy.cfg.new && '))
+        self.assertIn('sudo mv /tmp/haproxy.cfg.new '
+                      '/etc/haproxy/haproxy.cfg', remote)
+
+    def test_deploy_config_reports_the_steps_done(self):
+        self.execute.return_value = ('uploaded\n', '[ALERT] parsing')
+        steps = remote_control.RemoteControl(MGMT).deploy_config(
+            'global\n', '/tmp/new', '/etc/haproxy/haproxy.cfg')
+        self.assertEqual(steps, [remote_control.DEPLOY_UPLOADED])
+        self.execute.side_effect = RuntimeError()
+        steps = remote_control.RemoteControl(MGMT).deploy_config(
+            'global\n', '/tmp/new', '/etc/haproxy/haproxy.cfg')
+        self.assertEqual(steps, [])
+
+    def test_get_checksum(self):
+        self.execute.return_value = (
+            'd41d8cd98f00b204e9800998ecf8427e  /etc/haproxy/haproxy.cfg\n',
+            '')
+        control = remote_control.RemoteControl(MGMT)
+        self.assertEqual(control.get_checksum('/etc/haproxy/haproxy.cfg'),
+                         'd41d8cd98f00b204e9800998ecf8427e')
+        self.execute.side_effect = RuntimeError()
+        self.assertIsNone(control.get_checksum('/etc/haproxy/haproxy.cfg'))
+
+    def test_read_file(self):
+        self.execute.return_value = ('global\n', '')
+        control = remote_control.RemoteControl(MGMT)
+        self.assertEqual(control.read_file('/etc/haproxy/haproxy.cfg'),
+                         'global\n')
+        self.assertEqual(self._commands()[0][-1],
+                         'cat /etc/haproxy/haproxy.cfg')
+
+    def test_get_info(self):
+        self.execute.return_value = ('Name: HAProxy\nIdle_pct: 87\n\n', '')
+        self.assertEqual(remote_control.RemoteControl(MGMT).get_info(),
+                         {'Name': 'HAProxy', 'Idle_pct': '87'})
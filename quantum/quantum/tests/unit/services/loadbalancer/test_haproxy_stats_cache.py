@@ -0,0 +1,170 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.plugins.services.loadbalancer.drivers import constants
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    haproxy_driver)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    remote_control)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    stats_cache)
+
+MGMT = {'address': '10.0.0.3'}
+RAW_STATS = ('# pxname,svname,scur,stot,check_status,\n'
+             'vip1,FRONTEND,12,100,,\n'
+             'vip2,FRONTEND,3,20,,\n'
+             'pool1,member1,5,50,L7OK,\n'
+             '\n'
+             'pool1,BACKEND,5,50,,\n')
+
+
+class TestParseStats(unittest.TestCase):
+    def test_parse_stats(self):
+        stats = stats_cache.parse_stats(RAW_STATS)
+        self.assertEqual(sorted(stats),
+                         [('pool1', 'BACKEND'), ('pool1', 'member1'),
+                          ('vip1', 'FRONTEND'), ('vip2', 'FRONTEND')])
+        self.assertEqual(stats[('pool1', 'member1')]['check_status'], 'L7OK')
+        self.assertEqual(stats[('vip1', 'FRONTEND')]['scur'], '12')
+
+    def test_parse_empty_stats(self):
+        self.assertEqual(stats_cache.parse_stats(''), {})
+        self.assertEqual(stats_cache.parse_stats('# pxname,svname,\n'), {})
+
+
+class TestStatsCache(unittest.TestCase):
+    def setUp(self):
+        control = mock.patch.object(remote_control, 'RemoteControl')
+        self.control = control.start().return_value
+        self.addCleanup(control.stop)
+        self.control.get_stats.return_value = RAW_STATS
+        self.time = 1000.0
+        clock = mock.patch.object(stats_cache.time, 'time',
+                                  side_effect=lambda: self.time)
+        clock.start()
+        self.addCleanup(clock.stop)
+        spawn = mock.patch.object(stats_cache.eventlet, 'spawn')
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+        self.cache = stats_cache.StatsCache(ttl=10)
+
+    def test_stats_are_served_for_the_ttl(self):
+        stats = self.cache.get(MGMT)
+        self.time += 9
+        self.assertIs(self.cache.get(MGMT), stats)
+        self.assertEqual(self.control.get_stats.call_count, 1)
+        self.time += 1
+        self.cache.get(MGMT)
+        self.assertEqual(self.control.get_stats.call_count, 2)
+
+    def test_failed_fetch_is_not_cached(self):
+        self.control.get_stats.return_value = None
+        self.assertIsNone(self.cache.get(MGMT))
+        self.control.get_stats.return_value = RAW_STATS
+        self.assertIn(('pool1', 'BACKEND'), self.cache.get(MGMT))
+        self.assertEqual(self.control.get_stats.call_count, 2)
+
+    def test_expired_stats_are_dropped_on_error(self):
+        self.cache.get(MGMT)
+        self.time += 10
+        self.control.get_stats.return_value = None
+        self.assertIsNone(self.cache.get(MGMT))
+
+    def test_devices_are_cached_apart(self):
+        self.cache.get(MGMT)
+        self.cache.get(dict(MGMT, namespace='qlbaas-1'))
+        self.cache.get({'address': '10.0.0.4'})
+        self.assertEqual(self.control.get_stats.call_count, 3)
+
+    def test_forget(self):
+        self.cache.get(MGMT)
+        self.cache.forget(MGMT)
+        self.cache.get(MGMT)
+        self.assertEqual(self.control.get_stats.call_count, 2)
+        self.cache.forget({'address': '10.0.0.4'})
+
+    def test_no_refresher_without_interval(self):
+        self.cache.get(MGMT)
+        self.assertFalse(self.spawn.called)
+
+    def test_refresher_is_started_once_per_device(self):
+        cache = stats_cache.StatsCache(ttl=10, refresh_interval=5)
+        cache.get(MGMT)
+        cache.get(MGMT)
+        self.assertEqual(self.spawn.call_count, 1)
+        func, device_mgmt_info, device_stats = self.spawn.call_args[0]
+        self.assertEqual(func, cache._refresh)
+        self.assertEqual(device_mgmt_info, MGMT)
+        cache.forget(MGMT)
+        self.spawn.return_value.kill.assert_called_once_with()
+
+    def test_refresher_fetches_until_killed(self):
+        cache = stats_cache.StatsCache(ttl=10, refresh_interval=5)
+        cache.get(MGMT)
+        device_stats = self.spawn.call_args[0][2]
+        self.control.get_stats.side_effect = [Exception(), RAW_STATS]
+        with mock.patch.object(stats_cache.eventlet, 'sleep',
+                               side_effect=[None, None, StopIteration()]):
+            self.assertRaises(StopIteration, cache._refresh, MGMT,
+                              device_stats)
+        self.assertEqual(self.control.get_stats.call_count, 3)
+        self.assertIsNotNone(device_stats.stats)
+
+
+class FakeHAProxyDriver(haproxy_driver.HAProxyDriver):
+    def send_modified_notification(self):
+        pass
+
+
+class TestDriverStats(unittest.TestCase):
+    def setUp(self):
+        self.driver = FakeHAProxyDriver()
+        self.device = {'management': dict(MGMT, host='compute1')}
+        get = mock.patch.object(self.driver.stats, 'get',
+                                return_value=stats_cache.parse_stats(
+                                    RAW_STATS))
+        self.get = get.start()
+        self.addCleanup(get.stop)
+
+    def test_pool_and_member_stats_share_a_fetch(self):
+        pool = self.driver.get_pool_stats(self.device, 'pool1')
+        member = self.driver.get_member_stats(self.device, 'pool1',
+                                              'member1')
+        self.assertEqual(pool[constants.STATS_CURRENT_SESSIONS], '5')
+        self.assertEqual(member[constants.STATS_HEALTH],
+                         constants.HEALTH_L7_OK)
+        self.assertEqual(self.get.call_args_list,
+                         [mock.call(self.device['management'])] * 2)
+
+    def test_unknown_pool(self):
+        self.assertRaises(haproxy_driver.HAProxyError,
+                          self.driver.get_pool_stats, self.device, 'pool2')
+
+    def test_device_without_stats(self):
+        self.get.return_value = None
+        self.assertRaises(haproxy_driver.HAProxyError,
+                          self.driver.get_pool_stats, self.device, 'pool1')
+
+    def test_device_load(self):
+        with mock.patch.object(remote_control, 'RemoteControl') as control:
+            control.return_value.get_info.return_value = {'Idle_pct': '70'}
+            self.assertEqual(self.driver.get_device_load(self.device),
+                             {'host': 'compute1', 'connections': 15,
+                              'cpu_load': 30})
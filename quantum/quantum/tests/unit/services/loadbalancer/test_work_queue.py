@@ -0,0 +1,141 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+import unittest2 as unittest
+
+from quantum.plugins.services.loadbalancer import work_queue
+
+
+def _keep_newer(older, newer):
+    return newer
+
+
+class TestDeviceWorkQueues(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.queues = work_queue.DeviceWorkQueues(pool_size=4,
+                                                  merge=_keep_newer)
+
+    def _operation(self, action, model='vip', obj_id='vip1', device='dev1'):
+        def run():
+            # lets the queues of the other devices run meanwhile
+            eventlet.sleep(0)
+            self.calls.append((device, action))
+        return work_queue.Operation(action, (model, obj_id), run)
+
+    def _put(self, action, model='vip', obj_id='vip1', device='dev1'):
+        self.queues.put(device, self._operation(action, model, obj_id,
+                                                device))
+
+    def _drain(self):
+        self.queues.pool.waitall()
+        return [action for device, action in self.calls]
+
+    def test_operations_of_a_device_run_in_order(self):
+        self.queues.merge = None
+        for action in ('create_vip', 'update_vip', 'delete_vip'):
+            self._put(action)
+        self.assertEqual(self._drain(),
+                         ['create_vip', 'update_vip', 'delete_vip'])
+        self.assertEqual(self.queues.get_stats()['depth'], {})
+
+    def test_devices_are_drained_concurrently(self):
+        self._put('create_vip', device='dev1')
+        self._put('create_pool', 'pool', 'pool1', device='dev1')
+        self._put('create_vip', device='dev2')
+        self.queues.pool.waitall()
+        self.assertEqual(self.calls, [('dev1', 'create_vip'),
+                                      ('dev2', 'create_vip'),
+                                      ('dev1', 'create_pool')])
+
+    def test_running_operation_is_not_merged(self):
+        self._put('create_vip')
+        self._put('update_vip')
+        self.assertEqual(self._drain(), ['create_vip', 'update_vip'])
+
+    def test_pending_operation_is_merged(self):
+        self._put('create_vip')
+        self._put('update_vip')
+        self._put('delete_vip')
+        self.assertEqual(self._drain(), ['create_vip', 'delete_vip'])
+        self.assertEqual(
+            self.queues.get_stats()['actions']['delete_vip']['merged'], 1)
+
+    def test_merge_across_other_objects_of_the_model(self):
+        self._put('create_pool', 'pool', 'pool1')
+        self._put('update_vip', obj_id='vip1')
+        self._put('update_vip', obj_id='vip2')
+        self._put('delete_vip', obj_id='vip1')
+        self.assertEqual(self._drain(), ['create_pool', 'delete_vip',
+                                         'update_vip'])
+
+    def test_no_merge_across_another_model(self):
+        self._put('create_pool', 'pool', 'pool1')
+        self._put('update_vip')
+        self._put('update_pool', 'pool', 'pool1')
+        self._put('delete_vip')
+        self.assertEqual(self._drain(), ['create_pool', 'update_vip',
+                                         'update_pool', 'delete_vip'])
+
+    def test_merge_refused(self):
+        self.queues.merge = mock.Mock(return_value=None)
+        self._put('create_pool', 'pool', 'pool1')
+        self._put('update_vip')
+        self._put('update_vip')
+        self.assertEqual(self._drain(), ['create_pool', 'update_vip',
+                                         'update_vip'])
+        self.assertEqual(self.queues.merge.call_count, 1)
+
+    def test_merged_operation_keeps_the_queueing_time(self):
+        with mock.patch.object(work_queue.time, 'time', return_value=10.0):
+            self._put('create_pool', 'pool', 'pool1')
+            self._put('update_vip')
+        with mock.patch.object(work_queue.time, 'time', return_value=20.0):
+            self._put('delete_vip')
+        with mock.patch.object(work_queue.time, 'time', return_value=25.0):
+            self._drain()
+        stats = self.queues.get_stats()['actions']['delete_vip']
+        self.assertEqual((stats['count'], stats['max_latency']), (1, 15.0))
+
+    def test_failed_operation_does_not_stop_the_queue(self):
+        self.queues.put('dev1', work_queue.Operation(
+            'create_vip', ('vip', 'vip1'), mock.Mock(side_effect=Exception)))
+        self._put('create_pool', 'pool', 'pool1')
+        self.assertEqual(self._drain(), ['create_pool'])
+        stats = self.queues.get_stats()['actions']
+        self.assertEqual(stats['create_vip']['count'], 1)
+
+    def test_queue_is_restarted_after_it_drained(self):
+        self._put('create_vip')
+        self._drain()
+        self._put('update_vip')
+        self.assertEqual(self.queues.get_stats()['depth'], {'dev1': 1})
+        self.assertEqual(self._drain(), ['create_vip', 'update_vip'])
+
+    def test_stats(self):
+        with mock.patch.object(work_queue.time, 'time', return_value=10.0):
+            self._put('create_vip', obj_id='vip1')
+            self._put('create_vip', obj_id='vip2')
+        with mock.patch.object(work_queue.time, 'time',
+                               side_effect=[12.0, 16.0]):
+            self.queues.pool.waitall()
+        stats = self.queues.get_stats()['actions']['create_vip']
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_latency'], 4.0)
+        self.assertEqual(stats['max_latency'], 6.0)
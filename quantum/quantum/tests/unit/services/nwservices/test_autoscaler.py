@@ -0,0 +1,174 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import datetime
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import timeutils
+from quantum.plugins.services.nwservices.drivers import autoscaler
+
+NOW = datetime.datetime(2013, 5, 1, 12, 0, 0)
+
+
+class FakePool(object):
+    def __init__(self, client):
+        self.client = client
+
+    @contextlib.contextmanager
+    def item(self):
+        yield self.client
+
+
+def _row(instance_id, seconds_ago, proxy_type='frontend', sessions=0,
+         rate=0, queue=0):
+    row = mock.Mock()
+    row.instance_id = instance_id
+    row.created_at = NOW - datetime.timedelta(seconds=seconds_ago)
+    row.type = proxy_type
+    row.sessions = sessions
+    row.rate = rate
+    row.queue = queue
+    return row
+
+
+def _policy(**kwargs):
+    policy = {'id': 'policy1', 'chain_map_id': 'image1',
+              'metric': 'sessions', 'min_instances': 1, 'max_instances': 3,
+              'scale_out_threshold': 100, 'scale_in_threshold': 20}
+    policy.update(kwargs)
+    return policy
+
+
+class TestAutoscaler(unittest.TestCase):
+    def setUp(self):
+        timeutils.set_time_override(NOW)
+        self.addCleanup(timeutils.clear_time_override)
+        self.driver = mock.Mock()
+        self.db = self.driver.db
+        self.db.get_chain_image.return_value = {
+            'id': 'image1', 'name': 'slb', 'image_map_id': 'map1',
+            'instance_uuid': 'uuid0'}
+        self.db.get_chain_image_instances.return_value = []
+        self.db.get_chain_image_confs.return_value = [
+            {'config_handle_id': 'handle1'}]
+        self.db.get_stats.return_value = []
+        self.db.get_image.return_value = {'image_id': 'glance1',
+                                          'flavor_id': '2',
+                                          'security_group_id': 'sg1'}
+        self.db.get_chain_image_networks.return_value = [
+            {'network_id': 'net1'}, {'network_id': 'net2'}]
+        self.nova = mock.Mock()
+        self.nova.servers.create.return_value.id = 'uuid1'
+        self.scaler = autoscaler.Autoscaler(self.driver,
+                                            FakePool(self.nova),
+                                            window=300, retention=3600)
+
+    def _measure(self, rows, metric='sessions'):
+        self.db.get_stats.return_value = rows
+        return self.scaler.measure(metric, ['handle1'], NOW)
+
+    def test_measure_sums_proxies_and_averages_instances(self):
+        rows = [_row('uuid0', 10, sessions=30),
+                _row('uuid0', 10, sessions=20),
+                _row('uuid0', 40, sessions=10),
+                _row('uuid0', 10, 'backend', sessions=1000),
+                _row('uuid1', 10, sessions=90)]
+        # uuid0: (50 + 10) / 2 samples, uuid1: 90
+        self.assertEqual(self._measure(rows), 60.0)
+
+    def test_measure_uses_the_proxies_of_the_metric(self):
+        rows = [_row('uuid0', 10, sessions=30, queue=3),
+                _row('uuid0', 10, 'backend', queue=5)]
+        self.assertEqual(self._measure(rows, 'queue'), 5.0)
+
+    def test_measure_without_samples(self):
+        self.assertIsNone(self._measure([]))
+        self.assertIsNone(self._measure([_row('uuid0', 10, 'backend')]))
+
+    def test_measure_counts_unreported_metric_as_zero(self):
+        self.assertEqual(self._measure([_row('uuid0', 10, sessions=None)]),
+                         0.0)
+
+    def test_scale_out_above_the_threshold(self):
+        self.db.get_stats.return_value = [_row('uuid0', 10, sessions=150)]
+        self.scaler.evaluate(_policy(), NOW)
+        self.nova.security_groups.get.assert_called_once_with('sg1')
+        kwargs = self.nova.servers.create.call_args[1]
+        self.assertEqual(kwargs['nics'],
+                         [{'net-id': 'net1', 'v4-fixed-ip': ''},
+                          {'net-id': 'net2', 'v4-fixed-ip': ''}])
+        self.db.add_chain_image_instance.assert_called_once_with(
+            self.driver.context, 'image1', 'uuid1')
+        self.db.mark_scaled.assert_called_once_with(self.driver.context,
+                                                    'policy1')
+        self.driver.notify_config.assert_called_once_with('handle1')
+        since = self.db.get_stats.call_args[0][2]
+        self.assertEqual(since, NOW - datetime.timedelta(seconds=300))
+
+    def test_no_scale_out_beyond_max_instances(self):
+        self.db.get_chain_image_instances.return_value = ['uuid1', 'uuid2']
+        self.db.get_stats.return_value = [_row('uuid0', 10, sessions=150)]
+        self.scaler.evaluate(_policy(), NOW)
+        self.assertFalse(self.nova.servers.create.called)
+        self.assertFalse(self.db.mark_scaled.called)
+        self.assertFalse(self.driver.notify_config.called)
+
+    def test_scale_out_below_min_instances_without_stats(self):
+        self.scaler.evaluate(_policy(min_instances=2), NOW)
+        self.assertTrue(self.nova.servers.create.called)
+
+    def test_scale_in_deletes_the_newest_instance(self):
+        self.db.get_chain_image_instances.return_value = ['uuid1', 'uuid2']
+        self.db.get_stats.return_value = [_row('uuid0', 10, sessions=5)]
+        self.scaler.evaluate(_policy(), NOW)
+        self.nova.servers.delete.assert_called_once_with('uuid2')
+        self.db.delete_chain_image_instance.assert_called_once_with(
+            self.driver.context, 'uuid2')
+        self.driver.tracker.forget.assert_called_once_with('uuid2')
+        self.driver.notify_config.assert_called_once_with('handle1')
+
+    def test_original_instance_is_not_scaled_in(self):
+        self.db.get_stats.return_value = [_row('uuid0', 10, sessions=5)]
+        self.scaler.evaluate(_policy(min_instances=0), NOW)
+        self.assertFalse(self.nova.servers.delete.called)
+
+    def test_no_scaling_between_the_thresholds(self):
+        self.db.get_chain_image_instances.return_value = ['uuid1']
+        self.db.get_stats.return_value = [_row('uuid0', 10, sessions=50)]
+        self.scaler.evaluate(_policy(), NOW)
+        self.assertFalse(self.nova.servers.create.called)
+        self.assertFalse(self.nova.servers.delete.called)
+
+    def test_chain_not_launched(self):
+        self.db.get_chain_image.return_value['instance_uuid'] = None
+        self.scaler.evaluate(_policy(min_instances=2), NOW)
+        self.assertFalse(self.db.get_stats.called)
+        self.assertFalse(self.nova.servers.create.called)
+
+    def test_run_once_prunes_and_evaluates_due_policies(self):
+        self.db.get_due_scaling_policies.return_value = [
+            _policy(id='policy1'), _policy(id='policy2')]
+        with mock.patch.object(self.scaler, 'evaluate',
+                               side_effect=[Exception(), None]) as evaluate:
+            self.scaler.run_once()
+        self.db.prune_stats.assert_called_once_with(
+            self.driver.context, NOW - datetime.timedelta(seconds=3600))
+        # a failing policy does not keep the others from being evaluated
+        self.assertEqual(evaluate.call_count, 2)
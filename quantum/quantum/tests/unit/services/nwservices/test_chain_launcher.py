@@ -0,0 +1,144 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import eventlet
+import mock
+import unittest2 as unittest
+
+from quantum.common import exceptions as q_exc
+from quantum.plugins.common import constants
+from quantum.plugins.services.nwservices.drivers import chain_launcher
+
+
+class FakePool(object):
+    def __init__(self, client):
+        self.client = client
+
+    @contextlib.contextmanager
+    def item(self):
+        yield self.client
+
+
+def _entry(image_id, sequence_number, network_ids, config_handle_ids=None):
+    return {'id': image_id, 'name': 'vm-%s' % image_id,
+            'sequence_number': sequence_number, 'network_ids': network_ids,
+            'config_handle_ids': config_handle_ids or ['handle-%s' % image_id],
+            'security_group_id': 'sg1', 'image_id': 'glance1',
+            'flavor_id': '2'}
+
+
+class TestChainLauncher(unittest.TestCase):
+    def setUp(self):
+        self.driver = mock.Mock()
+        self.db = self.driver.db
+        self.db.create_chain_launch.side_effect = lambda context, chain_id, \
+            plan: {'id': 'launch1',
+                   'images': [{'chain_map_id': entry['id'],
+                               'id': 'launch-%s' % entry['id']}
+                              for entry in plan]}
+        self.nova = mock.Mock()
+        security_group = mock.Mock()
+        security_group.id = 'sg1'
+        security_group.name = 'default'
+        self.nova.security_groups.list.return_value = [security_group]
+        self.booted = []
+
+        def create(name, *args, **kwargs):
+            # lets the other boots run meanwhile
+            eventlet.sleep(0)
+            self.booted.append(name)
+            server = mock.Mock()
+            server.id = 'uuid-%s' % name
+            return server
+
+        self.nova.servers.create.side_effect = create
+        self.launcher = chain_launcher.ChainLauncher(self.driver,
+                                                     FakePool(self.nova))
+        self.context = mock.Mock()
+
+    def _launch(self, plan):
+        self.db.get_chain_launch_plan.return_value = plan
+        launch = self.launcher.launch(self.context, 'chain1')
+        self.launcher.pool.waitall()
+        return launch
+
+    def _statuses(self):
+        calls = self.db.update_chain_launch_image.call_args_list
+        return dict((call[0][1], call[1]['status']) for call in calls
+                    if 'status' in call[1])
+
+    def test_images_sharing_a_network_boot_in_sequence(self):
+        self._launch([_entry('c', 3, ['net2']),
+                      _entry('b', 2, ['net1']),
+                      _entry('a', 1, ['net1', 'net3'])])
+        self.assertEqual(self.booted, ['vm-c', 'vm-a', 'vm-b'])
+        kwargs = self.nova.servers.create.call_args[1]
+        self.assertEqual(kwargs['nics'], [{'net-id': 'net1',
+                                           'v4-fixed-ip': ''}])
+        self.assertEqual(kwargs['security_groups'], ['default'])
+        # the security groups are listed once for the launch
+        self.assertEqual(self.nova.security_groups.list.call_count, 1)
+        self.db.update_chain_image.assert_any_call(
+            mock.ANY, 'b', {'chain_image': {'instance_uuid': 'uuid-vm-b'}})
+
+    def test_failed_boot_fails_the_images_waiting_for_it(self):
+        create = self.nova.servers.create.side_effect
+
+        def fail_a(name, *args, **kwargs):
+            if name == 'vm-a':
+                raise Exception('no more quota')
+            return create(name, *args, **kwargs)
+
+        self.nova.servers.create.side_effect = fail_a
+        self._launch([_entry('b', 2, ['net1']),
+                      _entry('a', 1, ['net1']),
+                      _entry('c', 1, ['net2'])])
+        self.assertEqual(self.booted, ['vm-c'])
+        self.assertEqual(self._statuses(),
+                         {'launch-a': constants.ERROR,
+                          'launch-b': constants.ERROR})
+        self.assertEqual([call[0][1] for call in
+                          self.driver.tracker.wait.call_args_list],
+                         ['uuid-vm-c'])
+
+    def test_active_image_gets_its_configs(self):
+        self._launch([_entry('a', 1, ['net1'], ['handle1', 'handle2'])])
+        args = self.driver.tracker.wait.call_args[0]
+        self.assertEqual(args[1], 'uuid-vm-a')
+        # called back by the instance tracker
+        args[2](10, 'tenant1', 'compute1')
+        self.db.update_chain_image.assert_called_with(
+            mock.ANY, 'a', {'chain_image': {'instance_id': 10}})
+        self.assertEqual(self._statuses(), {'launch-a': constants.ACTIVE})
+        self.assertEqual(self.driver.notify_config.call_args_list,
+                         [mock.call('handle1'), mock.call('handle2')])
+
+    def test_image_failing_to_become_active(self):
+        self._launch([_entry('a', 1, ['net1'])])
+        self.driver.tracker.wait.call_args[0][3]('instance in error state')
+        self.assertEqual(self._statuses(), {'launch-a': constants.ERROR})
+        self.assertFalse(self.driver.notify_config.called)
+
+    def test_invalid_plans_are_refused(self):
+        for plan in ([], [_entry('a', 1, [])],
+                     [_entry('a', 1, ['net1'], ['handle1', ''])]):
+            self.db.get_chain_launch_plan.return_value = plan
+            self.assertRaises(q_exc.InvalidInput, self.launcher.launch,
+                              self.context, 'chain1')
+        self.assertFalse(self.db.create_chain_launch.called)
@@ -0,0 +1,254 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import sqlalchemy as sa
+import unittest2 as unittest
+
+from quantum.common import config
+from quantum.common import exceptions as q_exc
+from quantum import context
+from quantum.db import api as db
+from quantum.db import model_base
+from quantum.db import models_v2
+from quantum.db.nwservices import nwservices_db
+from quantum.openstack.common import cfg
+
+
+class TestChainTopology(unittest.TestCase):
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite://',
+                         'base': model_base.BASEV2})
+        self.addCleanup(db.clear_db, model_base.BASEV2)
+        self.addCleanup(cfg.CONF.reset)
+        self.statements = []
+        sa.event.listen(db._ENGINE, 'before_cursor_execute',
+                        self._count_statement)
+        topologies = mock.patch.object(nwservices_db, '_topologies',
+                                       nwservices_db.ChainTopologyCache())
+        self.topologies = topologies.start()
+        self.addCleanup(topologies.stop)
+        self.time = 1000.0
+        clock = mock.patch.object(nwservices_db.time, 'time',
+                                  side_effect=lambda: self.time)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.plugin = nwservices_db.NwservicePluginDb()
+        self.context = context.get_admin_context()
+        with self.context.session.begin():
+            self.context.session.add(models_v2.Network(
+                id='net1', name='net1', tenant_id='tenant1'))
+        self.function = self.plugin.create_networkfunction(self.context, {
+            'networkfunction': {'name': 'firewall', 'description': '',
+                                'shared': True, 'tenant_id': 'tenant1'}})
+        category = self.plugin.create_category(self.context, {
+            'category': {'name': 'security', 'description': '',
+                         'shared': True, 'tenant_id': 'tenant1'}})
+        vendor = self.plugin.create_vendor(self.context, {
+            'vendor': {'name': 'freescale', 'description': '',
+                       'shared': True, 'tenant_id': 'tenant1'}})
+        self.image = self._create_image('fw', category, vendor)
+        self.chain = self._create_chain('chain1')
+
+    def _count_statement(self, conn, cursor, statement, *args):
+        if statement.startswith('SELECT'):
+            self.statements.append(statement)
+
+    def _create_image(self, name, category, vendor):
+        image = self.plugin.create_image(self.context, {'image': {
+            'name': name, 'category_id': category['id'],
+            'vendor_id': vendor['id'], 'image_id': 'glance-' + name,
+            'flavor_id': 2, 'security_group_id': 1, 'shared': True,
+            'tenant_id': 'tenant1'}})
+        self.plugin.create_metadata(self.context, {'metadata': {
+            'name': 'role', 'value': name, 'image_map_id': image['id']}})
+        self.plugin.create_personality(self.context, {'personality': {
+            'file_path': '/etc/' + name, 'file_content': 'on',
+            'image_map_id': image['id']}})
+        return image
+
+    def _create_chain(self, name):
+        return self.plugin.create_chain(self.context, {'chain': {
+            'name': name, 'type': 'L3', 'auto_boot': False,
+            'tenant_id': 'tenant1'}})
+
+    def _create_chain_image(self, name, sequence_number, chain=None):
+        chain_image = self.plugin.create_chain_image(self.context, {
+            'chain_image': {'name': name,
+                            'chain_id': (chain or self.chain)['id'],
+                            'image_map_id': self.image['id'],
+                            'sequence_number': sequence_number,
+                            'instance_id': None, 'instance_uuid': None}})
+        network = self.plugin.create_chain_image_network(self.context, {
+            'chain_image_network': {'chain_map_id': chain_image['id'],
+                                    'network_id': 'net1'}})
+        conf = self.plugin.create_chain_image_conf(self.context, {
+            'chain_image_conf': {'chain_map_id': chain_image['id'],
+                                 'networkfunction_id': self.function['id'],
+                                 'config_handle_id': None}})
+        return chain_image, network, conf
+
+    def _topology(self, chain=None, context=None):
+        return self.plugin.get_chain_topology(context or self.context,
+                                              (chain or self.chain)['id'])
+
+    def _queries(self, chain=None):
+        del self.statements[:]
+        self._topology(chain)
+        return len(self.statements)
+
+    def test_topology(self):
+        second = self._create_chain_image('second', 2)[0]
+        first, network, conf = self._create_chain_image('first', 1)
+        topology = self._topology()
+        self.assertEqual(topology['id'], self.chain['id'])
+        self.assertEqual(topology['tenant_id'], 'tenant1')
+        self.assertEqual([image['id'] for image in topology['images']],
+                         [first['id'], second['id']])
+        image = topology['images'][0]
+        self.assertEqual(image['image']['id'], self.image['id'])
+        self.assertEqual(image['image']['metadatas'][0]['value'], 'fw')
+        self.assertEqual(image['image']['personalities'][0]['file_path'],
+                         '/etc/fw')
+        self.assertEqual(image['networks'],
+                         [{'id': network['id'], 'name': None,
+                           'network_id': 'net1', 'network_name': 'net1'}])
+        self.assertEqual(image['confs'][0]['id'], conf['id'])
+        self.assertEqual(image['confs'][0]['networkfunction_id'],
+                         self.function['id'])
+
+    def test_topology_without_images(self):
+        self.assertEqual(self._topology()['images'], [])
+
+    def test_unknown_chain(self):
+        self.assertRaises(q_exc.ChainNotFound, self._topology,
+                          {'id': 'nosuchchain'})
+
+    def test_query_count_does_not_grow_with_the_chain(self):
+        self._create_chain_image('first', 1)
+        self.assertEqual(self._queries(), 6)
+        self.topologies.invalidate(None)
+        self._create_chain_image('second', 2)
+        self._create_chain_image('third', 3)
+        self.assertEqual(self._queries(), 6)
+
+    def test_cached_topology_takes_no_query(self):
+        self._create_chain_image('first', 1)
+        self._topology()
+        self.assertEqual(self._queries(), 0)
+
+    def test_cached_topology_is_a_copy(self):
+        self._topology()['images'].append({})
+        self.assertEqual(self._topology()['images'], [])
+
+    def test_other_tenants_do_not_see_the_topology(self):
+        other = context.Context('user2', 'tenant2')
+        self.assertRaises(q_exc.ChainNotFound, self._topology, context=other)
+        # nor once it is cached
+        self._topology()
+        self.assertRaises(q_exc.ChainNotFound, self._topology, context=other)
+        owner = context.Context('user1', 'tenant1')
+        self.assertEqual(self._topology(context=owner)['id'],
+                         self.chain['id'])
+
+    def test_chain_image_changes_drop_the_topology(self):
+        first = self._create_chain_image('first', 1)[0]
+        second = self._create_chain_image('second', 2)[0]
+        self._topology()
+        self.plugin.update_chain_image(self.context, second['id'], {
+            'chain_image': {'sequence_number': 0}})
+        self.assertEqual([image['id'] for image in
+                          self._topology()['images']],
+                         [second['id'], first['id']])
+        self.plugin.delete_chain_image_conf(
+            self.context, self._topology()['images'][0]['confs'][0]['id'])
+        self.assertEqual(self._topology()['images'][0]['confs'], [])
+        self.plugin.delete_chain_image_network(
+            self.context, self._topology()['images'][1]['networks'][0]['id'])
+        self.assertEqual(self._topology()['images'][1]['networks'], [])
+
+    def test_association_changes_drop_the_topology(self):
+        network = self._create_chain_image('first', 1)[1]
+        self._topology()
+        self.plugin.update_chain_image_network(self.context, network['id'], {
+            'chain_image_network': {'name': 'uplink'}})
+        self.assertEqual(self._topology()['images'][0]['networks'][0]['name'],
+                         'uplink')
+        self.assertEqual(self._queries(), 0)
+
+    def test_other_chains_are_kept(self):
+        self._create_chain_image('first', 1)
+        other = self._create_chain('chain2')
+        self._create_chain_image('other', 1, chain=other)
+        self._topology()
+        self._topology(other)
+        self.plugin.update_chain(self.context, other['id'], {
+            'chain': {'name': 'renamed'}})
+        self.assertEqual(self._queries(), 0)
+        self.assertEqual(self._topology(other)['name'], 'renamed')
+
+    def test_shared_changes_drop_every_topology(self):
+        self._create_chain_image('first', 1)
+        other = self._create_chain('chain2')
+        self._topology()
+        self._topology(other)
+        self.plugin.update_image(self.context, self.image['id'], {
+            'image': {'flavor_id': 3}})
+        self.assertNotEqual(self._queries(), 0)
+        self.assertNotEqual(self._queries(other), 0)
+        self.assertEqual(self._topology()['images'][0]['image']['flavor_id'],
+                         3)
+
+    def test_rolled_back_changes_drop_the_topology(self):
+        session = self.context.session
+        session.begin()
+        session.query(nwservices_db.ns_chain).filter_by(
+            id=self.chain['id']).one().name = 'renamed'
+        session.flush()
+        # read within the transaction, must not outlive it
+        self.assertEqual(self._topology()['name'], 'renamed')
+        session.rollback()
+        self.assertIsNone(self.topologies.get(self.chain['id']))
+        self.assertEqual(self._topology()['name'], 'chain1')
+
+    def test_topology_read_during_an_invalidation_is_not_cached(self):
+        load = self.plugin._load_chain_topology
+
+        def racing_load(context, chain_id):
+            topology = load(context, chain_id)
+            # committed by another request meanwhile
+            self.topologies.invalidate([chain_id])
+            return topology
+
+        with mock.patch.object(self.plugin, '_load_chain_topology',
+                               side_effect=racing_load):
+            self._topology()
+        self.assertIsNone(self.topologies.get(self.chain['id']))
+
+    def test_topology_expires(self):
+        self._topology()
+        self.time += 60
+        self.assertEqual(self._queries(), 0)
+        # changed by another API worker
+        self.time += 1
+        self.assertNotEqual(self._queries(), 0)
+
+    def test_topology_ttl(self):
+        cfg.CONF.set_override('chain_topology_ttl', 0, 'NWSDRIVER')
+        self._topology()
+        self.time += 1
+        self.assertNotEqual(self._queries(), 0)
@@ -0,0 +1,118 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import timeutils
+from quantum.plugins.services.nwservices import client_pool
+
+NOW = datetime.datetime(2013, 5, 1, 12, 0, 0)
+
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        timeutils.set_time_override(NOW)
+        self.addCleanup(timeutils.clear_time_override)
+        self.create_client = mock.Mock(side_effect=lambda: mock.Mock())
+        self.authenticate = mock.Mock(return_value='2013-05-01T13:00:00Z')
+        self.pool = client_pool.ClientPool('nova', self.create_client,
+                                           self.authenticate, max_size=2,
+                                           refresh_margin=60)
+
+    def _use(self):
+        with self.pool.item() as client:
+            return client
+
+    def test_client_is_reused_with_its_token(self):
+        client = self._use()
+        self.assertIs(self._use(), client)
+        self.assertEqual(self.create_client.call_count, 1)
+        self.assertEqual(self.authenticate.call_count, 1)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['requests']),
+                         (1, 1, 2))
+        self.assertEqual((stats['free'], stats['size']), (2, 1))
+
+    def test_expiring_token_is_refreshed(self):
+        client = self._use()
+        timeutils.advance_time_seconds(3600 - 60)
+        self.assertIs(self._use(), client)
+        self.assertEqual(self.authenticate.call_count, 2)
+        self.assertEqual(self.pool.stats['refreshes'], 1)
+
+    def test_token_is_kept_until_the_margin(self):
+        self._use()
+        timeutils.advance_time_seconds(3600 - 61)
+        self._use()
+        self.assertEqual(self.authenticate.call_count, 1)
+
+    def test_token_without_expiry_gets_the_default_lifetime(self):
+        self.authenticate.return_value = None
+        self._use()
+        timeutils.advance_time_seconds(
+            client_pool.DEFAULT_TOKEN_LIFETIME - 61)
+        self._use()
+        self.assertEqual(self.authenticate.call_count, 1)
+        timeutils.advance_time_seconds(1)
+        self._use()
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    def test_failed_request_drops_the_token(self):
+        def fail():
+            with self.pool.item():
+                raise ValueError()
+
+        client = self._use()
+        self.assertRaises(ValueError, fail)
+        self.assertIs(self._use(), client)
+        self.assertEqual(self.authenticate.call_count, 2)
+        self.assertEqual(self.pool.stats['refreshes'], 0)
+
+    def test_failed_authentication_returns_the_client(self):
+        self.authenticate.side_effect = [ValueError(), None]
+        self.assertRaises(ValueError, self._use)
+        self.assertEqual(self.pool.stats['failures'], 1)
+        self.assertEqual(len(self.pool.free_items), 1)
+        self._use()
+        self.assertEqual(self.create_client.call_count, 1)
+
+    def test_concurrent_items_get_their_own_clients(self):
+        with self.pool.item() as client1:
+            with self.pool.item() as client2:
+                self.assertIsNot(client1, client2)
+        self.assertEqual(self.pool.get_stats()['size'], 2)
+
+
+class TestGetPool(unittest.TestCase):
+    def setUp(self):
+        pools = mock.patch.object(client_pool, '_pools', {})
+        pools.start()
+        self.addCleanup(pools.stop)
+
+    def test_pools_are_registered_by_name(self):
+        pool = client_pool.get_pool('nova', mock.Mock(), mock.Mock(),
+                                    max_size=3)
+        self.assertIs(client_pool.get_pool('nova', mock.Mock(), mock.Mock()),
+                      pool)
+        self.assertEqual(pool.max_size, 3)
+        self.assertIsNot(client_pool.get_pool('quantum', mock.Mock(),
+                                              mock.Mock()), pool)
+        self.assertEqual(sorted(client_pool.get_stats()),
+                         ['nova', 'quantum'])
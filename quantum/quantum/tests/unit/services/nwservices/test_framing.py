@@ -0,0 +1,107 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.plugins.services.nwservices.agent import framing
+from quantum.plugins.services.nwservices.agent import quantum_relay_agent
+from quantum.plugins.services.nwservices.agent import remote_control
+
+HELLO = {'method': 'hello'}
+CONFIG = {'config': {'config_handle_id': 'handle1', 'version': '3'}}
+
+
+class TestFrameDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = framing.FrameDecoder()
+
+    def test_round_trip(self):
+        self.assertEqual(self.decoder.feed(framing.encode(CONFIG)), [CONFIG])
+        self.assertEqual(len(self.decoder.buffer), 0)
+
+    def test_frame_split_at_every_byte(self):
+        data = framing.encode(CONFIG)
+        messages = []
+        for i in range(len(data)):
+            messages.extend(self.decoder.feed(data[i]))
+            if i < len(data) - 1:
+                self.assertEqual(messages, [])
+        self.assertEqual(messages, [CONFIG])
+
+    def test_frames_of_one_chunk(self):
+        data = framing.encode(HELLO) + framing.encode(CONFIG)
+        partial = framing.encode(HELLO)
+        self.assertEqual(self.decoder.feed(data + partial[:2]),
+                         [HELLO, CONFIG])
+        self.assertEqual(self.decoder.feed(partial[2:]), [HELLO])
+        self.assertEqual(len(self.decoder.buffer), 0)
+
+    def test_empty_message(self):
+        self.assertEqual(self.decoder.feed(framing.encode({})), [{}])
+
+    def test_oversized_frame_is_refused_from_its_header(self):
+        decoder = framing.FrameDecoder(max_frame_size=16)
+        self.assertRaises(framing.FramingError, decoder.feed,
+                          framing.HEADER.pack(17))
+        decoder = framing.FrameDecoder(max_frame_size=16)
+        self.assertEqual(decoder.feed(framing.HEADER.pack(16)), [])
+
+    def test_malformed_message(self):
+        self.assertRaises(framing.FramingError, self.decoder.feed,
+                          framing.HEADER.pack(5) + 'nojso')
+
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(remote_control, 'quantumclient_pool'):
+            self.control = remote_control.RemoteControl()
+        self.port = remote_control.VMPort(10, 4, 2)
+        self.port.sock = mock.Mock()
+        self.port.decoder = framing.FrameDecoder()
+        handle = mock.patch.object(self.control, '_handle_message')
+        self.handle = handle.start()
+        self.addCleanup(handle.stop)
+
+    def _read(self, *chunks):
+        self.port.sock.recv.side_effect = list(chunks) + ['']
+        self.control._reader(self.port)
+        return [call[0][1] for call in self.handle.call_args_list]
+
+    def test_messages_are_reassembled_across_reads(self):
+        data = framing.encode(HELLO) + framing.encode(CONFIG)
+        self.assertEqual(self._read(data[:3], data[3:-1], data[-1:]),
+                         [HELLO, CONFIG])
+
+    def test_corrupt_stream_drops_the_connection(self):
+        corrupt = framing.HEADER.pack(3) + 'bad'
+        self.assertEqual(self._read(framing.encode(HELLO), corrupt,
+                                    framing.encode(CONFIG)), [HELLO])
+        # the connection is dropped before the next read
+        self.assertEqual(self.port.sock.recv.call_count, 2)
+
+    def test_read_error_drops_the_connection(self):
+        self.port.sock.recv.side_effect = remote_control.socket.error()
+        self.control._reader(self.port)
+        self.assertFalse(self.handle.called)
+
+    def test_connect_starts_a_new_stream(self):
+        self.port.decoder.feed(framing.encode(HELLO)[:3])
+        with mock.patch.object(remote_control.socket, 'socket'):
+            self.assertTrue(self.control._connect(self.port))
+        self.assertEqual(len(self.port.decoder.buffer), 0)
+        self.assertEqual(self.port.generation, 1)
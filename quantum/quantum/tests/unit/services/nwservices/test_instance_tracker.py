@@ -0,0 +1,163 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+import unittest2 as unittest
+
+from quantum.plugins.services.nwservices.drivers import instance_tracker
+
+UUID = 'b5c5e2f5-3a9e-4a54-9a4c-4b6b4b0a1a01'
+
+
+class FakePool(object):
+    def __init__(self, client):
+        self.client = client
+
+    @contextlib.contextmanager
+    def item(self):
+        yield self.client
+
+
+def _server(state, uuid=UUID, host='compute1',
+            instance_name='instance-0000000a'):
+    server = mock.Mock()
+    server.id = uuid
+    server.tenant_id = 'tenant1'
+    setattr(server, instance_tracker.VM_STATE, state)
+    setattr(server, instance_tracker.INSTANCE_NAME, instance_name)
+    setattr(server, instance_tracker.HOST, host)
+    return server
+
+
+class TestInstanceReadinessTracker(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.servers.list.return_value = []
+        self.tracker = instance_tracker.InstanceReadinessTracker(
+            FakePool(self.client), timeout=300, cache_ttl=600)
+        spawn = mock.patch.object(instance_tracker.eventlet, 'spawn')
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+        self.time = 1000.0
+        clock = mock.patch.object(instance_tracker.time, 'time',
+                                  side_effect=lambda: self.time)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.callback = mock.Mock()
+        self.errback = mock.Mock()
+
+    def _wait(self, uuid=UUID):
+        self.tracker.wait('handle1', uuid, self.callback, self.errback)
+
+    def test_unchanged_active_instance_is_looked_up(self):
+        # active long ago, the changes-since listing does not return it
+        self.client.servers.get.return_value = _server('active')
+        self._wait()
+        self.assertTrue(self.spawn.called)
+        self.assertTrue(self.tracker._poll_once())
+        self.client.servers.get.assert_called_once_with(UUID)
+        self.callback.assert_called_once_with(10, 'tenant1', 'compute1')
+        self.assertFalse(self.tracker._pending)
+
+    def test_building_instance_is_found_by_listing(self):
+        self.client.servers.get.return_value = _server('building')
+        self._wait()
+        self.assertFalse(self.tracker._poll_once())
+        self.assertFalse(self.callback.called)
+        self.client.servers.list.return_value = [_server('active')]
+        self.assertTrue(self.tracker._poll_once())
+        self.callback.assert_called_once_with(10, 'tenant1', 'compute1')
+        # looked up on its own once only
+        self.assertEqual(self.client.servers.get.call_count, 1)
+        kwargs = self.client.servers.list.call_args[1]
+        self.assertEqual(kwargs['search_opts']['all_tenants'], 1)
+        self.assertIn('changes-since', kwargs['search_opts'])
+
+    def test_deleted_instance_calls_errback(self):
+        self.client.servers.get.side_effect = (
+            instance_tracker.nova_exc.NotFound(404))
+        self._wait()
+        self.assertTrue(self.tracker._poll_once())
+        self.assertFalse(self.callback.called)
+        self.assertEqual(self.errback.call_count, 1)
+        self.assertFalse(self.tracker._pending)
+
+    def test_error_state_calls_errback(self):
+        self.client.servers.get.return_value = _server('error')
+        self._wait()
+        self.tracker._poll_once()
+        self.assertEqual(self.errback.call_count, 1)
+
+    def test_timeout_drops_waiters(self):
+        self.client.servers.get.return_value = _server('building')
+        self._wait()
+        self.tracker._poll_once()
+        self.time += 301
+        self.tracker._poll_once()
+        self.assertFalse(self.callback.called)
+        self.assertEqual(self.errback.call_count, 1)
+        self.assertFalse(self.tracker._pending)
+
+    def test_waiters_of_one_instance_share_a_lookup(self):
+        self.client.servers.get.return_value = _server('active')
+        self._wait()
+        self._wait()
+        self.tracker._poll_once()
+        self.assertEqual(self.callback.call_count, 2)
+        self.assertEqual(self.client.servers.get.call_count, 1)
+
+    def test_resolved_instance_skips_nova(self):
+        self.client.servers.get.return_value = _server('active')
+        self._wait()
+        self.tracker._poll_once()
+        self.spawn.reset_mock()
+        self._wait()
+        self.assertEqual(self.callback.call_count, 2)
+        self.assertFalse(self.spawn.called)
+        self.assertFalse(self.tracker._pending)
+
+    def test_resolved_instance_expires(self):
+        self.client.servers.get.return_value = _server('active')
+        self._wait()
+        self.tracker._poll_once()
+        self.time += 599
+        self.assertEqual(self.tracker.lookup(UUID),
+                         (10, 'tenant1', 'compute1'))
+        self.time += 1
+        self.assertIsNone(self.tracker.lookup(UUID))
+        # live migrated meanwhile
+        self.client.servers.get.return_value = _server('active',
+                                                       host='compute2')
+        self._wait()
+        self.tracker._poll_once()
+        self.callback.assert_called_with(10, 'tenant1', 'compute2')
+
+    def test_failed_delivery_forgets_instance(self):
+        self.client.servers.get.return_value = _server('active')
+        self.callback.side_effect = Exception()
+        self._wait()
+        self.tracker._poll_once()
+        self.assertIsNone(self.tracker.lookup(UUID))
+
+    def test_forget(self):
+        self.client.servers.get.return_value = _server('active')
+        self._wait()
+        self.tracker._poll_once()
+        self.tracker.forget(UUID)
+        self.assertIsNone(self.tracker.lookup(UUID))
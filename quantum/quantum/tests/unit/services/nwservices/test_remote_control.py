@@ -0,0 +1,214 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import cfg
+from quantum.plugins.services.nwservices.agent import framing
+from quantum.plugins.services.nwservices.agent import quantum_relay_agent
+from quantum.plugins.services.nwservices.agent import remote_control
+
+
+def _config(handle, version):
+    return {'config': {'config_handle_id': handle, 'version': version,
+                       'slug': 'loadbalancer'}}
+
+
+class FakePool(object):
+    def __init__(self, client):
+        self.client = client
+
+    @contextlib.contextmanager
+    def item(self):
+        yield self.client
+
+
+class TestVMPort(unittest.TestCase):
+    def setUp(self):
+        self.port = remote_control.VMPort(10, 2, 2)
+
+    def _drain(self):
+        messages = []
+        while self.port.queue:
+            messages.append(self.port.pop()[1])
+        return messages
+
+    def test_newer_keyed_message_replaces_the_queued_one(self):
+        self.port.put(_config('h1', '1'), ('config', 'h1'))
+        self.port.put({'id': 1}, None)
+        self.port.put(_config('h2', '1'), ('config', 'h2'))
+        self.port.put(_config('h1', '2'), ('config', 'h1'))
+        # the replaced message keeps its place in the queue
+        self.assertEqual(self._drain(), [_config('h1', '2'), {'id': 1},
+                                         _config('h2', '1')])
+        self.assertEqual(self.port.coalesced, 1)
+
+    def test_replies_are_bounded_by_the_queue_size(self):
+        self.port.put({'id': 1})
+        self.port.put({'id': 2})
+        self.assertEqual(self.port.room.balance, 0)
+        self.port.pop()
+        self.assertEqual(self.port.room.balance, 1)
+        # keyed messages do not take room
+        self.port.put(_config('h1', '1'), ('config', 'h1'))
+        self.assertEqual(self.port.room.balance, 1)
+
+    def test_reset_queues_the_last_configs_again(self):
+        self.port.put(_config('h1', '1'), ('config', 'h1'), resend=True)
+        self.port.put(_config('h1', '2'), ('config', 'h1'), resend=True)
+        self.port.put({'id': 1})
+        self.port.put({'stats': {}}, ('stats', 'h1'))
+        self.port.status_up = True
+        self.port.sent[('config', 'h1')] = 0
+        self.port.reset()
+        self.assertFalse(self.port.status_up)
+        self.assertEqual(self.port.sent, {})
+        self.assertEqual(self.port.room.balance, 2)
+        self.assertEqual(self._drain(), [_config('h1', '2')])
+
+    def test_round_trip_time(self):
+        with mock.patch.object(remote_control.time, 'time',
+                               side_effect=[10.0, 11.0]):
+            self.port.sent[('stats', 'h1')] = 9.0
+            self.port.received(('stats', 'h1'))
+            self.port.sent[('stats', 'h1')] = 9.0
+            self.port.received(('stats', 'h1'))
+        self.assertEqual(self.port.rtt, 2.0)
+        self.assertAlmostEqual(self.port.avg_rtt,
+                               1.0 + remote_control.RTT_WEIGHT)
+        # a reply that was not waited for is ignored
+        self.port.received(('stats', 'h2'))
+        self.assertEqual(self.port.rtt, 2.0)
+
+
+class TestRemoteControl(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('stats_interval', 0, 'RELAY')
+        self.client = mock.Mock()
+        with mock.patch.object(remote_control, 'quantumclient_pool',
+                               return_value=FakePool(self.client)):
+            self.control = remote_control.RemoteControl(
+                stats_callback=mock.Mock())
+        self.port = remote_control.VMPort(10, 4, 2)
+        self.port.sock = mock.Mock()
+        self.port.generation = 1
+        self.control.ports[10] = self.port
+
+    def _sent(self):
+        return [framing.FrameDecoder().feed(call[0][0])[0]
+                for call in self.port.sock.sendall.call_args_list]
+
+    def _write(self):
+        self.port.wakeup = mock.Mock()
+        self.port.wakeup.get.side_effect = [None, StopIteration()]
+        self.assertRaises(StopIteration, self.control._writer, self.port)
+
+    def test_nothing_is_written_before_hello(self):
+        self.port.put(_config('h1', '1'), ('config', 'h1'))
+        self._write()
+        self.assertEqual(self._sent(), [])
+        self.control._handle_message(self.port, {'method': 'hello'})
+        self.assertTrue(self.port.status_up)
+        self._write()
+        self.assertEqual(self._sent(), [_config('h1', '1')])
+        self.assertIn(('config', 'h1'), self.port.sent)
+
+    def test_write_error_stops_the_writer(self):
+        self.port.status_up = True
+        self.port.put({'id': 1})
+        self.port.put({'id': 2})
+        self.port.sock.sendall.side_effect = remote_control.socket.error()
+        self.control._writer(self.port)
+        self.assertEqual(self.port.sock.sendall.call_count, 1)
+
+    def test_requests_are_answered_with_their_id(self):
+        self.client.list_ports.return_value = {'ports': []}
+        with mock.patch.object(self.control.pool, 'spawn_n') as spawn_n:
+            self.control._handle_message(self.port, {
+                'id': 7, 'method': 'list_ports', 'kwargs': {'name': 'p'}})
+        self.assertEqual(self.port.requests.balance, 1)
+        spawn_n.assert_called_once_with(self.control._call_quantum,
+                                        self.port, 1, mock.ANY)
+        self.control._call_quantum(*spawn_n.call_args[0][1:])
+        self.client.list_ports.assert_called_once_with(name='p')
+        self.assertEqual(self.port.requests.balance, 2)
+        self.assertEqual(self.port.pop(),
+                         (None, {'id': 7, 'result': {'ports': []}}))
+
+    def test_failed_request_is_answered_with_the_error(self):
+        self.client.show_port.side_effect = Exception('not found')
+        self.port.requests.acquire()
+        self.control._call_quantum(self.port, 1,
+                                   {'id': 8, 'method': 'show_port'})
+        self.assertEqual(self.port.pop(),
+                         (None, {'id': 8, 'error': 'not found'}))
+        self.assertEqual(self.port.requests.balance, 2)
+
+    def test_reply_to_an_earlier_connection_is_dropped(self):
+        self.port.requests.acquire()
+        self.port.generation = 2
+        self.control._call_quantum(self.port, 1,
+                                   {'id': 9, 'method': 'list_ports'})
+        self.assertEqual(len(self.port.queue), 0)
+        self.assertEqual(self.port.requests.balance, 2)
+
+    def test_stats_reply_is_reported(self):
+        self.port.sent[('stats', 'h1')] = 0
+        self.control._handle_message(self.port, {
+            'header': 'stats', 'config_handle_id': 'h1', 'stats': {'a': 1}})
+        self.control.stats_callback.assert_called_once_with(10, 'h1',
+                                                            {'a': 1})
+        self.assertNotIn(('stats', 'h1'), self.port.sent)
+
+    def test_config_is_keyed_on_its_handle(self):
+        with mock.patch.object(self.control, '_get_port',
+                               return_value=self.port):
+            self.assertTrue(self.control.send_data_to_vm(
+                10, _config('h1', '1')))
+            self.assertTrue(self.control.send_data_to_vm(
+                10, _config('h1', '2')))
+        self.assertEqual(self.port.pop(), (('config', 'h1'),
+                                           _config('h1', '2')))
+        self.assertEqual(self.port.last, {('config', 'h1'):
+                                          _config('h1', '2')})
+
+    def test_unknown_instance(self):
+        with mock.patch.object(remote_control.os.path, 'isdir',
+                               return_value=False):
+            self.assertFalse(self.control.send_data_to_vm(11, {}))
+        self.assertNotIn(11, self.control.ports)
+
+    def test_stats_are_polled_on_ready_vms(self):
+        self.port.put(_config('h1', '1'), ('config', 'h1'), resend=True)
+        self.port.pop()
+        idle = remote_control.VMPort(11, 4, 2)
+        idle.put(_config('h2', '1'), ('config', 'h2'), resend=True)
+        idle.pop()
+        self.control.ports[11] = idle
+        self.port.status_up = True
+        with mock.patch.object(remote_control.eventlet, 'sleep',
+                               side_effect=[None, None, StopIteration()]):
+            self.assertRaises(StopIteration, self.control._poll_stats)
+        # asked twice, the second request replaced the first
+        self.assertEqual(self.port.pop(), (('stats', 'h1'), {
+            'stats': {'config_handle_id': 'h1', 'slug': 'loadbalancer'}}))
+        self.assertEqual(len(self.port.queue), 0)
+        self.assertEqual(len(idle.queue), 0)
@@ -0,0 +1,262 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
+from sqlalchemy import orm
+import unittest2 as unittest
+
+from quantum.common import config
+from quantum.common import exceptions as q_exc
+from quantum.openstack.common import cfg
+from quantum.plugins.common import constants
+from quantum.plugins.services.nwservices.scheduler import device_manager
+from quantum.plugins.services.nwservices.scheduler import policies
+
+
+def _device(dev_id, ref_counter=0, connections=0, cpu_load=0, host=''):
+    return {'id': dev_id, 'ref_counter': ref_counter,
+            'connections': connections, 'cpu_load': cpu_load, 'host': host}
+
+
+RESOURCE = {'id': 'pool1', 'tenant_id': 'tenant1', 'subnet_id': 'subnet1'}
+
+
+class TestPolicies(unittest.TestCase):
+    def setUp(self):
+        cfg.CONF.set_override('max_resources_per_device', 10, 'NWSDRIVER')
+        cfg.CONF.set_override('max_connections_per_device', 1000,
+                              'NWSDRIVER')
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_load_is_the_highest_relative_load(self):
+        self.assertEqual(policies.load(_device('d', ref_counter=5)), 0.5)
+        self.assertEqual(policies.load(_device('d', ref_counter=1,
+                                               cpu_load=80)), 0.8)
+        self.assertEqual(policies.load(_device('d', ref_counter=1,
+                                               connections=900)), 0.9)
+
+    def test_load_ignores_connections_without_limit(self):
+        cfg.CONF.set_override('max_connections_per_device', 0, 'NWSDRIVER')
+        self.assertEqual(policies.load(_device('d', connections=5000)), 0)
+
+    def test_load_of_unreported_device(self):
+        device = _device('d', ref_counter=None, connections=None,
+                         cpu_load=None)
+        self.assertEqual(policies.load(device), 0)
+
+    def test_least_loaded(self):
+        devices = [_device('d1', ref_counter=2),
+                   _device('d2', ref_counter=1, cpu_load=50),
+                   _device('d3', ref_counter=3)]
+        self.assertEqual(policies.LeastLoaded()(RESOURCE, devices)['id'],
+                         'd1')
+
+    def test_bin_pack(self):
+        devices = [_device('d1', ref_counter=2),
+                   _device('d2', ref_counter=1, cpu_load=50),
+                   _device('d3', ref_counter=3)]
+        self.assertEqual(policies.BinPack()(RESOURCE, devices)['id'], 'd2')
+
+    def test_ties_are_broken_by_id(self):
+        devices = [_device('d2'), _device('d1')]
+        self.assertEqual(policies.LeastLoaded()(RESOURCE, devices)['id'],
+                         'd1')
+
+    def test_spread_prefers_the_least_used_host(self):
+        devices = [_device('d1', ref_counter=1, host='compute1'),
+                   _device('d2', ref_counter=1, host='compute1'),
+                   _device('d3', ref_counter=1, cpu_load=60,
+                           host='compute2')]
+        self.assertEqual(policies.Spread()(RESOURCE, devices)['id'], 'd3')
+
+    def test_spread_counts_unknown_hosts_apart(self):
+        devices = [_device('d1', ref_counter=1, cpu_load=50,
+                           host='compute1'),
+                   _device('d2', ref_counter=1),
+                   _device('d3', ref_counter=1)]
+        self.assertEqual(policies.Spread()(RESOURCE, devices)['id'], 'd2')
+
+    def test_get_policy(self):
+        self.assertIsInstance(policies.get_policy(), policies.LeastLoaded)
+        self.assertIsInstance(policies.get_policy('spread'), policies.Spread)
+        self.assertIsInstance(policies.get_policy(
+            'quantum.plugins.services.nwservices.scheduler.policies.BinPack'),
+            policies.BinPack)
+        self.assertRaises(q_exc.ClassNotFound, policies.get_policy,
+                          'no.such.Policy')
+
+
+class TestDeviceIndex(unittest.TestCase):
+    def setUp(self):
+        self.time = 1000.0
+        clock = mock.patch.object(device_manager.time, 'time',
+                                  side_effect=lambda: self.time)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.index = device_manager.DeviceIndex(60)
+
+    def test_entries_expire(self):
+        self.index.put('key', ['d1'])
+        self.time += 60
+        self.assertEqual(self.index.get('key'), set(['d1']))
+        self.time += 1
+        self.assertIsNone(self.index.get('key'))
+
+    def test_invalidate(self):
+        self.index.put('key1', ['d1'])
+        self.index.put('key2', ['d2'])
+        self.index.invalidate('key1', 'key3')
+        self.assertIsNone(self.index.get('key1'))
+        self.assertEqual(self.index.get('key2'), set(['d2']))
+
+
+class TestLoadColumnsUpgrade(unittest.TestCase):
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        # balancerdevices as created before the load was reported
+        sa.Table('balancerdevices', sa.MetaData(),
+                 sa.Column('id', sa.String(36), primary_key=True),
+                 sa.Column('tenant_id', sa.String(255)),
+                 sa.Column('name', sa.String(36), nullable=False),
+                 sa.Column('type', sa.String(36), nullable=False),
+                 sa.Column('version', sa.String(36), nullable=False),
+                 sa.Column('management', sa.String(255), nullable=False),
+                 sa.Column('ref_counter', sa.Integer),
+                 sa.Column('subnet_id', sa.String(36)),
+                 sa.Column('status', sa.String(36),
+                           nullable=False)).create(self.engine)
+        self.engine.execute("INSERT INTO balancerdevices VALUES "
+                            "('dev1', 'tenant1', 'dev1', 'HAPROXY', 'v1.0', "
+                            "'{}', 1, 'subnet1', 'ACTIVE')")
+
+    def test_upgrade(self):
+        device_manager._add_load_columns(self.engine)
+        inspector = reflection.Inspector.from_engine(self.engine)
+        columns = [column['name'] for column in
+                   inspector.get_columns('balancerdevices')]
+        for name in ('host', 'connections', 'cpu_load'):
+            self.assertIn(name, columns)
+        self.assertIn('balancerdevices_scheduling',
+                      [index['name'] for index in
+                       inspector.get_indexes('balancerdevices')])
+        session = orm.sessionmaker(bind=self.engine)()
+        device = session.query(device_manager.BalancerDevice).one()
+        self.assertEqual((device.host, device.connections, device.cpu_load),
+                         ('', 0, 0))
+        self.assertEqual(device.ref_counter, 1)
+
+    def test_upgraded_table_is_left_alone(self):
+        device_manager._add_load_columns(self.engine)
+        self.engine.execute("UPDATE balancerdevices SET connections = 7")
+        # adding the columns or the index again would fail
+        device_manager._add_load_columns(self.engine)
+        self.assertEqual(self.engine.execute(
+            "SELECT connections FROM balancerdevices").scalar(), 7)
+
+    def test_no_table(self):
+        engine = sa.create_engine('sqlite://')
+        device_manager._add_load_columns(engine)
+        self.assertEqual(reflection.Inspector.from_engine(
+            engine).get_table_names(), [])
+
+
+class TestBalancerDeviceManager(unittest.TestCase):
+    def setUp(self):
+        cfg.CONF.set_override('max_resources_per_device', 2, 'NWSDRIVER')
+        cfg.CONF.set_override('max_connections_per_device', 1000,
+                              'NWSDRIVER')
+        self.addCleanup(cfg.CONF.reset)
+        engine = sa.create_engine('sqlite://')
+        device_manager.BalancerDevice.__table__.create(engine)
+        device_manager.ResourceAssociation.__table__.create(engine)
+        self.context = mock.Mock()
+        self.context.session = orm.sessionmaker(bind=engine, autocommit=True,
+                                                expire_on_commit=False)()
+        with mock.patch.object(device_manager.BalancerDeviceManager,
+                               '_initialize_db'):
+            self.manager = device_manager.BalancerDeviceManager()
+
+    def _create_device(self, name, status=constants.ACTIVE,
+                       subnet_id='subnet1'):
+        return self.manager.create_device(
+            self.context, {'name': name, 'type': 'HAPROXY',
+                           'version': 'v1.0', 'management': {},
+                           'tenant_id': 'tenant1', 'subnet_id': subnet_id,
+                           'status': status})
+
+    def _schedule(self, resource_id, policy=policies.LeastLoaded()):
+        resource = dict(RESOURCE, id=resource_id)
+        return self.manager.schedule(self.context, resource, policy,
+                                     'HAPROXY')
+
+    def _get(self, device):
+        self.context.session.expire_all()
+        return (self.context.session.query(device_manager.BalancerDevice).
+                filter_by(id=device.id).one())
+
+    def test_schedule_spreads_by_load(self):
+        dev1 = self._create_device('dev1')
+        dev2 = self._create_device('dev2')
+        self._create_device('pending', status=constants.PENDING_CREATE)
+        self._create_device('other', subnet_id='subnet2')
+        chosen = set([self._schedule('pool1').id, self._schedule('pool2').id])
+        self.assertEqual(chosen, set([dev1.id, dev2.id]))
+        self.assertEqual(self._get(dev1).ref_counter, 1)
+        self.assertEqual(self._get(dev2).ref_counter, 1)
+
+    def test_schedule_skips_full_devices(self):
+        self._create_device('dev1')
+        self._schedule('pool1')
+        self._schedule('pool2')
+        self.assertRaises(device_manager.NoValidDevice, self._schedule,
+                          'pool3')
+
+    def test_schedule_skips_devices_overloaded_by_reports(self):
+        dev1 = self._create_device('dev1')
+        dev2 = self._create_device('dev2')
+        self.manager.report_load(self.context, dev1.id, 'compute1', 1000, 10)
+        self.assertEqual(self._schedule('pool1').id, dev2.id)
+        self.manager.report_load(self.context, dev2.id, 'compute2', 10, 100)
+        self.assertRaises(device_manager.NoValidDevice, self._schedule,
+                          'pool2')
+
+    def test_schedule_sees_devices_created_by_other_workers(self):
+        self.assertRaises(device_manager.NoValidDevice, self._schedule,
+                          'pool1')
+        dev1 = self._create_device('dev1')
+        # created by another API worker, this index is stale
+        self.manager.index.put(('tenant1', 'subnet1', 'HAPROXY',
+                                constants.ACTIVE), [])
+        self.assertEqual(self._schedule('pool1').id, dev1.id)
+
+    def test_report_load_keeps_the_unreported_host(self):
+        dev1 = self._create_device('dev1')
+        self.manager.report_load(self.context, dev1.id, 'compute1', 5, 20)
+        self.manager.report_load(self.context, dev1.id, None, 7, 30)
+        device = self._get(dev1)
+        self.assertEqual((device.host, device.connections, device.cpu_load),
+                         ('compute1', 7, 30))
+
+    def test_delete_association_releases_the_device(self):
+        dev1 = self._create_device('dev1')
+        self._schedule('pool1')
+        device = self.manager.delete_association(self.context,
+                                                 {'id': 'pool1'})
+        self.assertEqual(device.status, constants.PENDING_DELETE)
+        self.assertEqual(self._get(dev1).ref_counter, 0)
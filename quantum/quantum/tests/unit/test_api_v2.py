@@ -315,6 +315,120 @@ class APIv2TestCase(APIv2TestBase):
                                                    fields=mock.ANY)
 
 
+class PaginationSortingTestCase(APIv2TestBase):
+    def _setup_api(self, native):
+        cfg.CONF.set_override('allow_pagination', True)
+        cfg.CONF.set_override('allow_sorting', True)
+        instance = self.plugin.return_value
+        instance._QuantumPluginBaseV2__native_pagination_support = native
+        instance._QuantumPluginBaseV2__native_sorting_support = native
+        self.api = webtest.TestApp(router.APIRouter())
+        return instance
+
+    def _networks(self, *names):
+        # what a plugin projecting on the fields requested returns
+        return [{'id': 'id-%s' % name, 'name': name, 'tenant_id': 'tenant',
+                 'shared': False} for name in names]
+
+    def test_native_pagination_with_fields(self):
+        instance = self._setup_api(True)
+        instance.get_networks.return_value = self._networks('a', 'b', 'c')
+
+        res = self.api.get(_get_path('networks'),
+                           {'limit': 2, 'fields': 'name'})
+        kwargs = instance.get_networks.call_args[1]
+        self.assertIn('id', kwargs['fields'])
+        self.assertEqual(kwargs['sorts'], [('id', True)])
+        self.assertEqual(kwargs['limit'], 3)
+        self.assertIsNone(kwargs['marker'])
+        self.assertEqual(res.json['networks'], [{'name': 'a'},
+                                                {'name': 'b'}])
+        links = res.json['networks_links']
+        self.assertEqual([link['rel'] for link in links], ['next'])
+        self.assertIn('marker=id-b', links[0]['href'])
+
+    def test_native_sorting_with_fields(self):
+        instance = self._setup_api(True)
+        instance.get_networks.return_value = self._networks('b', 'a')
+
+        res = self.api.get(_get_path('networks'),
+                           {'sort_key': 'name', 'sort_dir': 'desc',
+                            'fields': 'id'})
+        kwargs = instance.get_networks.call_args[1]
+        self.assertIn('name', kwargs['fields'])
+        self.assertEqual(kwargs['sorts'], [('name', False)])
+        self.assertNotIn('limit', kwargs)
+        self.assertEqual(res.json['networks'], [{'id': 'id-b'},
+                                                {'id': 'id-a'}])
+
+    def test_emulated_pagination(self):
+        instance = self._setup_api(False)
+        instance.get_networks.return_value = self._networks('d', 'b', 'a',
+                                                            'c', 'e')
+
+        res = self.api.get(_get_path('networks'),
+                           {'limit': 2, 'marker': 'id-b', 'fields': 'name',
+                            'sort_key': 'name', 'sort_dir': 'asc'})
+        kwargs = instance.get_networks.call_args[1]
+        self.assertNotIn('limit', kwargs)
+        self.assertNotIn('sorts', kwargs)
+        self.assertIn('id', kwargs['fields'])
+        self.assertEqual(res.json['networks'], [{'name': 'c'},
+                                                {'name': 'd'}])
+        links = dict((link['rel'], link['href'])
+                     for link in res.json['networks_links'])
+        self.assertIn('marker=id-d', links['next'])
+        self.assertIn('marker=id-c', links['previous'])
+        self.assertIn('page_reverse=True', links['previous'])
+
+    def test_emulated_pagination_reverse(self):
+        instance = self._setup_api(False)
+        instance.get_networks.return_value = self._networks('a', 'b', 'c',
+                                                            'd')
+
+        res = self.api.get(_get_path('networks'),
+                           {'limit': 2, 'marker': 'id-d',
+                            'page_reverse': 'True'})
+        self.assertEqual([net['name'] for net in res.json['networks']],
+                         ['b', 'c'])
+        links = dict((link['rel'], link['href'])
+                     for link in res.json['networks_links'])
+        self.assertIn('marker=id-c', links['next'])
+        self.assertIn('marker=id-b', links['previous'])
+
+    def test_emulated_pagination_last_page(self):
+        instance = self._setup_api(False)
+        instance.get_networks.return_value = self._networks('a', 'b')
+
+        res = self.api.get(_get_path('networks'), {'limit': 2})
+        self.assertEqual(len(res.json['networks']), 2)
+        self.assertNotIn('networks_links', res.json)
+
+    def test_emulated_pagination_bad_marker(self):
+        instance = self._setup_api(False)
+        instance.get_networks.return_value = self._networks('a', 'b')
+
+        res = self.api.get(_get_path('networks'),
+                           {'limit': 1, 'marker': 'nope'},
+                           expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+
+    def test_sort_key_not_visible(self):
+        self._setup_api(False)
+        res = self.api.get(_get_path('networks'),
+                           {'sort_key': 'foo', 'sort_dir': 'asc'},
+                           expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+
+    def test_pagination_max_limit(self):
+        cfg.CONF.set_override('pagination_max_limit', 2)
+        instance = self._setup_api(True)
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'), {'limit': 10})
+        self.assertEqual(instance.get_networks.call_args[1]['limit'], 3)
+
+
 # Note: since all resources use the same controller and validation
 # logic, we actually get really good coverage from testing just networks.
 class JSONV2TestCase(APIv2TestBase):
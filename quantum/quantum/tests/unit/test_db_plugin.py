@@ -20,6 +20,8 @@ import logging
 import mock
 import os
 import random
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
 import unittest2
 import webob.exc
 
@@ -33,6 +35,8 @@ from quantum.common.test_lib import test_config
 from quantum import context
 from quantum.db import api as db
 from quantum.db import db_base_plugin_v2
+from quantum.db import ipam
+from quantum.db import macs
 from quantum.db import models_v2
 from quantum.extensions.extensions import PluginAwareExtensionManager
 from quantum.manager import QuantumManager
@@ -705,11 +709,14 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                 return False
             return real_has_attr(item, attr)
 
-        with mock.patch('__builtin__.hasattr',
-                        new=fakehasattr):
-            orig = QuantumManager.get_plugin().create_port
-            with mock.patch.object(QuantumManager.get_plugin(),
-                                   'create_port') as patched_plugin:
+        plugin = QuantumManager.get_plugin()
+        bulk_port_rows = mock.patch.object(
+            plugin, "_%s__bulk_port_rows" % plugin.__class__.__name__, False,
+            create=True)
+        with contextlib.nested(mock.patch('__builtin__.hasattr',
+                                          new=fakehasattr), bulk_port_rows):
+            orig = plugin.create_port
+            with mock.patch.object(plugin, 'create_port') as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
@@ -728,10 +735,15 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk port create")
         ctx = context.get_admin_context()
-        with self.network() as net:
-            orig = QuantumManager._instance.plugin.create_port
-            with mock.patch.object(QuantumManager._instance.plugin,
-                                   'create_port') as patched_plugin:
+        plugin = QuantumManager._instance.plugin
+        # the ports are created one by one, as by a plugin doing more than
+        # the database work in create_port
+        bulk_port_rows = mock.patch.object(
+            plugin, "_%s__bulk_port_rows" % plugin.__class__.__name__, False,
+            create=True)
+        with contextlib.nested(self.network(), bulk_port_rows) as (net, _x):
+            orig = plugin.create_port
+            with mock.patch.object(plugin, 'create_port') as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
@@ -743,6 +755,55 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                 # We expect a 500 as we injected a fault in the plugin
                 self._validate_behavior_on_bulk_failure(res, 'ports')
 
+    def test_create_ports_bulk_with_fixed_ips(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            overrides = {0: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.10'}]},
+                         1: {'fixed_ips': [{'subnet_id': subnet_id}]}}
+            res = self._create_port_bulk('json', 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=overrides)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize('json', res)['ports']
+            ips = [[(ip['subnet_id'], ip['ip_address'])
+                    for ip in port['fixed_ips']] for port in ports]
+            self.assertEqual(ips, [[(subnet_id, '10.0.0.10')],
+                                   [(subnet_id, '10.0.0.2')],
+                                   [(subnet_id, '10.0.0.3')]])
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_failure_releases_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            net_id = subnet['subnet']['network_id']
+            # the last port of the bulk requests the address of the first
+            fixed_ips = [{'subnet_id': subnet_id, 'ip_address': '10.0.0.10'}]
+            overrides = {0: {'fixed_ips': fixed_ips},
+                         2: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk('json', 3, net_id, 'test', True,
+                                         override=overrides)
+            self.assertEqual(res.status_int, 409)
+            req = self.new_list_request('ports')
+            self.assertEqual(
+                self.deserialize('json', req.get_response(self.api))['ports'],
+                [])
+            # none of the addresses taken for the bulk are left in use
+            res = self._create_port_bulk('json', 2, net_id, 'test', True,
+                                         override={0: {'fixed_ips':
+                                                       fixed_ips}})
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize('json', res)['ports']
+            self.assertEqual([port['fixed_ips'][0]['ip_address']
+                              for port in ports], ['10.0.0.10', '10.0.0.2'])
+            for port in ports:
+                self._delete('ports', port['id'])
+
     def test_list_ports(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
@@ -1003,6 +1064,53 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             res = self._create_port(fmt, net_id=net_id)
             self.assertEquals(res.status_int, 503)
 
+    def _take_next_mac(self, net_id):
+        """Creates a port with the MAC address to be generated next on the
+        network, as another process would, and returns the address"""
+        prefix, size = macs._prefix()
+        suffix = macs._used_macs._cursors[(net_id, prefix)]
+        mac_address = macs._mac_address(prefix, size, suffix)
+        session = db.get_session()
+        with session.begin():
+            session.add(models_v2.Port(tenant_id=self._tenant_id, name='',
+                                       network_id=net_id,
+                                       mac_address=mac_address,
+                                       admin_state_up=True, status='ACTIVE',
+                                       device_id='', device_owner=''))
+        return mac_address
+
+    def test_mac_taken_by_another_process(self):
+        with self.network(do_delete=False) as network:
+            net_id = network['network']['id']
+            self._create_port('json', net_id)
+            taken = self._take_next_mac(net_id)
+            res = self._create_port('json', net_id)
+            self.assertEquals(res.status_int, 201)
+            port = self.deserialize('json', res)
+            self.assertNotEqual(port['port']['mac_address'], taken)
+
+    def test_mac_taken_by_another_process_bulk(self):
+        with self.network(do_delete=False) as network:
+            net_id = network['network']['id']
+            self._create_port('json', net_id)
+            taken = self._take_next_mac(net_id)
+            res = self._create_port_bulk('json', 2, net_id, 'test', True)
+            self.assertEquals(res.status_int, 201)
+            ports = self.deserialize('json', res)['ports']
+            self.assertNotIn(taken, [port['mac_address'] for port in ports])
+
+    def test_mac_taken_by_another_process_attempts(self):
+        with self.network(do_delete=False) as network:
+            net_id = network['network']['id']
+            res = self._create_port('json', net_id)
+            port = self.deserialize('json', res)
+            mac_address = port['port']['mac_address']
+            with mock.patch.object(macs._used_macs, 'take',
+                                   return_value=[mac_address]) as take:
+                res = self._create_port('json', net_id)
+            self.assertEquals(res.status_int, 503)
+            self.assertEquals(take.call_count, macs.MAX_ATTEMPTS)
+
     def test_requested_duplicate_ip(self):
         fmt = 'json'
         with self.subnet() as subnet:
@@ -1761,6 +1869,68 @@ class TestNetworksV2(QuantumDbPluginV2TestCase):
                 res = req.get_response(self.api)
                 self.assertEquals(400, res.status_int)
 
+    def _enable_pagination_sorting(self):
+        cfg.CONF.set_override('allow_pagination', True)
+        cfg.CONF.set_override('allow_sorting', True)
+        # the controllers read the options when created
+        self.api = APIRouter()
+
+    def test_list_networks_with_pagination(self):
+        self._enable_pagination_sorting()
+        with contextlib.nested(self.network(name='net3'),
+                               self.network(name='net1'),
+                               self.network(name='net2')):
+            res = self._list('networks',
+                             query_params='limit=2&sort_key=name&'
+                                          'sort_dir=asc&fields=name')
+            self.assertEquals(res['networks'], [{'name': 'net1'},
+                                                {'name': 'net2'}])
+            links = dict((link['rel'], link['href'])
+                         for link in res['networks_links'])
+            query = links['next'].split('?', 1)[1]
+            res = self._list('networks', query_params=query)
+            self.assertEquals(res['networks'], [{'name': 'net3'}])
+            self.assertEquals([link['rel'] for link in
+                               res['networks_links']], ['previous'])
+
+    def test_list_networks_with_pagination_reverse(self):
+        self._enable_pagination_sorting()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')) as nets:
+            marker = nets[2]['network']['id']
+            res = self._list('networks',
+                             query_params='limit=1&sort_key=name&'
+                                          'sort_dir=asc&page_reverse=True&'
+                                          'marker=%s' % marker)
+            self.assertEquals([net['name'] for net in res['networks']],
+                              ['net2'])
+            rels = sorted(link['rel'] for link in res['networks_links'])
+            self.assertEquals(rels, ['next', 'previous'])
+
+    def test_list_networks_with_sort_and_fields(self):
+        self._enable_pagination_sorting()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net3'),
+                               self.network(name='net2')) as nets:
+            res = self._list('networks',
+                             query_params='sort_key=name&sort_dir=desc&'
+                                          'fields=id')
+            ids = [net['network']['id'] for net in (nets[1], nets[2],
+                                                     nets[0])]
+            self.assertEquals(res['networks'], [{'id': net_id}
+                                                for net_id in ids])
+
+    def test_list_networks_with_pagination_bad_marker(self):
+        self._enable_pagination_sorting()
+        with self.network():
+            # no such network
+            marker = '5c8a7e5c-1d3f-4f46-9c5b-7a1e1b2e0d11'
+            req = self.new_list_request('networks',
+                                        params='limit=1&marker=%s' % marker)
+            res = req.get_response(self.api)
+            self.assertEquals(res.status_int, 400)
+
     def test_show_network(self):
         with self.network(name='net1') as net:
             req = self.new_show_request('networks', net['network']['id'])
@@ -2803,3 +2973,175 @@ class TestSubnetsV2(QuantumDbPluginV2TestCase):
         req = self.new_delete_request('subnets', subnet['subnet']['id'])
         res = req.get_response(self.api)
         self.assertEquals(res.status_int, 204)
+
+
+class TestIpam(QuantumDbPluginV2TestCase):
+
+    def _ranges(self, subnet):
+        session = context.get_admin_context().session
+        query = session.query(models_v2.IPAvailabilityRange).join(
+            models_v2.IPAllocationPool).filter_by(
+                subnet_id=subnet['subnet']['id'])
+        return sorted((ip_range['first_ip'], ip_range['last_ip'])
+                      for ip_range in query)
+
+    def _port_ips(self, subnet, fixed_ips=None):
+        kwargs = {}
+        if fixed_ips:
+            kwargs['fixed_ips'] = [{'subnet_id': subnet['subnet']['id'],
+                                    'ip_address': ip_address}
+                                   for ip_address in fixed_ips]
+        res = self._create_port('json', subnet['subnet']['network_id'],
+                                **kwargs)
+        self.assertEqual(res.status_int, 201)
+        port = self.deserialize('json', res)
+        return port['port']['id'], [ip['ip_address'] for ip
+                                    in port['port']['fixed_ips']]
+
+    def test_specific_ip_splits_range(self):
+        # addresses are recycled as soon as their port is deleted
+        cfg.CONF.set_override('dhcp_lease_duration', -1)
+        with self.subnet() as subnet:
+            port_id, ips = self._port_ips(subnet, ['10.0.0.10'])
+            self.assertEqual(ips, ['10.0.0.10'])
+            self.assertEqual(self._ranges(subnet),
+                             [('10.0.0.11', '10.0.0.254'),
+                              ('10.0.0.2', '10.0.0.9')])
+            self._delete('ports', port_id)
+            # returned to the range before it and merged with the one after
+            self.assertEqual(self._ranges(subnet),
+                             [('10.0.0.2', '10.0.0.254')])
+
+    def test_specific_ips_at_range_ends(self):
+        cfg.CONF.set_override('dhcp_lease_duration', -1)
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            port_id, ips = self._port_ips(subnet, ['10.0.0.2', '10.0.0.6'])
+            self.assertEqual(self._ranges(subnet),
+                             [('10.0.0.3', '10.0.0.5')])
+            self._delete('ports', port_id)
+            self.assertEqual(self._ranges(subnet),
+                             [('10.0.0.2', '10.0.0.6')])
+
+    def test_allocation_locks_one_range(self):
+        with self.subnet() as subnet:
+            # a hole makes two ranges
+            hole_id, ips = self._port_ips(subnet, ['10.0.0.10'])
+            with contextlib.nested(
+                mock.patch.object(ipam, '_lock_range',
+                                  wraps=ipam._lock_range),
+                mock.patch.object(ipam, '_lock_lowest_range')
+            ) as (lock_range, lock_lowest_range):
+                port_id, ips = self._port_ips(subnet)
+            self.assertEqual(ips, ['10.0.0.2'])
+            self.assertEqual(lock_range.call_count, 1)
+            self.assertFalse(lock_lowest_range.called)
+            self._delete('ports', port_id)
+            self._delete('ports', hole_id)
+
+    def test_range_taken_by_another_worker(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            port1_id, ips = self._port_ips(subnet)
+            self.assertEqual(ips, ['10.0.0.2'])
+            # another API worker allocated 10.0.0.3 and 10.0.0.4, the
+            # free range remembered by this one is gone
+            session = context.get_admin_context().session
+            with session.begin():
+                ip_range = session.query(
+                    models_v2.IPAvailabilityRange).filter_by(
+                        first_ip='10.0.0.3').one()
+                ip_range['first_ip'] = '10.0.0.5'
+            port2_id, ips = self._port_ips(subnet)
+            self.assertEqual(ips, ['10.0.0.5'])
+            self.assertEqual(self._ranges(subnet),
+                             [('10.0.0.6', '10.0.0.6')])
+            self._delete('ports', port1_id)
+            self._delete('ports', port2_id)
+
+
+class TestIpamUpgrade(unittest2.TestCase):
+
+    def setUp(self):
+        super(TestIpamUpgrade, self).setUp()
+        self.engine = sa.create_engine('sqlite://')
+        models_v2.model_base.BASEV2.metadata.create_all(self.engine)
+        # as created before the ranges had keys
+        self.engine.execute('DROP TABLE ipavailabilityranges')
+        self.engine.execute('CREATE TABLE ipavailabilityranges ('
+                            'allocation_pool_id VARCHAR(36), '
+                            'first_ip VARCHAR(64) NOT NULL, '
+                            'last_ip VARCHAR(64) NOT NULL, '
+                            'PRIMARY KEY (allocation_pool_id, first_ip, '
+                            'last_ip))')
+        self.engine.execute("INSERT INTO ipavailabilityranges VALUES "
+                            "('pool1', '10.0.0.2', '10.0.0.9'), "
+                            "('pool1', '10.0.0.11', '10.0.0.254')")
+
+    def _ranges(self):
+        return sorted(tuple(row) for row in self.engine.execute(
+            'SELECT first_ip, last_ip, first_ip_key, last_ip_key '
+            'FROM ipavailabilityranges'))
+
+    def test_keys_added_and_filled_in(self):
+        ipam._add_ip_keys(self.engine)
+        self.assertEqual(self._ranges(),
+                         [('10.0.0.11', '10.0.0.254',
+                           models_v2.ip_key('10.0.0.11'),
+                           models_v2.ip_key('10.0.0.254')),
+                          ('10.0.0.2', '10.0.0.9',
+                           models_v2.ip_key('10.0.0.2'),
+                           models_v2.ip_key('10.0.0.9'))])
+        inspector = reflection.Inspector.from_engine(self.engine)
+        indexed = [index['column_names'] for index in
+                   inspector.get_indexes('ipavailabilityranges')]
+        self.assertIn(['first_ip_key'], indexed)
+        self.assertIn(['last_ip_key'], indexed)
+        # up to date
+        ipam._add_ip_keys(self.engine)
+
+    def test_missing_keys_filled_in(self):
+        ipam._add_ip_keys(self.engine)
+        self.engine.execute("INSERT INTO ipavailabilityranges "
+                            "(allocation_pool_id, first_ip, last_ip) "
+                            "VALUES ('pool2', '10.0.1.2', '10.0.1.2')")
+        ipam._add_ip_keys(self.engine)
+        self.assertIn(('10.0.1.2', '10.0.1.2', models_v2.ip_key('10.0.1.2'),
+                       models_v2.ip_key('10.0.1.2')), self._ranges())
+
+
+class TestMacsUpgrade(unittest2.TestCase):
+
+    def setUp(self):
+        super(TestMacsUpgrade, self).setUp()
+        self.engine = sa.create_engine('sqlite://')
+        models_v2.model_base.BASEV2.metadata.create_all(self.engine)
+        # as created before the ports were indexed on their addresses
+        self.engine.execute('DROP INDEX %s' % models_v2.PORT_MAC_INDEX)
+
+    def _indexes(self):
+        inspector = reflection.Inspector.from_engine(self.engine)
+        return [index['name'] for index in inspector.get_indexes('ports')]
+
+    def _insert_port(self, id, mac_address):
+        self.engine.execute(models_v2.Port.__table__.insert(),
+                            id=id, tenant_id='tenant', name='',
+                            network_id='net', mac_address=mac_address,
+                            admin_state_up=True, status='ACTIVE',
+                            device_id='', device_owner='')
+
+    def test_index_added(self):
+        self._insert_port('port1', '12:34:56:00:00:01')
+        macs._index_macs(self.engine)
+        self.assertIn(models_v2.PORT_MAC_INDEX, self._indexes())
+        # up to date
+        macs._index_macs(self.engine)
+
+    def test_duplicates_not_indexed(self):
+        self._insert_port('port1', '12:34:56:00:00:01')
+        self._insert_port('port2', '12:34:56:00:00:01')
+        macs._index_macs(self.engine)
+        self.assertNotIn(models_v2.PORT_MAC_INDEX, self._indexes())
+        self.engine.execute(models_v2.Port.__table__.delete().where(
+            models_v2.Port.__table__.c.id == 'port2'))
+        macs._index_macs(self.engine)
+        self.assertIn(models_v2.PORT_MAC_INDEX, self._indexes())
+
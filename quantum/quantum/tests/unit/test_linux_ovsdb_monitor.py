@@ -0,0 +1,108 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import mock
+import unittest2 as unittest
+
+from quantum.agent.linux import ovsdb_monitor
+
+HEADINGS = ['row', 'action', 'name', 'ofport', 'external_ids']
+
+
+def _vif(iface_id, mac='fa:16:3e:00:00:01'):
+    return ['map', [['attached-mac', mac], ['iface-id', iface_id]]]
+
+
+def _update(*rows):
+    return json.dumps({'headings': HEADINGS, 'data': list(rows)}) + '\n'
+
+
+class TestInterfaceMonitor(unittest.TestCase):
+    def setUp(self):
+        self.bridge = mock.Mock()
+        self.bridge.br_name = 'br-int'
+        self.bridge.root_helper = 'sudo'
+        self.bridge.get_port_name_list.return_value = ['tap1', 'tap2',
+                                                       'patch-tun']
+        self.monitor = ovsdb_monitor.InterfaceMonitor(self.bridge)
+
+    def test_polls_bridge_until_synced(self):
+        self.bridge.get_vif_port_set.return_value = set(['port1'])
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_initial_rows(self):
+        self.monitor.process_update(_update(
+            ['u1', 'initial', 'tap1', 1, _vif('port1')],
+            ['u2', 'initial', 'patch-tun', 2, ['map', []]],
+            ['u3', 'initial', 'tap9', 3, _vif('port9')]))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+        self.assertFalse(self.bridge.get_vif_port_set.called)
+        self.assertTrue(self.monitor.wait(0))
+
+    def test_insert_and_delete(self):
+        self.monitor.process_update(_update(
+            ['u1', 'initial', 'tap1', 1, _vif('port1')]))
+        self.monitor.process_update(_update(
+            ['u2', 'insert', 'tap2', 2, _vif('port2')]))
+        self.assertEqual(self.monitor.get_vif_port_set(),
+                         set(['port1', 'port2']))
+        self.assertEqual(self.bridge.get_port_name_list.call_count, 2)
+
+        self.monitor.process_update(_update(
+            ['u1', 'delete', 'tap1', 1, _vif('port1')]))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port2']))
+        self.assertEqual(self.bridge.get_port_name_list.call_count, 2)
+
+    def test_modified_row(self):
+        self.monitor.process_update(_update(
+            ['u1', 'initial', 'tap1', ['set', []], ['map', []]]))
+        self.assertEqual(self.monitor.get_vif_port_set(), set())
+        self.monitor.process_update(_update(
+            ['u1', 'old', '', '', ['map', []]],
+            ['u1', 'new', 'tap1', 1, _vif('port1')]))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_ofport_change_does_not_list_ports(self):
+        self.monitor.process_update(_update(
+            ['u1', 'initial', 'tap1', -1, _vif('port1')]))
+        self.monitor.process_update(_update(
+            ['u1', 'old', '', -1, ''],
+            ['u1', 'new', 'tap1', 1, _vif('port1')]))
+        self.assertEqual(self.bridge.get_port_name_list.call_count, 1)
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_xenserver_vif(self):
+        self.bridge.get_xapi_iface_id.return_value = 'port1'
+        external_ids = ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                                ['xs-vif-uuid', 'xs1']]]
+        self.monitor.process_update(_update(
+            ['u1', 'initial', 'tap1', 1, external_ids]))
+        self.monitor.process_update(_update(
+            ['u2', 'insert', 'tap2', 2, _vif('port2')]))
+        self.assertEqual(self.monitor.get_vif_port_set(),
+                         set(['port1', 'port2']))
+        self.bridge.get_xapi_iface_id.assert_called_once_with('xs1')
+
+    def test_wait_timeout(self):
+        self.assertFalse(self.monitor.wait(0))
+
+    def test_command(self):
+        self.assertEqual(self.monitor._command(),
+                         ['sudo', 'ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport,external_ids', '--format=json'])
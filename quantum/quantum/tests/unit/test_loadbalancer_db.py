@@ -0,0 +1,290 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
+import unittest2 as unittest
+
+from quantum.common import config
+from quantum import context
+from quantum.db import api as db
+from quantum.db.loadbalancer import haproxy_config
+from quantum.db.loadbalancer import loadbalancer_db
+from quantum.db import model_base
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+
+HANDLE = 'c0a8e2a6-0d3e-4b1a-9a5e-5f3c2b1a0001'
+
+
+class LoadbalancerDbTestCase(unittest.TestCase):
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite://',
+                         'base': model_base.BASEV2})
+        self.addCleanup(db.clear_db, model_base.BASEV2)
+        self.addCleanup(cfg.CONF.reset)
+        haproxy_config.cache.invalidate()
+        self.plugin = loadbalancer_db.LoadbalancerPluginDb()
+        self.context = context.get_admin_context()
+        with self.context.session.begin():
+            self.context.session.add(models_v2.Subnet(
+                id='subnet1', ip_version=4, cidr='10.0.0.0/24'))
+        self.pool = self.plugin.create_pool(self.context, {'pool': {
+            'name': 'pool1', 'description': '', 'protocol': 'HTTP',
+            'lb_method': 'ROUND_ROBIN', 'subnet_id': 'subnet1'}})
+        self.session = self.plugin.create_session(self.context, {
+            'session': {'type': 'SOURCE_IP', 'cookie_name': None}})
+
+    def _create_vip(self, name='vip1', port_no=80):
+        return self.plugin.create_vip(self.context, {'vip': {
+            'name': name, 'description': '', 'port_no': port_no,
+            'protocol': 'HTTP', 'connection_limit': 100,
+            'session_persistance_id': self.session['id'],
+            'config_handle_id': HANDLE, 'pool_id': self.pool['id']}})
+
+    def _create_member(self, address):
+        return self.plugin.create_member(self.context, {'member': {
+            'name': address, 'ip_address': address,
+            'pool_id': self.pool['id'], 'port_no': 8080, 'weight': 1}})
+
+    def _sync(self, version=0, shard=None):
+        return self.plugin.create_config_sync(self.context, {'config_sync': {
+            'config_handle_id': HANDLE, 'version': str(version),
+            'shard': shard}})
+
+
+class TestConfigCache(LoadbalancerDbTestCase):
+    def _compile(self):
+        return ''.join(section for vip_id, section in
+                       self.plugin._compile_config(self.context, HANDLE))
+
+    def test_compiled_config_is_cached(self):
+        self._create_vip()
+        self._create_member('10.0.0.3')
+        self._compile()
+        with mock.patch.object(haproxy_config, 'render_vip') as render:
+            with mock.patch.object(self.plugin,
+                                   '_load_config_rows') as load:
+                self._compile()
+        self.assertFalse(load.called)
+        self.assertFalse(render.called)
+
+    def test_local_change_is_compiled(self):
+        self._create_vip()
+        self._create_member('10.0.0.3')
+        self.assertNotIn('10.0.0.4', self._compile())
+        self._create_member('10.0.0.4')
+        self.assertIn('10.0.0.4', self._compile())
+
+    def test_change_of_another_worker_is_compiled(self):
+        self._create_vip()
+        self._create_member('10.0.0.3')
+        self.assertNotIn('10.0.0.4', self._compile())
+        # committed by another API worker, this cache is not invalidated
+        with mock.patch.object(self.plugin, '_invalidate_config'):
+            self._create_member('10.0.0.4')
+        self.assertIn('10.0.0.4', self._compile())
+
+    def test_sections_read_before_an_invalidation_are_not_cached(self):
+        cache = haproxy_config.ConfigCache()
+        generation = cache.generation
+        cache.invalidate([HANDLE])
+        cache.put(HANDLE, 1, [('vip1', 'listen vip1\n')], generation)
+        self.assertIsNone(cache.get(HANDLE, 1))
+        cache.put(HANDLE, 1, [('vip1', 'listen vip1\n')], cache.generation)
+        self.assertEqual(cache.get(HANDLE, 1), [('vip1', 'listen vip1\n')])
+
+    def test_sections_of_another_version_are_not_served(self):
+        cache = haproxy_config.ConfigCache()
+        cache.put(HANDLE, 1, [('vip1', 'listen vip1\n')], cache.generation)
+        self.assertIsNone(cache.get(HANDLE, 2))
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_shards_are_cached_apart(self):
+        cache = haproxy_config.ConfigCache()
+        cache.put(HANDLE, 1, [('vip1', 'a')], cache.generation, (0, 2))
+        cache.put(HANDLE, 1, [('vip1', 'b')], cache.generation, (1, 2))
+        self.assertEqual(cache.get(HANDLE, 1, (0, 2)), [('vip1', 'a')])
+        self.assertEqual(cache.get(HANDLE, 1, (1, 2)), [('vip1', 'b')])
+        self.assertIsNone(cache.get(HANDLE, 1))
+
+    def test_unchanged_sections_are_not_rendered_again(self):
+        self._create_vip('vip1', 80)
+        self._create_vip('vip2', 81)
+        self._compile()
+        renders = haproxy_config.cache.stats['renders']
+        self.plugin.update_vip(self.context, self._vip_id('vip2'),
+                               {'vip': {'connection_limit': 200}})
+        self.assertIn('maxconn 200', self._compile())
+        self.assertEqual(haproxy_config.cache.stats['renders'], renders + 1)
+
+    def test_disabled_member_is_rendered(self):
+        self._create_vip()
+        member = self._create_member('10.0.0.3')
+        self.assertNotIn('disabled', self._compile())
+        self.plugin.update_member(self.context, member['id'],
+                                  {'member': {'admin_status': False}})
+        self.assertIn('server 10.0.0.3 10.0.0.3:8080 weight 1 disabled',
+                      self._compile())
+        self.plugin.update_member(self.context, member['id'],
+                                  {'member': {'admin_status': True}})
+        self.assertNotIn('disabled', self._compile())
+
+    def _vip_id(self, name):
+        return [vip['id'] for vip in self.plugin.get_vips(self.context)
+                if vip['name'] == name][0]
+
+
+class TestConfigSync(LoadbalancerDbTestCase):
+    def setUp(self):
+        super(TestConfigSync, self).setUp()
+        self.vip1 = self._create_vip('vip1', 80)
+        self.vip2 = self._create_vip('vip2', 81)
+        self.version = self._sync()['version']
+
+    def test_first_sync_is_full(self):
+        sync = self._sync()
+        self.assertTrue(sync['full'])
+        self.assertEqual(sorted(sync['sections']),
+                         sorted([self.vip1['id'], self.vip2['id']]))
+        self.assertEqual(sync['version'], str(
+            self.plugin.get_config_version(self.context, HANDLE)))
+        self.assertIn('maxconn', sync['global'])
+
+    def test_sync_returns_the_changed_vips(self):
+        self.plugin.update_vip(self.context, self.vip2['id'],
+                               {'vip': {'connection_limit': 200}})
+        sync = self._sync(self.version)
+        self.assertFalse(sync['full'])
+        self.assertEqual(sync['sections'].keys(), [self.vip2['id']])
+        self.assertIn('maxconn 200', sync['sections'][self.vip2['id']])
+        self.assertEqual(sync['global'], '')
+        self.assertNotEqual(sync['version'], self.version)
+
+    def test_sync_at_the_current_version_is_empty(self):
+        sync = self._sync(self.version)
+        self.assertFalse(sync['full'])
+        self.assertEqual(sync['sections'], {})
+        self.assertEqual(sync['version'], self.version)
+
+    def test_member_change_returns_the_vips_of_its_pool(self):
+        self._create_member('10.0.0.3')
+        sync = self._sync(self.version)
+        self.assertEqual(sorted(sync['sections']),
+                         sorted([self.vip1['id'], self.vip2['id']]))
+        self.assertIn('10.0.0.3', sync['sections'][self.vip1['id']])
+
+    def test_removed_vip_maps_to_none(self):
+        self.plugin.delete_vip(self.context, self.vip1['id'])
+        sync = self._sync(self.version)
+        self.assertEqual(sync['sections'], {self.vip1['id']: None})
+
+    def test_unknown_version_is_full(self):
+        sync = self._sync(int(self.version) + 100)
+        self.assertTrue(sync['full'])
+        self.assertEqual(len(sync['sections']), 2)
+
+    def test_history_is_pruned(self):
+        cfg.CONF.set_override('config_history', 3, 'DRIVER')
+        for limit in range(200, 205):
+            self.plugin.update_vip(self.context, self.vip1['id'],
+                                   {'vip': {'connection_limit': limit}})
+        session = self.context.session
+        versions = [row[0] for row in session.query(
+            loadbalancer_db.LB_Version.id).filter_by(
+                config_handle_id=HANDLE).order_by(
+                    loadbalancer_db.LB_Version.id)]
+        self.assertEqual(len(versions), 3)
+        self.assertEqual(versions[-1], int(
+            self.plugin.get_config_version(self.context, HANDLE)))
+        self.assertEqual(session.query(loadbalancer_db.LB_Delta).count(), 3)
+        # a VM behind the pruned history syncs its full config
+        self.assertTrue(self._sync(self.version)['full'])
+        sync = self._sync(versions[0])
+        self.assertFalse(sync['full'])
+        self.assertEqual(sync['sections'].keys(), [self.vip1['id']])
+
+    def test_history_is_pruned_per_config_handle(self):
+        cfg.CONF.set_override('config_history', 1, 'DRIVER')
+        other = self.plugin.create_vip(self.context, {'vip': {
+            'name': 'other', 'description': '', 'port_no': 82,
+            'protocol': 'HTTP', 'connection_limit': 100,
+            'session_persistance_id': self.session['id'],
+            'config_handle_id': 'other-handle', 'pool_id': self.pool['id']}})
+        self.plugin.update_vip(self.context, self.vip1['id'],
+                               {'vip': {'connection_limit': 200}})
+        self.assertTrue(self.plugin.get_config_version(self.context,
+                                                       'other-handle'))
+        self.plugin.update_vip(self.context, other['id'],
+                               {'vip': {'connection_limit': 200}})
+        query = self.context.session.query(loadbalancer_db.LB_Version)
+        self.assertEqual(sorted(version.config_handle_id
+                                for version in query),
+                         sorted([HANDLE, 'other-handle']))
+
+
+class TestConfigHistoryUpgrade(unittest.TestCase):
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        metadata = sa.MetaData()
+        # the tables as they were before the history was kept per handle
+        sa.Table('lb_versions', metadata,
+                 sa.Column('id', sa.Integer, primary_key=True),
+                 sa.Column('runtime_version', sa.String(50), nullable=False))
+        sa.Table('lb_deltas', metadata,
+                 sa.Column('id', sa.String(36), primary_key=True),
+                 sa.Column('main_table_name', sa.String(50), nullable=False),
+                 sa.Column('link_id', sa.Integer),
+                 sa.Column('old_value', sa.String(50)),
+                 sa.Column('new_value', sa.String(50)),
+                 sa.Column('operation', sa.String(50)),
+                 sa.Column('version_id', sa.Integer,
+                           sa.ForeignKey('lb_versions.id'), nullable=False),
+                 sa.Column('updated_at', sa.DateTime),
+                 sa.Column('user_id', sa.String(50), nullable=False))
+        metadata.create_all(self.engine)
+        self.engine.execute(metadata.tables['lb_versions'].insert(),
+                            id=1, runtime_version='1.0')
+        self.engine.execute(metadata.tables['lb_deltas'].insert(),
+                            id='delta1', main_table_name='lb_vips',
+                            link_id=1, version_id=1, user_id='')
+
+    def _columns(self, table):
+        inspector = reflection.Inspector.from_engine(self.engine)
+        return dict((column['name'], column['type'])
+                    for column in inspector.get_columns(table))
+
+    def test_history_is_recreated(self):
+        loadbalancer_db._recreate_config_history(self.engine)
+        self.assertIn('config_handle_id', self._columns('lb_versions'))
+        deltas = self._columns('lb_deltas')
+        self.assertIsInstance(deltas['link_id'], sa.String)
+        self.assertIsInstance(deltas['old_value'], sa.Text)
+        for table in ('lb_versions', 'lb_deltas'):
+            self.assertEqual(self.engine.execute(
+                'SELECT COUNT(*) FROM %s' % table).scalar(), 0)
+
+    def test_upgraded_history_is_kept(self):
+        loadbalancer_db._recreate_config_history(self.engine)
+        self.engine.execute(loadbalancer_db.LB_Version.__table__.insert(),
+                            id=1, config_handle_id=HANDLE,
+                            runtime_version='1')
+        loadbalancer_db._recreate_config_history(self.engine)
+        self.assertEqual(self.engine.execute(
+            'SELECT config_handle_id FROM lb_versions').fetchall(),
+            [(HANDLE,)])
@@ -319,3 +319,36 @@ class QuantumPolicyTestCase(unittest.TestCase):
             target = {'network_id': 'whatever'}
             result = policy.enforce(self.context, action, target, self.plugin)
             self.assertIsNone(result)
+
+    def test_check_list_parentresource_owner(self):
+        networks = [{'id': 'mine', 'tenant_id': 'fake'},
+                    {'id': 'other', 'tenant_id': 'somebody_else'}]
+
+        def fakegetnetworks(context, filters=None, fields=None):
+            self.assertEqual(sorted(filters['id']), ['mine', 'other'])
+            return networks
+
+        self.rules['get_port'] = [["rule:admin_or_network_owner"]]
+        ports = [{'network_id': 'mine', 'tenant_id': 'somebody_else'},
+                 {'network_id': 'other', 'tenant_id': 'somebody_else'},
+                 {'network_id': 'mine', 'tenant_id': 'fake'}]
+        with contextlib.nested(
+            mock.patch.object(self.plugin, 'get_networks',
+                              new=fakegetnetworks),
+            mock.patch.object(self.plugin, 'get_network')) as (
+                get_networks, get_network):
+            result = policy.check_list(self.context, 'get_port', ports,
+                                       self.plugin)
+            self.assertEqual(result, [ports[0], ports[2]])
+            self.assertFalse(get_network.called)
+
+    def test_check_list_matches_check(self):
+        networks = [{'tenant_id': 'fake', 'shared': False},
+                    {'tenant_id': 'somebody_else', 'shared': False},
+                    {'tenant_id': 'somebody_else', 'shared': True}]
+        result = policy.check_list(self.context, 'get_network', networks)
+        self.assertEqual(result, [network for network in networks
+                                  if policy.check(self.context,
+                                                  'get_network', network)])
+        self.assertEqual(result, [networks[0], networks[2]])
+
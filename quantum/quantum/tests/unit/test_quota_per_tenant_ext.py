@@ -1,3 +1,4 @@
+import functools
 import unittest
 import webtest
 
@@ -5,14 +6,19 @@ import mock
 
 from quantum.api.v2 import attributes
 from quantum.common import config
+from quantum.common import exceptions
 from quantum import context
 from quantum.db import api as db
+from quantum.db import quota_usages
+from quantum.extensions import _quotav2_driver
 from quantum.extensions import extensions
 from quantum import manager
 from quantum.openstack.common import cfg
+from quantum.openstack.common import timeutils
 from quantum.plugins.linuxbridge.db import l2network_db_v2
 from quantum import quota
 from quantum.tests.unit import test_api_v2
+from quantum.tests.unit import test_db_plugin
 from quantum.tests.unit import test_extensions
 
 
@@ -180,6 +186,30 @@ class QuotaExtensionTestCase(unittest.TestCase):
                               extra_environ=env, expect_errors=True)
         self.assertEquals(403, res.status_int)
 
+    def test_quotas_reserve_over_quota(self):
+        tenant_id = 'tenant_id1'
+        ctx = context.get_admin_context()
+        driver = _quotav2_driver.DbQuotaDriver()
+        resources = quota.QUOTAS._resources
+        reservations = driver.reserve(ctx, tenant_id, resources,
+                                      {'network': 10})
+        self.assertRaises(exceptions.OverQuota, driver.reserve, ctx,
+                          tenant_id, resources, {'network': 1})
+        driver.rollback(ctx, reservations)
+        self.assertEquals(1, len(driver.reserve(ctx, tenant_id, resources,
+                                                {'network': 1})))
+
+    def test_quotas_reservation_expired(self):
+        tenant_id = 'tenant_id1'
+        ctx = context.get_admin_context()
+        driver = _quotav2_driver.DbQuotaDriver()
+        resources = quota.QUOTAS._resources
+        cfg.CONF.set_override('reservation_expire', -1, group='QUOTAS')
+        driver.reserve(ctx, tenant_id, resources, {'network': 10})
+        cfg.CONF.set_override('reservation_expire', 600, group='QUOTAS')
+        self.assertEquals(1, len(driver.reserve(ctx, tenant_id, resources,
+                                                {'network': 10})))
+
     def test_quotas_loaded_bad(self):
         self.testflag = 2
         try:
@@ -188,3 +218,100 @@ class QuotaExtensionTestCase(unittest.TestCase):
         except Exception:
             pass
         self.testflag = 1
+
+
+class QuotaUsagesTestCase(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(QuotaUsagesTestCase, self).setUp()
+        # the engine was created with the driver configured on import
+        driver = mock.patch.object(quota.QUOTAS, '_driver',
+                                   _quotav2_driver.DbQuotaDriver())
+        driver.start()
+        self.addCleanup(driver.stop)
+        self.ctx = context.get_admin_context()
+
+    def _usage(self, resource):
+        usage = self.ctx.session.query(quota_usages.QuotaUsage).filter_by(
+            tenant_id=self._tenant_id, resource=resource).first()
+        self.ctx.session.expire_all()
+        return usage and (usage.in_use, usage.reserved)
+
+    def _reservations(self):
+        return self.ctx.session.query(quota_usages.Reservation).count()
+
+    def test_usage_follows_create_and_delete(self):
+        with self.network():
+            self.assertEqual(self._usage('network'), (1, 0))
+            self.assertEqual(self._reservations(), 0)
+        self.assertEqual(self._usage('network'), (0, 0))
+
+    def test_usage_counts_existing_resources(self):
+        with self.network(do_delete=False):
+            pass
+        self.ctx.session.query(quota_usages.QuotaUsage).delete()
+        with self.network():
+            # counted with the row of the first network
+            self.assertEqual(self._usage('network'), (2, 0))
+
+    def test_usage_follows_bulk_create(self):
+        res = self._create_network_bulk('json', 2, 'test', True)
+        self.assertEqual(res.status_int, 201)
+        self.assertEqual(self._usage('network'), (2, 0))
+        net = self.deserialize('json', res)['networks'][0]
+        res = self._create_port_bulk('json', 3, net['id'], 'test', True)
+        self.assertEqual(res.status_int, 201)
+        # inserted by statements rather than flushed
+        self.assertEqual(self._usage('port'), (3, 0))
+        self.assertEqual(self._reservations(), 0)
+
+    def test_usage_follows_cascaded_subnets(self):
+        with self.network(do_delete=False) as net:
+            self._make_subnet('json', net, '10.0.0.1', '10.0.0.0/24')
+            self.assertEqual(self._usage('subnet'), (1, 0))
+        self._delete('networks', net['network']['id'])
+        self.assertEqual(self._usage('subnet'), (0, 0))
+
+    def test_bulk_create_over_quota(self):
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        res = self._create_network_bulk('json', 3, 'test', True)
+        self.assertNotEqual(res.status_int, 201)
+        self.assertEqual(self._list('networks')['networks'], [])
+        self.assertEqual(self._usage('network'), (0, 0))
+        self.assertEqual(self._reservations(), 0)
+
+    def test_rollback_on_plugin_failure(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with mock.patch.object(plugin, 'create_network',
+                               side_effect=Exception()):
+            res = self._create_network('json', 'net1', True)
+            self.assertEqual(res.status_int, 500)
+        self.assertEqual(self._usage('network'), (0, 0))
+        self.assertEqual(self._reservations(), 0)
+
+    def test_rollback_on_bulk_failure(self):
+        plugin = manager.QuantumManager.get_plugin()
+        orig = plugin.create_network
+        with mock.patch.object(plugin, 'create_network') as patched:
+            patched.side_effect = functools.partial(self._do_side_effect,
+                                                    patched, orig)
+            res = self._create_network_bulk('json', 2, 'test', True)
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(self._usage('network'), (0, 0))
+        self.assertEqual(self._reservations(), 0)
+
+    def test_usage_inserted_concurrently(self):
+        other = context.get_admin_context()
+
+        def count(context, resource, tenant_id):
+            # the first reservation of another request, meanwhile
+            with other.session.begin():
+                other.session.add(quota_usages.QuotaUsage(
+                    tenant_id=tenant_id, resource=resource, in_use=0,
+                    reserved=5, counted_at=timeutils.utcnow()))
+            return 0
+
+        with mock.patch.object(quota_usages, 'count', side_effect=count):
+            quota.QUOTAS.reserve(self.ctx, self._tenant_id, 'network', 1)
+        self.assertEqual(self._usage('network'), (0, 6))
+
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark of the HAProxy config generation of the LB db plugin.
+
+Compares the per-VIP query implementation create_config used to have
+with the config compiler, cold (nothing cached), warm (config handle
+cached) and after changing one member. Runs against an in-memory sqlite
+database, so the numbers show query counts and python overhead rather
+than database latency:
+
+    PYTHONPATH=. python tools/haproxy_config_bench.py [vips ...]
+"""
+
+import gettext
+import sys
+import time
+
+gettext.install('quantum', unicode=1)
+
+from sqlalchemy import event
+
+from quantum import context
+from quantum.common import config
+from quantum.db import api as db
+from quantum.db.loadbalancer import haproxy_config
+from quantum.db.loadbalancer import loadbalancer_db as lb_db
+
+CONFIG_HANDLE_ID = '00000000-0000-0000-0000-000000000001'
+MEMBERS_PER_POOL = 3
+REPEAT = 5
+
+
+def legacy_create_config(ctx, config_handle_id):
+    """create_config as it was: four queries per VIP, string concatenation."""
+    vips = ctx.session.query(lb_db.LB_Virtual_IP).filter_by(
+        config_handle_id=config_handle_id).all()
+    lb_str = haproxy_config.GLOBAL
+    for vip in vips:
+        pool = ctx.session.query(lb_db.LB_Pool).filter_by(
+            id=vip.pool_id).one()
+        members = ctx.session.query(lb_db.LB_Pool_Member).filter_by(
+            pool_id=vip.pool_id).all()
+        try:
+            monitor = ctx.session.query(lb_db.LB_Health_Monitor).filter_by(
+                pool_id=vip.pool_id).one()
+        except Exception:
+            monitor = None
+        session = ctx.session.query(lb_db.LB_Session_Persistance).filter_by(
+            id=vip.session_persistance_id).one()
+        lb_str += "listen %s" % (vip.name) + "\n"
+        lb_str += "\t mode %s" % (str(vip.protocol).lower()) + "\n"
+        lb_str += "\t bind :%s" % (vip.port_no) + "\n"
+        lb_str += "\t maxconn %s" % (vip.connection_limit) + "\n"
+        lb_str += "\t balance %s" % (str(pool.lb_method).lower()) + "\n"
+        if monitor and monitor.type == 'HTTP':
+            lb_str += "\t option httpchk"
+            lb_str += " %s" % (monitor.http_method)
+            lb_str += " %s" % (monitor.url_path)
+            lb_str += " HTTP/1.0\n"
+        if monitor and monitor.expected_codes:
+            lb_str += "\t http-check expect"
+            lb_str += " status %s" % (int(monitor.expected_codes))
+            lb_str += "\n"
+        if session.type:
+            lb_str += "\t option persist\n"
+            lb_str += "\t cookie %s" % (session.cookie_name) + " insert\n"
+        for member in members:
+            name = str(member.ip_address)
+            lb_str += "\t server %s" % (name) + " %s" % (name)
+            lb_str += ":%s" % (member.port_no)
+            lb_str += " cookie %s" % (name.replace('.', ''))
+            lb_str += " weight %s" % (member.weight)
+            lb_str += " check inter %s fall %s rise 1" % (monitor.delay,
+                                                          monitor.max_retries)
+            lb_str += "\n"
+    return lb_str
+
+
+def populate(plugin, ctx, vips):
+    session = plugin.create_session(
+        ctx, {'session': {'type': 'HTTP_COOKIE', 'cookie_name': 'srv'}})
+    members = []
+    for i in range(vips):
+        pool_id = 'pool-%d' % i
+        ctx.session.add(lb_db.LB_Pool(id=pool_id, name=pool_id,
+                                      subnet_id='subnet', protocol='HTTP',
+                                      lb_method='ROUNDROBIN'))
+        plugin.create_vip(ctx, {'vip': {
+            'name': 'vip-%d' % i, 'description': '', 'port_no': 80,
+            'protocol': 'HTTP', 'connection_limit': 1000,
+            'session_persistance_id': session['id'],
+            'config_handle_id': CONFIG_HANDLE_ID,
+            'pool_id': pool_id, 'tenant_id': 'bench'}})
+        for j in range(MEMBERS_PER_POOL):
+            members.append(plugin.create_member(ctx, {'member': {
+                'name': 'member', 'ip_address': '10.%d.%d.%d' % (
+                    i / 250, i % 250, j + 1),
+                'pool_id': pool_id, 'port_no': 8080, 'weight': 1,
+                'tenant_id': 'bench'}}))
+        plugin.create_monitor(ctx, {'monitor': {
+            'name': 'monitor', 'pool_id': pool_id, 'type': 'HTTP',
+            'delay': 5, 'timeout': 5, 'max_retries': 3,
+            'http_method': 'GET', 'url_path': '/', 'expected_codes': '200',
+            'tenant_id': 'bench'}})
+    return members
+
+
+class QueryCounter(object):
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self)
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def measure(queries, func):
+    start_count = queries.count
+    start = time.time()
+    for i in range(REPEAT):
+        func()
+    elapsed = (time.time() - start) / REPEAT
+    return elapsed * 1000, (queries.count - start_count) / REPEAT
+
+
+def cold():
+    haproxy_config.cache.invalidate()
+    haproxy_config.cache._sections.clear()
+
+
+def bench(vips):
+    db.configure_db({'sql_connection': 'sqlite://',
+                     'base': lb_db.model_base.BASEV2})
+    plugin = lb_db.LoadbalancerPluginDb()
+    ctx = context.get_admin_context()
+    members = populate(plugin, ctx, vips)
+    queries = QueryCounter(ctx.session.get_bind())
+    request = {'config': {'config_handle_id': CONFIG_HANDLE_ID,
+                          'slug': 'loadbalancer', 'version': '0'}}
+
+    def compile_cold():
+        cold()
+        plugin.create_config(ctx, request)
+
+    def compile_changed():
+        plugin.update_member(ctx, members[0]['id'],
+                             {'member': {'weight': int(time.time())}})
+        plugin.create_config(ctx, request)
+
+    results = [
+        ('legacy', measure(queries, lambda: legacy_create_config(
+            ctx, CONFIG_HANDLE_ID))),
+        ('compiler cold', measure(queries, compile_cold)),
+        ('compiler warm', measure(queries, lambda: plugin.create_config(
+            ctx, request))),
+        ('member update+compile', measure(queries, compile_changed)),
+    ]
+    db.clear_db(lb_db.model_base.BASEV2)
+    print '%d VIPs, %d members each' % (vips, MEMBERS_PER_POOL)
+    for name, (ms, queries) in results:
+        print '    %-20s %10.2f ms %6d queries' % (name, ms, queries)
+
+
+def main():
+    config.parse([])
+    for vips in [int(arg) for arg in sys.argv[1:]] or [1, 100, 1000]:
+        bench(vips)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the HAProxy driver remote control against one device.
+
+Measures operations per second on a haproxy VM with a new ssh connection
+per command (haproxy_ssh_persist = 0) and with a multiplexed master
+connection:
+
+    command   one remote command (md5sum of the config)
+    fetch     fetching the config
+    deploy    redeploying the current config, as four commands (scp,
+              haproxy -c, mv, reload) and pipelined in one round trip
+
+The config of the device is written back unchanged, but HAProxy is
+reloaded on every deploy:
+
+    PYTHONPATH=. python tools/haproxy_remote_bench.py address [namespace]
+        [--key path] [--count n]
+"""
+
+import argparse
+import gettext
+import os
+import tempfile
+import time
+
+gettext.install('quantum', unicode=1)
+
+from quantum.common import config
+from quantum.openstack.common import cfg
+# registers the HAPROXY options
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    haproxy_driver)
+from quantum.plugins.services.loadbalancer.drivers.haproxy import (
+    remote_control)
+
+CONFIG_PATH = '/etc/haproxy/haproxy.cfg'
+TMP_PATH = '/tmp/haproxy.cfg.remote'
+
+
+def legacy_deploy(rc, local_path):
+    return (rc.put_file(local_path, TMP_PATH) and
+            rc.validate_config(TMP_PATH) and
+            rc.perform('sudo mv %s %s' % (TMP_PATH, CONFIG_PATH)) and
+            rc.restart_haproxy())
+
+
+def pipelined_deploy(rc, raw_config):
+    return (remote_control.DEPLOY_RELOADED in
+            rc.deploy_config(raw_config, TMP_PATH, CONFIG_PATH))
+
+
+def measure(count, func):
+    start = time.time()
+    for i in range(count):
+        if not func():
+            raise RuntimeError('operation failed, see the log')
+    return count / (time.time() - start)
+
+
+def bench(mgmt, count, persist):
+    cfg.CONF.set_override('haproxy_ssh_persist', persist, 'HAPROXY')
+    # a RemoteControl per operation, as the driver does
+    new = lambda: remote_control.RemoteControl(mgmt)
+    raw_config = new().read_file(CONFIG_PATH)
+    if raw_config is None:
+        raise RuntimeError('could not read %s' % CONFIG_PATH)
+    fd, local_path = tempfile.mkstemp()
+    os.write(fd, raw_config)
+    os.close(fd)
+    try:
+        results = [
+            ('command', measure(count, lambda: new().get_checksum(
+                CONFIG_PATH))),
+            ('fetch', measure(count, lambda: new().read_file(
+                CONFIG_PATH) is not None)),
+            ('deploy (4 commands)', measure(count, lambda: legacy_deploy(
+                new(), local_path))),
+            ('deploy (pipelined)', measure(count, lambda: pipelined_deploy(
+                new(), raw_config))),
+        ]
+    finally:
+        os.unlink(local_path)
+        new().close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('address')
+    parser.add_argument('namespace', nargs='?')
+    parser.add_argument('--key', default=None)
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args()
+    config.parse([])
+    if args.key:
+        cfg.CONF.set_override('haproxy_key_path', args.key, 'HAPROXY')
+    cfg.CONF.set_override('haproxy_ssh_control_dir',
+                          tempfile.mkdtemp(), 'HAPROXY')
+    mgmt = {'address': args.address, 'namespace': args.namespace}
+
+    before = bench(mgmt, args.count, 0)
+    after = bench(mgmt, args.count, 60)
+    print '%s, %d operations each' % (args.address, args.count)
+    print '    %-20s %14s %14s' % ('ops/sec', 'per command', 'multiplexed')
+    for (name, ops), (name, mux_ops) in zip(before, after):
+        print '    %-20s %14.2f %14.2f' % (name, ops, mux_ops)
+
+
+if __name__ == '__main__':
+    main()
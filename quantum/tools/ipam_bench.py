@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Concurrency benchmark of the IP address allocation of the v2 plugins.
+
+Creates ports on one subnet from several processes at once, as API
+workers do, then checks that no address was handed out twice and that
+the allocated and free addresses add up to the allocation pool. Use a
+database with row locks (MySQL, PostgreSQL) to measure the contention:
+
+    PYTHONPATH=. python tools/ipam_bench.py [--connection url]
+        [--workers n] [--ports n] [--bulk n] [--random-range]
+
+The database (a new sqlite file by default) gets a network with a /16
+subnet. Transactions failing on a lock or, with sqlite, on a range
+changed by another worker are retried and counted.
+"""
+
+import argparse
+import gettext
+import multiprocessing
+import os
+import tempfile
+import time
+
+gettext.install('quantum', unicode=1)
+
+import netaddr
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.orm import exc as orm_exc
+
+from quantum.api.v2 import attributes
+from quantum.common import config
+from quantum import context
+from quantum.db import api as db
+from quantum.db import db_base_plugin_v2
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+
+CIDR = '10.0.0.0/16'
+
+
+def setup(connection, random_range):
+    config.parse([])
+    cfg.CONF.set_override('ip_allocation_random_range', random_range)
+    db.configure_db({'sql_connection': connection,
+                     'base': models_v2.model_base.BASEV2})
+    return db_base_plugin_v2.QuantumDbPluginV2()
+
+
+def create_network(plugin):
+    ctx = context.get_admin_context()
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'ipam_bench', 'admin_state_up': True, 'tenant_id': 'bench',
+        'shared': False}})
+    plugin.create_subnet(ctx, {'subnet': {
+        'network_id': network['id'], 'cidr': CIDR, 'ip_version': 4,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED, 'name': '',
+        'tenant_id': 'bench', 'enable_dhcp': True,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED}})
+    return network['id']
+
+
+def port(network_id):
+    return {'port': {'network_id': network_id, 'name': '',
+                     'admin_state_up': True, 'tenant_id': 'bench',
+                     'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                     'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+                     'device_id': '', 'device_owner': ''}}
+
+
+def worker(args, network_id, count, results):
+    plugin = setup(args.connection, args.random_range)
+    created = retries = 0
+    try:
+        while created < count:
+            size = min(args.bulk, count - created)
+            ctx = context.get_admin_context()
+            try:
+                if size > 1:
+                    plugin.create_port_bulk(
+                        ctx, {'ports': [port(network_id)
+                                        for i in range(size)]})
+                else:
+                    plugin.create_port(ctx, port(network_id))
+            except (sa_exc.OperationalError, orm_exc.StaleDataError):
+                # without row locks (sqlite) a range changed by another
+                # worker fails the flush
+                retries += 1
+                continue
+            created += size
+    finally:
+        results.put((created, retries))
+
+
+def check(plugin):
+    ctx = context.get_admin_context()
+    addresses = [ip for ip, in ctx.session.query(
+        models_v2.IPAllocation.ip_address)]
+    free = 0
+    for first_ip, last_ip in ctx.session.query(
+            models_v2.IPAvailabilityRange.first_ip,
+            models_v2.IPAvailabilityRange.last_ip):
+        free += int(netaddr.IPAddress(last_ip)) - int(
+            netaddr.IPAddress(first_ip)) + 1
+    # all of the /16 but the network, broadcast and gateway addresses
+    pool_size = netaddr.IPNetwork(CIDR).size - 3
+    return len(addresses), len(set(addresses)), free, pool_size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connection', default=None)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--ports', type=int, default=10000)
+    parser.add_argument('--bulk', type=int, default=1)
+    parser.add_argument('--random-range', action='store_true')
+    args = parser.parse_args()
+    if args.connection is None:
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        args.connection = 'sqlite:///%s' % path
+
+    network_id = create_network(setup(args.connection, args.random_range))
+    # the workers open connections of their own
+    context.get_admin_context().session.bind.dispose()
+    results = multiprocessing.Queue()
+    share = args.ports // args.workers
+    counts = [share + (i < args.ports % args.workers)
+              for i in range(args.workers)]
+    workers = [multiprocessing.Process(target=worker,
+                                       args=(args, network_id, count,
+                                             results))
+               for count in counts]
+    start = time.time()
+    for process in workers:
+        process.start()
+    created = retries = 0
+    for process in workers:
+        c, r = results.get()
+        created += c
+        retries += r
+    for process in workers:
+        process.join()
+    elapsed = time.time() - start
+
+    allocated, distinct, free, pool_size = check(
+        setup(args.connection, args.random_range))
+    print '%s, %d workers, bulk of %d%s' % (
+        args.connection, args.workers, args.bulk,
+        ', random range' if args.random_range else '')
+    print '    ports created       %8d in %.2fs, %.1f/s' % (
+        created, elapsed, created / elapsed)
+    print '    retried             %8d' % retries
+    print '    addresses allocated %8d, %d distinct' % (allocated, distinct)
+    print '    free + allocated    %8d of %d in the pool' % (
+        free + allocated, pool_size)
+    if allocated != distinct or free + allocated != pool_size:
+        raise SystemExit('IP allocation is inconsistent')
+
+
+if __name__ == '__main__':
+    main()
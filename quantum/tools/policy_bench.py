@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 Freescale Semiconductor, Inc.
+# All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the authorization of the v2 list operations.
+
+Times GET /ports, as a tenant owning half of the networks and ports,
+without authorization, with the policy checks of the whole list at once
+(policy.check_list, what the API does) and with a check per port, which
+looks up the network of each port:
+
+    PYTHONPATH=. python tools/policy_bench.py [--connection url]
+        [--ports n] [--networks n] [--repeat n]
+
+The database (a new sqlite file by default) is filled with the ports
+first.
+"""
+
+import argparse
+import gettext
+import os
+import tempfile
+import time
+
+gettext.install('quantum', unicode=1)
+
+from quantum.api.v2 import attributes
+from quantum.api.v2 import base
+from quantum.common import config
+from quantum import context
+from quantum.db import api as db
+from quantum.db import db_base_plugin_v2
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum import policy
+from quantum import wsgi
+
+POLICY = """{
+    "admin_or_owner": [["role:admin"], ["tenant_id:%(tenant_id)s"]],
+    "admin_or_network_owner": [["role:admin"],
+                               ["tenant_id:%(network_tenant_id)s"]],
+    "admin_only": [["role:admin"]],
+    "shared": [["field:networks:shared=True"]],
+    "default": [["rule:admin_or_owner"]],
+    "get_network": [["rule:admin_or_owner"], ["rule:shared"]],
+    "get_port": [["rule:admin_or_owner"], ["rule:admin_or_network_owner"]]
+}"""
+
+
+def setup(args):
+    config.parse([])
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.write(fd, POLICY)
+    os.close(fd)
+    cfg.CONF.set_override('policy_file', path)
+    db.configure_db({'sql_connection': args.connection,
+                     'base': models_v2.model_base.BASEV2})
+    return db_base_plugin_v2.QuantumDbPluginV2()
+
+
+def populate(plugin, args):
+    ctx = context.get_admin_context()
+    networks = [plugin.create_network(ctx, {'network': {
+        'name': 'policy_bench', 'admin_state_up': True,
+        'tenant_id': ('bench', 'other')[i % 2], 'shared': False}})
+        for i in range(args.networks)]
+    ports = []
+    for i in range(args.ports):
+        ports.append({'port': {
+            'network_id': networks[i % len(networks)]['id'], 'name': '',
+            'admin_state_up': True, 'tenant_id': ('bench', 'other')[i % 2],
+            'mac_address': attributes.ATTR_NOT_SPECIFIED,
+            'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+            'device_id': '', 'device_owner': ''}})
+        if len(ports) == 1000 or i == args.ports - 1:
+            plugin.create_port_bulk(ctx, {'ports': ports})
+            ports = []
+
+
+def per_port(controller, request):
+    ports = controller._items(request)['ports']
+    return {'ports': [port for port in ports
+                      if policy.check(request.context, 'get_port', port,
+                                      plugin=controller._plugin)]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connection', default=None)
+    parser.add_argument('--ports', type=int, default=10000)
+    parser.add_argument('--networks', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    if args.connection is None:
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        args.connection = 'sqlite:///%s' % path
+
+    plugin = setup(args)
+    populate(plugin, args)
+    get_network = plugin.get_network
+    lookups = []
+
+    def counting_get_network(*args, **kwargs):
+        lookups.append(1)
+        return get_network(*args, **kwargs)
+    plugin.get_network = counting_get_network
+
+    controller = base.Controller(plugin, 'ports', 'port',
+                                 attributes.RESOURCE_ATTRIBUTE_MAP['ports'])
+    print '%s, %d ports on %d networks' % (args.connection, args.ports,
+                                           args.networks)
+    for name, index in (('no authz', lambda r: controller._items(r)),
+                        ('authz', controller.index),
+                        ('authz per port', lambda r: per_port(controller,
+                                                              r))):
+        best = None
+        for i in range(args.repeat):
+            request = wsgi.Request.blank('/ports')
+            request.environ['quantum.context'] = context.Context(
+                'user', 'bench', roles=['member'])
+            del lookups[:]
+            start = time.time()
+            ports = index(request)['ports']
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print '    %-15s %6d ports in %.3fs, %d network lookups' % (
+            name, len(ports), best, len(lookups))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,65 +13,383 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 # SLB VM Configuration Daemon
+import errno
+import json
+import os
+import select
+import socket
+import struct
+import subprocess
 import sys
 import time
-import os
+
+PORT_PATH = "/dev/virtio-ports/ns_port"
+HAPROXY_CFG_PATH = "/etc/haproxy/haproxy.cfg"
+HAPROXY_PID_PATH = "/var/run/haproxy.pid"
+# must match the stats socket in the global section sent by quantum
+STATS_SOCKET_PATH = "/tmp/haproxy"
+
+# Messages on the port are JSON objects preceded by their length as a 4 byte
+# unsigned integer in network byte order. This is a copy of
+# quantum/plugins/services/nwservices/agent/framing.py, keep them in sync.
+HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class FramingError(Exception):
+    pass
+
+
+def encode(message):
+    payload = json.dumps(message)
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder(object):
+    """
+    Reassembles messages from the chunks read off the port.
+    """
+    def __init__(self,max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self,data):
+        """
+        Buffers data and returns the messages completed by it.
+        """
+        self.buffer.extend(data)
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            size = HEADER.unpack_from(self.buffer, offset)[0]
+            if size > self.max_frame_size:
+                raise FramingError('frame of %d bytes exceeds the limit' %
+                                   size)
+            end = offset + HEADER.size + size
+            if len(self.buffer) < end:
+                break
+            try:
+                messages.append(json.loads(
+                    str(self.buffer[offset + HEADER.size:end])))
+            except ValueError, e:
+                raise FramingError('malformed message: %s' % e)
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return messages
 
 
 class SLBVMConfigurationDaemon(object):
     """
-    SLBVMConfigurationDaemon class implements the SLB VM configuration routines 
+    SLBVMConfigurationDaemon class implements the SLB VM configuration routines
     required for the updates to the configuration of the SLB.
     Here, HA-Proxy
+
+    The daemon keeps the listen sections of the running configuration and
+    asks quantum (through the relay agent) only for the sections changed
+    since the version it applied last. Changes are applied without dropping
+    established connections: the new configuration is validated in a
+    temporary file and swapped in with a rename, then weight and
+    enable/disable changes go through the stats socket while anything else
+    is picked up by a soft reload (-sf).
+
+    Sync requests carry an id which the relay agent echoes in its reply.
+    Only one sync per config handle is in flight, a notification arriving
+    meanwhile is answered once the running sync has been applied.
+
+    When quantum scaled the chain image out, each of its VMs serves a
+    shard of the pool members. A notification for another shard than the
+    one applied asks for the full configuration.
     """
     def __init__(self):
         """
         Initializing the data required
         """
-        self.response = ''
-        self.tmp_path ="/tmp/haproxy.cfg"
-        self.haproxy_cfg_path ="/etc/haproxy/haproxy.cfg"
-        
+        self.tmp_path = HAPROXY_CFG_PATH + ".tmp"
+        self.haproxy_cfg_path = HAPROXY_CFG_PATH
+        self.version = '0'
+        self.global_section = ''
+        # vip id -> listen section
+        self.sections = {}
+        # [index, count] of the member shard applied, None for all members
+        self.shard = None
+        self.next_id = 0
+        # request id -> config handle of the syncs in flight
+        self.syncing = {}
+        # config handle -> notification received while syncing it
+        self.resync = {}
+        self.out = bytearray()
+
     def _handle_loadbalancer_config(self,request_dict):
         """
         Handles update of HA-Proxy Configuration
         and Resuests from Compute node.
         """
-        self.client_api = 'dummy.api'
-        request_dict['client_api'] = self.client_api
         if request_dict['header'] == 'request':
-            json_data = self._prepare_response(request_dict)
+            if (request_dict['version'] == self.version and
+                request_dict.get('shard') == self.shard):
+                return None
+            return self._prepare_sync_request(request_dict)
         elif request_dict['header'] == 'data':
-            # TODO (Trinath) for now dont send response for DATA header
-            self._handle_request_data(request_dict)
-        return json_data
+            return self._handle_request_data(request_dict)
+
+    def _prepare_sync_request(self,request):
+        """
+        Asks quantum for the changes since the applied version.
+        """
+        handle = request['config_handle_id']
+        if handle in self.syncing.values():
+            self.resync[handle] = request
+            return None
+        version = self.version
+        if request.get('shard') != self.shard:
+            version = '0'
+        self.next_id += 1
+        self.syncing[self.next_id] = handle
+        return {'id':self.next_id,
+                'method':'sync_slb_config',
+                'kwargs':{'body':{'config_sync':{
+                    'config_handle_id':request['config_handle_id'],
+                    'slug':request['slug'],
+                    'version':version,
+                    'shard':request.get('shard')}}}}
 
     def _handle_request_data(self,request_dict):
         """
-        Handles 'data' header and prepares the 
+        Applies the sections received from quantum and prepares the
         response json.
         """
-        self._write_file(self.tmp_path,request_dict['data'])
-        check_cfg = os.popen("haproxy -c -f {0}".self.tmp_path)
-        print check_cfg
-        # TODO (trinath) Check the return status of the above 
-        # haproxy command, and work the next operation
-        self._write_file(self.haproxy_cfg_path,request_dict['data'])
-        json_data = self._prepare_response(request_dict)
-        os.system("service haproxy restart")
-        return json_data
+        start = time.time()
+        if request_dict['full']:
+            global_section = request_dict['global']
+            sections = {}
+        else:
+            global_section = self.global_section
+            sections = dict(self.sections)
+        for vip_id, section in request_dict['sections'].items():
+            if section is None:
+                sections.pop(vip_id, None)
+            else:
+                sections[vip_id] = section
+        data = self._render(global_section, sections)
+
+        try:
+            # nothing is applied unless the whole configuration is valid,
+            # the file also keeps the weights and enabled/disabled servers
+            # changed at runtime for the next reload or reboot
+            self._validate_and_swap(data)
+            commands = None
+            if global_section == self.global_section:
+                commands = self._runtime_commands(self.sections, sections)
+            if commands is not None and self._run_socket_commands(commands):
+                reload = 'runtime'
+            else:
+                self._reload()
+                reload = 'soft'
+        except RuntimeError, e:
+            return self._prepare_response(request_dict, 'error',
+                                          time.time() - start, error=str(e))
+
+        self.global_section = global_section
+        self.sections = sections
+        self.version = request_dict['version']
+        self.shard = request_dict.get('shard')
+        return self._prepare_response(request_dict, 'ok', time.time() - start,
+                                      reload=reload)
+
+    def _render(self,global_section,sections):
+        """
+        Builds the configuration file, listen sections sorted by name.
+        """
+        return global_section + ''.join(sorted(sections.values()))
 
+    def _runtime_commands(self,old_sections,new_sections):
+        """
+        Returns the stats socket commands turning the old sections into
+        the new ones, or None if the change needs a reload.
+        """
+        if set(old_sections) != set(new_sections):
+            return None
+        commands = []
+        for vip_id, new in new_sections.items():
+            old = old_sections[vip_id]
+            if old == new:
+                continue
+            old_lines = old.splitlines()
+            new_lines = new.splitlines()
+            if len(old_lines) != len(new_lines):
+                return None
+            backend = None
+            for old_line, new_line in zip(old_lines, new_lines):
+                if old_line == new_line:
+                    if old_line.startswith('listen '):
+                        backend = old_line.split()[1]
+                    continue
+                old_server = self._split_server(old_line)
+                new_server = self._split_server(new_line)
+                if (backend is None or old_server is None or
+                    new_server is None or old_server[0] != new_server[0] or
+                    old_server[3] != new_server[3]):
+                    return None
+                name, weight, disabled = new_server[:3]
+                if old_server[1] != weight:
+                    commands.append('set weight %s/%s %s' %
+                                    (backend, name, weight))
+                if old_server[2] != disabled:
+                    commands.append('%s server %s/%s' %
+                                    (disabled and 'disable' or 'enable',
+                                     backend, name))
+        return commands
+
+    def _split_server(self,line):
+        """
+        Splits a server line into (name, weight, disabled, other options).
+        """
+        tokens = line.split()
+        if len(tokens) < 3 or tokens[0] != 'server':
+            return None
+        weight = '1'
+        disabled = False
+        rest = []
+        i = 1
+        while i < len(tokens):
+            if tokens[i] == 'weight' and i + 1 < len(tokens):
+                weight = tokens[i + 1]
+                i += 2
+                continue
+            if tokens[i] == 'disabled':
+                disabled = True
+            else:
+                rest.append(tokens[i])
+            i += 1
+        return tokens[1], weight, disabled, rest
 
-    def _prepare_response(self,request):
+    def _run_socket_commands(self,commands):
+        """
+        Runs commands on the HAProxy stats socket, False if any failed.
+        """
+        for command in commands:
+            try:
+                reply = self._socket_command(command)
+            except socket.error, e:
+                sys.stderr.write('stats socket error: %s\n' % e)
+                return False
+            if reply.strip():
+                sys.stderr.write('%s: %s\n' % (command, reply.strip()))
+                return False
+        return True
+
+    def _socket_command(self,command):
+        """
+        Runs one command on the HAProxy stats socket and returns its output.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(STATS_SOCKET_PATH)
+            sock.sendall(command + '\n')
+            reply = ''
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                reply += data
+        finally:
+            sock.close()
+        return reply
+
+    def _handle_stats(self,request):
+        """
+        Returns the frontend and backend counters of HAProxy, quantum
+        scales the chain image on them.
+        """
+        try:
+            # -1 proxies, 3 = frontends and backends, -1 servers
+            reply = self._socket_command('show stat -1 3 -1')
+        except socket.error, e:
+            sys.stderr.write('stats socket error: %s\n' % e)
+            reply = ''
+        return {"header":"stats",
+                "config_handle_id":request['config_handle_id'],
+                "slug":request['slug'],
+                "stats":self._parse_stats(reply)}
+
+    def _parse_stats(self,reply):
+        """
+        Parses the CSV output of 'show stat'.
+        """
+        lines = reply.splitlines()
+        if not lines or not lines[0].startswith('# '):
+            return []
+        columns = lines[0][2:].split(',')
+        stats = []
+        for line in lines[1:]:
+            row = dict(zip(columns, line.split(',')))
+            if row.get('svname') not in ('FRONTEND', 'BACKEND'):
+                continue
+            stats.append({'name':row['pxname'],
+                          'type':row['svname'].lower(),
+                          'sessions':self._counter(row.get('scur')),
+                          'rate':self._counter(row.get('rate')),
+                          'queue':self._counter(row.get('qcur'))})
+        return stats
+
+    def _counter(self,value):
+        try:
+            return int(value or 0)
+        except ValueError:
+            return 0
+
+    def _validate_and_swap(self,data):
+        """
+        Validates data in a temporary file and renames it over the
+        configuration, the rename is atomic so HAProxy never reads a
+        partial file.
+        """
+        self._write_file(self.tmp_path,data)
+        check = subprocess.Popen(['haproxy', '-c', '-f', self.tmp_path],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+        output = check.communicate()[0]
+        if check.returncode != 0:
+            os.unlink(self.tmp_path)
+            raise RuntimeError('invalid configuration: %s' % output.strip())
+        os.rename(self.tmp_path,self.haproxy_cfg_path)
+
+    def _reload(self):
+        """
+        Starts a new HAProxy which tells the old processes to finish their
+        connections and exit (-sf).
+        """
+        command = ['haproxy', '-f', self.haproxy_cfg_path,
+                   '-p', HAPROXY_PID_PATH]
+        try:
+            with open(HAPROXY_PID_PATH) as fd:
+                old_pids = fd.read().split()
+        except IOError:
+            old_pids = []
+        if old_pids:
+            command += ['-sf'] + old_pids
+        reload = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT)
+        output = reload.communicate()[0]
+        if reload.returncode != 0:
+            raise RuntimeError('reload failed: %s' % output.strip())
+
+    def _prepare_response(self,request,status,latency,reload=None,
+                          error=None):
         """
         Prepare the JSON formatted Response data.
         """
         data = {"header":"response",
                 "config_handle_id":request['config_handle_id'],
                 "slug":request['slug'],
-                "client_api":request['client_api'],
-                "version":"0.0",
+                "version":self.version,
+                "status":status,
+                "reload":reload,
+                "latency":latency,
                }
+        if error:
+            data['error'] = error
         return data
 
     def _write_file(self,path,data):
@@ -80,39 +398,125 @@ class SLBVMConfigurationDaemon(object):
         """
         with open(path,"w") as fd:
             fd.write(data)
-            fd.close()
+            fd.flush()
+            os.fsync(fd.fileno())
+
+    def _dispatch(self,message):
+        """
+        Returns the replies to a message from the relay agent.
+        """
+        if 'id' in message:
+            return self._handle_reply(message)
+        if 'stats' in message:
+            if message['stats'].get('slug') != 'loadbalancer':
+                return []
+            return [self._handle_stats(message['stats'])]
+        if 'config' in message:
+            request_dict = message['config']
+        elif 'config_sync' in message:
+            request_dict = message['config_sync']
+        else:
+            return []
+        if request_dict.get('slug') != 'loadbalancer':
+            return []
+        reply = self._handle_loadbalancer_config(request_dict)
+        return reply and [reply] or []
+
+    def _handle_reply(self,message):
+        """
+        Applies the reply to a sync request and asks again if a newer
+        version was announced while it was in flight.
+        """
+        handle = self.syncing.pop(message['id'], None)
+        if handle is None:
+            sys.stderr.write('reply to unknown request %s\n' % message['id'])
+            return []
+        replies = []
+        if 'error' in message:
+            sys.stderr.write('config sync failed: %s\n' % message['error'])
+        else:
+            replies.extend(self._dispatch(message['result']))
+        if handle in self.resync:
+            replies.extend(self._dispatch({'config':self.resync.pop(handle)}))
+        return replies
+
+    def _send(self,message):
+        self.out.extend(encode(message))
+
+    def _flush(self,fd):
+        """
+        Writes as much of the pending output as the port takes.
+        """
+        try:
+            sent = os.write(fd, buffer(self.out))
+        except OSError, e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+        del self.out[:sent]
 
+    def _reset(self):
+        """
+        Drops the state of the connection to the host, the relay agent
+        waits for a new hello when it reconnects.
+        """
+        self.syncing.clear()
+        self.resync.clear()
+        self.out = bytearray()
+        self._send({'method':'hello','msg':'Config Daemon is UP'})
 
     def daemon_loop(self):
         """
         Loop to find the incoming config change requests
-        and update and restart the SLB.
+        and update and reload the SLB.
         """
-        fd = open("/dev/virtio-ports/ns_port",'a+')
-        fd.write("{'method':'hello','msg':'Config Daemon is UP'}")
+        fd = os.open(PORT_PATH, os.O_RDWR | os.O_NONBLOCK)
+        poller = select.poll()
+        decoder = FrameDecoder()
+        self._reset()
         while True:
-            request_dict = fd.read(65535)
-            if self.request_dict['slug'] == 'loadbalancer':
-                self.response = self._handle_loadbalancer_config(self.request_dict)
-            if self.response:
-                fd.write(self.response)
+            events = select.POLLIN
+            if self.out:
+                events |= select.POLLOUT
+            poller.register(fd, events)
+            for _fd, event in poller.poll():
+                if event & select.POLLOUT:
+                    self._flush(fd)
+                if not event & (select.POLLIN | select.POLLHUP |
+                                select.POLLERR):
+                    continue
+                try:
+                    data = os.read(fd, 65536)
+                except OSError, e:
+                    if e.errno in (errno.EAGAIN, errno.EINTR):
+                        continue
+                    raise
+                if not data:
+                    # the host side of the port is not connected
+                    decoder = FrameDecoder()
+                    self._reset()
+                    time.sleep(1)
+                    continue
+                try:
+                    messages = decoder.feed(data)
+                except FramingError, e:
+                    sys.stderr.write('%s, resetting\n' % e)
+                    decoder = FrameDecoder()
+                    self._reset()
+                    continue
+                for message in messages:
+                    for reply in self._dispatch(message):
+                        self._send(reply)
+
 
-            
 def main():
     """
     Start the Daemon Loop with required data
     """
     VmConf = SLBVMConfigurationDaemon()
-    VmConf.deamon_loop()
+    VmConf.daemon_loop()
     sys.exit(0)
-    pass
 
 
 if __name__ == "__main__":
     main()
-
-
-
-    
-
-